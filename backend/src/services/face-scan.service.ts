@@ -314,10 +314,12 @@ export async function processFaceScan(scanId: string, files: Express.Multer.File
       });
     }
 
-    // Call ML service for face analysis
+    // Call ML service for face analysis. The timeout is forwarded so the ML
+    // service stops (and returns a partial result) instead of working past it.
+    const timeoutMs = 60000; // 60 second timeout
     const response = await axios.post(`${ML_SERVICE_URL}/face-scan`, formData, {
-      headers: formData.getHeaders(),
-      timeout: 60000 // 60 second timeout
+      headers: { ...formData.getHeaders(), 'X-Request-Timeout-Ms': String(timeoutMs) },
+      timeout: timeoutMs
     });
 
     const processingTime = Date.now() - startTime;
@@ -334,6 +336,10 @@ export async function processFaceScan(scanId: string, files: Express.Multer.File
       return; // Don't throw - just mark as failed
     }
 
+    if (response.data.quality_tier && response.data.quality_tier !== 'full') {
+      console.log(`[FaceScan] Scan ${scanId} ran at degraded quality tier: ${response.data.quality_tier}`);
+    }
+
     // Update scan with results
     await updateFaceScan(scanId, {
       status: 'completed',
@@ -0,0 +1,120 @@
+"""
+Production server configuration
+Prefork Uvicorn workers sized to the CPU quota, with preloaded assets and worker recycling
+
+    gunicorn -c gunicorn.conf.py main:app
+
+- The app is imported once in the master (preload_app) so read-only assets
+  loaded at import time (Haar cascade, face region mask template, size
+  charts) are shared copy-on-write by every worker.
+- MediaPipe landmarkers are created after the fork, in each worker's
+  startup hook (FaceScanService.warm_up).
+- Workers are recycled after MAX_REQUESTS requests or when their RSS
+  passes WORKER_RSS_LIMIT_MB, to contain native memory growth.
+- On SIGTERM (deploy), workers stop accepting connections and finish
+  in-flight requests for up to GRACEFUL_TIMEOUT seconds.
+"""
+
+import gc
+import math
+import os
+import resource
+import signal
+import threading
+import time
+
+
+def _cpu_quota() -> float:
+    """CPUs this container may use: cgroup v2/v1 quota, else the affinity mask"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+cpus = _cpu_quota()
+
+# Scans are CPU-bound, so one worker per CPU (fractional quotas round down, minimum 1)
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(1, math.floor(cpus)))))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+# Split the CPUs between workers' detector threads instead of each assuming the whole machine
+os.environ.setdefault("DETECTOR_THREADS", str(max(1, math.floor(cpus / workers))))
+
+# Recycling: request count (jittered so workers don't restart together) and RSS ceiling
+max_requests = int(os.getenv("MAX_REQUESTS", "500"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "50"))
+rss_limit_mb = float(os.getenv("WORKER_RSS_LIMIT_MB", "0"))  # 0 = no ceiling
+rss_check_seconds = float(os.getenv("WORKER_RSS_CHECK_SECONDS", "10"))
+
+# A 3-view scan at full quality takes a few seconds; give slow ones room before the master kills a worker
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Heartbeat files in RAM rather than on the container's (possibly slow) disk
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = "-"
+errorlog = "-"
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        # Peak rather than current RSS (KB on Linux, bytes on macOS), but better than nothing
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if os.uname().sysname == "Darwin" else peak / 1e3
+
+
+def _watch_rss(worker):
+    while worker.alive:
+        time.sleep(rss_check_seconds)
+        rss = _rss_mb()
+        if rss > rss_limit_mb:
+            worker.log.warning(f"[Server] Worker {worker.pid} RSS {rss:.0f} MB over {rss_limit_mb:.0f} MB, recycling")
+            # Same as a deploy: stop accepting, finish in-flight requests, exit; the master forks a fresh one
+            os.kill(worker.pid, signal.SIGTERM)
+            return
+
+
+def when_ready(server):
+    # Everything allocated so far (preloaded app and assets) is never collected, so the
+    # collector doesn't touch those pages and break copy-on-write sharing in the workers
+    gc.freeze()
+    server.log.info(f"[Server] {workers} workers, {cpus:g} CPUs, DETECTOR_THREADS={os.environ['DETECTOR_THREADS']}, "
+                    f"max_requests={max_requests}, rss_limit_mb={rss_limit_mb:g}")
+
+
+def post_fork(server, worker):
+    server.log.info(f"[Server] Worker {worker.pid} forked")
+
+
+def post_worker_init(worker):
+    if rss_limit_mb > 0:
+        threading.Thread(target=_watch_rss, args=(worker,), name="rss-watchdog", daemon=True).start()
+
+
+def child_exit(server, worker):
+    server.log.info(f"[Server] Worker {worker.pid} exited")
@@ -3,19 +3,34 @@ Flash AI VTO - ML Inference Service
 Main FastAPI application for body scanning and virtual try-on ML inference
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union
 import uvicorn
+import asyncio
+import functools
+import hmac
+import json
 import os
+import time
 import traceback
 from dotenv import load_dotenv
 
-from services.body_scan_service_simple import BodyScanService
+from services.body_scan_service import BodyScanService
+from services.body_scan_service_simple import BodyScanService as SimpleBodyScanService
 from services.size_recommendation_service import SizeRecommendationService
 from services.face_scan_service import FaceScanService
+from services.serialization import FastJSONResponse, dumps
+from services.scan_job_queue import ScanJobQueue
+from services.admission import UNKNOWN_IMAGE_PIXELS, AdmissionController, AdmissionRejected
+from services.deadline import DEADLINE_HEADER, Deadline
+from services.quality_tiers import QualityTierController
+from services.scan_profiler import ScanProfiler
+from services.product_index import ProductIndex
+from services.shade_index import ShadeIndex
 
 # Load environment variables
 load_dotenv()
@@ -54,11 +69,62 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+# Shed overload explicitly (429/503/413) instead of timing out or running out of memory
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"success": False, "error": exc.reason, "lane": exc.lane, "retry_after": exc.retry_after},
+        headers=headers
+    )
+
 # Initialize services
-body_scan_service = BodyScanService()
+try:
+    body_scan_service = BodyScanService()
+except Exception as e:
+    # No MediaPipe or no pose model: keep /body-scan up with placeholder measurements
+    print(f"[BodyScan] Pose engine unavailable ({e}), using simplified measurements")
+    body_scan_service = SimpleBodyScanService()
 size_rec_service = SizeRecommendationService()
 face_scan_service = FaceScanService()
 
+# Durable queue for job-mode scans (POST returns immediately, workers process in background)
+scan_job_queue = ScanJobQueue()
+scan_job_queue.register_handler("face", face_scan_service.analyze_face)
+scan_job_queue.register_handler("body", body_scan_service.process_scan)
+
+# Per-endpoint concurrency lanes + decoded-pixel budget for synchronous requests
+admission = AdmissionController()
+
+# Picks the face-scan quality tier from the face_scan lane backlog and recent p95 latency
+face_scan_quality = QualityTierController(admission.lanes["face_scan"])
+
+# Admin-armed sampling profiler for live face scans (free when nothing is armed)
+scan_profiler = ScanProfiler()
+
+# Per-store skincare catalog index for matching products to a face-scan analysis
+product_index = ProductIndex()
+
+# Foundation/concealer shades of all brands for nearest-shade matching
+shade_index = ShadeIndex()
+
+@app.on_event("startup")
+async def start_scan_job_workers():
+    scan_job_queue.start()
+
+@app.on_event("startup")
+async def warm_up_models():
+    # Runs in each server worker after the fork: per-process models (MediaPipe) are created here
+    face_scan_service.warm_up()
+    body_scan_service.warm_up()
+
+@app.on_event("shutdown")
+async def stop_scan_job_workers():
+    scan_job_queue.stop()
+    face_scan_service.shutdown_workers()
+    body_scan_service.shutdown()
+
 # =============================================================================
 # Request/Response Models
 # =============================================================================
@@ -82,17 +148,58 @@ class BodyScanResponse(BaseModel):
     processing_time_ms: int
     error: Optional[str] = None
 
+class ScanJobResponse(BaseModel):
+    success: bool
+    scan_id: str
+    job_id: str
+    status: str
+    status_url: str
+
 class SizeRecommendationRequest(BaseModel):
     measurements: BodyMeasurements
     product_id: str
     product_metadata: Optional[Dict] = None
 
+class ProfilingRequest(BaseModel):
+    count: int = 1
+    scan_id: Optional[str] = None
+    interval_ms: float = 5.0
+
 class SizeRecommendationResponse(BaseModel):
     recommended_size: str
     confidence: float
     all_sizes: Dict[str, float]
     fit_advice: str
 
+class CatalogProduct(BaseModel):
+    product_id: str
+    concerns: Union[List[str], Dict[str, float]] = []
+    skin_types: List[str] = []
+    undertones: List[str] = []
+
+class CatalogUpsertRequest(BaseModel):
+    products: List[CatalogProduct]
+    replace: bool = False
+
+class CatalogRemoveRequest(BaseModel):
+    product_ids: List[str]
+
+class ProductMatchRequest(BaseModel):
+    analysis: Dict
+    k: int = 10
+
+class ShadeCatalogRequest(BaseModel):
+    catalogs: Dict[str, List[Dict]]
+
+class ShadeMatchRequest(BaseModel):
+    skin_hex_color: Optional[str] = None
+    lab: Optional[List[float]] = None
+    undertone: Optional[str] = None
+    analysis: Optional[Dict] = None
+    k: int = 5
+    brands: Optional[List[str]] = None
+    per_brand: bool = False
+
 # =============================================================================
 # Health Check
 # =============================================================================
@@ -115,16 +222,19 @@ async def health_check():
 # Body Scanning Endpoints
 # =============================================================================
 
-@app.post("/body-scan", response_model=BodyScanResponse)
+@app.post("/body-scan", response_model=Union[BodyScanResponse, ScanJobResponse])
 async def process_body_scan(
     scan_id: str = Form(...),
-    images: List[UploadFile] = File(...)
+    images: List[UploadFile] = File(...),
+    mode: str = Form("sync")
 ):
     """
     Process body scan from uploaded images
 
     - **scan_id**: Unique identifier for this scan
     - **images**: 3-5 images from different angles (front, side, back)
+    - **mode**: "sync" (default) waits for the result; "job" enqueues the scan
+      and returns immediately - poll /body-scan/{scan_id}/status for the result
 
     Returns:
     - 3D mesh URL
@@ -145,21 +255,50 @@ async def process_body_scan(
             content = await image.read()
             image_data.append(content)
 
+        if mode == "job":
+            return _enqueue_scan_job("body", scan_id, image_data)
+
         # Process body scan
-        result = await body_scan_service.process_scan(scan_id, image_data)
+        async with admission.admit("body_scan", admission.estimate_pixels(image_data)):
+            result = await body_scan_service.process_scan(scan_id, image_data)
 
         return BodyScanResponse(**result)
 
+    except (HTTPException, AdmissionRejected):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/body-scan/{scan_id}/status")
 async def get_scan_status(scan_id: str):
-    """Get status of a body scan"""
-    status = await body_scan_service.get_scan_status(scan_id)
+    """Get status (and result, once completed) of a job-mode body scan"""
+    status = scan_job_queue.get_status("body", scan_id)
     if not status:
         raise HTTPException(status_code=404, detail="Scan not found")
-    return status
+    return FastJSONResponse(status)
+
+async def _run_until_disconnect(request: Request, deadline: Deadline, coro):
+    """Await coro, cancelling its deadline if the client goes away so the work is abandoned"""
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=0.5)
+        if done:
+            return task.result()
+        if not deadline.cancelled and await request.is_disconnected():
+            print("[Deadline] Client disconnected, abandoning work")
+            deadline.cancel("client_disconnected")
+
+def _enqueue_scan_job(kind: str, scan_id: str, image_data: List[bytes],
+                      options: Optional[Dict] = None) -> ScanJobResponse:
+    """Persist a job-mode scan and return its job handle (idempotent by scan_id)"""
+    job = scan_job_queue.enqueue(kind, scan_id, image_data, options)
+    return ScanJobResponse(
+        success=job["status"] != "failed",
+        scan_id=scan_id,
+        job_id=job["job_id"],
+        status=job["status"],
+        status_url=f"/{kind}-scan/{scan_id}/status"
+    )
 
 # =============================================================================
 # Face Scan & Skin Analysis Endpoints
@@ -167,14 +306,29 @@ async def get_scan_status(scan_id: str):
 
 @app.post("/face-scan")
 async def process_face_scan(
+    request: Request,
     scan_id: str = Form(...),
-    images: List[UploadFile] = File(...)
+    images: List[UploadFile] = File(...),
+    mode: str = Form("sync"),
+    features: Optional[str] = Form(None)
 ):
     """
     Process face scan and perform comprehensive skin analysis
 
     - **scan_id**: Unique identifier for this scan
     - **images**: 1-3 facial images (front, profile views)
+    - **mode**: "sync" (default) waits for the result; "job" enqueues the scan
+      and returns immediately - poll /face-scan/{scan_id}/status for the result
+    - **features**: Optional comma-separated features or profiles to compute
+      (e.g. "shade_match" or "skin_tone,skin_undertone"); omitted runs the full
+      analysis. See /models/info for the feature list and cost estimates.
+
+    An X-Request-Timeout-Ms header (the caller's own timeout) bounds the work:
+    when it runs out, or the client disconnects, the scan stops early and returns
+    the finished detectors plus defaults with "partial": true.
+
+    Under load, synchronous scans run at a lower quality tier (reduced resolution,
+    front view only, essential detectors); the tier used is returned as "quality_tier".
 
     Returns:
     - Comprehensive skin analysis with scores for:
@@ -196,6 +350,12 @@ async def process_face_scan(
                 detail="At least 1 image required for face scanning"
             )
 
+        # Validate requested features before reading uploads
+        try:
+            selected = face_scan_service.resolve_features(features) if features else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
         # Read image data
         image_data = []
         for image in images:
@@ -203,39 +363,310 @@ async def process_face_scan(
             image_data.append(content)
             print(f"[FaceScan] Read image: {image.filename}, size: {len(content)} bytes")
 
+        if mode == "job":
+            return _enqueue_scan_job("face", scan_id, image_data, {"features": selected} if selected else None)
+
         print(f"[FaceScan] Processing {len(image_data)} images for scan_id: {scan_id}")
 
         # Process face scan
+        deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
         try:
-            result = await face_scan_service.analyze_face(scan_id, image_data)
-            print(f"[FaceScan] Result success: {result.get('success', False)}")
-            return result
+            async with admission.admit("face_scan", admission.estimate_pixels(image_data), deadline.remaining()):
+                tier = face_scan_quality.select()
+                profile = scan_profiler.claim(scan_id)
+                result = await _run_until_disconnect(
+                    request, deadline, face_scan_service.analyze_face(
+                        scan_id, image_data, selected, deadline, tier,
+                        wrap_events=functools.partial(scan_profiler.wrap, profile) if profile else None
+                    )
+                )
+            face_scan_quality.record((time.monotonic() - deadline.started_at) * 1000)
+            print(f"[FaceScan] Result success: {result.get('success', False)} (tier: {tier})")
+            # Serialize in one pass (NumPy-aware) instead of FastAPI's jsonable_encoder walk
+            return FastJSONResponse(result)
+        except AdmissionRejected:
+            raise
         except Exception as analysis_error:
             error_msg = f"Analysis failed: {str(analysis_error)}"
             print(f"[FaceScan] Analysis ERROR: {error_msg}")
             print(traceback.format_exc())
             # Return error response instead of 500
-            return {
+            return FastJSONResponse({
                 "success": False,
                 "scan_id": scan_id,
                 "quality_score": 0.0,
                 "processing_time_ms": 0,
                 "error": error_msg,
                 "analysis": {}
-            }
+            })
 
+    except AdmissionRejected:
+        raise
     except Exception as e:
         error_detail = f"{str(e)}\n{traceback.format_exc()}"
         print(f"[FaceScan] ERROR: {error_detail}")
         # Return error response instead of raising 500
-        return {
+        return FastJSONResponse({
             "success": False,
             "scan_id": scan_id if 'scan_id' in dir() else "unknown",
             "quality_score": 0.0,
             "processing_time_ms": 0,
             "error": str(e),
             "analysis": {}
-        }
+        })
+
+@app.post("/face-scan/stream")
+async def process_face_scan_stream(
+    request: Request,
+    scan_id: str = Form(...),
+    images: List[UploadFile] = File(...),
+    features: Optional[str] = Form(None)
+):
+    """
+    Streaming variant of /face-scan using server-sent events
+
+    - **scan_id**: Unique identifier for this scan
+    - **images**: 1-3 facial images (front, profile views)
+    - **features**: Optional comma-separated features or profiles (as for /face-scan)
+
+    Emits events as stages finish:
+    - **faces_detected**: images received / faces found
+    - **quality_gate**: per-view blur & lighting verdict (accepted or skipped)
+    - **preview**: skin_tone, skin_hex_color, skin_undertone, face_shape from the front view
+    - **view_result**: per-view detector results
+    - **result**: final merged analysis (same payload as /face-scan)
+
+    Closing the connection stops the analysis at the next stage boundary. An
+    X-Request-Timeout-Ms header bounds the work, and the quality tier is chosen
+    from load, as for /face-scan.
+    """
+    try:
+        selected = face_scan_service.resolve_features(features) if features else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    image_data = [await image.read() for image in images]
+    print(f"[FaceScan] Streaming {len(image_data)} images for scan_id: {scan_id}")
+
+    # Admit before the response starts, so shedding is still a proper 429/503
+    deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+    pixels = admission.estimate_pixels(image_data)
+    await admission.acquire("face_scan", pixels, deadline.remaining())
+
+    released = False
+
+    async def release_admission():
+        # Stream closed (finished or client gone): stop any detectors still queued, free the slot once
+        nonlocal released
+        if not released:
+            released = True
+            deadline.cancel("stream_closed")
+            await admission.release("face_scan", pixels)
+
+    try:
+        tier = face_scan_quality.select()
+
+        async def event_stream():
+            # Each pipeline step runs in a worker thread, keeping the event loop free
+            try:
+                events = scan_profiler.wrap(
+                    scan_profiler.claim(scan_id),
+                    face_scan_service.iter_analysis_events(scan_id, image_data, selected, deadline, tier)
+                )
+                async for event, payload in iterate_in_threadpool(events):
+                    yield b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+                    if event == "result":
+                        face_scan_quality.record((time.monotonic() - deadline.started_at) * 1000)
+            finally:
+                await release_admission()
+
+        return _ReleasingStreamingResponse(
+            event_stream(),
+            on_close=release_admission,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except BaseException:
+        await release_admission()
+        raise
+
+class _ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that awaits on_close() when it is done, however it ended.
+
+    The body generator's own cleanup only runs if it was started, and a
+    BackgroundTask is skipped when the client is gone before the body is
+    sent; this runs in every case (on_close must tolerate a second call).
+    """
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+@app.post("/face-scan/burst")
+async def process_face_scan_burst(
+    request: Request,
+    scan_id: str = Form(...),
+    frames: List[UploadFile] = File(None),
+    clip: Optional[UploadFile] = File(None),
+    features: Optional[str] = Form(None)
+):
+    """
+    Face scan from a burst of frames or a short clip instead of 1-3 stills
+
+    - **scan_id**: Unique identifier for this scan
+    - **frames**: JPEG/PNG burst frames in capture order (e.g. a slow head turn)
+    - **clip**: Alternatively, a short video clip (MP4/WebM, at most BURST_MAX_CLIP_MB)
+    - **features**: Optional comma-separated features or profiles (as for /face-scan)
+
+    Every frame (up to BURST_MAX_FRAMES; later ones are ignored) is scored at
+    low resolution for face presence, head pose, sharpness and exposure; only the best front, left and
+    right frames are analyzed. The response is the /face-scan result plus
+    "frame_selection" (frames scored and the ones picked, with their scores).
+    Deadlines and quality tiers apply as for /face-scan.
+    """
+    try:
+        selected = face_scan_service.resolve_features(features) if features else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Frames past BURST_MAX_FRAMES are never scored, so they aren't read either
+    max_frames = int(os.getenv("BURST_MAX_FRAMES", "30"))
+    if frames and len(frames) > max_frames:
+        print(f"[FaceScan] Burst for scan_id {scan_id}: {len(frames)} frames, scoring the first {max_frames}")
+        frames = frames[:max_frames]
+    frame_data = [await frame.read() for frame in frames] if frames else []
+    clip_data = None
+    if clip is not None and not frame_data:
+        max_clip_bytes = int(float(os.getenv("BURST_MAX_CLIP_MB", "20")) * 1024 * 1024)
+        too_large = HTTPException(status_code=413, detail=f"Clip is larger than {max_clip_bytes} bytes")
+        if (clip.size or 0) > max_clip_bytes:
+            raise too_large
+        # Reading one byte past the cap catches clips whose size wasn't known up front
+        clip_data = await clip.read(max_clip_bytes + 1)
+        if len(clip_data) > max_clip_bytes:
+            raise too_large
+    if not frame_data and not clip_data:
+        raise HTTPException(status_code=400, detail="Provide burst frames or a clip")
+    print(f"[FaceScan] Burst for scan_id {scan_id}: "
+          f"{f'{len(frame_data)} frames' if frame_data else f'{len(clip_data)} byte clip'}")
+
+    # At most three frames (any three of the burst) are analyzed at full size;
+    # scoring works on small copies
+    if frame_data:
+        pixels = sum(sorted(admission.estimate_pixels([data]) for data in frame_data)[-3:])
+    else:
+        pixels = 3 * UNKNOWN_IMAGE_PIXELS
+    deadline = Deadline.from_header(request.headers.get(DEADLINE_HEADER))
+    async with admission.admit("face_scan", pixels, deadline.remaining()):
+        tier = face_scan_quality.select()
+        profile = scan_profiler.claim(scan_id)
+        result = await _run_until_disconnect(
+            request, deadline, face_scan_service.analyze_burst(
+                scan_id, frame_data, clip_data, selected, deadline, tier,
+                wrap_events=functools.partial(scan_profiler.wrap, profile) if profile else None
+            )
+        )
+    face_scan_quality.record((time.monotonic() - deadline.started_at) * 1000)
+    print(f"[FaceScan] Burst result success: {result.get('success', False)} (tier: {tier})")
+    return FastJSONResponse(result)
+
+PRECHECK_VIEWS = ("front", "left", "right")
+
+@app.post("/face-scan/precheck")
+async def precheck_face_frame(
+    frame: UploadFile = File(...),
+    view: Optional[str] = Form(None)
+):
+    """
+    Live framing check of one small preview frame, before the real capture
+
+    - **frame**: Preview frame (a ~320px JPEG is plenty; larger ones are scaled down)
+    - **view**: Optional view being captured: front, left or right
+
+    Returns face presence, pose (front/left/right from yaw), blur and lighting
+    verdicts, "ready" and "guidance" (the first thing to fix: no_face, move_closer,
+    face_camera, show_left_side, show_right_side, more_light, less_light,
+    even_lighting, hold_still). For a live camera feed use the
+    /face-scan/precheck/ws WebSocket, which tracks the face across frames.
+    """
+    if view is not None and view not in PRECHECK_VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of {', '.join(PRECHECK_VIEWS)}")
+    data = await frame.read()
+    async with admission.admit("precheck"):
+        scorer = face_scan_service.create_frame_scorer(tracking=False)
+        result = await asyncio.to_thread(face_scan_service.precheck_frame, scorer, data, 0, view)
+    return FastJSONResponse(result)
+
+@app.websocket("/face-scan/precheck/ws")
+async def precheck_face_stream(websocket: WebSocket):
+    """
+    Live framing checks over a WebSocket, one verdict per preview frame
+
+    Send preview frames as binary messages (encoded JPEG/PNG) and, whenever
+    the capture step changes, a text message {"view": "front" | "left" | "right"}.
+    Each frame gets a JSON verdict as for POST /face-scan/precheck. The
+    connection keeps one tracking landmarker, so the face is followed from
+    frame to frame instead of being re-detected. Under load a frame is answered
+    with {"success": false, "busy": true} and the next one is tried. Open
+    connections are capped (ADMISSION_PRECHECK_STREAM_CONCURRENCY); past the cap
+    the socket is closed with 1013 (try again later).
+    """
+    await websocket.accept()
+    try:
+        await admission.acquire("precheck_stream")
+    except AdmissionRejected as e:
+        await websocket.close(code=1013, reason=e.reason)
+        return
+    scorer = None
+    try:
+        # Loading the landmarker model blocks, so it happens off the event loop
+        scorer = await asyncio.to_thread(face_scan_service.create_frame_scorer, tracking=True)
+        started = time.monotonic()
+        view = None
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("text") is not None:
+                try:
+                    view = json.loads(message["text"]).get("view")
+                except (ValueError, AttributeError):
+                    view = None
+                if view not in PRECHECK_VIEWS:
+                    view = None
+                continue
+            if not message.get("bytes"):
+                continue
+            try:
+                async with admission.admit("precheck"):
+                    result = await asyncio.to_thread(
+                        face_scan_service.precheck_frame, scorer, message["bytes"],
+                        (time.monotonic() - started) * 1000, view
+                    )
+            except AdmissionRejected as e:
+                result = {"success": False, "busy": True, "error": e.reason}
+            await websocket.send_text(dumps(result).decode())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if scorer is not None:
+            scorer.close()
+        await admission.release("precheck_stream")
+
+@app.get("/face-scan/{scan_id}/status")
+async def get_face_scan_status(scan_id: str):
+    """Get status (and result, once completed) of a job-mode face scan"""
+    status = scan_job_queue.get_status("face", scan_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return FastJSONResponse(status)
 
 # =============================================================================
 # Size Recommendation Endpoints
@@ -257,17 +688,138 @@ async def get_size_recommendation(request: SizeRecommendationRequest):
     - Fit advice
     """
     try:
-        result = await size_rec_service.recommend_size(
-            measurements=request.measurements.dict(),
-            product_id=request.product_id,
-            product_metadata=request.product_metadata
-        )
+        async with admission.admit("size_recommendation"):
+            result = await size_rec_service.recommend_size(
+                measurements=request.measurements.dict(),
+                product_id=request.product_id,
+                product_metadata=request.product_metadata
+            )
 
         return SizeRecommendationResponse(**result)
 
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# =============================================================================
+# Product Matching Endpoints
+# =============================================================================
+
+@app.put("/product-index/{store_id}")
+async def upsert_catalog_products(store_id: str, request: CatalogUpsertRequest, http_request: Request):
+    """
+    Add or update a store's products in the matching index (admin: X-Admin-Token)
+
+    - **products**: product_id, targeted concerns (list or {concern: weight}),
+      suitable skin_types and undertones (empty = suits everyone)
+    - **replace**: Drop the store's products not in this request (full sync)
+    """
+    _require_admin(http_request)
+    try:
+        products = [product.dict() for product in request.products]
+        return await asyncio.to_thread(product_index.upsert, store_id, products, request.replace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/product-index/{store_id}/remove")
+async def remove_catalog_products(store_id: str, request: CatalogRemoveRequest, http_request: Request):
+    """Remove products from a store's matching index (admin: X-Admin-Token)"""
+    _require_admin(http_request)
+    try:
+        return await asyncio.to_thread(product_index.remove, store_id, request.product_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/product-index/{store_id}")
+async def get_catalog_index(store_id: str):
+    """Number of indexed products of a store"""
+    try:
+        return await asyncio.to_thread(product_index.stats, store_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/product-index/{store_id}/match")
+async def match_catalog_products(store_id: str, request: ProductMatchRequest):
+    """
+    Best-matching products of a store for a face-scan analysis
+
+    - **analysis**: The `analysis` object returned by /face-scan
+    - **k**: Number of products to return
+
+    Returns products best first with match_score and the user's concerns each one targets
+    """
+    try:
+        async with admission.admit("product_match"):
+            # Off the event loop: it can wait on a log replay or write in another thread
+            recommendations = await asyncio.to_thread(
+                product_index.match, store_id, request.analysis, max(1, request.k)
+            )
+        return {"store_id": store_id, "recommendations": recommendations}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# =============================================================================
+# Shade Matching Endpoints
+# =============================================================================
+
+@app.put("/shade-index")
+async def load_shade_catalogs(request: ShadeCatalogRequest, http_request: Request):
+    """
+    Bulk-load shade catalogs, replacing each given brand's shades (admin: X-Admin-Token)
+
+    - **catalogs**: brand -> [{shade_id, name, hex or lab, undertone}]
+    """
+    _require_admin(http_request)
+    try:
+        return await asyncio.to_thread(shade_index.load, request.catalogs)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/shade-index/{brand}")
+async def remove_shade_catalog(brand: str, request: Request):
+    """Drop a brand's shade catalog (admin: X-Admin-Token)"""
+    _require_admin(request)
+    try:
+        if not await asyncio.to_thread(shade_index.remove_brand, brand):
+            raise HTTPException(status_code=404, detail="Brand not found")
+        return {"brand": brand, "removed": True}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/shade-index")
+async def get_shade_index():
+    """Shades per brand"""
+    return shade_index.stats()
+
+@app.post("/shade-match")
+async def match_shades(request: ShadeMatchRequest):
+    """
+    Nearest foundation/concealer shades to a skin colour by CIEDE2000
+
+    - **skin_hex_color** / **lab**: Skin colour, or pass the /face-scan **analysis**
+      (its skin_hex_color and skin_undertone are used)
+    - **undertone**: warm / cool / neutral; only compatible shades are returned
+    - **k**, **brands**, **per_brand**: k shades overall, or k from each brand
+    """
+    analysis = request.analysis or {}
+    hex_color = request.skin_hex_color or analysis.get("skin_hex_color")
+    if hex_color is None and request.lab is None:
+        raise HTTPException(status_code=400, detail="Provide skin_hex_color, lab or analysis")
+    try:
+        async with admission.admit("shade_match"):
+            matches = shade_index.match(
+                hex_color=hex_color,
+                lab=request.lab,
+                undertone=request.undertone or analysis.get("skin_undertone"),
+                k=max(1, request.k),
+                brands=request.brands,
+                per_brand=request.per_brand
+            )
+        return {"matches": matches}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # =============================================================================
 # Model Management Endpoints
 # =============================================================================
@@ -291,6 +843,76 @@ async def get_models_info():
         "face_scan": face_scan_service.get_model_info()
     }
 
+@app.get("/metrics/admission")
+async def get_admission_metrics():
+    """Admission lane depths, shed counts and decoded-pixel budget usage"""
+    return admission.metrics()
+
+@app.get("/metrics/quality")
+async def get_quality_metrics():
+    """Current face-scan quality tier, its load signals and scans per tier"""
+    return face_scan_quality.metrics()
+
+# =============================================================================
+# Admin: live scan profiling
+# =============================================================================
+
+def _require_admin(request: Request):
+    """Admin endpoints need X-Admin-Token matching ADMIN_TOKEN (disabled when it isn't set)"""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.post("/admin/profiling")
+async def arm_profiling(body: ProfilingRequest, request: Request):
+    """
+    Profile the next `count` /face-scan requests, or the one with `scan_id`
+
+    Captures sampled Python stacks (native OpenCV/MediaPipe/NumPy calls show
+    up as "[native]" leaves) every `interval_ms`, plus per-stage timings and
+    memory high-water marks. Fetch results from /admin/profiling/{profile_id}.
+    """
+    _require_admin(request)
+    return scan_profiler.arm(body.count, body.scan_id, body.interval_ms)
+
+@app.get("/admin/profiling")
+async def get_profiling_status(request: Request):
+    """Armed state and captured profiles (this worker only)"""
+    _require_admin(request)
+    return scan_profiler.status()
+
+@app.delete("/admin/profiling")
+async def disarm_profiling(request: Request):
+    """Stop profiling upcoming scans"""
+    _require_admin(request)
+    scan_profiler.disarm()
+    return scan_profiler.status()
+
+@app.get("/admin/profiling/{profile_id}")
+async def get_profile(profile_id: str, request: Request, format: str = "summary"):
+    """
+    A captured profile
+
+    - **format**: "summary" (stages, memory peaks, hottest frames), "speedscope"
+      (open at https://www.speedscope.app) or "collapsed" (flamegraph.pl input)
+    """
+    _require_admin(request)
+    profile = scan_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    if format == "speedscope":
+        return FastJSONResponse(
+            profile.speedscope(),
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'}
+        )
+    if format != "summary":
+        raise HTTPException(status_code=400, detail="format must be summary, speedscope or collapsed")
+    return FastJSONResponse(profile.summary())
+
 @app.get("/face-scan/test")
 async def face_scan_test():
     """Test face scan with a synthetic image"""
@@ -382,6 +1004,7 @@ async def face_scan_debug():
 # =============================================================================
 
 if __name__ == "__main__":
+    # Development server with auto-reload; production runs `gunicorn -c gunicorn.conf.py main:app`
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
 
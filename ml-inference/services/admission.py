@@ -0,0 +1,212 @@
+"""
+Admission Control
+Per-endpoint concurrency lanes and a global decoded-pixel budget for incoming scans
+"""
+
+import asyncio
+import io
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+# Assumed size of an image whose header can't be read (a 1080p photo)
+UNKNOWN_IMAGE_PIXELS = 1920 * 1080
+
+
+class AdmissionRejected(Exception):
+    """Request shed by the admission controller (maps to an HTTP error response)"""
+
+    def __init__(self, status_code: int, lane: str, reason: str, retry_after: Optional[int] = None):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLane:
+    """Concurrency cap and bounded wait queue for one class of requests"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_too_large = 0
+        self.total_wait_ms = 0.0
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_too_large": self.rejected_too_large,
+            "avg_wait_ms": round(self.total_wait_ms / self.admitted, 1) if self.admitted else 0.0,
+        }
+
+
+class AdmissionController:
+    """
+    Admits requests into per-endpoint lanes against a shared pixel budget.
+
+    Each lane (face_scan, body_scan, size_recommendation, product_match,
+    shade_match, precheck, precheck_stream) has its own concurrency cap and
+    wait queue, so a burst of heavy body scans can't starve cheap size
+    recommendations. Scan lanes additionally reserve their decoded image size
+    (width * height from the image headers, read before any full decode) from
+    a global budget, which bounds decode memory across all in-flight requests.
+
+    Load is shed explicitly:
+    - 429 when a lane's wait queue is full
+    - 503 when a request can't be admitted within the lane's queue timeout
+    - 413 when a single request is larger than the whole pixel budget
+    """
+
+    def __init__(self, pixel_budget: Optional[int] = None):
+        megapixels = float(os.getenv("ADMISSION_PIXEL_BUDGET_MP", "150"))
+        self.pixel_budget = pixel_budget if pixel_budget is not None else int(megapixels * 1_000_000)
+        self.pixels_in_use = 0
+
+        self.lanes: Dict[str, AdmissionLane] = {}
+        self.add_lane("face_scan", max_concurrent=2, max_queue=8, queue_timeout=20.0)
+        self.add_lane("body_scan", max_concurrent=1, max_queue=4, queue_timeout=30.0)
+        self.add_lane("size_recommendation", max_concurrent=64, max_queue=256, queue_timeout=2.0)
+        self.add_lane("product_match", max_concurrent=64, max_queue=256, queue_timeout=2.0)
+        self.add_lane("shade_match", max_concurrent=64, max_queue=256, queue_timeout=2.0)
+        # Live preview frames: a frame that waits is already stale, so barely queue
+        self.add_lane("precheck", max_concurrent=8, max_queue=8, queue_timeout=0.1)
+        # Open precheck WebSockets, each holding its own tracking landmarker; never queued
+        self.add_lane("precheck_stream", max_concurrent=16, max_queue=0, queue_timeout=0.0)
+
+        self._cond: Optional[asyncio.Condition] = None
+
+    def add_lane(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        """Register a lane; ADMISSION_<NAME>_CONCURRENCY / _QUEUE / _TIMEOUT override the defaults"""
+        prefix = f"ADMISSION_{name.upper()}"
+        self.lanes[name] = AdmissionLane(
+            name,
+            max_concurrent=int(os.getenv(f"{prefix}_CONCURRENCY", str(max_concurrent))),
+            max_queue=int(os.getenv(f"{prefix}_QUEUE", str(max_queue))),
+            queue_timeout=float(os.getenv(f"{prefix}_TIMEOUT", str(queue_timeout))),
+        )
+
+    @staticmethod
+    def estimate_pixels(image_data: List[bytes]) -> int:
+        """
+        Decoded pixel count of a set of uploads, from image headers only.
+
+        PIL reads just the header on open(), so this is cheap even for large
+        images; unreadable headers count as a 1080p image.
+        """
+        total = 0
+        for data in image_data:
+            try:
+                with Image.open(io.BytesIO(data)) as img:
+                    width, height = img.size
+                total += width * height
+            except Exception:
+                total += UNKNOWN_IMAGE_PIXELS
+        return total
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so it belongs to the serving event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self, lane_name: str, pixels: int = 0, timeout: Optional[float] = None):
+        """
+        Wait for a slot in the lane and `pixels` of the budget.
+
+        timeout caps the lane's queue timeout (e.g. the request's remaining deadline).
+
+        Raises:
+            AdmissionRejected: when the request is shed
+        """
+        lane = self.lanes[lane_name]
+
+        if pixels > self.pixel_budget:
+            lane.rejected_too_large += 1
+            raise AdmissionRejected(
+                413, lane_name,
+                f"Images too large: {pixels / 1e6:.1f} MP exceeds the {self.pixel_budget / 1e6:.1f} MP budget"
+            )
+
+        def can_run() -> bool:
+            return lane.active < lane.max_concurrent and self.pixels_in_use + pixels <= self.pixel_budget
+
+        # Fast path: check-and-claim without awaiting is atomic on the event loop
+        if lane.waiting == 0 and can_run():
+            lane.active += 1
+            self.pixels_in_use += pixels
+            lane.admitted += 1
+            return
+
+        if lane.waiting >= lane.max_queue:
+            lane.rejected_queue_full += 1
+            print(f"[Admission] {lane_name} queue full ({lane.waiting} waiting), shedding request")
+            raise AdmissionRejected(429, lane_name, f"Too many {lane_name} requests queued", retry_after=2)
+
+        cond = self._condition()
+        start = time.time()
+        wait_timeout = lane.queue_timeout if timeout is None else min(lane.queue_timeout, timeout)
+        lane.waiting += 1
+        try:
+            async with cond:
+                await asyncio.wait_for(cond.wait_for(can_run), timeout=wait_timeout)
+                lane.active += 1
+                self.pixels_in_use += pixels
+        except asyncio.TimeoutError:
+            lane.rejected_timeout += 1
+            print(f"[Admission] {lane_name} request waited {wait_timeout:.1f}s without a slot, shedding")
+            raise AdmissionRejected(
+                503, lane_name, f"{lane_name} is overloaded, try again shortly",
+                retry_after=max(1, int(lane.queue_timeout))
+            )
+        finally:
+            lane.waiting -= 1
+
+        lane.admitted += 1
+        lane.total_wait_ms += (time.time() - start) * 1000
+
+    async def release(self, lane_name: str, pixels: int = 0):
+        """Return a slot and its pixels, waking waiters in every lane"""
+        lane = self.lanes[lane_name]
+        cond = self._condition()
+        async with cond:
+            lane.active -= 1
+            self.pixels_in_use -= pixels
+            cond.notify_all()
+
+    @asynccontextmanager
+    async def admit(self, lane_name: str, pixels: int = 0, timeout: Optional[float] = None):
+        """`async with controller.admit("face_scan", pixels):` around the admitted work"""
+        await self.acquire(lane_name, pixels, timeout)
+        try:
+            yield
+        finally:
+            await self.release(lane_name, pixels)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Lane depths, shed counts and pixel budget usage"""
+        return {
+            "lanes": {name: lane.metrics() for name, lane in self.lanes.items()},
+            "pixel_budget": {
+                "limit": self.pixel_budget,
+                "in_use": self.pixels_in_use,
+                "utilization": round(self.pixels_in_use / self.pixel_budget, 3) if self.pixel_budget else 0.0,
+            },
+        }
@@ -1,47 +1,298 @@
 """
 Body Scan Service
-Handles body scanning using MediaPipe, depth estimation, and 3D reconstruction
+Body measurements from 3-5 photos using a pool of MediaPipe Pose Landmarkers,
+silhouette widths from their segmentation masks, and front/side view fusion
 """
 
-import cv2
-import numpy as np
-import mediapipe as mp
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
-from typing import List, Dict, Optional
-import time
+import asyncio
+import contextlib
 import io
-from PIL import Image
-import trimesh
-import json
 import os
+import queue
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+from PIL import Image
+
+# MediaPipe is required for this service; main.py falls back to the simplified one without it
+MEDIAPIPE_AVAILABLE = False
+try:
+    import mediapipe as mp
+    from mediapipe.tasks import python as mp_python
+    from mediapipe.tasks.python import vision
+    MEDIAPIPE_AVAILABLE = True
+except Exception:
+    pass
+
+# Optional: the scan's landmarks are saved as a point cloud when trimesh is installed
+try:
+    import trimesh
+except Exception:
+    trimesh = None
+
+
+# MediaPipe pose landmark indices
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+LEFT_HEEL, RIGHT_HEEL = 29, 30
+LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX = 31, 32
+
+# Near-vertical bone segments whose world length (metres) over their image length
+# gives a view's cm-per-pixel scale; their image length barely depends on the view angle
+SCALE_SEGMENTS = np.array([
+    (LEFT_SHOULDER, LEFT_HIP), (RIGHT_SHOULDER, RIGHT_HIP),
+    (LEFT_HIP, LEFT_KNEE), (RIGHT_HIP, RIGHT_KNEE),
+    (LEFT_KNEE, LEFT_ANKLE), (RIGHT_KNEE, RIGHT_ANKLE),
+])
+
+# Limb chains measured on the world landmarks, per side (left, right)
+SLEEVE_CHAINS = ((LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST), (RIGHT_SHOULDER, RIGHT_ELBOW, RIGHT_WRIST))
+INSEAM_CHAINS = ((LEFT_HIP, LEFT_KNEE, LEFT_ANKLE), (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE))
+
+FEET = [LEFT_HEEL, RIGHT_HEEL, LEFT_FOOT_INDEX, RIGHT_FOOT_INDEX]
+
+DEFAULT_POSE_MODEL_URL = (
+    "https://storage.googleapis.com/mediapipe-models/pose_landmarker/"
+    "pose_landmarker_full/float16/1/pose_landmarker_full.task"
+)
+
+
+def ellipse_perimeter(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Ramanujan's second approximation of ellipse perimeters, element-wise.
+
+    Args:
+        a, b: Semi-axes (any broadcastable shapes); NaN propagates
+
+    Returns:
+        Perimeters, same units as the axes
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    s = a + b
+    with np.errstate(invalid="ignore", divide="ignore"):
+        h = np.where(s > 0, ((a - b) / s) ** 2, 0.0)
+    return np.pi * s * (1.0 + 3.0 * h / (10.0 + np.sqrt(4.0 - 3.0 * h)))
+
+
+def silhouette_run_widths(mask: np.ndarray, xs: np.ndarray, ys: np.ndarray, half_band: int) -> np.ndarray:
+    """
+    Width of the mask's horizontal run through each (x, y), median over a band of rows.
+
+    Args:
+        mask: Boolean person mask (H, W)
+        xs, ys: Pixel centers, one per level (L,)
+        half_band: Rows above and below each center that are measured too
+
+    Returns:
+        (L,) widths in pixels; NaN where the center isn't on the person in any row
+    """
+    h, w = mask.shape
+    xs = np.clip(np.round(xs).astype(int), 0, w - 1)
+    offsets = np.arange(-half_band, half_band + 1)
+    rows = np.clip(np.round(ys).astype(int)[:, None] + offsets, 0, h - 1)   # (L, B)
+    band = mask[rows]                                                        # (L, B, W)
+    cols = np.arange(w)
+    cx = xs[:, None, None]
+    outside = ~band
+    # Nearest background pixel on either side of the center bounds the run
+    left = np.where(outside & (cols < cx), cols, -1).max(axis=-1) + 1
+    right = np.where(outside & (cols > cx), cols, w).min(axis=-1)
+    widths = (right - left).astype(np.float64)
+    widths[~band[np.arange(len(xs))[:, None], np.arange(len(offsets)), xs[:, None]]] = np.nan
+    with np.errstate(all="ignore"), _ignore_empty_slices():
+        return np.nanmedian(widths, axis=1)
+
+
+@contextlib.contextmanager
+def _ignore_empty_slices():
+    """Silence NumPy's warnings for nan-reductions over all-NaN slices (they yield NaN, as intended)"""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="All-NaN slice encountered")
+        warnings.filterwarnings("ignore", message="Mean of empty slice")
+        yield
+
 
 class BodyScanService:
+    """Pose-based body measurement engine (MediaPipe Pose Landmarker)"""
+
+    # Girth levels, as positions along the shoulder-midpoint -> hip-midpoint axis
+    # (0 = shoulder line, 1 = hip line; negative is above the shoulders)
+    LEVELS = ("neck", "chest", "waist", "hips")
+    LEVEL_POSITIONS = np.array([-0.15, 0.30, 0.70, 1.10])
+
+    # Depth/width ratio of each level's cross-section, used when no side view was measured
+    DEFAULT_DEPTH_RATIOS = np.array([0.95, 0.70, 0.75, 0.80])
+
+    # Shoulder spread over torso length in the image: at least FRONTAL_MIN_SPREAD is a
+    # front or back view (gives widths), at most SIDE_MAX_SPREAD a profile (gives depths)
+    FRONTAL_MIN_SPREAD = 0.45
+    SIDE_MAX_SPREAD = 0.20
+
+    # Landmarks below this visibility aren't used for scale or lengths
+    MIN_VISIBILITY = 0.5
+
+    # Band of rows (fraction of the image height, either side) silhouette widths are medians over
+    WIDTH_BAND = 0.005
+
+    # Mask confidence above which a pixel belongs to the person
+    MASK_THRESHOLD = 0.5
+
     def __init__(self):
-        """Initialize body scan service with MediaPipe models"""
-        # Initialize MediaPipe Pose Landmarker (new API)
-        try:
-            base_options = python.BaseOptions(model_asset_path='')
-            options = vision.PoseLandmarkerOptions(
-                base_options=base_options,
-                output_segmentation_masks=True,
-                num_poses=1
-            )
-            self.pose_landmarker = vision.PoseLandmarker.create_from_options(options)
-        except Exception as e:
-            print(f"Note: Using simplified pose detection (model file not found): {e}")
-            self.pose_landmarker = None
-        self.holistic = self.mp_holistic.Holistic(
-            static_image_mode=True,
-            model_complexity=2,
-            min_detection_confidence=0.5
+        """
+        Locate the pose model and check that it loads.
+
+        Raises:
+            RuntimeError: MediaPipe isn't installed or the model can't be loaded
+        """
+        if not MEDIAPIPE_AVAILABLE:
+            raise RuntimeError("MediaPipe is not installed")
+
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.model_path = os.getenv("POSE_MODEL_PATH", os.path.join(base_dir, "models", "pose_landmarker_full.task"))
+        if not os.path.exists(self.model_path):
+            self._download_pose_model(self.model_path)
+        if not os.path.exists(self.model_path):
+            raise RuntimeError(f"Pose model not found at {self.model_path}")
+
+        self.pool_size = max(1, int(os.getenv("BODY_SCAN_LANDMARKERS", str(min(5, os.cpu_count() or 1)))))
+        self.max_side = int(os.getenv("BODY_SCAN_MAX_SIDE", "1280"))
+        self.output_dir = os.getenv("OUTPUT_DIR", "./output")
+
+        self._options = vision.PoseLandmarkerOptions(
+            base_options=mp_python.BaseOptions(model_asset_path=self.model_path),
+            running_mode=vision.RunningMode.IMAGE,
+            num_poses=1,
+            min_pose_detection_confidence=0.5,
+            min_pose_presence_confidence=0.5,
+            output_segmentation_masks=True
         )
+        # Fail now (so main.py can fall back) rather than on the first scan; the pool
+        # itself is per process, since landmarkers don't survive a fork
+        self._create_landmarker().close()
 
-        self.ready = True
+        self._pool_lock = threading.Lock()
+        self._pool_pid = None
+        self._landmarkers: "queue.LifoQueue" = queue.LifoQueue()
+        self._landmarkers_created = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        self._ready = True
+        print(f"[BodyScan] Pose Landmarker pool ready ({self.pool_size} x {os.path.basename(self.model_path)})")
 
     def is_ready(self) -> bool:
         """Check if service is ready"""
-        return self.ready
+        return self._ready
+
+    def _download_pose_model(self, model_path: str):
+        """Download the MediaPipe pose landmarker model (POSE_MODEL_URL overrides the source)"""
+        import urllib.request
+
+        model_url = os.getenv("POSE_MODEL_URL", DEFAULT_POSE_MODEL_URL)
+        try:
+            print(f"[BodyScan] Downloading {os.path.basename(model_path)}...")
+            os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+            urllib.request.urlretrieve(model_url, model_path)
+            print(f"[BodyScan] Model downloaded to {model_path}")
+        except Exception as e:
+            print(f"[BodyScan] Failed to download pose model: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(model_path)
+
+    # =========================================================================
+    # Landmarker pool
+    # =========================================================================
+
+    def _create_landmarker(self):
+        return vision.PoseLandmarker.create_from_options(self._options)
+
+    def _ensure_pool(self):
+        """(Re)create the landmarker pool and view threads for the current process"""
+        if self._pool_pid == os.getpid():
+            return
+        with self._pool_lock:
+            if self._pool_pid != os.getpid():
+                # Whatever a parent process created is unusable here: start empty
+                self._landmarkers = queue.LifoQueue()
+                self._landmarkers_created = 0
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="body-scan")
+                self._pool_pid = os.getpid()
+
+    @contextlib.contextmanager
+    def _landmarker(self):
+        """
+        Borrow a landmarker from the pool, creating one while fewer than pool_size exist.
+
+        Views run on pool_size threads, so a borrower only ever waits for a
+        landmarker another view is about to return.
+        """
+        self._ensure_pool()
+        pool = self._landmarkers
+        try:
+            landmarker = pool.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                create = self._landmarkers_created < self.pool_size
+                if create:
+                    self._landmarkers_created += 1
+            if create:
+                try:
+                    landmarker = self._create_landmarker()
+                except Exception:
+                    with self._pool_lock:
+                        self._landmarkers_created -= 1
+                    raise
+            else:
+                landmarker = pool.get()
+        try:
+            yield landmarker
+        finally:
+            pool.put(landmarker)
+
+    def warm_up(self):
+        """Fill this process's landmarker pool now (server startup) rather than during the first scans"""
+        self._ensure_pool()
+        with self._pool_lock:
+            missing = self.pool_size - self._landmarkers_created
+            self._landmarkers_created = self.pool_size
+        for created in range(missing):
+            try:
+                self._landmarkers.put(self._create_landmarker())
+            except Exception as e:
+                print(f"[BodyScan] Landmarker warm-up failed: {e}")
+                with self._pool_lock:
+                    self._landmarkers_created -= missing - created
+                break
+
+    def shutdown(self):
+        """Stop the view threads and close the pooled landmarkers"""
+        with self._pool_lock:
+            if self._pool_pid != os.getpid():
+                return
+            executor, pool = self._executor, self._landmarkers
+            self._executor = None
+            self._pool_pid = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
+            except Exception as e:
+                print(f"[BodyScan] Failed to close landmarker: {e}")
+
+    # =========================================================================
+    # Scanning
+    # =========================================================================
 
     async def process_scan(self, scan_id: str, image_data: List[bytes]) -> Dict:
         """
@@ -54,61 +305,28 @@ class BodyScanService:
         Returns:
             Dictionary with mesh_url, measurements, quality_score, etc.
         """
+        # Pose detection and mask measuring are CPU-bound: keep them off the event loop
+        return await asyncio.to_thread(self._process_scan_sync, scan_id, image_data)
+
+    def _process_scan_sync(self, scan_id: str, image_data: List[bytes]) -> Dict:
+        """Blocking implementation of process_scan(): views are measured in parallel, then fused"""
         start_time = time.time()
 
         try:
-            # Convert bytes to numpy arrays
-            images = []
-            for img_bytes in image_data:
-                img = Image.open(io.BytesIO(img_bytes))
-                img_array = np.array(img)
-                # Convert RGB to BGR for OpenCV
-                if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                    img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-                images.append(img_array)
-
-            # Step 1: Detect body pose and keypoints
-            keypoints_list = []
-            segmentation_masks = []
-
-            for img in images:
-                results = self.pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
-
-                if results.pose_landmarks:
-                    # Extract 3D keypoints
-                    keypoints = []
-                    for landmark in results.pose_landmarks.landmark:
-                        keypoints.append([
-                            landmark.x,
-                            landmark.y,
-                            landmark.z,
-                            landmark.visibility
-                        ])
-                    keypoints_list.append(keypoints)
-
-                    # Extract segmentation mask
-                    if results.segmentation_mask is not None:
-                        segmentation_masks.append(results.segmentation_mask)
-                else:
-                    # If no pose detected in this image, skip it
-                    continue
-
-            if len(keypoints_list) == 0:
-                raise Exception("No valid body pose detected in any image")
-
-            # Step 2: Extract body measurements from keypoints
-            measurements = self._extract_measurements(keypoints_list, images)
-
-            # Step 3: Generate 3D mesh (simplified - would use PIFu or similar in production)
-            mesh_data = self._generate_3d_mesh(keypoints_list, measurements)
-
-            # Step 4: Save mesh (in production, upload to S3)
-            mesh_url = self._save_mesh(scan_id, mesh_data)
-
-            # Step 5: Calculate quality score
-            quality_score = self._calculate_quality_score(keypoints_list, images)
+            self._ensure_pool()
+            futures = [self._executor.submit(self._measure_view, idx, data) for idx, data in enumerate(image_data)]
+            views = [future.result() for future in futures]
+
+            measured = [view for view in views if view.get("scale") is not None]
+            if not measured:
+                raise ValueError("No valid body pose detected in any image")
+
+            measurements = self._fuse_views(measured)
+            mesh_url = self._save_mesh(scan_id, measured)
+            quality_score = self._calculate_quality_score(views, measured)
 
             processing_time = int((time.time() - start_time) * 1000)
+            print(f"[BodyScan] {scan_id}: {len(measured)}/{len(views)} views measured in {processing_time}ms")
 
             return {
                 "success": True,
@@ -116,11 +334,14 @@ class BodyScanService:
                 "mesh_url": mesh_url,
                 "measurements": measurements,
                 "quality_score": quality_score,
-                "processing_time_ms": processing_time
+                "processing_time_ms": processing_time,
+                "views": [{"index": view["index"], "kind": view.get("kind"), "error": view.get("error")}
+                          for view in views]
             }
 
         except Exception as e:
             processing_time = int((time.time() - start_time) * 1000)
+            print(f"[BodyScan] {scan_id}: failed: {e}")
             return {
                 "success": False,
                 "scan_id": scan_id,
@@ -131,185 +352,216 @@ class BodyScanService:
                 "error": str(e)
             }
 
-    def _extract_measurements(
-        self,
-        keypoints_list: List[List],
-        images: List[np.ndarray]
-    ) -> Dict:
+    def _decode_image(self, img_bytes: bytes) -> np.ndarray:
+        """Decode an upload to a contiguous RGB array whose longer side is at most max_side"""
+        img = Image.open(io.BytesIO(img_bytes))
+        fit = min(1.0, self.max_side / max(img.width, img.height))
+        if img.format == "JPEG" and fit < 1.0:
+            # Let the JPEG decoder downscale (DCT scaling) before the exact resize
+            img.draft("RGB", (int(img.width * fit), int(img.height * fit)))
+        img = img.convert("RGB")
+        if max(img.width, img.height) > self.max_side:
+            fit = self.max_side / max(img.width, img.height)
+            img = img.resize((max(1, round(img.width * fit)), max(1, round(img.height * fit))), Image.BILINEAR)
+        return np.ascontiguousarray(np.asarray(img))
+
+    def _detect_pose(self, rgb: np.ndarray) -> Optional[Dict[str, np.ndarray]]:
         """
-        Extract body measurements from detected keypoints
+        Pose landmarks of one image as arrays (the only conversion from MediaPipe objects).
 
-        Uses MediaPipe pose landmarks to estimate body dimensions
+        Returns:
+            None if no body was found, else:
+            - keypoints: (33, 4) pixel x, pixel y, relative z, visibility
+            - world: (33, 3) metric coordinates in metres (origin between the hips)
+            - mask: (H, W) boolean person mask, or None
         """
-        # Use the first image's keypoints (front view ideally)
-        keypoints = keypoints_list[0]
-
-        # MediaPipe landmark indices
-        LEFT_SHOULDER = 11
-        RIGHT_SHOULDER = 12
-        LEFT_HIP = 23
-        RIGHT_HIP = 24
-        LEFT_KNEE = 25
-        RIGHT_KNEE = 26
-        LEFT_ANKLE = 27
-        RIGHT_ANKLE = 28
-        NOSE = 0
-        LEFT_HEEL = 29
-        RIGHT_HEEL = 30
-
-        # Get image dimensions for scaling
-        img_height, img_width = images[0].shape[:2]
-
-        # Helper function to calculate distance between two points
-        def distance(p1_idx, p2_idx):
-            p1 = keypoints[p1_idx]
-            p2 = keypoints[p2_idx]
-            # Scale by image dimensions and estimate real-world size
-            # Assuming average person height ~170cm and proportional scaling
-            pixel_dist = np.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
-            # Rough estimation: if person is ~0.8 of image height, that's ~170cm
-            scale_factor = 170 / 0.8
-            return pixel_dist * scale_factor
-
-        # Calculate measurements
-        # Shoulder width (distance between shoulders)
-        shoulder_width = distance(LEFT_SHOULDER, RIGHT_SHOULDER)
-
-        # Hip width (distance between hips)
-        hip_width = distance(LEFT_HIP, RIGHT_HIP)
-
-        # Height (nose to heel)
-        height = distance(NOSE, LEFT_HEEL)
-
-        # Inseam (hip to ankle)
-        inseam = distance(LEFT_HIP, LEFT_ANKLE)
-
-        # Estimate other measurements based on proportions
-        # These are rough estimates - would use more sophisticated models in production
-        chest = shoulder_width * 2.5  # Typical ratio
-        waist = hip_width * 1.8
-        hips = hip_width * 2.0
-        sleeve_length = shoulder_width * 1.5
-
-        return {
-            "height_cm": round(height, 1),
-            "chest_cm": round(chest, 1),
-            "waist_cm": round(waist, 1),
-            "hips_cm": round(hips, 1),
-            "inseam_cm": round(inseam, 1),
-            "shoulder_width_cm": round(shoulder_width, 1),
-            "sleeve_length_cm": round(sleeve_length, 1),
-            "neck_cm": round(shoulder_width * 0.8, 1)  # Estimate
-        }
-
-    def _generate_3d_mesh(self, keypoints_list: List, measurements: Dict) -> trimesh.Trimesh:
+        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+        with self._landmarker() as landmarker:
+            result = landmarker.detect(mp_image)
+        if not result.pose_landmarks:
+            return None
+
+        h, w = rgb.shape[:2]
+        keypoints = np.array([(lm.x, lm.y, lm.z, lm.visibility if lm.visibility is not None else 0.0)
+                              for lm in result.pose_landmarks[0]], dtype=np.float64)
+        keypoints[:, 0] *= w
+        keypoints[:, 1] *= h
+        world = np.array([(lm.x, lm.y, lm.z) for lm in result.pose_world_landmarks[0]], dtype=np.float64)
+
+        mask = None
+        if result.segmentation_masks:
+            confidence = result.segmentation_masks[0].numpy_view()
+            mask = confidence.reshape(confidence.shape[0], confidence.shape[1]) > self.MASK_THRESHOLD
+        return {"keypoints": keypoints, "world": world, "mask": mask}
+
+    def _measure_view(self, idx: int, img_bytes: bytes) -> Dict[str, Any]:
         """
-        Generate a 3D mesh from keypoints and measurements
+        Decode, detect and measure one view (runs on a view thread).
 
-        This is a simplified version. In production, you'd use:
-        - PIFu/PIFuHD for detailed reconstruction
-        - SMPL model for parametric body model
-        - Neural rendering techniques
+        Returns:
+            Dictionary with index, kind ('frontal', 'side', 'oblique'), scale
+            (cm per pixel), widths_cm per LEVELS, height_cm, limb lengths and
+            mean visibility; scale is None (with an error) if the view is unusable
         """
-        # For now, create a simple humanoid mesh using SMPL-like approach
-        # This is a placeholder - would use actual 3D reconstruction in production
-
-        # Get keypoints from front view
-        keypoints = keypoints_list[0]
-
-        # Create vertices based on keypoints
-        vertices = []
-        for kp in keypoints:
-            # Scale keypoints to real-world dimensions
-            height = measurements["height_cm"]
-            x = kp[0] * 50 - 25  # Center around 0
-            y = -(kp[1] * height - height/2)  # Y is inverted, center at 0
-            z = kp[2] * 30  # Depth
-            vertices.append([x, y, z])
-
-        vertices = np.array(vertices)
-
-        # Create simple triangular faces connecting the keypoints
-        # This creates a wireframe-like mesh
-        faces = []
-
-        # Connect body parts (simplified skeleton)
-        # Torso connections
-        torso_connections = [
-            (11, 12), (12, 24), (24, 23), (23, 11),  # Shoulders to hips
-            (11, 13), (13, 15),  # Left arm
-            (12, 14), (14, 16),  # Right arm
-            (23, 25), (25, 27), (27, 31),  # Left leg
-            (24, 26), (26, 28), (28, 32),  # Right leg
-        ]
-
-        # For simple visualization, we'll create a point cloud
-        # In production, you'd have proper mesh with faces
-
-        mesh = trimesh.points.PointCloud(vertices)
-
-        return mesh
-
-    def _save_mesh(self, scan_id: str, mesh: trimesh.Trimesh) -> str:
+        view: Dict[str, Any] = {"index": idx, "scale": None}
+        start = time.perf_counter()
+        try:
+            rgb = self._decode_image(img_bytes)
+        except Exception as e:
+            view["error"] = f"Could not read image: {e}"
+            return view
+
+        pose = self._detect_pose(rgb)
+        if pose is None:
+            view["error"] = "No body detected"
+            return view
+
+        kp, world, mask = pose["keypoints"], pose["world"], pose["mask"]
+        px, vis = kp[:, :2], kp[:, 3]
+
+        # Scale: world length over image length of the visible near-vertical bones
+        a, b = SCALE_SEGMENTS[:, 0], SCALE_SEGMENTS[:, 1]
+        px_len = np.linalg.norm(px[a] - px[b], axis=1)
+        world_len = np.linalg.norm(world[a] - world[b], axis=1) * 100.0
+        usable = (np.minimum(vis[a], vis[b]) >= self.MIN_VISIBILITY) & (px_len > 1.0)
+        if not usable.any():
+            view["error"] = "Torso and legs not visible"
+            return view
+        scale = float(np.median(world_len[usable] / px_len[usable]))
+
+        # View kind from how far apart the shoulders are relative to the torso length
+        shoulder_mid = px[[LEFT_SHOULDER, RIGHT_SHOULDER]].mean(axis=0)
+        hip_mid = px[[LEFT_HIP, RIGHT_HIP]].mean(axis=0)
+        torso = hip_mid - shoulder_mid
+        torso_len = float(np.hypot(*torso))
+        spread = abs(px[LEFT_SHOULDER, 0] - px[RIGHT_SHOULDER, 0]) / max(torso_len, 1.0)
+        if spread >= self.FRONTAL_MIN_SPREAD:
+            kind = "frontal"
+        elif spread <= self.SIDE_MAX_SPREAD:
+            kind = "side"
+        else:
+            kind = "oblique"
+
+        widths_cm = np.full(len(self.LEVELS), np.nan)
+        height_cm = None
+        if mask is not None and torso_len > 1.0:
+            # Silhouette width (depth, in a profile) across the body axis at each level
+            centers = shoulder_mid + self.LEVEL_POSITIONS[:, None] * torso
+            half_band = max(1, int(mask.shape[0] * self.WIDTH_BAND))
+            widths_cm = silhouette_run_widths(mask, centers[:, 0], centers[:, 1], half_band) * scale
+
+            # Height: top of the silhouette to the lowest visible foot point
+            rows = np.flatnonzero(mask.any(axis=1))
+            feet = [i for i in FEET if vis[i] >= self.MIN_VISIBILITY]
+            if len(rows) and feet:
+                top, bottom = rows[0], max(float(px[feet, 1].max()), float(rows[-1]))
+                # A silhouette touching the top or bottom edge is cut off
+                if top > 0 and rows[-1] < mask.shape[0] - 1:
+                    height_cm = (bottom - top) * scale
+
+        view.update({
+            "kind": kind,
+            "scale": scale,
+            "widths_cm": widths_cm,
+            "height_cm": height_cm,
+            "shoulder_width_cm": self._world_length(world, vis, [(LEFT_SHOULDER, RIGHT_SHOULDER)]),
+            "sleeve_length_cm": self._world_length(world, vis, SLEEVE_CHAINS),
+            "inseam_cm": self._world_length(world, vis, INSEAM_CHAINS),
+            "visibility": float(vis.mean()),
+            "world": world,
+        })
+        print(f"[BodyScan] View {idx}: {kind}, {rgb.shape[1]}x{rgb.shape[0]}, "
+              f"{(time.perf_counter() - start) * 1000:.0f}ms")
+        return view
+
+    def _world_length(self, world: np.ndarray, vis: np.ndarray, chains) -> Optional[float]:
+        """Mean length in cm of the chains (e.g. left and right arm) whose landmarks are all visible"""
+        lengths = []
+        for chain in chains:
+            chain = list(chain)
+            if vis[chain].min() >= self.MIN_VISIBILITY:
+                lengths.append(np.linalg.norm(np.diff(world[chain], axis=0), axis=1).sum() * 100.0)
+        return float(np.mean(lengths)) if lengths else None
+
+    def _fuse_views(self, views: List[Dict[str, Any]]) -> Dict:
         """
-        Save 3D mesh to file
+        Combine per-view measurements into one set.
 
-        In production, this would upload to S3
-        Returns URL to the mesh
+        Frontal (front/back) views give each level's width and profiles its
+        depth; the girth is the perimeter of the ellipse with those axes. A
+        level without a profile gets DEFAULT_DEPTH_RATIOS of its width.
+        Lengths are medians over every view they were visible in.
         """
-        # Create output directory
-        output_dir = os.path.join(os.getcwd(), "output", "meshes")
-        os.makedirs(output_dir, exist_ok=True)
+        def stack(kind: str) -> np.ndarray:
+            rows = [view["widths_cm"] for view in views if view["kind"] == kind]
+            if not rows:
+                return np.full(len(self.LEVELS), np.nan)
+            with _ignore_empty_slices():
+                return np.nanmedian(np.vstack(rows), axis=0)
+
+        widths = stack("frontal")
+        depths = stack("side")
+        depths = np.where(np.isnan(depths), widths * self.DEFAULT_DEPTH_RATIOS, depths)
+        girths = ellipse_perimeter(widths / 2.0, depths / 2.0)
+        girth = dict(zip(self.LEVELS, girths))
+
+        if any(np.isnan(girth[level]) for level in ("chest", "waist", "hips")):
+            raise ValueError("Chest, waist and hips need a front or back view with the whole torso visible")
+
+        def median_of(key: str) -> Optional[float]:
+            values = [view[key] for view in views if view.get(key) is not None]
+            return round(float(np.median(values)), 1) if values else None
+
+        height = median_of("height_cm")
+        if height is None:
+            raise ValueError("Height needs a view with the whole body (head to feet) in frame")
 
-        # Save as GLB (binary glTF)
-        mesh_path = os.path.join(output_dir, f"{scan_id}.glb")
+        return {
+            "height_cm": height,
+            "chest_cm": round(float(girth["chest"]), 1),
+            "waist_cm": round(float(girth["waist"]), 1),
+            "hips_cm": round(float(girth["hips"]), 1),
+            "inseam_cm": median_of("inseam_cm"),
+            "shoulder_width_cm": median_of("shoulder_width_cm"),
+            "sleeve_length_cm": median_of("sleeve_length_cm"),
+            "neck_cm": None if np.isnan(girth["neck"]) else round(float(girth["neck"]), 1)
+        }
 
-        # Export mesh (if it's a point cloud, convert to mesh first)
+    def _save_mesh(self, scan_id: str, views: List[Dict[str, Any]]) -> str:
+        """
+        Save the scan's world landmarks as a point cloud (in production, upload to S3).
+
+        Returns:
+            URL of the mesh, or "" when trimesh is missing or the export fails
+        """
+        safe_id = "".join(c for c in scan_id if c.isalnum() or c in "-_")
+        if trimesh is None or not safe_id:
+            return ""
+        view = next((view for view in views if view["kind"] == "frontal"), views[0])
+        # MediaPipe's world y points down; meshes are y-up, in cm
+        points = view["world"] * np.array([100.0, -100.0, -100.0])
         try:
-            mesh.export(mesh_path)
-        except:
-            # If export fails, save as PLY instead
-            mesh_path = os.path.join(output_dir, f"{scan_id}.ply")
-            mesh.export(mesh_path)
-
-        # Return local path (in production, return S3 URL)
-        return f"/meshes/{scan_id}.glb"
-
-    def _calculate_quality_score(
-        self,
-        keypoints_list: List,
-        images: List[np.ndarray]
-    ) -> float:
+            output_dir = os.path.join(self.output_dir, "meshes")
+            os.makedirs(output_dir, exist_ok=True)
+            trimesh.points.PointCloud(points).export(os.path.join(output_dir, f"{safe_id}.ply"))
+        except Exception as e:
+            print(f"[BodyScan] Failed to save mesh: {e}")
+            return ""
+        return f"/meshes/{safe_id}.ply"
+
+    def _calculate_quality_score(self, views: List[Dict[str, Any]], measured: List[Dict[str, Any]]) -> float:
         """
-        Calculate quality score for the body scan
+        Scan quality (0-100).
 
         Factors:
-        - Number of images provided
-        - Visibility of keypoints
-        - Image quality (resolution, lighting)
-        - Pose variation (different angles)
+        - Share of uploaded views with a usable pose (max 30 points)
+        - Mean landmark visibility of those views (max 40 points)
+        - A front/back view and a profile were both measured (max 30 points)
         """
-        score = 0.0
-
-        # Factor 1: Number of images (max 30 points)
-        num_images = len(keypoints_list)
-        score += min(num_images / 5.0, 1.0) * 30
-
-        # Factor 2: Keypoint visibility (max 40 points)
-        total_visibility = 0
-        for keypoints in keypoints_list:
-            for kp in keypoints:
-                total_visibility += kp[3]  # visibility score
-        avg_visibility = total_visibility / (len(keypoints_list) * len(keypoints_list[0]))
-        score += avg_visibility * 40
-
-        # Factor 3: Image quality (max 30 points)
-        for img in images:
-            height, width = img.shape[:2]
-            # Check resolution (prefer > 720p)
-            resolution_score = min((height * width) / (1280 * 720), 1.0)
-            score += resolution_score * (30 / len(images))
-
+        score = len(measured) / max(len(views), 1) * 30
+        score += float(np.mean([view["visibility"] for view in measured])) * 40
+        kinds = {view["kind"] for view in measured}
+        score += 15 * ("frontal" in kinds) + 15 * ("side" in kinds)
         return round(min(score, 100.0), 1)
 
     def _get_default_measurements(self) -> Dict:
@@ -325,29 +577,21 @@ class BodyScanService:
             "neck_cm": 38.0
         }
 
-    async def get_scan_status(self, scan_id: str) -> Optional[Dict]:
-        """Get status of a body scan (would query database in production)"""
-        # Placeholder - in production, this would query the scan status from DB
-        return {
-            "scan_id": scan_id,
-            "status": "completed",  # pending | processing | completed | failed
-            "progress": 100
-        }
-
     def reload_models(self):
-        """Reload ML models"""
-        # Reinitialize models
-        self.__init__()
+        """Reload ML models (landmarkers are recreated on next use)"""
+        self.shutdown()
 
     def get_model_info(self) -> Dict:
         """Get information about loaded models"""
         return {
-            "name": "MediaPipe Pose + Holistic",
-            "version": "0.10.8",
-            "ready": self.ready,
+            "name": "MediaPipe Pose Landmarker",
+            "model": os.path.basename(self.model_path),
+            "version": getattr(mp, "__version__", "unknown"),
+            "ready": self._ready,
+            "landmarkers": self.pool_size,
             "capabilities": [
                 "pose_estimation",
                 "body_segmentation",
-                "3d_reconstruction"
+                "multi_view_measurement_fusion"
             ]
         }
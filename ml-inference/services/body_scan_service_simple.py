@@ -3,6 +3,7 @@ Body Scan Service - Simplified Version
 Provides basic body measurements from images
 """
 
+import asyncio
 import cv2
 import numpy as np
 from typing import List, Dict, Optional
@@ -35,6 +36,11 @@ class BodyScanService:
         Returns:
             Dictionary with scan results
         """
+        # Decoding and measuring is CPU-bound: keep it off the event loop
+        return await asyncio.to_thread(self._process_scan_sync, scan_id, image_data)
+
+    def _process_scan_sync(self, scan_id: str, image_data: List[bytes]) -> Dict:
+        """Blocking implementation of process_scan()"""
         start_time = time.time()
 
         try:
@@ -118,3 +124,21 @@ class BodyScanService:
         confidence_bonus = measurements.get('confidence', 0.7) * 10
 
         return round(min(base_score + image_bonus + confidence_bonus, 100.0), 1)
+
+    def warm_up(self):
+        """Nothing to preload (no models)"""
+
+    def shutdown(self):
+        """Nothing to release (no models)"""
+
+    def reload_models(self):
+        """Nothing to reload (no models)"""
+
+    def get_model_info(self) -> Dict:
+        """Get information about loaded models"""
+        return {
+            "name": "Simplified body measurements",
+            "version": "1.0.0",
+            "ready": self._ready,
+            "capabilities": ["placeholder_measurements"]
+        }
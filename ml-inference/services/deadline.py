@@ -0,0 +1,78 @@
+"""
+Request Deadlines
+Time budget propagated from the caller so analysis stops when nobody will read the result
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+# Header carrying the caller's remaining budget in milliseconds (e.g. its axios timeout)
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+
+class Deadline:
+    """
+    Time budget for one request, checked between pipeline stages and detectors.
+
+    A deadline stops work either when its budget runs out or when it is
+    cancelled explicitly (client disconnected, stream closed). It is shared
+    with worker threads, so cancellation uses a threading.Event.
+    """
+
+    def __init__(self, budget_seconds: Optional[float], margin_seconds: float = 0.0):
+        """
+        Args:
+            budget_seconds: Time the caller will wait, from now (None = no time limit)
+            margin_seconds: Reserved at the end for serializing and sending the response
+        """
+        self.started_at = time.monotonic()
+        self.expires_at = (
+            self.started_at + max(0.0, budget_seconds - margin_seconds)
+            if budget_seconds is not None else None
+        )
+        self._cancelled = threading.Event()
+        self.reason: Optional[str] = None
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> "Deadline":
+        """
+        Build a deadline from the X-Request-Timeout-Ms header value.
+
+        Missing or malformed values give a deadline without a time limit
+        (it can still be cancelled). DEADLINE_MARGIN_MS (default 250) is kept
+        back for the response itself.
+        """
+        margin = float(os.getenv("DEADLINE_MARGIN_MS", "250")) / 1000
+        try:
+            budget = float(value) / 1000 if value else None
+        except ValueError:
+            budget = None
+        return cls(budget, margin_seconds=margin)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left (None when there is no time limit)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self, reason: str = "cancelled"):
+        """Abandon the work (e.g. the client disconnected)"""
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def expired(self) -> bool:
+        """True once the budget is spent or the request was cancelled"""
+        if self._cancelled.is_set():
+            return True
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            if self.reason is None:
+                self.reason = "deadline_exceeded"
+            return True
+        return False
@@ -0,0 +1,164 @@
+"""
+Detector Graph
+Per-view scheduler that computes shared inputs once and runs independent detectors concurrently
+"""
+
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from services.pixel_classifier import classify_pixels
+
+# Inputs every view starts with: normalized BGR image, skin mask, landmarks/bbox
+BASE_INPUTS = ("img", "skin_mask", "face_data")
+
+# Shared inputs derived from the base inputs (or each other): name -> (inputs it reads, provider)
+INPUT_PROVIDERS: Dict[str, Tuple[Tuple[str, ...], Callable[..., np.ndarray]]] = {
+    "gray": (("img",), lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)),
+    "lab": (("img",), lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2LAB)),
+    "hsv": (("img",), lambda img: cv2.cvtColor(img, cv2.COLOR_BGR2HSV)),
+    "skin_region": (("img", "skin_mask"), lambda img, mask: cv2.bitwise_and(img, img, mask=mask)),
+    # Packed colour classes of the skin pixels (see services.pixel_classifier)
+    "pixel_classes": (("hsv", "lab", "skin_mask"), classify_pixels),
+}
+
+# Detector: (inputs it reads, callable(view) -> result dict)
+DetectorNode = Tuple[List[str], Callable[[Dict], Dict]]
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def detector_threads() -> int:
+    """Worker threads for detectors (DETECTOR_THREADS, default min(4, CPUs); 1 runs inline)"""
+    return max(1, int(os.getenv("DETECTOR_THREADS", str(min(4, os.cpu_count() or 1)))))
+
+
+def get_detector_pool() -> Optional[ThreadPoolExecutor]:
+    """Shared detector thread pool, created on first use (None when running inline)"""
+    global _pool
+    if detector_threads() <= 1:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=detector_threads(), thread_name_prefix="face-detector")
+    return _pool
+
+
+def _compute_input(view: Dict, name: str) -> Optional[np.ndarray]:
+    deps, provider = INPUT_PROVIDERS[name]
+    value = provider(*[view[d] for d in deps])
+    # Shared by concurrently running detectors, so nobody may write to it
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    return value
+
+
+def _inputs_to_compute(view: Dict, names) -> List[str]:
+    """Derived inputs missing from `view`, including inputs they derive from, dependencies first"""
+    ordered: List[str] = []
+
+    def visit(name: str):
+        if name not in INPUT_PROVIDERS or name in view or name in ordered:
+            return
+        for dep in INPUT_PROVIDERS[name][0]:
+            visit(dep)
+        ordered.append(name)
+
+    for name in sorted(names):
+        visit(name)
+    return ordered
+
+
+def run_detector_graph(view: Dict, detectors: Dict[str, DetectorNode],
+                       pool: Optional[ThreadPoolExecutor] = None,
+                       should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, Dict]:
+    """
+    Run detectors on one view as a small dependency graph.
+
+    Derived inputs (gray, LAB, HSV, skin region, pixel classes) are computed
+    at most once per view and cached in `view`, so a later call on the same
+    view reuses them.
+    Each detector is submitted as soon as every input it declares exists;
+    OpenCV releases the GIL inside its kernels, so independent detectors
+    overlap. Scheduling happens on the calling thread, so pool threads never
+    block on each other.
+
+    Detector callables handle their own failures (fall back to defaults). If
+    a derived input can't be computed it is left out of `view` and
+    detectors that read it run without it.
+
+    Once should_stop() returns True no further work is started; detectors
+    already running finish, the rest are missing from the result.
+
+    Args:
+        view: Per-view inputs ("img", "skin_mask", "face_data", "view_name", ...)
+        detectors: name -> (input names, callable(view) -> result dict)
+        pool: Executor to use (defaults to the shared detector pool)
+        should_stop: Checked before starting each input or detector
+
+    Returns:
+        name -> result dict (callers merge them in their own order)
+    """
+    should_stop = should_stop or (lambda: False)
+    pool = pool if pool is not None else get_detector_pool()
+
+    needed = _inputs_to_compute(view, {name for inputs, _ in detectors.values() for name in inputs})
+
+    if pool is None or len(detectors) <= 1:
+        # Inline: same semantics, sequential in the given order
+        for name in needed:
+            if should_stop():
+                break
+            try:
+                view[name] = _compute_input(view, name)
+            except Exception as e:
+                print(f"[DetectorGraph] Could not compute input '{name}': {e}")
+        results = {}
+        for name, (_, run) in detectors.items():
+            if should_stop():
+                break
+            results[name] = run(view)
+        return results
+
+    available = set(view) | set(BASE_INPUTS)
+    pending_inputs = set(needed)
+    pending = dict(detectors)
+    running = {}
+    results = {}
+
+    while pending_inputs or pending or running:
+        if should_stop():
+            # Let running work finish, start nothing new
+            pending_inputs.clear()
+            pending.clear()
+        for name in sorted(pending_inputs):
+            if all(d in available for d in INPUT_PROVIDERS[name][0]):
+                pending_inputs.discard(name)
+                running[pool.submit(_compute_input, view, name)] = ("input", name)
+        for name, (inputs, run) in list(pending.items()):
+            if all(d in available or d not in INPUT_PROVIDERS for d in inputs):
+                del pending[name]
+                running[pool.submit(run, view)] = ("detector", name)
+
+        if not running:
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            kind, name = running.pop(future)
+            if kind == "input":
+                try:
+                    view[name] = future.result()
+                except Exception as e:
+                    print(f"[DetectorGraph] Could not compute input '{name}': {e}")
+                # Either way dependents may run now (without it, on failure)
+                available.add(name)
+            else:
+                results[name] = future.result()
+
+    return results
@@ -0,0 +1,172 @@
+"""
+Face Region Masks
+Region masks rasterized once on a face template and warped into each view
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Rasterization primitives, matching how each region was drawn per view:
+# - "polygon": cv2.fillPoly over the landmarks in list order
+# - "hull":    cv2.fillPoly over the convex hull of the landmarks
+# - "convex":  cv2.fillConvexPoly over the landmarks in list order
+RegionSpec = Tuple[List[int], str]
+
+
+def load_face_mesh_template(json_path: str) -> np.ndarray:
+    """
+    Load the face mesh template (services/face_mesh_template.json) as 2D points.
+
+    The template is one frontal face's MediaPipe landmarks, centred on the
+    face oval and scaled to a face width of 1, stored as [x, y, z] rows.
+
+    Returns:
+        (N, 2) float array of x/y in image orientation (y down), N >= 468
+
+    Raises:
+        ValueError: The file doesn't hold a full face mesh
+    """
+    with open(json_path) as f:
+        points = np.array(json.load(f), dtype=np.float64)
+    if points.ndim != 2 or points.shape[0] < 468 or points.shape[1] < 2:
+        raise ValueError(f"{json_path} is not a face mesh (shape {points.shape})")
+    return points[:, :2]
+
+
+class ViewRegionMasks:
+    """
+    Region masks for one view: a bit-plane array warped from the template.
+
+    Each region is one bit of a uint16 image the size of the canonical crop;
+    masks are unpacked lazily (and cached) as 0/255 uint8 images.
+    """
+
+    def __init__(self, planes: np.ndarray, bits: Dict[str, int]):
+        self.planes = planes
+        self.bits = bits
+        self.shape = planes.shape
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def get(self, name: str) -> Optional[np.ndarray]:
+        """Get the 0/255 mask for a region, or None if the region isn't in the template"""
+        if name not in self.bits:
+            return None
+        mask = self._cache.get(name)
+        if mask is None:
+            mask = ((self.planes >> self.bits[name]) & 1).astype(np.uint8) * 255
+            self._cache[name] = mask
+        return mask
+
+    def combine(self, include: str, exclude: List[str]) -> np.ndarray:
+        """Mask of pixels inside `include` and outside every `exclude` region, in one pass"""
+        include_bit = 1 << self.bits[include]
+        select = include_bit
+        for name in exclude:
+            select |= 1 << self.bits[name]
+        return ((self.planes & select) == include_bit).astype(np.uint8) * 255
+
+
+class RegionMaskTemplate:
+    """
+    Static region masks rasterized once on a face template.
+
+    The template is a set of landmark positions in canonical-crop pixels.
+    Every region is rasterized once into its own bit of a packed uint16
+    array, which is never written afterwards and so can be shared read-only
+    (including copy-on-write across forked workers). Per view, a single
+    affine transform fitted from template landmarks to the view's landmarks
+    brings all regions in with one warpAffine.
+    """
+
+    def __init__(self, template_points: np.ndarray, regions: Dict[str, RegionSpec],
+                 size: Tuple[int, int], source: str = "face_mesh_template"):
+        """
+        Args:
+            template_points: (N, 2) landmark positions in canonical-crop pixels
+            regions: region name -> (landmark indices, primitive)
+            size: (width, height) of the canonical crop
+            source: where the template came from (for model info / logs)
+        """
+        if len(regions) > 16:
+            raise ValueError("At most 16 regions fit in the uint16 bit-plane array")
+
+        self.template_points = np.asarray(template_points, dtype=np.float64)
+        self.regions = regions
+        self.size = size
+        self.source = source
+        self.bits = {name: bit for bit, name in enumerate(regions)}
+
+        planes = self._rasterize(self.template_points)
+        planes.setflags(write=False)
+        self.planes = planes
+
+    def _rasterize(self, points: np.ndarray) -> np.ndarray:
+        """Every region drawn from `points` into its bit of a packed uint16 array"""
+        width, height = self.size
+        planes = np.zeros((height, width), dtype=np.uint16)
+        scratch = np.zeros((height, width), dtype=np.uint8)
+        n_points = len(points)
+
+        for name, (indices, primitive) in self.regions.items():
+            region_points = np.array([points[i] for i in indices if i < n_points], dtype=np.int32)
+            if len(region_points) < 3:
+                continue
+            # Fill only the region's bounding box (clipped to the crop)
+            x0, y0 = np.maximum(region_points.min(axis=0), 0)
+            x1, y1 = np.minimum(region_points.max(axis=0) + 1, (width, height))
+            if x0 >= x1 or y0 >= y1:
+                continue
+            box = scratch[y0:y1, x0:x1]
+            box[:] = 0
+            region_points = region_points - (x0, y0)
+            if primitive == "hull":
+                cv2.fillPoly(box, [cv2.convexHull(region_points)], 1)
+            elif primitive == "convex":
+                cv2.fillConvexPoly(box, region_points, 1)
+            else:
+                cv2.fillPoly(box, [region_points], 1)
+            planes[y0:y1, x0:x1] |= box.astype(np.uint16) << self.bits[name]
+        return planes
+
+    def rasterize_view(self, view_points: np.ndarray) -> ViewRegionMasks:
+        """Regions drawn directly on a view's own landmarks (exact, but one fill per region)"""
+        return ViewRegionMasks(self._rasterize(np.asarray(view_points, dtype=np.float64)), self.bits)
+
+    def warp_to(self, view_points: np.ndarray, max_residual: Optional[float] = None) -> Optional[ViewRegionMasks]:
+        """
+        Bring the template regions into a view.
+
+        One affine transform only follows in-plane rotation, scale and shift:
+        a turned head (the left/right views) moves near and far landmarks by
+        different amounts. When the RMS residual of the fit is above
+        `max_residual`, the regions are rasterized on the view's landmarks instead.
+
+        Args:
+            view_points: (N, 2) landmark positions of the view in canonical-crop pixels
+            max_residual: Largest RMS fit residual (canonical pixels) the warp is used for
+
+        Returns:
+            ViewRegionMasks for the view, or None if the transform can't be fitted
+        """
+        n = min(len(self.template_points), len(view_points))
+        if n < 3:
+            return None
+
+        # Least-squares affine fit: [x, y, 1] @ A = view
+        src = np.hstack([self.template_points[:n], np.ones((n, 1))])
+        dst = np.asarray(view_points[:n], dtype=np.float64)
+        A, _, rank, _ = np.linalg.lstsq(src, dst, rcond=None)
+        if rank < 3:
+            return None
+        if max_residual is not None:
+            residual = np.sqrt(np.mean(np.sum((src @ A - dst) ** 2, axis=1)))
+            if residual > max_residual:
+                return self.rasterize_view(view_points)
+
+        width, height = self.size
+        planes = cv2.warpAffine(self.planes, A.T, (width, height),
+                                flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return ViewRegionMasks(planes, self.bits)
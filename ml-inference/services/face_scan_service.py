@@ -3,8 +3,15 @@ Face Scan & Skin Analysis Service
 Real skin analysis using OpenCV with optional MediaPipe enhancement
 """
 
+import asyncio
+import dataclasses
+import hashlib
+import multiprocessing
+import threading
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Callable
 import io
 import math
 import os
@@ -13,6 +20,17 @@ import cv2
 import numpy as np
 from PIL import Image
 
+from services.deadline import Deadline
+from services.frame_scoring import (FrameScorer, decode_preview, iter_clip_frames, iter_image_frames,
+                                    precheck_verdict)
+from services.frame_transport import FrameHandle, FrameRing, attach_frame
+from services.pixel_classifier import PixelClasses, classify_pixels
+from services.detector_graph import run_detector_graph
+from services.face_region_masks import RegionMaskTemplate, ViewRegionMasks, load_face_mesh_template
+from services.quality_tiers import QUALITY_TIERS
+from services.product_index import CatalogPartition, encode_analysis
+from services.perceptual_hash import RecentScanIndex, face_hash, near_duplicates
+
 # Try to import MediaPipe, but make it optional
 MEDIAPIPE_AVAILABLE = False
 try:
@@ -24,9 +42,35 @@ except Exception:
     pass
 
 
+# Landmark in a normalized view other than MediaPipe's (e.g. the canonical face crop)
+_Landmark = namedtuple("_Landmark", ["x", "y", "z"])
+
+
 class FaceScanService:
     """Service for face scanning and real skin analysis using computer vision"""
 
+    # Canonical face crop that every view is warped into before analysis,
+    # so detector cost and thresholds don't depend on the upload resolution
+    CANONICAL_WIDTH = 512
+    CANONICAL_HEIGHT = 640
+    CANONICAL_EYE_CENTER = (256.0, 230.0)       # midpoint between the eyes
+    CANONICAL_EYE_DISTANCE = 180.0              # inter-ocular distance (eye centroids)
+    CANONICAL_EYE_MOUTH_DISTANCE = 190.0        # caps the scale for profile views
+    CANONICAL_BBOX_FACE_WIDTH = 360.0           # Haar bbox width when there are no landmarks
+
+    # RMS residual (canonical px) of the template fit above which a view's region
+    # masks are rasterized on its own landmarks instead of warped from the template
+    REGION_WARP_MAX_RESIDUAL = 1.0
+
+    # Views a burst is reduced to, in analysis order
+    BURST_POSES = ("front", "left", "right")
+
+    # Front-view features cheap enough to stream as a preview
+    APPEARANCE_FEATURES = ("skin_tone", "skin_undertone", "face_shape")
+
+    # Products returned by get_recommendations
+    RECOMMENDATION_COUNT = 10
+
     def __init__(self):
         # Initialize face detection (with fallbacks)
         self._init_face_detection()
@@ -34,6 +78,25 @@ class FaceScanService:
         # Initialize face region landmark indices
         self._init_face_regions()
 
+        # Rasterize static region masks once on the canonical face template
+        self._init_region_template()
+
+        # Per-feature detector registry (drives selective analysis)
+        self._init_detector_registry()
+
+        # Optional worker processes fed through a shared-memory frame ring (0 = analyze in-process)
+        self._worker_processes = int(os.getenv("FACE_SCAN_WORKER_PROCESSES", "0"))
+        self._frame_workers: Optional[Tuple[ProcessPoolExecutor, FrameRing]] = None
+        self._frame_workers_lock = threading.Lock()
+
+        # Duplicate uploads: views of a scan whose face hashes are this close are analyzed
+        # once (-1 = never collapse), and byte-identical re-submissions are answered from recent results
+        self._view_duplicate_distance = int(os.getenv("VIEW_DUPLICATE_MAX_DISTANCE", "4"))
+        self._recent_scans = RecentScanIndex(
+            max_entries=int(os.getenv("RECENT_SCAN_CACHE_SIZE", "256")),
+            ttl_seconds=float(os.getenv("RECENT_SCAN_TTL_SECONDS", "600")),
+        )
+
         self._ready = True
         self._model_info = {
             "name": "FaceScan-v3",
@@ -54,7 +117,9 @@ class FaceScanService:
                 "Direction-aware wrinkle detection",
                 "Lighting normalization for consistency",
                 "Blur detection with quality warnings",
-                "Regional wrinkle analysis (forehead, crow's feet, nasolabial)"
+                "Regional wrinkle analysis (forehead, crow's feet, nasolabial)",
+                "Canonical face normalization (fixed-scale crop, resolution-independent cost)",
+                "Precomputed region masks warped from a canonical face template"
             ]
         }
 
@@ -63,6 +128,16 @@ class FaceScanService:
         self.face_landmarker = None
         self.use_mediapipe = False
         self.face_cascade = None
+        # The landmarker itself is created per process on first use (see _get_landmarker)
+        self._landmarker_options = None
+        self._landmarker_pid = None
+        self._landmarker_lock = threading.Lock()
+        # Scans run on worker threads: the shared IMAGE-mode landmarker is used under a lock,
+        # and each thread loads its own Haar cascade (CascadeClassifier isn't thread-safe)
+        self._landmarker_detect_lock = threading.Lock()
+        self._cascade_lock = threading.Lock()  # for self.face_cascade, shared by one-off frame scorers
+        self._cascade_path = None
+        self._thread_detectors = threading.local()
 
         # Try MediaPipe first
         if MEDIAPIPE_AVAILABLE:
@@ -87,7 +162,7 @@ class FaceScanService:
                         output_face_blendshapes=False,
                         output_facial_transformation_matrixes=False
                     )
-                    self.face_landmarker = vision.FaceLandmarker.create_from_options(options)
+                    self._landmarker_options = options
                     self.use_mediapipe = True
                     print("Using MediaPipe Face Landmarker")
             except Exception as e:
@@ -101,18 +176,121 @@ class FaceScanService:
                 print("Warning: Haar Cascade loaded but is empty")
                 self.face_cascade = None
             else:
+                self._cascade_path = cascade_path
                 print("OpenCV Haar Cascade loaded as fallback")
         except Exception as e:
             print(f"OpenCV face cascade failed: {e}")
 
-    def _download_face_model(self, model_dir: str, model_path: str):
-        """Download the MediaPipe face landmarker model"""
+    def _get_landmarker(self):
+        """
+        The MediaPipe landmarker for the current process, created on first use.
+
+        A landmarker owns native threads that don't survive fork(), so one
+        created in a preloading server's master can't be used by its workers;
+        each process creates its own (tracked by pid).
+        """
+        if not self.use_mediapipe:
+            return None
+        if self.face_landmarker is None or self._landmarker_pid != os.getpid():
+            with self._landmarker_lock:
+                if self.face_landmarker is None or self._landmarker_pid != os.getpid():
+                    try:
+                        self.face_landmarker = vision.FaceLandmarker.create_from_options(self._landmarker_options)
+                        self._landmarker_pid = os.getpid()
+                    except Exception as e:
+                        print(f"MediaPipe initialization failed: {e}")
+                        self.face_landmarker = None
+                        self.use_mediapipe = False
+        return self.face_landmarker
+
+    def _get_cascade(self):
+        """This thread's Haar cascade, loaded on first use (None if the cascade isn't available)"""
+        if self.face_cascade is None:
+            return None
+        cascade = getattr(self._thread_detectors, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self._cascade_path)
+            self._thread_detectors.cascade = cascade
+        return cascade
+
+    def create_tracking_landmarker(self):
+        """
+        A new VIDEO-mode landmarker, which tracks the face from frame to frame instead of re-detecting it.
+
+        Use one per frame sequence (timestamps must increase) and close() it
+        afterwards. None without MediaPipe.
+        """
+        if not self.use_mediapipe or self._landmarker_options is None:
+            return None
+        try:
+            options = dataclasses.replace(self._landmarker_options, running_mode=vision.RunningMode.VIDEO)
+            return vision.FaceLandmarker.create_from_options(options)
+        except Exception as e:
+            print(f"[FaceScan] Tracking landmarker unavailable: {e}")
+            return None
+
+    def create_frame_scorer(self, tracking: bool = True, width: int = 320) -> FrameScorer:
+        """
+        A FrameScorer for cheap per-frame checks (see services/frame_scoring.py).
+
+        Args:
+            tracking: Give it its own VIDEO-mode landmarker (or Haar cascade), for one
+                      ordered frame sequence (a burst, a pre-check connection); False
+                      shares the service's detectors under their locks, for one-off frames
+            width: Width frames are scored at
+
+        The caller close()s it when done.
+        """
+        if tracking:
+            landmarker = self.create_tracking_landmarker()
+            cascade = None
+            if landmarker is None and self.face_cascade is not None:
+                cascade = cv2.CascadeClassifier(self._cascade_path)
+            return FrameScorer(landmarker, cascade, width, tracking=True)
+        landmarker = self._get_landmarker()
+        lock = self._landmarker_detect_lock if landmarker is not None else self._cascade_lock
+        return FrameScorer(landmarker, self.face_cascade, width, tracking=False, detector_lock=lock)
+
+    def precheck_frame(self, scorer: FrameScorer, frame: bytes, timestamp_ms: float,
+                       view: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Live framing check of one small preview frame, before the real capture.
+
+        Args:
+            scorer: From create_frame_scorer() (one per client connection)
+            frame: Encoded preview frame (a ~320px JPEG is plenty)
+            timestamp_ms: Capture time, increasing from frame to frame
+            view: View the shopper is capturing ('front', 'left', 'right'), or None
+
+        Returns:
+            precheck_verdict() fields plus processing_time_ms
+        """
+        start = time.perf_counter()
+        try:
+            score = scorer.score(decode_preview(frame, scorer.width), timestamp_ms)
+        except Exception as e:
+            return {"success": False, "error": f"Could not read frame: {e}"}
+        verdict = precheck_verdict(
+            score, view,
+            min_sharpness=float(os.getenv("PRECHECK_MIN_SHARPNESS", "100")),
+            min_face_width=float(os.getenv("PRECHECK_MIN_FACE_WIDTH", "0.15")),
+        )
+        verdict["success"] = True
+        verdict["processing_time_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return verdict
+
+    def warm_up(self):
+        """Create per-process models now (server startup) rather than on the first scan"""
+        self._get_landmarker()
+
+    def _download_face_model(self, model_dir: str, model_path: str, model_url: Optional[str] = None):
+        """Download the MediaPipe face landmarker model (or another MediaPipe asset)"""
         import urllib.request
 
-        model_url = "https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task"
+        model_url = model_url or "https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task"
 
         try:
-            print(f"Downloading face landmarker model...")
+            print(f"Downloading {os.path.basename(model_path)}...")
             os.makedirs(model_dir, exist_ok=True)
             urllib.request.urlretrieve(model_url, model_path)
             print(f"Model downloaded successfully to {model_path}")
@@ -171,6 +349,235 @@ class FaceScanService:
         self.LEFT_EYE = [33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246]
         self.RIGHT_EYE = [362, 382, 381, 380, 374, 373, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398]
 
+    def _region_mask_specs(self) -> Dict[str, Tuple[List[int], str]]:
+        """Regions rasterized on the template, with the primitive each consumer used per view"""
+        return {
+            # Skin mask (_create_skin_mask)
+            "face_oval": (self.FACE_OVAL, "polygon"),
+            "left_eye": (self.LEFT_EYE, "polygon"),
+            "right_eye": (self.RIGHT_EYE, "polygon"),
+            "lips_hull": (self.LIPS[:20], "hull"),
+            # Wrinkle regions (_detect_wrinkles)
+            "forehead_hull": (self.FOREHEAD, "hull"),
+            "left_crows_feet_hull": (self.LEFT_CROWS_FEET, "hull"),
+            "right_crows_feet_hull": (self.RIGHT_CROWS_FEET, "hull"),
+            "left_nasolabial_hull": (self.LEFT_NASOLABIAL, "hull"),
+            "right_nasolabial_hull": (self.RIGHT_NASOLABIAL, "hull"),
+            # T-zone (_analyze_hydration)
+            "t_zone_hull": (self.T_ZONE[:30], "hull"),
+            # Dark circle and reference regions (_detect_dark_circles)
+            "left_under_eye": (self.LEFT_UNDER_EYE, "convex"),
+            "right_under_eye": (self.RIGHT_UNDER_EYE, "convex"),
+            "left_cheek": (self.LEFT_CHEEK, "convex"),
+            "right_cheek": (self.RIGHT_CHEEK, "convex"),
+            "forehead": (self.FOREHEAD, "convex"),
+        }
+
+    def _init_region_template(self):
+        """
+        Build the shared region-mask template from the face mesh template shipped with the service.
+
+        The mesh is aligned into the canonical crop the same way views are, and
+        every region is rasterized once into a packed bit-plane array, so every
+        worker and restart uses identical region masks.
+        """
+        mesh_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "face_mesh_template.json")
+        # The mesh has a face width of 1; alignment expects pixel-sized landmarks
+        mesh_points = load_face_mesh_template(mesh_path) * self.CANONICAL_WIDTH
+
+        M, _ = self._landmark_alignment(mesh_points)
+        template_points = mesh_points @ M[:, :2].T + M[:, 2]
+        self._region_template = RegionMaskTemplate(
+            template_points, self._region_mask_specs(),
+            (self.CANONICAL_WIDTH, self.CANONICAL_HEIGHT), source="face_mesh_template"
+        )
+        print("[FaceScan] Region mask template rasterized from the face mesh template")
+
+    def _view_region_masks(self, canonical_points: np.ndarray) -> Optional[ViewRegionMasks]:
+        """
+        Region masks for a view (landmarks in canonical-crop pixels).
+
+        Near-frontal views get the shared template warped in; turned heads,
+        which one affine fit can't follow, get their regions rasterized on
+        their own landmarks.
+        """
+        try:
+            return self._region_template.warp_to(canonical_points, self.REGION_WARP_MAX_RESIDUAL)
+        except Exception as e:
+            print(f"[FaceScan] Region mask warp failed, rasterizing per view: {e}")
+            return None
+
+    def _region_mask(self, face_data: Dict, name: str, shape: tuple) -> Optional[np.ndarray]:
+        """Precomputed 0/255 mask for a named region, if this view has one at this size"""
+        regions = face_data.get("regions")
+        if regions is None or regions.shape != tuple(shape[:2]):
+            return None
+        return regions.get(name)
+
+    def _init_detector_registry(self):
+        """
+        Register the analysis features that callers can select with `features=`.
+
+        Each feature has:
+        - run: callable(view) -> result dict, where view holds img, skin_mask,
+          face_data and view_name ("merged" features get the merged analysis)
+        - default: fallback values used when the detector fails
+        - views: "front", "all" or "merged" (computed after views are merged)
+        - requires: features that must also run for this one to be accurate
+        - inputs: per-view inputs the detector reads (see services.detector_graph);
+          derived ones (gray, lab, hsv, skin_region, pixel_classes) are computed once per view
+        - locations: result field whose entries get tagged with the view name
+        - cost_ms: rough per-view cost on the canonical crop (CPU, single thread)
+        """
+        self._detectors = {
+            "skin_tone": {
+                "run": lambda v: self._analyze_skin_tone(v.get("skin_region"), v["skin_mask"], lab=v.get("lab")),
+                "default": self._default_skin_tone,
+                "views": "front", "requires": [], "inputs": ["skin_region", "skin_mask", "lab"],
+                "locations": None, "cost_ms": 25,
+            },
+            "skin_undertone": {
+                "run": lambda v: self._analyze_undertone(v.get("skin_region"), v["skin_mask"], lab=v.get("lab")),
+                "default": lambda: {"skin_undertone": "neutral"},
+                "views": "front", "requires": [], "inputs": ["skin_region", "skin_mask", "lab"],
+                "locations": None, "cost_ms": 12,
+            },
+            "face_shape": {
+                "run": lambda v: self._classify_face_shape(v["face_data"], v["img"].shape),
+                "default": lambda: {"face_shape": "oval", "face_shape_confidence": 0.5},
+                "views": "front", "requires": [], "inputs": ["face_data"],
+                "locations": None, "cost_ms": 1,
+            },
+            "dark_circles": {
+                "run": lambda v: self._detect_dark_circles(v["img"], v["skin_mask"], v["face_data"], lab=v.get("lab")),
+                "default": self._default_dark_circles,
+                "views": "front", "requires": [], "inputs": ["img", "skin_mask", "face_data", "lab"],
+                "locations": None, "cost_ms": 7,
+            },
+            "face_outline": {
+                "run": lambda v: {"face_outline": self._extract_face_outline(v["face_data"], v["img"].shape)},
+                "default": lambda: {"face_outline": []},
+                "views": "front", "requires": [], "inputs": ["face_data"],
+                "locations": None, "cost_ms": 1,
+            },
+            "acne": {
+                "run": lambda v: self._detect_acne(v["img"], v["skin_mask"], v["face_data"], gray=v.get("gray"),
+                                                   hsv=v.get("hsv"), lab=v.get("lab"), classes=v.get("pixel_classes")),
+                "default": self._default_acne,
+                "views": "all", "requires": [],
+                "inputs": ["img", "skin_mask", "face_data", "gray", "hsv", "lab", "pixel_classes"],
+                "locations": "acne_locations", "cost_ms": 16,
+            },
+            "wrinkles": {
+                "run": lambda v: self._detect_wrinkles(v["img"], v["skin_mask"], v["face_data"], gray=v.get("gray")),
+                "default": self._default_wrinkles,
+                "views": "all", "requires": [], "inputs": ["img", "skin_mask", "face_data", "gray"],
+                "locations": "wrinkle_regions", "cost_ms": 34,
+            },
+            "texture": {
+                "run": lambda v: self._analyze_texture(v["img"], v["skin_mask"], gray=v.get("gray")),
+                "default": self._default_texture,
+                "views": "all", "requires": [], "inputs": ["img", "skin_mask", "gray"],
+                "locations": "enlarged_pores_locations", "cost_ms": 5,
+            },
+            "redness": {
+                "run": lambda v: self._analyze_redness(v["img"], v["skin_mask"], hsv=v.get("hsv"), lab=v.get("lab"),
+                                                       classes=v.get("pixel_classes")),
+                "default": self._default_redness,
+                "views": "all", "requires": [], "inputs": ["img", "skin_mask", "hsv", "lab", "pixel_classes"],
+                "locations": "redness_regions", "cost_ms": 14,
+            },
+            "hydration": {
+                "run": lambda v: self._analyze_hydration(v["img"], v["skin_mask"], v["face_data"], lab=v.get("lab"),
+                                                         classes=v.get("pixel_classes")),
+                "default": self._default_hydration,
+                "views": "front", "requires": [], "inputs": ["img", "skin_mask", "face_data", "lab", "pixel_classes"],
+                "locations": None, "cost_ms": 4,
+            },
+            "pigmentation": {
+                "run": lambda v: self._detect_pigmentation(v["img"], v["skin_mask"], lab=v.get("lab")),
+                "default": self._default_pigmentation,
+                "views": "all", "requires": [], "inputs": ["img", "skin_mask", "lab"],
+                "locations": "dark_spots_locations", "cost_ms": 12,
+            },
+            "skin_score": {
+                "run": lambda merged: {"skin_score": self._calculate_overall_score(merged)},
+                "default": lambda: {"skin_score": 50},
+                "views": "merged",
+                "requires": ["acne", "wrinkles", "texture", "redness", "hydration", "pigmentation"],
+                "inputs": [], "locations": None, "cost_ms": 0,
+            },
+            "skin_age": {
+                "run": self._estimate_skin_age,
+                "default": lambda: {"skin_age_estimate": 30},
+                "views": "merged",
+                "requires": ["acne", "wrinkles", "texture", "hydration", "pigmentation", "skin_tone", "face_shape"],
+                "inputs": [], "locations": None, "cost_ms": 0,
+            },
+        }
+
+        # Named feature sets for common flows
+        self.FEATURE_PROFILES = {
+            "full": list(self._detectors),
+            "shade_match": ["skin_tone", "skin_undertone"],
+            "appearance": ["skin_tone", "skin_undertone", "face_shape", "face_outline"],
+            # Cheap detectors kept by the "essential" quality tier under heavy load
+            "essential": ["skin_tone", "skin_undertone", "face_shape", "face_outline",
+                          "dark_circles", "texture", "hydration"],
+        }
+
+    def resolve_features(self, features: Optional[Any] = None) -> List[str]:
+        """
+        Expand requested features (names or profile names) with their dependencies.
+
+        Args:
+            features: Iterable of names, a comma-separated string, or None for everything
+
+        Returns:
+            Feature names in registry (execution) order
+
+        Raises:
+            ValueError: if a name is neither a feature nor a profile
+        """
+        if features is None:
+            return list(self._detectors)
+        if isinstance(features, str):
+            features = features.split(",")
+
+        selected = set()
+        pending = []
+        for name in (f.strip() for f in features):
+            if not name:
+                continue
+            if name in self.FEATURE_PROFILES:
+                pending.extend(self.FEATURE_PROFILES[name])
+            elif name in self._detectors:
+                pending.append(name)
+            else:
+                raise ValueError(f"Unknown feature '{name}'")
+
+        while pending:
+            name = pending.pop()
+            if name not in selected:
+                selected.add(name)
+                pending.extend(self._detectors[name]["requires"])
+
+        if not selected:
+            return list(self._detectors)
+        return [name for name in self._detectors if name in selected]
+
+    def _feature_fields(self, features: List[str]) -> set:
+        """Response fields produced by the given features"""
+        fields = set()
+        for name in features:
+            spec = self._detectors[name]
+            fields.update(spec["default"]())
+            if spec["locations"]:
+                fields.add(spec["locations"])
+            if name == "skin_age":
+                fields.add("age_confidence")
+        return fields
+
     def _normalize_lighting(self, img: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Normalize lighting conditions for consistent analysis.
@@ -291,7 +698,7 @@ class FaceScanService:
 
         return {
             "blur_level": blur_level,
-            "sharpness_score": round(min(1.0, sharpness_score), 3),
+            "sharpness_score": round(float(min(1.0, sharpness_score)), 3),
             "laplacian_variance": float(lap_var),
             "gradient_mean": float(grad_mean),
             # ADJUSTED: Moderate thresholds for better accuracy while still accepting webcam images
@@ -355,43 +762,50 @@ class FaceScanService:
             "brightness_std": float(std_brightness)
         }
 
-    def _convert_to_python_types(self, obj):
-        """
-        Recursively convert numpy types to Python native types for JSON serialization.
-        Fixes 'numpy.bool' object is not iterable' and similar errors.
-        """
-        if isinstance(obj, dict):
-            return {key: self._convert_to_python_types(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [self._convert_to_python_types(item) for item in obj]
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        elif isinstance(obj, np.bool_):
-            return bool(obj)
-        elif isinstance(obj, np.integer):  # Covers all numpy integer types
-            return int(obj)
-        elif isinstance(obj, np.floating):  # Covers all numpy float types
-            return float(obj)
-        elif isinstance(obj, np.str_):
-            return str(obj)
-        else:
-            return obj
-
     def is_ready(self) -> bool:
         """Check if service is ready"""
         return self._ready
 
     def get_model_info(self) -> Dict:
         """Get model information"""
+        self._model_info["region_template"] = self._region_template.source
+        self._model_info["features"] = {
+            name: {
+                "views": spec["views"],
+                "requires": spec["requires"],
+                "inputs": spec["inputs"],
+                "cost_ms_per_view": spec["cost_ms"],
+            }
+            for name, spec in self._detectors.items()
+        }
+        self._model_info["feature_profiles"] = {
+            name: {
+                "features": features,
+                "cost_ms_per_scan": self.estimate_feature_cost(features),
+            }
+            for name, features in self.FEATURE_PROFILES.items()
+        }
         return self._model_info
 
+    def estimate_feature_cost(self, features: Optional[Any] = None, num_views: int = 3) -> int:
+        """Rough detector cost (ms) for a scan with the given features and number of views"""
+        cost = 0
+        for name in self.resolve_features(features):
+            spec = self._detectors[name]
+            cost += spec["cost_ms"] * (num_views if spec["views"] == "all" else 1)
+        return cost
+
     def reload_models(self):
         """Reload ML models"""
         # Reinitialize face detection
         self._init_face_detection()
         self._ready = True
 
-    async def analyze_face(self, scan_id: str, image_data: List[bytes]) -> Dict[str, Any]:
+    async def analyze_face(self, scan_id: str, image_data: List[bytes],
+                           features: Optional[Any] = None,
+                           deadline: Optional[Deadline] = None,
+                           quality_tier: Optional[str] = None,
+                           wrap_events: Optional[Callable[[Iterator], Iterator]] = None) -> Dict[str, Any]:
         """
         Analyze facial images for comprehensive skin analysis using MULTIPLE VIEWS.
 
@@ -402,223 +816,864 @@ class FaceScanService:
         Args:
             scan_id: Unique scan identifier
             image_data: List of image bytes (front, left, right)
+            features: Features or profiles to compute (see get_model_info()); None runs everything
+            deadline: Caller's time budget; when it runs out the result is partial
+            quality_tier: Tier from QUALITY_TIERS (None = "full"), reported back in the result
+            wrap_events: Optional wrapper around the pipeline's event iterator (e.g. a profiler)
 
         Returns:
             Dictionary containing quality_score and detailed analysis from all views
         """
+        # CPU-bound: run off the event loop so other requests keep being served
+        return await asyncio.to_thread(
+            self._run_analysis, scan_id, image_data, features, deadline, quality_tier, wrap_events
+        )
+
+    def _run_analysis(self, scan_id: str, image_data: List[bytes], features: Optional[Any] = None,
+                      deadline: Optional[Deadline] = None, quality_tier: Optional[str] = None,
+                      wrap_events: Optional[Callable[[Iterator], Iterator]] = None) -> Dict[str, Any]:
+        """Drive iter_analysis_events() to completion and return the final result"""
+        result = None
+        events = self.iter_analysis_events(scan_id, image_data, features, deadline, quality_tier)
+        if wrap_events is not None:
+            events = wrap_events(events)
+        for event, payload in events:
+            if event == "result":
+                result = payload
+        return result
+
+    def iter_analysis_events(self, scan_id: str, image_data: List[bytes],
+                             features: Optional[Any] = None,
+                             deadline: Optional[Deadline] = None,
+                             quality_tier: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Run the multi-view analysis pipeline, yielding (event, payload) as stages finish.
+
+        Events, in order:
+        - "faces_detected": number of images received and faces found
+        - "quality_gate": per-view blur/lighting verdict (accepted or skipped)
+        - "preview": cheap front-view metrics (skin tone, undertone, face shape)
+        - "view_result": per-view detector results
+        - "result": the final response, identical to what analyze_face() returns
+
+        This is a plain generator so callers can drive it from a worker thread
+        and stop consuming (e.g. on client disconnect) at any stage boundary.
+
+        Only the requested features (plus their dependencies) are computed;
+        fields of skipped features are omitted from the result.
+
+        With a deadline, the budget is checked between stages and between
+        detectors. Once it is spent (or the request is cancelled) no new work
+        starts: the result carries the detectors that finished, defaults for
+        the rest, and "partial": true.
+
+        quality_tier (see services/quality_tiers.py) trades accuracy for
+        throughput: reduced_resolution detects faces on smaller uploads,
+        single_view analyzes only the front image and essential also limits
+        detectors to the cheap "essential" profile. The tier is reported as
+        "quality_tier" in the faces_detected event and the result.
+
+        Views whose face crops have near-identical perceptual hashes are
+        analyzed once; the skipped ones are listed as "duplicate_views" in the
+        faces_detected event and the analysis. A scan that repeats a recent one
+        byte for byte (same uploads, features and tier) gets that scan's result,
+        with "duplicate_of" set to its scan_id, right after faces_detected.
+        """
+        tier = quality_tier or "full"
+        yield from self._with_tier(self._iter_pipeline(scan_id, image_data, features, deadline, tier), tier)
+
+    @staticmethod
+    def _with_tier(events: Iterator[Tuple[str, Dict[str, Any]]], tier: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Report the quality tier in the faces_detected event and the result"""
+        for event, payload in events:
+            if event in ("faces_detected", "result"):
+                payload["quality_tier"] = tier
+            yield event, payload
+
+    def _tier_settings(self, tier: str, features: Optional[Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """Settings of a quality tier and the features to run at it"""
+        if tier not in QUALITY_TIERS:
+            raise ValueError(f"Unknown quality tier '{tier}'")
+        settings = QUALITY_TIERS[tier]
+
+        features = self.resolve_features(features)
+        if settings["profile"]:
+            allowed = set(self.resolve_features(settings["profile"]))
+            # A request with nothing in the profile still runs as asked (at this tier's resolution/views)
+            features = [name for name in features if name in allowed] or features
+        return settings, features
+
+    def _max_views(self, settings: Dict[str, Any], features: List[str]) -> Optional[int]:
+        """
+        Views worth decoding for these features at this tier (None = all).
+
+        Only the front view is analyzed unless some feature runs on every view,
+        so a front-only selection (e.g. shade_match) doesn't pay for decoding,
+        detecting and normalizing the side uploads.
+        """
+        if not any(self._detectors[name]["views"] == "all" for name in features):
+            return 1
+        return settings["max_views"]
+
+    def _iter_pipeline(self, scan_id: str, image_data: List[bytes], features: Optional[Any],
+                       deadline: Optional[Deadline], tier: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Pipeline behind iter_analysis_events() at a given quality tier"""
         start_time = time.time()
         VIEW_NAMES = ['front', 'left', 'right']
+        deadline = deadline or Deadline(None)
+        skipped = []
+        frame_slots = []  # Shared-memory slots held by this scan (worker mode)
+        frame_ring = None  # The ring they belong to (shutdown_workers() may drop self._frame_workers meanwhile)
 
         try:
+            settings, features = self._tier_settings(tier, features)
+            max_views = self._max_views(settings, features)
+            if max_views:
+                image_data = image_data[:max_views]
+
+            # Re-submission of a recently analyzed scan (the same uploads, byte for byte):
+            # replay its events without decoding or detecting anything. Only exact content
+            # is reused, since similar-looking photos may be of different shoppers
+            cache_key = None
+            if self._recent_scans.enabled:
+                cache_key = (tier, tuple(features), tuple(hashlib.sha256(data).digest() for data in image_data))
+                cached = self._recent_scans.lookup(cache_key)
+                if cached is not None:
+                    result = cached["result"]
+                    print(f"[FaceScan] Scan {scan_id} repeats {result['scan_id']}, reusing its result")
+                    yield "faces_detected", dict(cached["faces_detected"], scan_id=scan_id)
+                    result.update({
+                        "scan_id": scan_id,
+                        "duplicate_of": result["scan_id"],
+                        "processing_time_ms": int((time.time() - start_time) * 1000),
+                    })
+                    yield "result", result
+                    return
+
             # Step 1: Load and preprocess ALL images
-            images, face_data_list = self._process_images(image_data)
+            workers = self._get_frame_workers()
+            handles = None
+            if workers is not None:
+                # Decode into shared-memory slots; face detection runs in the worker processes
+                frame_ring = workers[1]
+                images, handles, face_data_list = self._process_images_in_workers(
+                    image_data, deadline, settings, workers, frame_slots
+                )
+            else:
+                images, face_data_list = self._process_images(
+                    image_data, deadline, max_size=settings["max_image_size"], fast_decode=settings["fast_decode"]
+                )
+            if deadline.expired() and len(images) < len(image_data):
+                skipped.append("images")  # Not every upload was decoded in time
+
+            view_names = [VIEW_NAMES[idx] if idx < len(VIEW_NAMES) else f'view_{idx}' for idx in range(len(images))]
+            hashes = [self._face_hash(img, face_data) for img, face_data in zip(images, face_data_list)]
+            duplicate_views = self._collapse_duplicate_views(view_names, hashes)
+            if duplicate_views:
+                keep = [idx for idx, name in enumerate(view_names) if name not in duplicate_views]
+                images = [images[idx] for idx in keep]
+                face_data_list = [face_data_list[idx] for idx in keep]
+                view_names = [view_names[idx] for idx in keep]
+                hashes = [hashes[idx] for idx in keep]
+                if handles is not None:
+                    handles = [handles[idx] for idx in keep]
+
+            faces_detected = {
+                "scan_id": scan_id,
+                "images_received": len(image_data),
+                "faces_detected": len(face_data_list) + len(duplicate_views),
+            }
+            if duplicate_views:
+                faces_detected["duplicate_views"] = duplicate_views
+            yield "faces_detected", faces_detected
 
-            if not face_data_list:
-                return self._error_response(scan_id, "No face detected in images", time.time() - start_time)
+            if not face_data_list and not skipped:
+                yield "result", self._error_response(scan_id, "No face detected in images", time.time() - start_time)
+                return
 
             print(f"[FaceScan] Multi-view analysis: {len(images)} images with {len(face_data_list)} valid faces")
 
             # Step 2: Analyze each view and collect results
-            view_analyses = []
-            view_quality_scores = []
-            primary_view_idx = 0  # Front view is primary
-
-            for idx in range(len(images)):
-                view_name = VIEW_NAMES[idx] if idx < len(VIEW_NAMES) else f'view_{idx}'
-                img_original = images[idx]
-                face_data = face_data_list[idx] if idx < len(face_data_list) else face_data_list[0]
+            views = list(zip(view_names, face_data_list))
+            if workers is not None:
+                view_events = self._iter_views_in_workers(views, handles, features, deadline, skipped, workers[0])
+            else:
+                view_events = self._iter_views(views, images, features, deadline, skipped)
+
+            for event, payload in self._iter_merged_result(
+                scan_id, view_events, features, deadline, skipped, start_time,
+                fallback_view=lambda: self._normalize_face_geometry(images[0], face_data_list[0])
+            ):
+                if event == "result":
+                    if duplicate_views:
+                        payload["analysis"]["duplicate_views"] = duplicate_views
+                    # Only complete analyses are worth reusing
+                    if cache_key is not None and payload.get("views_analyzed") != 0 and not payload.get("partial"):
+                        self._recent_scans.store(cache_key, {"faces_detected": faces_detected, "result": payload})
+                yield event, payload
 
-                print(f"[FaceScan] Analyzing {view_name} view...")
+        except Exception as e:
+            yield "result", self._error_response(scan_id, str(e), time.time() - start_time)
+        finally:
+            for slot in frame_slots:
+                frame_ring.release(slot)
+
+    @staticmethod
+    def _face_hash(img: np.ndarray, face_data: Dict) -> Optional[int]:
+        """Perceptual hash of a view's face crop (None if it can't be computed)"""
+        try:
+            return face_hash(img, face_data)
+        except Exception as e:
+            print(f"[FaceScan] Face hash failed: {e}")
+            return None
 
-                # Extract skin mask for this view
-                skin_mask = self._create_skin_mask(img_original, face_data)
+    def _collapse_duplicate_views(self, view_names: List[str], hashes: List[Optional[int]]) -> Dict[str, str]:
+        """
+        Views that are near-duplicates of an earlier view of the same scan.
 
-                # Normalize lighting
-                img = self._normalize_lighting(img_original, skin_mask)
+        The same photo uploaded as several views would otherwise be analyzed
+        once per copy, and its acne/spot/wrinkle counts summed in the merge.
 
-                # Check quality for this view
-                lighting_info = self._estimate_lighting_quality(img_original, skin_mask)
-                blur_info = self._detect_blur(img_original, skin_mask)
+        Returns:
+            {duplicate view name: name of the view it repeats}
+        """
+        if self._view_duplicate_distance < 0:
+            return {}
+        duplicates = {}
+        for name, original in zip(view_names, near_duplicates(hashes, self._view_duplicate_distance)):
+            if original is not None:
+                duplicates[name] = view_names[original]
+        if duplicates:
+            print(f"[FaceScan] Near-duplicate views skipped: {duplicates}")
+        return duplicates
+
+    def _iter_merged_result(self, scan_id: str, view_events: Iterator[Tuple[str, Dict[str, Any]]],
+                            features: List[str], deadline: Deadline, skipped: List[str], start_time: float,
+                            fallback_view: Callable[[], Tuple[np.ndarray, Dict, Dict]]
+                            ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Pass per-view events through, then merge the analyzed views into the final result.
 
-                # Skip view if quality is too poor (but continue with others)
-                if not blur_info["is_acceptable"] or lighting_info["lighting_quality"] < 0.15:
-                    print(f"[FaceScan] {view_name} view quality too low, skipping detailed analysis")
-                    continue
+        fallback_view() returns the normalized front view (canonical image, face
+        data, geometry), used for a low-confidence result when every view
+        fails its quality gate.
+        """
+        view_analyses = []
+        view_quality_scores = []
+        for event, payload in view_events:
+            if event == "view_result":
+                view_analyses.append((payload["view"], payload["analysis"]))
+                view_quality_scores.append(payload["quality_score"])
+            yield event, payload
+
+        # Step 3: Check if we have any valid analyses
+        if not view_analyses and skipped:
+            # Out of time before any view finished: defaults only
+            yield "result", dict({
+                "success": True,
+                "scan_id": scan_id,
+                "quality_score": 0.0,
+                "processing_time_ms": int((time.time() - start_time) * 1000),
+                "analysis": self._get_low_confidence_defaults(features),
+                "views_analyzed": 0
+            }, **self._partial_fields(skipped, deadline))
+            return
 
-                # Run analysis on this view
-                view_analysis = self._analyze_single_view(img, img_original, skin_mask, face_data, view_name)
-                view_analyses.append((view_name, view_analysis))
-
-                # Calculate quality score for this view
-                quality_score = self._calculate_quality_score(img_original, face_data, skin_mask)
-                view_quality_scores.append(quality_score)
-
-                print(f"[FaceScan] {view_name} view analysis complete - quality: {quality_score:.2f}")
-
-            # Step 3: Check if we have any valid analyses
-            if not view_analyses:
-                # Fall back to single image analysis if all views failed quality check
-                print("[FaceScan] All views failed quality check, falling back to best available")
-                img_original = images[0]
-                face_data = face_data_list[0]
-                skin_mask = self._create_skin_mask(img_original, face_data)
-                lighting_info = self._estimate_lighting_quality(img_original, skin_mask)
-                blur_info = self._detect_blur(img_original, skin_mask)
-
-                return self._convert_to_python_types({
-                    "success": True,
-                    "scan_id": scan_id,
-                    "quality_score": max(blur_info["sharpness_score"], lighting_info["lighting_quality"]) * 0.5,
-                    "processing_time_ms": int((time.time() - start_time) * 1000),
-                    "warning": "Image quality is poor. Results may be less accurate.",
-                    "analysis": self._get_low_confidence_defaults(),
-                    "views_analyzed": 0
-                })
-
-            # Step 4: Merge analyses from all views
-            merged_analysis = self._merge_multi_view_analysis(view_analyses)
-
-            # Add metadata about which views were used
-            merged_analysis["views_analyzed"] = [v[0] for v in view_analyses]
-            merged_analysis["multi_view"] = len(view_analyses) > 1
-
-            # Calculate overall quality score (average of valid views)
-            avg_quality = sum(view_quality_scores) / len(view_quality_scores) if view_quality_scores else 0.5
-
-            processing_time = int((time.time() - start_time) * 1000)
-            print(f"[FaceScan] Multi-view analysis complete: {len(view_analyses)} views in {processing_time}ms")
-
-            return self._convert_to_python_types({
+        if not view_analyses:
+            # Fall back to single image analysis if all views failed quality check
+            print("[FaceScan] All views failed quality check, falling back to best available")
+            img_original, face_data, geometry = fallback_view()
+            skin_mask = self._create_view_skin_mask(img_original, face_data, geometry)
+            lighting_info = self._estimate_lighting_quality(img_original, skin_mask)
+            blur_info = self._detect_blur(img_original, skin_mask)
+
+            yield "result", {
                 "success": True,
                 "scan_id": scan_id,
-                "quality_score": avg_quality,
-                "processing_time_ms": processing_time,
-                "analysis": merged_analysis
-            })
+                "quality_score": max(blur_info["sharpness_score"], lighting_info["lighting_quality"]) * 0.5,
+                "processing_time_ms": int((time.time() - start_time) * 1000),
+                "warning": "Image quality is poor. Results may be less accurate.",
+                "analysis": self._get_low_confidence_defaults(features),
+                "views_analyzed": 0
+            }
+            return
 
-        except Exception as e:
-            return self._error_response(scan_id, str(e), time.time() - start_time)
+        # Step 4: Merge analyses from all views
+        merged_analysis = self._merge_multi_view_analysis(view_analyses, features)
 
-    def _analyze_single_view(self, img: np.ndarray, img_original: np.ndarray,
-                             skin_mask: np.ndarray, face_data: Dict, view_name: str) -> Dict:
+        # Add metadata about which views were used
+        merged_analysis["views_analyzed"] = [v[0] for v in view_analyses]
+        merged_analysis["multi_view"] = len(view_analyses) > 1
+
+        # Calculate overall quality score (average of valid views)
+        avg_quality = sum(view_quality_scores) / len(view_quality_scores) if view_quality_scores else 0.5
+
+        processing_time = int((time.time() - start_time) * 1000)
+        print(f"[FaceScan] Multi-view analysis complete: {len(view_analyses)} views in {processing_time}ms")
+
+        result = {
+            "success": True,
+            "scan_id": scan_id,
+            "quality_score": avg_quality,
+            "processing_time_ms": processing_time,
+            "analysis": merged_analysis
+        }
+        if skipped:
+            result.update(self._partial_fields(skipped, deadline))
+        yield "result", result
+
+    async def analyze_burst(self, scan_id: str, frames: Optional[List[bytes]] = None,
+                            clip: Optional[bytes] = None, features: Optional[Any] = None,
+                            deadline: Optional[Deadline] = None, quality_tier: Optional[str] = None,
+                            wrap_events: Optional[Callable[[Iterator], Iterator]] = None) -> Dict[str, Any]:
         """
-        Analyze a single view (front/left/right) and return results with view context.
+        Analyze the best front/left/right frames of a burst of stills or a short clip.
 
         Args:
-            img: Lighting-normalized image
-            img_original: Original image
-            skin_mask: Mask for skin region
-            face_data: Face detection data
-            view_name: 'front', 'left', or 'right'
+            scan_id: Unique scan identifier
+            frames: Encoded frames of a photo burst, in capture order
+            clip: A short video clip (used when frames is empty)
+            features, deadline, quality_tier, wrap_events: As for analyze_face()
 
         Returns:
-            Dictionary with analysis results including view-specific location data
+            The analyze_face() result, plus "frame_selection"
+        """
+        def run():
+            result = None
+            selection = None
+            events = self.iter_burst_events(scan_id, frames, clip, features, deadline, quality_tier)
+            if wrap_events is not None:
+                events = wrap_events(events)
+            for event, payload in events:
+                if event == "frames_scored":
+                    selection = payload
+                elif event == "result":
+                    result = payload
+            if result is not None and selection is not None:
+                result["frame_selection"] = selection
+            return result
+
+        return await asyncio.to_thread(run)
+
+    def iter_burst_events(self, scan_id: str, frames: Optional[List[bytes]] = None,
+                          clip: Optional[bytes] = None, features: Optional[Any] = None,
+                          deadline: Optional[Deadline] = None,
+                          quality_tier: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Burst-mode pipeline: score every frame cheaply, analyze only the best one per view.
+
+        Each frame is downscaled to BURST_SCORING_WIDTH and scored for face
+        presence, head pose (yaw from tracked landmarks), Laplacian sharpness
+        of the face and exposure (see services/frame_scoring.py). Only the
+        sharpest well-exposed frame per pose is kept while scoring, so memory
+        stays at three frames however long the burst; those frames are then
+        decoded at the tier's resolution and run through the regular per-view
+        analysis, which is what makes blurry views rare here.
+
+        Emits a "frames_scored" event (frames scored, which were picked and
+        their scores) before the events of iter_analysis_events().
         """
-        # Extract skin region for analysis
-        skin_region = cv2.bitwise_and(img, img, mask=skin_mask)
+        tier = quality_tier or "full"
+        yield from self._with_tier(self._iter_burst_pipeline(scan_id, frames, clip, features, deadline, tier), tier)
 
-        analysis = {}
-        analysis["_view"] = view_name  # Track which view this came from
+    def _iter_burst_pipeline(self, scan_id: str, frames: Optional[List[bytes]], clip: Optional[bytes],
+                             features: Optional[Any], deadline: Optional[Deadline],
+                             tier: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Pipeline behind iter_burst_events() at a given quality tier"""
+        start_time = time.time()
+        deadline = deadline or Deadline(None)
+        skipped = []
 
-        # Color analysis (only meaningful from front view)
-        if view_name == 'front':
-            try:
-                skin_tone_result = self._analyze_skin_tone(skin_region, skin_mask)
-                analysis.update(skin_tone_result)
-            except Exception:
-                analysis.update(self._default_skin_tone())
+        try:
+            settings, features = self._tier_settings(tier, features)
 
-            # Undertone detection (front view only)
-            try:
-                undertone_result = self._analyze_undertone(skin_region, skin_mask)
-                analysis.update(undertone_result)
-            except Exception:
-                analysis["skin_undertone"] = "neutral"
+            # Step 1: Score every frame at low resolution, keeping the best per pose
+            best, scored = self._select_burst_frames(frames, clip, deadline, skipped)
+            poses = [pose for pose in self.BURST_POSES if pose in best][:self._max_views(settings, features)]
+            scoring_ms = int((time.time() - start_time) * 1000)
+            yield "frames_scored", {
+                "scan_id": scan_id,
+                "frames_received": len(frames) if frames else None,
+                "frames_scored": scored,
+                "scoring_ms": scoring_ms,
+                "selected": [dict(best[pose][0], view=pose) for pose in poses],
+            }
+            print(f"[FaceScan] Burst: scored {scored} frames in {scoring_ms}ms, selected {poses}")
+
+            # Step 2: Prepare the selected frames at the tier's resolution and detect faces properly
+            views, images = [], []
+            max_w, max_h = settings["max_image_size"]
+            for pose in poses:
+                score, source = best[pose]
+                if isinstance(source, bytes):
+                    img_bgr = self._decode_image(source, score["frame"], settings["max_image_size"],
+                                                 settings["fast_decode"])
+                else:
+                    img_bgr = source
+                    h, w = img_bgr.shape[:2]
+                    if h > max_h or w > max_w:
+                        scale = min(max_w / w, max_h / h)
+                        img_bgr = np.ascontiguousarray(cv2.resize(img_bgr, None, fx=scale, fy=scale))
+                face_data = self._detect_face(img_bgr, score["frame"]) if img_bgr is not None else None
+                if face_data:
+                    views.append((pose, face_data))
+                    images.append(img_bgr)
 
-            # Face shape classification (front view only)
-            try:
-                face_shape_result = self._classify_face_shape(face_data, img.shape)
-                analysis.update(face_shape_result)
-            except Exception:
-                analysis.update({"face_shape": "oval", "face_shape_confidence": 0.5})
+            yield "faces_detected", {
+                "scan_id": scan_id,
+                "images_received": len(poses),
+                "faces_detected": len(views),
+            }
 
-            # Dark circles (front view - under eye area)
-            try:
-                dark_circles_result = self._detect_dark_circles(img, skin_mask, face_data)
-                analysis.update(dark_circles_result)
-            except Exception:
-                analysis.update(self._default_dark_circles())
+            if not views and not skipped:
+                yield "result", self._error_response(scan_id, "No face detected in frames", time.time() - start_time)
+                return
 
-            # Extract face outline (front view only for overlay)
-            try:
-                face_outline = self._extract_face_outline(face_data, img.shape)
-                analysis["face_outline"] = face_outline
-            except Exception:
-                analysis["face_outline"] = []
+            # Step 3: Analyze the selected views and merge, as for stills
+            view_events = self._iter_views(views, images, features, deadline, skipped)
+            yield from self._iter_merged_result(
+                scan_id, view_events, features, deadline, skipped, start_time,
+                fallback_view=lambda: self._normalize_face_geometry(images[0], views[0][1])
+            )
 
-        # Acne/blemish detection (all views - side profiles catch cheek/jawline acne)
-        try:
-            acne_result = self._detect_acne(img, skin_mask, face_data)
-            # Tag locations with view name
-            if "acne_locations" in acne_result:
-                for loc in acne_result["acne_locations"]:
-                    loc["view"] = view_name
-            analysis.update(acne_result)
-        except Exception:
-            analysis.update(self._default_acne())
+        except Exception as e:
+            yield "result", self._error_response(scan_id, str(e), time.time() - start_time)
 
-        # Wrinkle detection (all views - profiles show crow's feet, nasolabial)
-        try:
-            wrinkle_result = self._detect_wrinkles(img, skin_mask, face_data)
-            # Tag wrinkle regions with view
-            if "wrinkle_regions" in wrinkle_result:
-                for region_name in wrinkle_result["wrinkle_regions"]:
-                    wrinkle_result["wrinkle_regions"][region_name]["view"] = view_name
-            analysis.update(wrinkle_result)
-        except Exception:
-            analysis.update(self._default_wrinkles())
+    def _select_burst_frames(self, frames: Optional[List[bytes]], clip: Optional[bytes], deadline: Deadline,
+                             skipped: List[str]) -> Tuple[Dict[str, Tuple[Dict, Any]], int]:
+        """
+        Score burst frames and keep the best one per pose.
 
-        # Texture analysis (all views)
-        try:
-            texture_result = self._analyze_texture(img, skin_mask)
-            if "enlarged_pores_locations" in texture_result:
-                for loc in texture_result["enlarged_pores_locations"]:
-                    loc["view"] = view_name
-            analysis.update(texture_result)
-        except Exception:
-            analysis.update(self._default_texture())
+        Returns:
+            ({pose: (score record, encoded frame bytes or decoded clip frame)}, frames scored)
+        """
+        width = int(os.getenv("BURST_SCORING_WIDTH", "320"))
+        max_frames = int(os.getenv("BURST_MAX_FRAMES", "30"))
+        min_brightness = float(os.getenv("BURST_MIN_BRIGHTNESS", "50"))
+        max_brightness = float(os.getenv("BURST_MAX_BRIGHTNESS", "210"))
+
+        if frames:
+            frames = frames[:max_frames]
+            source = iter_image_frames(frames, width)
+        elif clip:
+            source = iter_clip_frames(clip, max_frames)
+        else:
+            raise ValueError("No frames or clip provided")
 
-        # Redness/sensitivity (all views - cheek redness visible from profiles)
+        scorer = self.create_frame_scorer(width=width)
+        best: Dict[str, Tuple[Tuple[bool, float], Dict, Any]] = {}
+        scored = 0
         try:
-            redness_result = self._analyze_redness(img, skin_mask)
-            if "redness_regions" in redness_result:
-                for region in redness_result["redness_regions"]:
-                    region["view"] = view_name
-            analysis.update(redness_result)
-        except Exception:
-            analysis.update(self._default_redness())
+            for idx, timestamp_ms, frame in source:
+                if deadline.expired():
+                    print(f"[FaceScan] Burst: {deadline.reason}, scored {scored} frames")
+                    skipped.append("frames")
+                    break
+                if frame is None:
+                    continue
+                score = scorer.score(frame, timestamp_ms)
+                scored += 1
+                if not score["face"] or score["pose"] is None:
+                    continue
+                # Well-exposed frames first, then the sharpest
+                rank = (min_brightness <= score["brightness"] <= max_brightness, score["sharpness"])
+                if score["pose"] not in best or rank > best[score["pose"]][0]:
+                    record = {"frame": idx, "pose": score["pose"], "yaw": score["yaw"],
+                              "sharpness": score["sharpness"], "brightness": score["brightness"]}
+                    best[score["pose"]] = (rank, record, frames[idx] if frames else frame)
+        finally:
+            scorer.close()
+
+        if "front" not in best and best:
+            # Every frame was turned: the most usable one stands in for the front view
+            pose = max(best, key=lambda p: best[p][0])
+            best["front"] = best.pop(pose)
+        return {pose: (record, data) for pose, (_, record, data) in best.items()}, scored
+
+    def normalize_views(self, image_data: List[bytes]) -> List[Tuple[str, np.ndarray, Dict, Dict]]:
+        """
+        Decode, detect and warp uploads into canonical views, as analyze_face() does at the full tier.
+
+        The expensive, threshold-independent part of a scan; the output can
+        be cached (view_to_arrays()) and re-analyzed with analyze_normalized_views().
 
-        # Hydration/oiliness (front view mainly - T-zone analysis)
+        Returns:
+            [(view name, canonical image, canonical face data, geometry)] for uploads with a face
+        """
+        VIEW_NAMES = ['front', 'left', 'right']
+        images, face_data_list = self._process_images(image_data)
+        return [
+            (VIEW_NAMES[idx] if idx < len(VIEW_NAMES) else f'view_{idx}',
+             *self._normalize_face_geometry(image, face_data))
+            for idx, (image, face_data) in enumerate(zip(images, face_data_list))
+        ]
+
+    def analyze_normalized_views(self, scan_id: str, views: List[Tuple[str, np.ndarray, Dict, Dict]],
+                                 features: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        Analyze views from normalize_views(); same result as analyze_face() at the full tier.
+
+        Args:
+            scan_id: Unique scan identifier
+            views: normalize_views() output (or view_from_arrays() of a cached copy)
+            features: Features or profiles to compute; None runs everything
+        """
+        start_time = time.time()
+        deadline = Deadline(None)
+        skipped = []
+
+        def pipeline():
+            try:
+                selected = self.resolve_features(features)
+                if not views:
+                    yield "result", self._error_response(scan_id, "No face detected in images", time.time() - start_time)
+                    return
+                view_events = (
+                    event
+                    for view_name, image, face_data, geometry in views
+                    for event in self._iter_normalized_view(image, face_data, geometry, view_name, selected,
+                                                            deadline, skipped)
+                )
+                yield from self._iter_merged_result(
+                    scan_id, view_events, selected, deadline, skipped, start_time,
+                    fallback_view=lambda: views[0][1:]
+                )
+            except Exception as e:
+                yield "result", self._error_response(scan_id, str(e), time.time() - start_time)
+
+        for event, payload in self._with_tier(pipeline(), "full"):
+            if event == "result":
+                return payload
+
+    def view_to_arrays(self, view: Tuple[str, np.ndarray, Dict, Dict]) -> Dict[str, np.ndarray]:
+        """Plain arrays for one normalized view (e.g. for np.savez); inverse of view_from_arrays()"""
+        view_name, image, face_data, geometry = view
+        arrays = {
+            "view_name": np.array(view_name),
+            "image": image,
+            "face_type": np.array(face_data["type"]),
+            "to_source": geometry["to_source"],
+            "source_shape": np.array(geometry["source_shape"]),
+            "scale": np.array(geometry["scale"], dtype=np.float64),
+        }
+        if face_data["type"] == "landmarks":
+            arrays["points"] = face_data["points"]
+            arrays["z"] = np.array([lm.z for lm in face_data["data"]], dtype=np.float64)
+        else:
+            arrays["bbox"] = np.array(face_data["data"])
+        if geometry["valid_mask"] is not None:
+            arrays["valid_mask"] = geometry["valid_mask"]
+        return arrays
+
+    def view_from_arrays(self, arrays) -> Tuple[str, np.ndarray, Dict, Dict]:
+        """Normalized view from view_to_arrays() output (region masks are re-warped from the template)"""
+        if str(arrays["face_type"]) == "landmarks":
+            face_data = self._canonical_landmark_data(arrays["points"], arrays["z"].tolist())
+        else:
+            face_data = {"type": "bbox", "data": tuple(int(v) for v in arrays["bbox"])}
+        geometry = {
+            "to_source": arrays["to_source"],
+            "source_shape": tuple(int(v) for v in arrays["source_shape"]),
+            "scale": float(arrays["scale"]),
+            "valid_mask": arrays["valid_mask"] if "valid_mask" in arrays else None,
+        }
+        return str(arrays["view_name"]), arrays["image"], face_data, geometry
+
+    def _iter_views(self, views: List[Tuple[str, Dict]], images: List[np.ndarray], features: List[str],
+                    deadline: Deadline, skipped: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Analyze views one after another in this process, checking the deadline before each"""
+        for (view_name, source_face_data), image in zip(views, images):
+            if deadline.expired():
+                print(f"[FaceScan] {deadline.reason}: skipping {view_name} view")
+                skipped.append(view_name)
+                continue
+            yield from self._iter_view(image, source_face_data, view_name, features, deadline, skipped)
+
+    def _iter_view(self, image: np.ndarray, source_face_data: Dict, view_name: str, features: List[str],
+                   deadline: Deadline, skipped: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Analyze one view, yielding its quality_gate, preview and view_result events.
+
+        Args:
+            image: BGR upload (after the resolution cap)
+            source_face_data: Face detection data in that image
+            view_name: 'front', 'left', 'right' (or 'view_N')
+            features: Selected features from resolve_features()
+            deadline: Checked between detectors
+            skipped: Detectors that didn't run in time are appended as "<view>.<feature>"
+        """
+        print(f"[FaceScan] Analyzing {view_name} view...")
+
+        # Warp the face into the canonical crop; all detectors run in that space
+        img_original, face_data, geometry = self._normalize_face_geometry(image, source_face_data)
+        yield from self._iter_normalized_view(img_original, face_data, geometry, view_name, features,
+                                              deadline, skipped)
+
+    def _iter_normalized_view(self, img_original: np.ndarray, face_data: Dict, geometry: Dict, view_name: str,
+                              features: List[str], deadline: Deadline,
+                              skipped: List[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """_iter_view() from the canonical crop on (see _normalize_face_geometry())"""
+        # Extract skin mask for this view
+        skin_mask = self._create_view_skin_mask(img_original, face_data, geometry)
+
+        # Normalize lighting
+        img = self._normalize_lighting(img_original, skin_mask)
+
+        # Check quality for this view
+        lighting_info = self._estimate_lighting_quality(img_original, skin_mask)
+        blur_info = self._detect_blur(img_original, skin_mask)
+
+        # Skip view if quality is too poor (but continue with others)
+        accepted = blur_info["is_acceptable"] and lighting_info["lighting_quality"] >= 0.15
+        yield "quality_gate", {
+            "view": view_name,
+            "accepted": accepted,
+            "blur_level": blur_info["blur_level"],
+            "sharpness_score": blur_info["sharpness_score"],
+            "lighting_quality": lighting_info["lighting_quality"],
+            "lighting_issues": lighting_info["lighting_issues"],
+        }
+        if not accepted:
+            print(f"[FaceScan] {view_name} view quality too low, skipping detailed analysis")
+            return
+
+        # Per-view inputs; derived ones (gray/LAB/HSV) are computed once and shared by detectors
+        view = {"img": img, "skin_mask": skin_mask, "face_data": face_data, "view_name": view_name,
+                "deadline": deadline, "skipped": []}
+
+        # Cheap appearance metrics first, so they can be shown before the detectors finish
+        appearance = None
         if view_name == 'front':
+            appearance = self._analyze_view_appearance(img, skin_mask, face_data, features, view=view)
+            if appearance:
+                yield "preview", dict(appearance, view=view_name)
+
+        # Run analysis on this view
+        view_analysis = self._analyze_single_view(img, img_original, skin_mask, face_data, view_name,
+                                                  appearance=appearance, features=features, view=view)
+        self._map_view_to_source(view_analysis, geometry)
+        skipped.extend(f"{view_name}.{name}" for name in view["skipped"])
+
+        # Calculate quality score for this view
+        quality_score = self._calculate_quality_score(img_original, face_data, skin_mask,
+                                                      source_shape=geometry["source_shape"])
+
+        print(f"[FaceScan] {view_name} view analysis complete - quality: {quality_score:.2f}")
+        yield "view_result", {"view": view_name, "quality_score": quality_score, "analysis": view_analysis}
+
+    def _get_frame_workers(self) -> Optional[Tuple[ProcessPoolExecutor, FrameRing]]:
+        """
+        (process pool, frame ring) when FACE_SCAN_WORKER_PROCESSES > 0, else None.
+
+        Created on first use: worker processes build their own FaceScanService
+        but never call this, so they don't start pools of their own.
+        """
+        if self._worker_processes <= 0:
+            return None
+        if self._frame_workers is None:
+            with self._frame_workers_lock:
+                if self._frame_workers is None:
+                    # Enough slots for every admitted scan to have all three views in flight
+                    slots = int(os.getenv("FRAME_RING_SLOTS", str(3 * max(2, self._worker_processes))))
+                    ring = FrameRing(slots, max_size=QUALITY_TIERS["full"]["max_image_size"])
+                    # spawn, not fork: MediaPipe and OpenCV threads don't survive a fork
+                    pool = ProcessPoolExecutor(
+                        max_workers=self._worker_processes,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=_init_frame_worker,
+                    )
+                    self._frame_workers = (pool, ring)
+                    print(f"[FaceScan] Analysis runs in {self._worker_processes} worker processes")
+        return self._frame_workers
+
+    def shutdown_workers(self):
+        """Stop the analysis worker processes and free the frame ring"""
+        if self._frame_workers is not None:
+            pool, ring = self._frame_workers
+            self._frame_workers = None
+            pool.shutdown(wait=True, cancel_futures=True)
+            ring.close()
+
+    def _process_images_in_workers(self, image_data: List[bytes], deadline: Deadline, settings: Dict,
+                                   workers: Tuple[ProcessPoolExecutor, FrameRing],
+                                   frame_slots: List[int]) -> Tuple[List[np.ndarray], List[FrameHandle], List]:
+        """
+        Decode uploads into frame ring slots and detect faces in the worker processes.
+
+        Slots are appended to frame_slots as they are taken; the caller
+        releases them once the scan is done with the frames.
+
+        Returns:
+            (frames with a face, their handles, face data) - frames are views of the slots
+        """
+        pool, ring = workers
+        decoded = []
+        for idx, img_bytes in enumerate(image_data):
+            if deadline.expired():
+                print(f"[FaceScan] Image {idx}: {deadline.reason}, remaining images not processed")
+                break
+            slot = ring.acquire(timeout=deadline.remaining() if deadline.remaining() is not None else 30.0)
+            if slot is None:
+                raise RuntimeError("No free frame slot for decoding")
+            frame_slots.append(slot)
             try:
-                hydration_result = self._analyze_hydration(img, skin_mask, face_data)
-                analysis.update(hydration_result)
-            except Exception:
-                analysis.update(self._default_hydration())
+                img_bgr = self._decode_image(img_bytes, idx, settings["max_image_size"], settings["fast_decode"],
+                                             out=lambda shape, slot=slot: ring.frame(slot, shape))
+            except Exception as e:
+                print(f"[FaceScan] Image {idx}: Error processing: {e}")
+                continue
+            if img_bgr is not None:
+                decoded.append((img_bgr, ring.handle(slot, img_bgr.shape)))
+
+        futures = [pool.submit(_detect_frame_worker, handle, idx) for idx, (_, handle) in enumerate(decoded)]
+        images, handles, face_data_list = [], [], []
+        for (img_bgr, handle), future in zip(decoded, futures):
+            face_data = future.result()
+            if face_data:
+                images.append(img_bgr)
+                handles.append(handle)
+                face_data_list.append(face_data)
+
+        print(f"[FaceScan] Successfully processed {len(images)} images with faces")
+        return images, handles, face_data_list
+
+    def _iter_views_in_workers(self, views: List[Tuple[str, Dict]], handles: List[FrameHandle],
+                               features: List[str], deadline: Deadline, skipped: List[str],
+                               pool: ProcessPoolExecutor) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Analyze all views in parallel in the worker processes, yielding their events in view order.
+
+        Workers get the remaining time budget; views still queued when the
+        deadline runs out are cancelled and recorded as skipped.
+        """
+        futures = []
+        for (view_name, face_data), handle in zip(views, handles):
+            if deadline.expired():
+                futures.append((view_name, None))
+                continue
+            futures.append((view_name, pool.submit(
+                _analyze_frame_worker, handle, face_data, view_name, features, deadline.remaining()
+            )))
+
+        for view_name, future in futures:
+            if future is None or (deadline.expired() and future.cancel()):
+                print(f"[FaceScan] {deadline.reason}: skipping {view_name} view")
+                skipped.append(view_name)
+                continue
+            record = future.result()
+            skipped.extend(record["skipped"])
+            yield from record["events"]
+
+    def _analyze_view_appearance(self, img: np.ndarray, skin_mask: np.ndarray, face_data: Dict,
+                                 features: Optional[List[str]] = None, view: Optional[Dict] = None) -> Dict:
+        """
+        Cheap front-view appearance metrics: skin tone, undertone and face shape.
+
+        Args:
+            img: Lighting-normalized image
+            skin_mask: Mask for skin region
+            face_data: Face detection data
+            features: Selected features (None for all)
+            view: Per-view input cache shared with _analyze_single_view()
+
+        Returns:
+            Dictionary with the selected skin tone, undertone and face shape fields
+        """
+        if view is None:
+            view = {"img": img, "skin_mask": skin_mask, "face_data": face_data, "view_name": "front"}
+        names = [name for name in self.APPEARANCE_FEATURES if features is None or name in features]
+        return self._run_detectors(names, view)
+
+    def _run_detectors(self, names: List[str], view: Dict) -> Dict:
+        """
+        Run registered detectors on a view through the detector graph.
+
+        Independent detectors run concurrently; results are merged in the
+        order of `names`, so the output doesn't depend on scheduling.
+        Detectors not started before the view's deadline ran out get their
+        defaults and are recorded in view["skipped"].
+        """
+        graph = {
+            name: (self._detectors[name]["inputs"], lambda v, name=name: self._run_detector(name, v))
+            for name in names
+        }
+        deadline = view.get("deadline")
+        results = run_detector_graph(view, graph, should_stop=deadline.expired if deadline else None)
+        merged = {}
+        for name in names:
+            if name in results:
+                merged.update(results[name])
+            else:
+                merged.update(self._detectors[name]["default"]())
+                view.setdefault("skipped", []).append(name)
+        return merged
 
-        # Pigmentation/dark spots (all views)
+    def _run_detector(self, name: str, view: Dict) -> Dict:
+        """Run one registered detector on a view, tagging locations and falling back to defaults"""
+        spec = self._detectors[name]
         try:
-            pigmentation_result = self._detect_pigmentation(img, skin_mask)
-            if "dark_spots_locations" in pigmentation_result:
-                for loc in pigmentation_result["dark_spots_locations"]:
-                    loc["view"] = view_name
-            analysis.update(pigmentation_result)
+            result = spec["run"](view)
+            locations = result.get(spec["locations"]) if spec["locations"] else None
+            if isinstance(locations, dict):
+                locations = locations.values()
+            for loc in locations or []:
+                loc["view"] = view["view_name"]
+            return result
         except Exception:
-            analysis.update(self._default_pigmentation())
+            return spec["default"]()
+
+    def _analyze_single_view(self, img: np.ndarray, img_original: np.ndarray,
+                             skin_mask: np.ndarray, face_data: Dict, view_name: str,
+                             appearance: Optional[Dict] = None,
+                             features: Optional[List[str]] = None,
+                             view: Optional[Dict] = None) -> Dict:
+        """
+        Analyze a single view (front/left/right) and return results with view context.
+
+        Front-only features (color, face shape, dark circles, hydration) run on
+        the front view; acne, wrinkles, texture, redness and pigmentation run on
+        every view since profiles show cheek, jawline and crow's feet areas.
+
+        Args:
+            img: Lighting-normalized image
+            img_original: Original image
+            skin_mask: Mask for skin region
+            face_data: Face detection data
+            view_name: 'front', 'left', or 'right'
+            appearance: Precomputed _analyze_view_appearance() result for the front view
+            features: Selected features from resolve_features() (None for all)
+            view: Per-view input cache (img, skin_mask, face_data and derived inputs)
+
+        Returns:
+            Dictionary with analysis results including view-specific location data
+        """
+        features = features if features is not None else self.resolve_features()
+        analysis = {}
+        analysis["_view"] = view_name  # Track which view this came from
+
+        if view is None:
+            view = {"img": img, "skin_mask": skin_mask, "face_data": face_data, "view_name": view_name}
+
+        # Color analysis (only meaningful from front view)
+        if view_name == 'front':
+            if appearance is None:
+                appearance = self._analyze_view_appearance(img, skin_mask, face_data, features, view=view)
+            analysis.update(appearance)
+
+        names = []
+        for name in features:
+            spec = self._detectors[name]
+            if name in self.APPEARANCE_FEATURES or spec["views"] == "merged":
+                continue
+            if spec["views"] == "front" and view_name != 'front':
+                continue
+            names.append(name)
+        analysis.update(self._run_detectors(names, view))
 
         return analysis
 
-    def _merge_multi_view_analysis(self, view_analyses: List[Tuple[str, Dict]]) -> Dict:
+    def _merge_multi_view_analysis(self, view_analyses: List[Tuple[str, Dict]],
+                                   features: Optional[List[str]] = None) -> Dict:
         """
         Merge analysis results from multiple views into a comprehensive analysis.
 
@@ -630,14 +1685,16 @@ class FaceScanService:
 
         Args:
             view_analyses: List of (view_name, analysis_dict) tuples
+            features: Selected features (None for all); fields of skipped ones are omitted
 
         Returns:
             Merged analysis dictionary
         """
+        features = features if features is not None else self.resolve_features()
         merged = {}
 
         if not view_analyses:
-            return self._get_low_confidence_defaults()
+            return self._get_low_confidence_defaults(features)
 
         # Get front view analysis as baseline (or first available)
         front_analysis = None
@@ -667,6 +1724,8 @@ class FaceScanService:
             'enlarged_pores_count'
         ]
         for field in count_fields:
+            if not any(field in analysis for _, analysis in view_analyses):
+                continue  # Detector not selected
             total = 0
             for _, analysis in view_analyses:
                 total += analysis.get(field, 0)
@@ -724,15 +1783,14 @@ class FaceScanService:
         if all_wrinkle_regions:
             merged['wrinkle_regions'] = all_wrinkle_regions
 
-        # Calculate overall skin score from merged data
-        merged['skin_score'] = self._calculate_overall_score(merged)
-
-        # Calculate skin age from merged data
-        try:
-            age_result = self._estimate_skin_age(merged)
-            merged.update(age_result)
-        except Exception:
-            merged['skin_age_estimate'] = 30
+        # Overall skin score and skin age from merged data
+        for name in features:
+            spec = self._detectors[name]
+            if spec["views"] == "merged":
+                try:
+                    merged.update(spec["run"](merged))
+                except Exception:
+                    merged.update(spec["default"]())
 
         # Calculate analysis confidence (higher with more views)
         base_confidence = front_analysis.get('analysis_confidence', 0.7)
@@ -745,79 +1803,33 @@ class FaceScanService:
 
         return merged
 
-    def _process_images(self, image_data: List[bytes]) -> Tuple[List[np.ndarray], List]:
-        """Load images and detect faces"""
+    def _process_images(self, image_data: List[bytes], deadline: Optional[Deadline] = None,
+                        max_size: Tuple[int, int] = (1920, 1080),
+                        fast_decode: bool = False) -> Tuple[List[np.ndarray], List]:
+        """
+        Load images and detect faces (stops before the next image once the deadline is spent).
+
+        Args:
+            image_data: Uploaded image bytes
+            deadline: Checked before each image
+            max_size: (width, height) larger uploads are scaled down to
+            fast_decode: Decode JPEGs at a reduced DCT scale close to max_size (PIL draft mode)
+        """
         images = []
         face_data_list = []
 
         print(f"[FaceScan] Processing {len(image_data)} images")
 
         for idx, img_bytes in enumerate(image_data):
+            if deadline is not None and deadline.expired():
+                print(f"[FaceScan] Image {idx}: {deadline.reason}, remaining images not processed")
+                break
             try:
-                # Load image
-                print(f"[FaceScan] Image {idx}: Loading {len(img_bytes)} bytes")
-                img = Image.open(io.BytesIO(img_bytes))
-                img_array = np.array(img)
-                print(f"[FaceScan] Image {idx}: Shape {img_array.shape}, dtype {img_array.dtype}")
-
-                # Convert to BGR for OpenCV
-                if len(img_array.shape) == 3:
-                    if img_array.shape[2] == 4:  # RGBA
-                        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGBA2BGR)
-                    elif img_array.shape[2] == 3:  # RGB (PIL default)
-                        img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-                    else:
-                        print(f"[FaceScan] Image {idx}: Unsupported channels {img_array.shape[2]}")
-                        continue
-                elif len(img_array.shape) == 2:  # Grayscale
-                    img_bgr = cv2.cvtColor(img_array, cv2.COLOR_GRAY2BGR)
-                else:
-                    print(f"[FaceScan] Image {idx}: Unsupported shape {img_array.shape}")
+                img_bgr = self._decode_image(img_bytes, idx, max_size, fast_decode)
+                if img_bgr is None:
                     continue
 
-                # Resize if too large (max 1920x1080)
-                h, w = img_bgr.shape[:2]
-                if h > 1080 or w > 1920:
-                    scale = min(1920 / w, 1080 / h)
-                    img_bgr = cv2.resize(img_bgr, None, fx=scale, fy=scale)
-                    print(f"[FaceScan] Image {idx}: Resized to {img_bgr.shape[:2]}")
-
-                # Ensure array is contiguous for MediaPipe
-                img_bgr = np.ascontiguousarray(img_bgr)
-
-                # Try MediaPipe first
-                face_data = None
-                if self.use_mediapipe and self.face_landmarker:
-                    try:
-                        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-                        img_rgb = np.ascontiguousarray(img_rgb)
-                        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
-                        result = self.face_landmarker.detect(mp_image)
-                        # Check face_landmarks explicitly to avoid numpy.bool issues
-                        has_landmarks = result.face_landmarks is not None and len(result.face_landmarks) > 0
-                        if has_landmarks:
-                            landmarks = result.face_landmarks[0]
-                            face_data = {"type": "landmarks", "data": landmarks}
-                            print(f"[FaceScan] Image {idx}: MediaPipe detected {len(landmarks)} landmarks")
-                        else:
-                            print(f"[FaceScan] Image {idx}: MediaPipe no face detected")
-                    except Exception as mp_err:
-                        print(f"[FaceScan] Image {idx}: MediaPipe error: {mp_err}")
-
-                # Fallback to OpenCV
-                if face_data is None and self.face_cascade is not None:
-                    try:
-                        gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
-                        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
-                        if len(faces) > 0:
-                            x, y, fw, fh = faces[0]
-                            face_data = {"type": "bbox", "data": (x, y, fw, fh)}
-                            print(f"[FaceScan] Image {idx}: OpenCV detected face at ({x},{y},{fw},{fh})")
-                        else:
-                            print(f"[FaceScan] Image {idx}: OpenCV no face detected")
-                    except Exception as cv_err:
-                        print(f"[FaceScan] Image {idx}: OpenCV error: {cv_err}")
-
+                face_data = self._detect_face(img_bgr, idx)
                 if face_data:
                     images.append(img_bgr)
                     face_data_list.append(face_data)
@@ -831,11 +1843,279 @@ class FaceScanService:
         print(f"[FaceScan] Successfully processed {len(images)} images with faces")
         return images, face_data_list
 
+    def _decode_image(self, img_bytes: bytes, idx: int, max_size: Tuple[int, int] = (1920, 1080),
+                      fast_decode: bool = False, out=None) -> Optional[np.ndarray]:
+        """
+        Decode an upload to a contiguous BGR array no larger than max_size.
+
+        Args:
+            img_bytes: Encoded image
+            idx: Upload index (for logs)
+            max_size: (width, height) larger uploads are scaled down to
+            fast_decode: Decode JPEGs at a reduced DCT scale close to max_size (PIL draft mode)
+            out: Optional callable(shape) -> array; the final conversion/resize writes
+                 straight into it (e.g. a frame ring slot) instead of a new array
+
+        Returns:
+            BGR image, or None if the format isn't supported
+        """
+        max_w, max_h = max_size
+
+        # Load image
+        print(f"[FaceScan] Image {idx}: Loading {len(img_bytes)} bytes")
+        img = Image.open(io.BytesIO(img_bytes))
+        if fast_decode and img.format == "JPEG":
+            fit = min(1.0, max_w / img.width, max_h / img.height)
+            img.draft(img.mode, (int(img.width * fit), int(img.height * fit)))
+        img_array = np.array(img)
+        print(f"[FaceScan] Image {idx}: Shape {img_array.shape}, dtype {img_array.dtype}")
+
+        # Convert to BGR for OpenCV
+        if len(img_array.shape) == 3:
+            if img_array.shape[2] == 4:  # RGBA
+                code = cv2.COLOR_RGBA2BGR
+            elif img_array.shape[2] == 3:  # RGB (PIL default)
+                code = cv2.COLOR_RGB2BGR
+            else:
+                print(f"[FaceScan] Image {idx}: Unsupported channels {img_array.shape[2]}")
+                return None
+        elif len(img_array.shape) == 2:  # Grayscale
+            code = cv2.COLOR_GRAY2BGR
+        else:
+            print(f"[FaceScan] Image {idx}: Unsupported shape {img_array.shape}")
+            return None
+
+        # Resize if too large (max 1920x1080 at full quality)
+        h, w = img_array.shape[:2]
+        scale = min(max_w / w, max_h / h) if h > max_h or w > max_w else None
+
+        if out is None:
+            img_bgr = cv2.cvtColor(img_array, code)
+            if scale is not None:
+                img_bgr = cv2.resize(img_bgr, None, fx=scale, fy=scale)
+        else:
+            # Same size OpenCV computes from fx/fy, so the result lands in the destination
+            shape = (round(h * scale), round(w * scale), 3) if scale is not None else (h, w, 3)
+            dst = out(shape)
+            if scale is not None:
+                result = cv2.resize(cv2.cvtColor(img_array, code), None, dst=dst, fx=scale, fy=scale)
+            else:
+                result = cv2.cvtColor(img_array, code, dst=dst)
+            if result is not dst:
+                dst[...] = result
+            img_bgr = dst
+        if scale is not None:
+            print(f"[FaceScan] Image {idx}: Resized to {img_bgr.shape[:2]}")
+
+        # Ensure array is contiguous for MediaPipe
+        return np.ascontiguousarray(img_bgr)
+
+    def _detect_face(self, img_bgr: np.ndarray, idx: int) -> Optional[Dict]:
+        """Find the face in a decoded image: MediaPipe landmarks, else a Haar bbox (None if no face)"""
+        # Try MediaPipe first
+        face_data = None
+        landmarker = self._get_landmarker()
+        if landmarker is not None:
+            try:
+                img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+                img_rgb = np.ascontiguousarray(img_rgb)
+                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=img_rgb)
+                with self._landmarker_detect_lock:
+                    result = landmarker.detect(mp_image)
+                # Check face_landmarks explicitly to avoid numpy.bool issues
+                has_landmarks = result.face_landmarks is not None and len(result.face_landmarks) > 0
+                if has_landmarks:
+                    landmarks = result.face_landmarks[0]
+                    face_data = {"type": "landmarks", "data": landmarks}
+                    print(f"[FaceScan] Image {idx}: MediaPipe detected {len(landmarks)} landmarks")
+                else:
+                    print(f"[FaceScan] Image {idx}: MediaPipe no face detected")
+            except Exception as mp_err:
+                print(f"[FaceScan] Image {idx}: MediaPipe error: {mp_err}")
+
+        # Fallback to OpenCV
+        cascade = self._get_cascade() if face_data is None else None
+        if cascade is not None:
+            try:
+                gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+                faces = cascade.detectMultiScale(gray, 1.1, 4)
+                if len(faces) > 0:
+                    x, y, fw, fh = faces[0]
+                    face_data = {"type": "bbox", "data": (x, y, fw, fh)}
+                    print(f"[FaceScan] Image {idx}: OpenCV detected face at ({x},{y},{fw},{fh})")
+                else:
+                    print(f"[FaceScan] Image {idx}: OpenCV no face detected")
+            except Exception as cv_err:
+                print(f"[FaceScan] Image {idx}: OpenCV error: {cv_err}")
+
+        return face_data
+
+    def _normalize_face_geometry(self, img: np.ndarray, face_data: Dict) -> Tuple[np.ndarray, Dict, Dict]:
+        """
+        Warp a view into the canonical face crop (CANONICAL_WIDTH x CANONICAL_HEIGHT).
+
+        With landmarks, a similarity transform puts the eye midpoint at
+        CANONICAL_EYE_CENTER, levels the eye line and scales the inter-ocular
+        distance to CANONICAL_EYE_DISTANCE (capped by the eye-to-mouth distance
+        so turned profile views still fit). With only a Haar bbox, the box is
+        scaled to CANONICAL_BBOX_FACE_WIDTH and centred.
+
+        Args:
+            img: BGR image at upload resolution
+            face_data: Face detection data in that image
+
+        Returns:
+            (canonical image, face data in canonical space, geometry) where geometry
+            holds the inverse transform used to map result coordinates back
+        """
+        h, w = img.shape[:2]
+        cw, ch = self.CANONICAL_WIDTH, self.CANONICAL_HEIGHT
+        eye_cx, eye_cy = self.CANONICAL_EYE_CENTER
+
+        if face_data["type"] == "landmarks":
+            landmarks = face_data["data"]
+            points = np.array([[lm.x * w, lm.y * h] for lm in landmarks], dtype=np.float64)
+            M, scale = self._landmark_alignment(points)
+        else:
+            x, y, fw, fh = face_data["data"]
+            scale = self.CANONICAL_BBOX_FACE_WIDTH / max(fw, 1)
+            # Haar boxes are centred around the nose, a little below the eyes
+            M = self._similarity_matrix(
+                scale, 0.0, (x + fw / 2, y + fh / 2),
+                (eye_cx, eye_cy + 0.45 * self.CANONICAL_EYE_DISTANCE)
+            )
+
+        # Large downscales alias badly with a single bilinear warp - pre-shrink with INTER_AREA
+        src = img
+        if scale < 0.5:
+            pre = scale * 2
+            src = cv2.resize(img, None, fx=pre, fy=pre, interpolation=cv2.INTER_AREA)
+            M_src = M.copy()
+            M_src[:, :2] /= pre
+        else:
+            M_src = M
+        canonical = cv2.warpAffine(src, M_src, (cw, ch), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+        to_source = cv2.invertAffineTransform(M)
+
+        # Only track valid pixels if part of the crop falls outside the upload
+        corners = np.array([[0, 0, 1], [cw, 0, 1], [0, ch, 1], [cw, ch, 1]], dtype=np.float64) @ to_source.T
+        valid_mask = None
+        if corners[:, 0].min() < 0 or corners[:, 1].min() < 0 or corners[:, 0].max() > w or corners[:, 1].max() > h:
+            valid_mask = cv2.warpAffine(np.full(src.shape[:2], 255, dtype=np.uint8), M_src, (cw, ch),
+                                        flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT)
+
+        if face_data["type"] == "landmarks":
+            warped = points @ M[:, :2].T + M[:, 2]
+            canonical_face_data = self._canonical_landmark_data(warped, [getattr(lm, "z", 0.0) for lm in landmarks])
+        else:
+            x, y, fw, fh = face_data["data"]
+            bx, by = M @ np.array([x, y, 1.0])
+            canonical_face_data = {"type": "bbox", "data": (int(bx), int(by), int(fw * scale), int(fh * scale))}
+
+        geometry = {
+            "to_source": to_source,
+            "source_shape": (h, w),
+            "scale": scale,
+            "valid_mask": valid_mask,
+        }
+        return canonical, canonical_face_data, geometry
+
+    def _canonical_landmark_data(self, warped: np.ndarray, z: List[float]) -> Dict:
+        """Face data for landmarks in canonical-crop pixels (z kept from the source detection)"""
+        cw, ch = self.CANONICAL_WIDTH, self.CANONICAL_HEIGHT
+        return {
+            "type": "landmarks",
+            "data": [_Landmark(px / cw, py / ch, lz) for (px, py), lz in zip(warped.tolist(), z)],
+            "points": warped,
+            "regions": self._view_region_masks(warped),
+        }
+
+    def _landmark_alignment(self, points: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Similarity transform taking face landmarks (pixels) into the canonical crop.
+
+        Returns:
+            (2x3 affine matrix, scale)
+        """
+        left_eye = points[[i for i in self.LEFT_EYE if i < len(points)]].mean(axis=0)
+        right_eye = points[[i for i in self.RIGHT_EYE if i < len(points)]].mean(axis=0)
+        eye_mid = (left_eye + right_eye) / 2
+        eye_dist = max(np.linalg.norm(right_eye - left_eye), 1.0)
+        if len(points) > 14:
+            mouth = (points[13] + points[14]) / 2
+        else:
+            mouth = eye_mid + [0.0, eye_dist]
+        eye_mouth_dist = max(np.linalg.norm(mouth - eye_mid), 1.0)
+
+        scale = min(self.CANONICAL_EYE_DISTANCE / eye_dist, self.CANONICAL_EYE_MOUTH_DISTANCE / eye_mouth_dist)
+        angle = math.atan2(right_eye[1] - left_eye[1], right_eye[0] - left_eye[0])
+        return self._similarity_matrix(scale, angle, eye_mid, self.CANONICAL_EYE_CENTER), scale
+
+    @staticmethod
+    def _similarity_matrix(scale: float, angle: float, center, target) -> np.ndarray:
+        """2x3 matrix that rotates by -angle and scales about center, moving it to target"""
+        cos_a, sin_a = math.cos(-angle) * scale, math.sin(-angle) * scale
+        return np.array([
+            [cos_a, -sin_a, target[0] - (cos_a * center[0] - sin_a * center[1])],
+            [sin_a, cos_a, target[1] - (sin_a * center[0] + cos_a * center[1])],
+        ], dtype=np.float64)
+
+    def _create_view_skin_mask(self, img: np.ndarray, face_data: Dict, geometry: Dict) -> np.ndarray:
+        """Skin mask in canonical space, excluding pixels warped in from outside the upload"""
+        mask = self._create_skin_mask(img, face_data)
+        if geometry.get("valid_mask") is not None:
+            mask = cv2.bitwise_and(mask, geometry["valid_mask"])
+        return mask
+
+    def _map_view_to_source(self, analysis: Dict, geometry: Dict):
+        """
+        Map normalized coordinates in a view's results from the canonical crop
+        back to the uploaded image (in place): location points, region bboxes
+        and the face outline.
+        """
+        M = geometry["to_source"]
+        h, w = geometry["source_shape"]
+        cw, ch = self.CANONICAL_WIDTH, self.CANONICAL_HEIGHT
+
+        def map_point(x, y):
+            px, py = x * cw, y * ch
+            return ((M[0, 0] * px + M[0, 1] * py + M[0, 2]) / w,
+                    (M[1, 0] * px + M[1, 1] * py + M[1, 2]) / h)
+
+        def map_bbox(bbox):
+            x1, y1, x2, y2 = bbox
+            xs, ys = zip(*(map_point(x, y) for x, y in ((x1, y1), (x2, y1), (x1, y2), (x2, y2))))
+            return [round(min(1.0, max(0.0, v)), 3) for v in (min(xs), min(ys), max(xs), max(ys))]
+
+        for field in ("acne_locations", "dark_spots_locations", "enlarged_pores_locations"):
+            for loc in analysis.get(field) or []:
+                x, y = map_point(loc["x"], loc["y"])
+                loc["x"], loc["y"] = round(x, 3), round(y, 3)
+
+        regions = list(analysis.get("redness_regions") or [])
+        regions += list((analysis.get("wrinkle_regions") or {}).values())
+        regions += list((analysis.get("dark_circles_regions") or {}).values())
+        regions.append(analysis.get("pores_region"))
+        for region in regions:
+            if region and region.get("bbox"):
+                region["bbox"] = map_bbox(region["bbox"])
+
+        if analysis.get("face_outline"):
+            analysis["face_outline"] = [
+                [round(x, 4), round(y, 4)] for x, y in (map_point(px, py) for px, py in analysis["face_outline"])
+            ]
+
     def _create_skin_mask(self, img: np.ndarray, face_data: Dict) -> np.ndarray:
         """Create binary mask of skin region using face data"""
         h, w = img.shape[:2]
         mask = np.zeros((h, w), dtype=np.uint8)
 
+        regions = face_data.get("regions")
+        if face_data["type"] == "landmarks" and regions is not None and regions.shape == (h, w):
+            # Face oval minus eyes and lips, straight from the warped template bit-planes
+            return regions.combine("face_oval", ["left_eye", "right_eye", "lips_hull"])
+
         if face_data["type"] == "landmarks":
             landmarks = face_data["data"]
 
@@ -896,7 +2176,8 @@ class FaceScanService:
 
         return mask
 
-    def _analyze_skin_tone(self, skin_region: np.ndarray, mask: np.ndarray) -> Dict:
+    def _analyze_skin_tone(self, skin_region: np.ndarray, mask: np.ndarray,
+                           lab: Optional[np.ndarray] = None) -> Dict:
         """Analyze skin tone using LAB color space analysis"""
 
         # Extract only skin pixels
@@ -908,8 +2189,9 @@ class FaceScanService:
         # Calculate mean colors in BGR
         mean_bgr = np.mean(skin_pixels, axis=0)
 
-        # Convert to LAB for perceptual color analysis
-        skin_lab = cv2.cvtColor(skin_region, cv2.COLOR_BGR2LAB)
+        # Convert to LAB for perceptual color analysis (per-pixel, so the
+        # full image's LAB gives the same values under the mask)
+        skin_lab = lab if lab is not None else cv2.cvtColor(skin_region, cv2.COLOR_BGR2LAB)
         lab_pixels = skin_lab[mask > 0]
         mean_lab = np.mean(lab_pixels, axis=0)
 
@@ -942,7 +2224,7 @@ class FaceScanService:
 
         # Calculate confidence based on color variance
         color_std = np.std(skin_pixels, axis=0)
-        confidence = max(0.5, min(0.98, 1.0 - (np.mean(color_std) / 60)))
+        confidence = max(0.5, min(0.98, 1.0 - float(np.mean(color_std)) / 60))
 
         return {
             "skin_tone": skin_tone,
@@ -950,7 +2232,8 @@ class FaceScanService:
             "skin_tone_confidence": round(confidence, 3),
         }
 
-    def _analyze_undertone(self, skin_region: np.ndarray, mask: np.ndarray) -> Dict:
+    def _analyze_undertone(self, skin_region: np.ndarray, mask: np.ndarray,
+                           lab: Optional[np.ndarray] = None) -> Dict:
         """Detect skin undertone using color temperature analysis"""
 
         skin_pixels = skin_region[mask > 0]
@@ -958,7 +2241,7 @@ class FaceScanService:
             return {"skin_undertone": "neutral"}
 
         # Convert to LAB color space
-        skin_lab = cv2.cvtColor(skin_region, cv2.COLOR_BGR2LAB)
+        skin_lab = lab if lab is not None else cv2.cvtColor(skin_region, cv2.COLOR_BGR2LAB)
         lab_pixels = skin_lab[mask > 0]
 
         # A channel: negative = green, positive = red/magenta
@@ -1061,7 +2344,9 @@ class FaceScanService:
             "face_shape_confidence": round(confidence, 3),
         }
 
-    def _detect_acne(self, img: np.ndarray, mask: np.ndarray, face_data: Dict) -> Dict:
+    def _detect_acne(self, img: np.ndarray, mask: np.ndarray, face_data: Dict,
+                     gray: Optional[np.ndarray] = None, hsv: Optional[np.ndarray] = None,
+                     lab: Optional[np.ndarray] = None, classes: Optional[PixelClasses] = None) -> Dict:
         """Detect acne and blemishes with HIGH ACCURACY multi-stage validation.
 
         STRICT ACCURACY MODE:
@@ -1072,10 +2357,10 @@ class FaceScanService:
         """
 
         h, w = img.shape[:2]
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = gray if gray is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         gray_masked = cv2.bitwise_and(gray, gray, mask=mask)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        hsv = hsv if hsv is not None else cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
 
         # Calculate skin baseline statistics for comparison
         skin_pixels = gray[mask > 0]
@@ -1086,16 +2371,9 @@ class FaceScanService:
         skin_std = np.std(skin_pixels)
 
         # Detect red/inflamed areas - VERY STRICT: Only true inflammation
-        # Increased saturation requirement to avoid detecting normal skin flush
-        lower_red1 = np.array([0, 120, 80])  # Very high saturation required
-        upper_red1 = np.array([6, 255, 255])   # Narrower hue range
-        lower_red2 = np.array([174, 120, 80])  # Very high saturation
-        upper_red2 = np.array([180, 255, 255])
-
-        red_mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-        red_mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-        red_mask = cv2.bitwise_or(red_mask1, red_mask2)
-        red_mask = cv2.bitwise_and(red_mask, mask)
+        # (hue 0-6 or 174-180, saturation >= 120, value >= 80; see services.pixel_classifier)
+        classes = classes if classes is not None else classify_pixels(hsv, lab, mask)
+        red_mask = classes.mask("acne_red")
 
         # Strong morphological cleaning
         kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
@@ -1283,7 +2561,8 @@ class FaceScanService:
             "acne_locations": [],
         }
 
-    def _detect_wrinkles(self, img: np.ndarray, mask: np.ndarray, face_data: Dict) -> Dict:
+    def _detect_wrinkles(self, img: np.ndarray, mask: np.ndarray, face_data: Dict,
+                         gray: Optional[np.ndarray] = None) -> Dict:
         """
         Detect wrinkles using improved multi-stage analysis.
 
@@ -1295,7 +2574,7 @@ class FaceScanService:
         5. Distinction between fine lines and deep wrinkles
         """
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = gray if gray is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         h, w = gray.shape
 
         # === Step 1: Advanced Preprocessing ===
@@ -1349,7 +2628,10 @@ class FaceScanService:
         if face_data["type"] == "landmarks":
             landmarks = face_data["data"]
 
-            def get_region_mask(region_indices):
+            def get_region_mask(region_indices, region_name):
+                precomputed = self._region_mask(face_data, region_name, (h, w))
+                if precomputed is not None:
+                    return precomputed
                 region_mask = np.zeros((h, w), dtype=np.uint8)
                 points = []
                 for idx in region_indices:
@@ -1404,7 +2686,7 @@ class FaceScanService:
                 return valid_lines, avg_intensity
 
             # === Forehead Analysis ===
-            forehead_mask = get_region_mask(self.FOREHEAD)
+            forehead_mask = get_region_mask(self.FOREHEAD, "forehead_hull")
             forehead_lines, forehead_intensity = analyze_wrinkles_in_region(
                 wrinkle_edges, laplacian_masked, forehead_mask, min_length=12
             )
@@ -1421,8 +2703,8 @@ class FaceScanService:
             regional_wrinkle_count += forehead_lines
 
             # === Crow's Feet Analysis ===
-            left_cf_mask = get_region_mask(self.LEFT_CROWS_FEET)
-            right_cf_mask = get_region_mask(self.RIGHT_CROWS_FEET)
+            left_cf_mask = get_region_mask(self.LEFT_CROWS_FEET, "left_crows_feet_hull")
+            right_cf_mask = get_region_mask(self.RIGHT_CROWS_FEET, "right_crows_feet_hull")
             left_cf_lines, left_cf_int = analyze_wrinkles_in_region(
                 edges_fine, laplacian_masked, left_cf_mask, min_length=6
             )
@@ -1444,8 +2726,8 @@ class FaceScanService:
             regional_wrinkle_count += cf_lines
 
             # === Nasolabial Fold Analysis ===
-            left_nl_mask = get_region_mask(self.LEFT_NASOLABIAL)
-            right_nl_mask = get_region_mask(self.RIGHT_NASOLABIAL)
+            left_nl_mask = get_region_mask(self.LEFT_NASOLABIAL, "left_nasolabial_hull")
+            right_nl_mask = get_region_mask(self.RIGHT_NASOLABIAL, "right_nasolabial_hull")
             left_nl_lines, left_nl_int = analyze_wrinkles_in_region(
                 edges_deep, laplacian_masked, left_nl_mask, min_length=10
             )
@@ -1526,10 +2808,11 @@ class FaceScanService:
             "wrinkle_regions": wrinkle_regions,
         }
 
-    def _analyze_texture(self, img: np.ndarray, mask: np.ndarray) -> Dict:
+    def _analyze_texture(self, img: np.ndarray, mask: np.ndarray,
+                         gray: Optional[np.ndarray] = None) -> Dict:
         """Analyze skin texture using variance and gradient analysis"""
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = gray if gray is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         gray_masked = gray.copy()
         gray_masked[mask == 0] = 0
 
@@ -1613,7 +2896,9 @@ class FaceScanService:
             }
         }
 
-    def _analyze_redness(self, img: np.ndarray, mask: np.ndarray) -> Dict:
+    def _analyze_redness(self, img: np.ndarray, mask: np.ndarray,
+                         hsv: Optional[np.ndarray] = None, lab: Optional[np.ndarray] = None,
+                         classes: Optional[PixelClasses] = None) -> Dict:
         """Analyze skin redness with HIGH ACCURACY validation.
 
         STRICT ACCURACY MODE:
@@ -1621,48 +2906,33 @@ class FaceScanService:
         - Verify redness is abnormal, not natural undertone
         - Use LAB color space for better red detection
         - Only flag clinically significant redness
+
+        The per-pixel rules live in services.pixel_classifier; here they are
+        only counted and scored.
         """
 
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-        hsv_pixels = hsv[mask > 0]
-        lab_pixels = lab[mask > 0]
+        if classes is None:
+            hsv = hsv if hsv is not None else cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+            classes = classify_pixels(hsv, lab, mask)
 
-        if len(hsv_pixels) == 0:
+        total_pixels = classes.skin_pixels
+        if total_pixels == 0:
             return self._default_redness()
 
-        h_channel = hsv_pixels[:, 0]
-        s_channel = hsv_pixels[:, 1]
-        v_channel = hsv_pixels[:, 2]
-        a_channel = lab_pixels[:, 1]  # LAB 'a' channel: negative=green, positive=red
-        total_pixels = len(h_channel)
-
         # Calculate baseline skin tone
-        median_saturation = np.median(s_channel)
-        median_a = np.median(a_channel)  # Baseline red-green axis
+        median_saturation = classes.medians["s"]
 
         # ULTRA STRICT: Only count pixels EXTREMELY redder than person's baseline
-        # Using LAB 'a' channel which better captures red vs non-red
-        # Increased threshold from 20 to 35 - must be VERY obviously redder than baseline
-        red_threshold_a = median_a + 35  # Much higher threshold for true redness
-        abnormal_red_pixels = np.sum(a_channel > red_threshold_a)
-        abnormal_red_ratio = abnormal_red_pixels / total_pixels
+        # Using LAB 'a' channel (abnormal_red: a > median a + 35), which better captures red vs non-red
+        abnormal_red_ratio = classes.count("abnormal_red") / total_pixels
 
         # HSV-based red with ULTRA STRICT thresholds
         # Very narrow hue range AND very high saturation AND brightness check
-        strict_red = np.sum(
-            ((h_channel < 5) | (h_channel > 175)) &  # Very narrow hue range
-            (s_channel > 130) &  # Very high saturation - only true inflammation
-            (v_channel > 70)
-        )
-        strict_red_ratio = strict_red / total_pixels
+        strict_red_ratio = classes.count("strict_red") / total_pixels
 
         # Intense inflammation: extreme saturation red only
-        intense_red = np.sum(
-            ((h_channel < 4) | (h_channel > 176)) &  # Extremely narrow hue
-            (s_channel > 150)  # Only very obvious inflammation
-        )
-        intense_ratio = intense_red / total_pixels
+        intense_ratio = classes.count("intense_red") / total_pixels
 
         # Account for natural skin undertone - GENEROUS baseline subtraction
         # Warm skin tones (common in Indian population) naturally have higher redness
@@ -1693,10 +2963,7 @@ class FaceScanService:
             sensitivity = "low"
 
         # Check for irritation patterns
-        red_binary = np.zeros_like(mask)
-        hsv_full = hsv.copy()
-        red_binary[((hsv_full[:, :, 0] < 8) | (hsv_full[:, :, 0] > 172)) &
-                   (hsv_full[:, :, 1] > 90) & (mask > 0)] = 255
+        red_binary = classes.mask("irritation_red")
 
         # Morphological cleanup
         kernel = np.ones((3, 3), np.uint8)
@@ -1718,18 +2985,18 @@ class FaceScanService:
             redness_regions.append({
                 "region": "cheeks",
                 "bbox": [0.10, 0.35, 0.40, 0.65],
-                "intensity": round(max(adjusted_red_ratio, adjusted_abnormal_ratio), 2)
+                "intensity": round(float(max(adjusted_red_ratio, adjusted_abnormal_ratio)), 2)
             })
             redness_regions.append({
                 "region": "cheeks",
                 "bbox": [0.60, 0.35, 0.90, 0.65],
-                "intensity": round(max(adjusted_red_ratio, adjusted_abnormal_ratio), 2)
+                "intensity": round(float(max(adjusted_red_ratio, adjusted_abnormal_ratio)), 2)
             })
         if intense_ratio > 0.06:
             redness_regions.append({
                 "region": "nose",
                 "bbox": [0.38, 0.40, 0.62, 0.70],
-                "intensity": round(intense_ratio, 2)
+                "intensity": round(float(intense_ratio), 2)
             })
 
         return {
@@ -1740,10 +3007,11 @@ class FaceScanService:
             "redness_regions": redness_regions,
         }
 
-    def _analyze_hydration(self, img: np.ndarray, mask: np.ndarray, face_data: Dict) -> Dict:
+    def _analyze_hydration(self, img: np.ndarray, mask: np.ndarray, face_data: Dict,
+                           lab: Optional[np.ndarray] = None, classes: Optional[PixelClasses] = None) -> Dict:
         """Analyze skin hydration and oiliness using brightness analysis"""
 
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
         l_channel = lab[:, :, 0]
         h, w = img.shape[:2]
 
@@ -1755,11 +3023,16 @@ class FaceScanService:
         mean_brightness = np.mean(skin_brightness)
         brightness_std = np.std(skin_brightness)
 
-        # Detect shiny areas (specular highlights)
-        _, shine_mask = cv2.threshold(l_channel, 210, 255, cv2.THRESH_BINARY)
-        shine_mask = cv2.bitwise_and(shine_mask, mask)
-        skin_area = max(np.sum(mask > 0), 1)
-        shine_ratio = np.sum(shine_mask > 0) / skin_area
+        # Detect shiny areas (specular highlights, L > 210 on skin)
+        if classes is not None:
+            shine_mask = classes.mask("shine")
+            skin_area = max(classes.skin_pixels, 1)
+            shine_ratio = classes.count("shine") / skin_area
+        else:
+            _, shine_mask = cv2.threshold(l_channel, 210, 255, cv2.THRESH_BINARY)
+            shine_mask = cv2.bitwise_and(shine_mask, mask)
+            skin_area = max(np.sum(mask > 0), 1)
+            shine_ratio = np.sum(shine_mask > 0) / skin_area
 
         # T-zone analysis
         t_zone_mean = mean_brightness
@@ -1767,16 +3040,19 @@ class FaceScanService:
 
         if face_data["type"] == "landmarks":
             landmarks = face_data["data"]
-            t_zone_mask = np.zeros((h, w), dtype=np.uint8)
-            t_zone_points = []
-            for idx in self.T_ZONE[:30]:
-                if idx < len(landmarks):
-                    lm = landmarks[idx]
-                    t_zone_points.append([int(lm.x * w), int(lm.y * h)])
-
-            if len(t_zone_points) >= 3:
-                hull = cv2.convexHull(np.array(t_zone_points, dtype=np.int32))
-                cv2.fillPoly(t_zone_mask, [hull], 255)
+            t_zone_mask = self._region_mask(face_data, "t_zone_hull", (h, w))
+            if t_zone_mask is None:
+                t_zone_mask = np.zeros((h, w), dtype=np.uint8)
+                t_zone_points = []
+                for idx in self.T_ZONE[:30]:
+                    if idx < len(landmarks):
+                        lm = landmarks[idx]
+                        t_zone_points.append([int(lm.x * w), int(lm.y * h)])
+                if len(t_zone_points) >= 3:
+                    hull = cv2.convexHull(np.array(t_zone_points, dtype=np.int32))
+                    cv2.fillPoly(t_zone_mask, [hull], 255)
+
+            if t_zone_mask.any():
                 t_zone_combined = cv2.bitwise_and(t_zone_mask, mask)
                 t_zone_brightness = l_channel[t_zone_combined > 0]
                 t_zone_mean = np.mean(t_zone_brightness) if len(t_zone_brightness) > 0 else mean_brightness
@@ -1834,7 +3110,8 @@ class FaceScanService:
             "dry_patches_detected": dry_patches,
         }
 
-    def _detect_pigmentation(self, img: np.ndarray, mask: np.ndarray) -> Dict:
+    def _detect_pigmentation(self, img: np.ndarray, mask: np.ndarray,
+                             lab: Optional[np.ndarray] = None) -> Dict:
         """Detect pigmentation with HIGH ACCURACY contrast validation.
 
         STRICT ACCURACY MODE:
@@ -1844,7 +3121,7 @@ class FaceScanService:
         - Only count validated dark spots
         """
 
-        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
         l_channel = lab[:, :, 0]
         a_channel = lab[:, :, 1]  # For color-based validation
         h, w = l_channel.shape
@@ -1943,8 +3220,8 @@ class FaceScanService:
                         dark_spots_locations.append({
                             "x": round(cx, 3),
                             "y": round(cy, 3),
-                            "size": round(area / skin_area * 1000, 3),
-                            "contrast": round(contrast, 1)
+                            "size": round(float(area / skin_area * 1000), 3),
+                            "contrast": round(float(contrast), 1)
                         })
 
         dark_spots_count = min(dark_spots_count, 20)
@@ -1978,7 +3255,8 @@ class FaceScanService:
             "dark_spots_locations": dark_spots_locations,
         }
 
-    def _detect_dark_circles(self, img: np.ndarray, mask: np.ndarray, face_data: Dict) -> Dict:
+    def _detect_dark_circles(self, img: np.ndarray, mask: np.ndarray, face_data: Dict,
+                             lab: Optional[np.ndarray] = None) -> Dict:
         """
         Detect dark circles under the eyes using multiple methods:
         1. LAB color space L-channel (luminance) analysis
@@ -1991,7 +3269,7 @@ class FaceScanService:
         """
         try:
             h, w = img.shape[:2]
-            lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+            lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
             l_channel = lab[:, :, 0]
             a_channel = lab[:, :, 1]  # Red-green axis (for bluish tones)
             b_channel = lab[:, :, 2]  # Yellow-blue axis
@@ -2004,7 +3282,7 @@ class FaceScanService:
                 print("[Dark Circles] No landmarks available, using fallback detection")
                 return self._detect_dark_circles_fallback(img, mask, l_channel, h, w)
 
-            def get_region_mask_and_bbox(region_indices):
+            def get_region_mask_and_bbox(region_indices, region_name):
                 """Create mask and get bounding box for a region"""
                 points = []
                 for idx in region_indices:
@@ -2017,8 +3295,10 @@ class FaceScanService:
                     return None, None
 
                 points = np.array(points, dtype=np.int32)
-                region_mask = np.zeros((h, w), dtype=np.uint8)
-                cv2.fillConvexPoly(region_mask, points, 255)
+                region_mask = self._region_mask(face_data, region_name, (h, w))
+                if region_mask is None:
+                    region_mask = np.zeros((h, w), dtype=np.uint8)
+                    cv2.fillConvexPoly(region_mask, points, 255)
 
                 # Get normalized bounding box
                 x_coords = [p[0] / w for p in points]
@@ -2028,7 +3308,7 @@ class FaceScanService:
                 return region_mask, bbox
 
             # Analyze left under-eye
-            left_mask, left_bbox = get_region_mask_and_bbox(self.LEFT_UNDER_EYE)
+            left_mask, left_bbox = get_region_mask_and_bbox(self.LEFT_UNDER_EYE, "left_under_eye")
             left_darkness = 0.0
             left_blue_tone = 0.0
             if left_mask is not None:
@@ -2040,7 +3320,7 @@ class FaceScanService:
                     left_blue_tone = max(0, 128 - np.mean(left_b_pixels)) / 40
 
             # Analyze right under-eye
-            right_mask, right_bbox = get_region_mask_and_bbox(self.RIGHT_UNDER_EYE)
+            right_mask, right_bbox = get_region_mask_and_bbox(self.RIGHT_UNDER_EYE, "right_under_eye")
             right_darkness = 0.0
             right_blue_tone = 0.0
             if right_mask is not None:
@@ -2051,8 +3331,8 @@ class FaceScanService:
                     right_blue_tone = max(0, 128 - np.mean(right_b_pixels)) / 40
 
             # Get cheek brightness as reference
-            left_cheek_mask, _ = get_region_mask_and_bbox(self.LEFT_CHEEK)
-            right_cheek_mask, _ = get_region_mask_and_bbox(self.RIGHT_CHEEK)
+            left_cheek_mask, _ = get_region_mask_and_bbox(self.LEFT_CHEEK, "left_cheek")
+            right_cheek_mask, _ = get_region_mask_and_bbox(self.RIGHT_CHEEK, "right_cheek")
             cheek_brightness = 128  # default
             if left_cheek_mask is not None and right_cheek_mask is not None:
                 cheek_mask = cv2.bitwise_or(left_cheek_mask, right_cheek_mask)
@@ -2061,7 +3341,7 @@ class FaceScanService:
                     cheek_brightness = 255 - np.mean(cheek_pixels)
 
             # Get forehead brightness (often lighter, good reference)
-            forehead_mask, _ = get_region_mask_and_bbox(self.FOREHEAD)
+            forehead_mask, _ = get_region_mask_and_bbox(self.FOREHEAD, "forehead")
             forehead_brightness = cheek_brightness
             if forehead_mask is not None:
                 forehead_pixels = l_channel[forehead_mask > 0]
@@ -2144,8 +3424,8 @@ class FaceScanService:
             # Removed all minimum thresholds that were artificially inflating scores
 
             # Clamp to 0-1 range
-            left_severity = min(1.0, left_severity)
-            right_severity = min(1.0, right_severity)
+            left_severity = float(min(1.0, left_severity))
+            right_severity = float(min(1.0, right_severity))
 
             # Overall score (0-100, higher = worse dark circles)
             avg_severity = (left_severity + right_severity) / 2
@@ -2236,8 +3516,8 @@ class FaceScanService:
 
             # No artificial floor boosts - let detection methods determine severity
 
-            left_severity = min(1.0, left_severity)
-            right_severity = min(1.0, right_severity)
+            left_severity = float(min(1.0, left_severity))
+            right_severity = float(min(1.0, right_severity))
 
             avg_severity = (left_severity + right_severity) / 2
             # Direct mapping - no aggressive multiplier
@@ -2438,7 +3718,7 @@ class FaceScanService:
         shape_confidence = analysis.get("face_shape_confidence", 0.5)
         confidence_factors.append(shape_confidence * 0.8)
 
-        return round(np.mean(confidence_factors), 3)
+        return round(float(np.mean(confidence_factors)), 3)
 
     def _calculate_overall_score(self, analysis: Dict) -> int:
         """Calculate overall skin health score (0-100, higher is better)"""
@@ -2467,7 +3747,8 @@ class FaceScanService:
 
         return max(0, min(100, int(score)))
 
-    def _calculate_quality_score(self, img: np.ndarray, face_data: Dict, mask: np.ndarray) -> float:
+    def _calculate_quality_score(self, img: np.ndarray, face_data: Dict, mask: np.ndarray,
+                                 source_shape: Optional[tuple] = None) -> float:
         """
         Calculate comprehensive image quality score for face scan.
 
@@ -2477,13 +3758,17 @@ class FaceScanService:
         - Sharpness/blur (25 points)
         - Face detection quality (15 points)
         - Skin coverage (15 points)
+
+        source_shape is the upload's (h, w) when img is the canonical crop, so
+        resolution is still scored on what the user actually sent.
         """
 
         score = 0.0
         h, w = img.shape[:2]
 
         # === Resolution score (max 20 points) ===
-        resolution = h * w
+        src_h, src_w = source_shape[:2] if source_shape else (h, w)
+        resolution = src_h * src_w
         res_score = min(resolution / (1280 * 720), 1.0) * 20
         score += res_score
 
@@ -2556,7 +3841,16 @@ class FaceScanService:
             analysis.get("age_confidence", 0.6),
             lighting_quality,  # Factor in lighting quality
         ]
-        return round(np.mean(confidences), 3)
+        return round(float(np.mean(confidences)), 3)
+
+    def _partial_fields(self, skipped: List[str], deadline: Deadline) -> Dict:
+        """Response fields marking a scan cut short by its deadline (or cancelled)"""
+        print(f"[FaceScan] Partial result ({deadline.reason}), skipped: {', '.join(skipped)}")
+        return {
+            "partial": True,
+            "partial_reason": deadline.reason,
+            "skipped": skipped,
+        }
 
     def _error_response(self, scan_id: str, error: str, elapsed_time: float = 0) -> Dict:
         """Generate error response"""
@@ -2671,7 +3965,7 @@ class FaceScanService:
 
         return face_outline
 
-    def _get_low_confidence_defaults(self) -> Dict:
+    def _get_low_confidence_defaults(self, features: Optional[List[str]] = None) -> Dict:
         """Return default analysis values when image quality is too poor"""
         defaults = {}
         defaults.update(self._default_skin_tone())
@@ -2692,6 +3986,9 @@ class FaceScanService:
             "analysis_confidence": 0.2,
             "low_quality_warning": True
         })
+        if features is not None:
+            keep = self._feature_fields(features) | {"analysis_confidence", "low_quality_warning"}
+            defaults = {k: v for k, v in defaults.items() if k in keep}
         return defaults
 
     async def get_recommendations(
@@ -2707,7 +4004,47 @@ class FaceScanService:
             product_catalog: Optional list of products to match against
 
         Returns:
-            List of recommended products with match scores
+            List of recommended products with match scores, best first
         """
-        # Product matching is handled by the backend service
-        return []
+        if not product_catalog:
+            # Store catalogs are matched through the product index (/product-index/{store_id}/match)
+            return []
+        partition = CatalogPartition(capacity=len(product_catalog))
+        for product in product_catalog:
+            if product.get("product_id") not in (None, ""):
+                partition.upsert(product)
+        return partition.top_k(encode_analysis(analysis), self.RECOMMENDATION_COUNT)
+
+
+# =============================================================================
+# Worker-process entry points (FACE_SCAN_WORKER_PROCESSES > 0)
+# =============================================================================
+
+# Each worker process builds its own service (and landmarker) once, after it starts
+_frame_worker_service: Optional[FaceScanService] = None
+
+
+def _init_frame_worker():
+    global _frame_worker_service
+    _frame_worker_service = FaceScanService()
+    _frame_worker_service.warm_up()
+
+
+def _detect_frame_worker(handle: FrameHandle, idx: int) -> Optional[Dict]:
+    """Detect the face in a shared frame; returns plain landmark tuples or a bbox"""
+    face_data = _frame_worker_service._detect_face(attach_frame(handle), idx)
+    if face_data is None:
+        return None
+    if face_data["type"] == "landmarks":
+        return {"type": "landmarks", "data": [_Landmark(lm.x, lm.y, lm.z) for lm in face_data["data"]]}
+    return {"type": "bbox", "data": tuple(int(v) for v in face_data["data"])}
+
+
+def _analyze_frame_worker(handle: FrameHandle, face_data: Dict, view_name: str, features: List[str],
+                          budget_seconds: Optional[float]) -> Dict:
+    """Analyze one shared frame; replies with the view's events and skipped detectors (no arrays)"""
+    skipped = []
+    events = list(_frame_worker_service._iter_view(
+        attach_frame(handle), face_data, view_name, features, Deadline(budget_seconds), skipped
+    ))
+    return {"events": events, "skipped": skipped}
@@ -0,0 +1,341 @@
+"""
+Frame Scoring
+Cheap per-frame checks on downscaled frames: face presence and pose, sharpness, exposure
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Landmarks used for pose: nose tip and the outer eye corners (image-left, image-right)
+NOSE_TIP = 1
+EYE_OUTER = (33, 263)
+
+# |yaw| below this is a front view; a side view needs at least PROFILE_YAW
+FRONT_YAW = 0.12
+PROFILE_YAW = 0.18
+
+# Face crops are resized to this height before measuring sharpness, so frames
+# where the face is larger or smaller compare fairly
+SHARPNESS_CROP_HEIGHT = 160
+
+# Pre-check guidance for a view that isn't the one being captured
+VIEW_GUIDANCE = {"front": "face_camera", "left": "show_left_side", "right": "show_right_side"}
+
+# Clips sampled at a stride of at least this many frames seek to each kept
+# frame instead of reading through: phone encoders put a keyframe about every
+# second, so a seek decodes at most that far while reading decodes every frame
+CLIP_SEEK_MIN_STRIDE = 30
+
+
+def estimate_yaw(landmarks) -> Optional[float]:
+    """
+    Horizontal head turn from face mesh landmarks (normalized or pixel x).
+
+    Returns the nose tip's offset from the midpoint of the outer eye corners,
+    relative to the eye-corner distance: ~0 facing the camera, negative
+    when the nose points to the image's left (the subject's left cheek is
+    towards the camera), positive towards the image's right.
+    """
+    if len(landmarks) <= max(NOSE_TIP, *EYE_OUTER):
+        return None
+    left_x, right_x = landmarks[EYE_OUTER[0]].x, landmarks[EYE_OUTER[1]].x
+    span = abs(right_x - left_x)
+    if span < 1e-6:
+        return None
+    return (landmarks[NOSE_TIP].x - (left_x + right_x) / 2) / span
+
+
+def pose_from_yaw(yaw: Optional[float]) -> Optional[str]:
+    """'front', 'left' or 'right' view for a yaw estimate (None if in between or unknown)"""
+    if yaw is None:
+        return None
+    if abs(yaw) < FRONT_YAW:
+        return "front"
+    if abs(yaw) >= PROFILE_YAW:
+        return "left" if yaw < 0 else "right"
+    return None
+
+
+def lighting_issues(face_pixels: np.ndarray) -> List[str]:
+    """Lighting problems of a face's gray pixels (same checks and names as FaceScanService._estimate_lighting_quality)"""
+    if face_pixels.size == 0:
+        return []
+    issues = []
+    if np.count_nonzero(face_pixels > 240) > 0.1 * face_pixels.size:
+        issues.append("overexposed")
+    if np.count_nonzero(face_pixels < 30) > 0.1 * face_pixels.size:
+        issues.append("underexposed")
+    mean, std = cv2.meanStdDev(face_pixels)
+    if std[0][0] > 50:
+        issues.append("uneven_lighting")
+    if mean[0][0] < 80 or mean[0][0] > 200:
+        issues.append("poor_exposure")
+    return issues
+
+
+def face_sharpness(gray: np.ndarray, bbox: Optional[Tuple[int, int, int, int]]) -> float:
+    """Variance of the Laplacian over the face (or the whole frame), at a fixed crop height"""
+    if bbox is not None:
+        x, y, w, h = bbox
+        crop = gray[max(0, y):y + h, max(0, x):x + w]
+        if crop.size:
+            gray = crop
+    scale = SHARPNESS_CROP_HEIGHT / max(1, gray.shape[0])
+    resized = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(resized, cv2.CV_64F).var())
+
+
+class FrameScorer:
+    """
+    Scores a sequence of frames for face presence, pose, sharpness and exposure.
+
+    Works on a copy downscaled to `width` pixels. With a VIDEO-mode
+    (tracking) MediaPipe landmarker the face is tracked from frame to frame
+    rather than re-detected; without one, a Haar cascade gives presence
+    (frontal faces only, so no pose beyond "front").
+    """
+
+    def __init__(self, landmarker=None, face_cascade=None, width: int = 320, tracking: bool = True,
+                 detector_lock=None):
+        """
+        Args:
+            landmarker: MediaPipe FaceLandmarker, or None for the Haar fallback
+            face_cascade: cv2.CascadeClassifier fallback
+            width: Width frames are downscaled to before scoring
+            tracking: The landmarker runs in VIDEO mode and belongs to this scorer (closed by close());
+                      False for a shared IMAGE-mode landmarker
+            detector_lock: Held around every landmarker/cascade call, for detectors shared
+                           with other threads (neither is thread-safe); None for own ones
+        """
+        self.landmarker = landmarker
+        self.face_cascade = face_cascade
+        self._detector_lock = detector_lock if detector_lock is not None else contextlib.nullcontext()
+        self.width = width
+        self.tracking = tracking
+        self._last_timestamp_ms = -1
+        self._last_bbox: Optional[Tuple[int, int, int, int]] = None
+
+    def close(self):
+        """Release the tracking landmarker (a shared one is left alone)"""
+        if self.landmarker is not None and self.tracking:
+            self.landmarker.close()
+        self.landmarker = None
+
+    def score(self, frame: np.ndarray, timestamp_ms: float) -> Dict[str, Any]:
+        """
+        Score one BGR frame (any size).
+
+        Args:
+            frame: BGR image
+            timestamp_ms: Capture time; must increase from frame to frame for tracking
+
+        Returns:
+            face (bool), yaw, pose, sharpness, brightness, lighting_issues, face_width (fraction
+            of the frame), bbox (in the downscaled frame) and landmarks (normalized) when found
+        """
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.width / max(1, w))
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else frame
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        sh, sw = gray.shape
+
+        landmarks = None
+        bbox = None
+        if self.landmarker is not None:
+            import mediapipe as mp
+            rgb = np.ascontiguousarray(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+            mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
+            with self._detector_lock:
+                if self.tracking:
+                    # VIDEO mode rejects timestamps that don't increase
+                    ts = max(int(timestamp_ms), self._last_timestamp_ms + 1)
+                    self._last_timestamp_ms = ts
+                    result = self.landmarker.detect_for_video(mp_image, ts)
+                else:
+                    result = self.landmarker.detect(mp_image)
+            if result.face_landmarks is not None and len(result.face_landmarks) > 0:
+                landmarks = result.face_landmarks[0]
+                xs = [lm.x * sw for lm in landmarks]
+                ys = [lm.y * sh for lm in landmarks]
+                bbox = (int(min(xs)), int(min(ys)), int(max(xs) - min(xs)), int(max(ys) - min(ys)))
+        elif self.face_cascade is not None:
+            with self._detector_lock:
+                bbox = self._cascade_face(gray)
+
+        yaw = estimate_yaw(landmarks) if landmarks is not None else None
+        if bbox is not None and landmarks is None:
+            pose = "front"  # The frontal cascade only finds faces that roughly face the camera
+        else:
+            pose = pose_from_yaw(yaw)
+
+        # Exposure is judged on the cheeks and nose (middle of the box), not eyes, brows or hair
+        face_pixels = gray
+        if bbox is not None:
+            x, y, bw, bh = bbox
+            face_pixels = gray[max(0, y + bh * 2 // 5):y + bh * 4 // 5, max(0, x + bw // 4):x + bw * 3 // 4]
+
+        return {
+            "face": bbox is not None,
+            "yaw": round(yaw, 3) if yaw is not None else None,
+            "pose": pose,
+            "sharpness": round(face_sharpness(gray, bbox), 1),
+            "brightness": round(float(face_pixels.mean()), 1) if face_pixels.size else 0.0,
+            "lighting_issues": lighting_issues(face_pixels) if bbox is not None else [],
+            "face_width": round(bbox[2] / sw, 3) if bbox is not None else 0.0,
+            "bbox": bbox,
+            "landmarks": landmarks,
+        }
+
+    def _cascade_face(self, gray: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """Largest Haar face; in a sequence, searched near the previous one first (a cheap form of tracking)"""
+        sw = gray.shape[1]
+        if self.tracking and self._last_bbox is not None:
+            x, y, w, h = self._last_bbox
+            x0, y0 = max(0, x - w // 2), max(0, y - h // 2)
+            roi = gray[y0:y + h + h // 2, x0:x + w + w // 2]
+            faces = self.face_cascade.detectMultiScale(
+                roi, 1.1, 4, minSize=(int(w * 0.7), int(w * 0.7)), maxSize=(int(w * 1.4), int(w * 1.4))
+            )
+            if len(faces) > 0:
+                fx, fy, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+                self._last_bbox = (int(fx) + x0, int(fy) + y0, int(fw), int(fh))
+                return self._last_bbox
+        # Coarser scale steps than full detection: presence at preview size, ~3x faster
+        faces = self.face_cascade.detectMultiScale(gray, 1.25, 4, minSize=(sw // 8, sw // 8))
+        self._last_bbox = tuple(int(v) for v in max(faces, key=lambda f: f[2] * f[3])) if len(faces) > 0 else None
+        return self._last_bbox
+
+def decode_preview(data: bytes, width: int = 320) -> np.ndarray:
+    """
+    Decode an encoded frame to BGR at roughly `width` pixels or more.
+
+    JPEGs are decoded at a reduced DCT scale (PIL draft mode), so previews
+    never pay for a full-resolution decode; FrameScorer does the final resize.
+    """
+    img = Image.open(io.BytesIO(data))
+    if img.format == "JPEG" and img.width > width:
+        img.draft("RGB", (width, round(img.height * width / img.width)))
+    return cv2.cvtColor(np.asarray(img.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+def precheck_verdict(score: Dict[str, Any], view: Optional[str] = None, min_sharpness: float = 100.0,
+                     min_face_width: float = 0.15) -> Dict[str, Any]:
+    """
+    Capture guidance for a scored preview frame.
+
+    Args:
+        score: FrameScorer.score() output
+        view: View being captured ('front', 'left', 'right'), or None for any
+        min_sharpness: Face sharpness (preview scale) below which the frame counts as blurry
+        min_face_width: Smallest face width, as a fraction of the frame
+
+    Returns:
+        Verdicts (face, pose, blur, lighting), "ready" when the frame is good
+        to capture, and "guidance": the first thing to fix, or None
+    """
+    face = score["face"]
+    blurry = face and score["sharpness"] < min_sharpness
+    issues = score["lighting_issues"]
+    pose_ok = face and (view is None or score["pose"] == view)
+
+    if not face:
+        guidance = "no_face"
+    elif score["face_width"] < min_face_width:
+        guidance = "move_closer"
+    elif not pose_ok:
+        guidance = VIEW_GUIDANCE.get(view, "face_camera")
+    elif "underexposed" in issues or ("poor_exposure" in issues and score["brightness"] < 80):
+        guidance = "more_light"
+    elif "overexposed" in issues or "poor_exposure" in issues:
+        guidance = "less_light"
+    elif "uneven_lighting" in issues:
+        guidance = "even_lighting"
+    elif blurry:
+        guidance = "hold_still"
+    else:
+        guidance = None
+
+    return {
+        "face": face,
+        "pose": score["pose"],
+        "yaw": score["yaw"],
+        "pose_ok": pose_ok,
+        "blur": None if not face else "blurry" if blurry else "sharp",
+        "sharpness": score["sharpness"],
+        "lighting": None if not face else "poor" if issues else "good",
+        "lighting_issues": issues,
+        "face_width": score["face_width"],
+        "ready": guidance is None,
+        "guidance": guidance,
+    }
+
+
+def iter_image_frames(frames: List[bytes], width: int = 320,
+                      fps: float = 10.0) -> Iterator[Tuple[int, float, Optional[np.ndarray]]]:
+    """
+    Frames of a JPEG/PNG burst as (index, timestamp_ms, small BGR frame or None if undecodable).
+
+    Frames are decoded with decode_preview(). Bursts carry no timestamps,
+    so frames are spaced as if captured at `fps`.
+    """
+    for idx, data in enumerate(frames):
+        try:
+            frame = decode_preview(data, width)
+        except Exception as e:
+            print(f"[FrameScoring] Frame {idx}: could not decode: {e}")
+            frame = None
+        yield idx, idx * 1000.0 / fps, frame
+
+
+def iter_clip_frames(clip: bytes, max_frames: int = 30) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Up to max_frames frames spread evenly over a short video clip, as (index, timestamp_ms, BGR frame).
+
+    OpenCV reads video from a path, so the clip is spooled to a temporary file.
+    grab() still decodes every frame it passes (it only skips the colour
+    conversion retrieve() does), so long clips seek to each kept frame instead.
+    """
+    fd, path = tempfile.mkstemp(suffix=".mp4")
+    cap = None
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(clip)
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError("Could not decode video clip")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        stride = max(1, total // max_frames) if total > 0 else 1
+
+        if stride >= CLIP_SEEK_MIN_STRIDE:
+            for idx in range(0, total, stride)[:max_frames]:
+                if not cap.set(cv2.CAP_PROP_POS_FRAMES, idx):
+                    break
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                yield idx, idx * 1000.0 / fps, frame
+            return
+
+        idx = 0
+        kept = 0
+        while kept < max_frames:
+            if not cap.grab():
+                break
+            if idx % stride == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    yield idx, idx * 1000.0 / fps, frame
+                    kept += 1
+            idx += 1
+    finally:
+        if cap is not None:
+            cap.release()
+        os.unlink(path)
@@ -0,0 +1,133 @@
+"""
+Frame Transport
+Shared-memory ring of decoded frames, so worker processes get a handle instead of a pickled image
+"""
+
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+class FrameHandle(NamedTuple):
+    """What crosses the process boundary instead of the pixels (a few dozen bytes pickled)"""
+    shm_name: str
+    slot: int
+    offset: int
+    shape: Tuple[int, ...]
+
+
+class FrameRing:
+    """
+    Fixed ring of preallocated frame slots in one shared-memory block.
+
+    Each slot holds one decoded BGR frame up to max_size (the cap enforced
+    by FaceScanService._process_images). The parent process owns the ring:
+    it acquires a slot, decodes an upload straight into it, sends workers a
+    FrameHandle and releases the slot once every worker reply for that frame
+    is in. Workers only ever read the slot, and reply with plain result
+    records, so no image or mask is pickled in either direction.
+
+    Slot lifetimes are explicit: acquire() blocks (up to a timeout) when all
+    slots are in use, which doubles as backpressure on decoding, and
+    release() of a slot that isn't held raises.
+    """
+
+    def __init__(self, slots: int, max_size: Tuple[int, int] = (1920, 1080), channels: int = 3):
+        """
+        Args:
+            slots: Number of frames that can be in flight at once
+            max_size: (width, height) of the largest frame a slot must hold
+            channels: Channels per pixel (3 for BGR)
+        """
+        width, height = max_size
+        self.slots = slots
+        self.slot_bytes = width * height * channels
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * self.slot_bytes)
+        self.name = self._shm.name
+
+        self._free = deque(range(slots))
+        self._held = set()
+        self._cond = threading.Condition()
+
+        self.acquired = 0
+        self.waited = 0
+        self.timeouts = 0
+        print(f"[FrameRing] {slots} slots x {self.slot_bytes / 1e6:.1f} MB in shared memory '{self.name}'")
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[int]:
+        """Take a free slot, waiting up to `timeout` seconds (None = forever); None on timeout"""
+        with self._cond:
+            if not self._free:
+                self.waited += 1
+                if not self._cond.wait_for(lambda: self._free, timeout=timeout):
+                    self.timeouts += 1
+                    return None
+            slot = self._free.popleft()
+            self._held.add(slot)
+            self.acquired += 1
+            return slot
+
+    def release(self, slot: int):
+        """Return a slot to the ring (its contents may be overwritten from now on)"""
+        with self._cond:
+            if slot not in self._held:
+                raise ValueError(f"Frame slot {slot} is not held")
+            self._held.discard(slot)
+            self._free.append(slot)
+            self._cond.notify()
+
+    def frame(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        """Writable view of a held slot as a uint8 array of `shape` (parent side)"""
+        if int(np.prod(shape)) > self.slot_bytes:
+            raise ValueError(f"Frame of shape {shape} does not fit a {self.slot_bytes}-byte slot")
+        return np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+
+    def handle(self, slot: int, shape: Tuple[int, ...]) -> FrameHandle:
+        """Handle for the frame in `slot`, to send to a worker"""
+        return FrameHandle(self.name, slot, slot * self.slot_bytes, tuple(shape))
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            in_use = len(self._held)
+        return {
+            "slots": self.slots,
+            "in_use": in_use,
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "timeouts": self.timeouts,
+        }
+
+    def close(self):
+        """Free the shared memory (only after the workers using it have stopped)"""
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# Worker side: shared-memory blocks attached so far, kept open for the life of the process
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def attach_frame(handle: FrameHandle) -> np.ndarray:
+    """
+    Read-only view of a frame from its handle (worker side).
+
+    The block is attached once per process and reused; the parent owns it,
+    so workers never unlink it.
+    """
+    shm = _attached.get(handle.shm_name)
+    if shm is None:
+        try:
+            # Python 3.13+: don't let this process's resource tracker unlink the parent's block
+            shm = shared_memory.SharedMemory(name=handle.shm_name, track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=handle.shm_name)
+        _attached[handle.shm_name] = shm
+    frame = np.ndarray(handle.shape, dtype=np.uint8, buffer=shm.buf, offset=handle.offset)
+    frame.setflags(write=False)
+    return frame
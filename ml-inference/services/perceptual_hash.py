@@ -0,0 +1,159 @@
+"""
+Perceptual Hash
+DCT hashes of face crops for spotting near-duplicate views of a scan, and a bounded index of recent scans
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# The face crop is reduced to HASH_SIZE x HASH_SIZE grayscale before the DCT;
+# the lowest HASH_BITS_SIDE x HASH_BITS_SIDE frequencies make up the 64-bit hash
+HASH_SIZE = 32
+HASH_BITS_SIDE = 8
+
+# Margin added around the face box (fraction of its size) so the crop covers the jaw and hairline
+CROP_MARGIN = 0.1
+
+
+def face_crop_box(face_data: Dict, shape: tuple) -> Tuple[int, int, int, int]:
+    """
+    (x, y, w, h) of the face in an image, clipped to it.
+
+    Landmarks give the box around all mesh points, a Haar detection its own
+    box; either is grown by CROP_MARGIN on every side.
+    """
+    h, w = shape[:2]
+    if face_data.get("type") == "landmarks":
+        xs = [lm.x * w for lm in face_data["data"]]
+        ys = [lm.y * h for lm in face_data["data"]]
+        x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+    else:
+        x, y, fw, fh = face_data["data"]
+        x0, y0, x1, y1 = x, y, x + fw, y + fh
+    mx, my = (x1 - x0) * CROP_MARGIN, (y1 - y0) * CROP_MARGIN
+    x0, y0 = max(0, int(x0 - mx)), max(0, int(y0 - my))
+    x1, y1 = min(w, int(x1 + mx)), min(h, int(y1 + my))
+    return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+
+def dct_hash(gray: np.ndarray) -> int:
+    """
+    64-bit pHash of a grayscale image.
+
+    The image is resized to HASH_SIZE², transformed with a 2-D DCT, and each
+    of the 8x8 lowest frequencies becomes one bit: set when the coefficient
+    is above the median of those coefficients (the DC term excluded, so
+    overall brightness doesn't matter).
+    """
+    small = cv2.resize(gray, (HASH_SIZE, HASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:HASH_BITS_SIDE, :HASH_BITS_SIDE].ravel()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def face_hash(img_bgr: np.ndarray, face_data: Dict) -> Optional[int]:
+    """pHash of the face crop of a decoded BGR image (None if the crop is empty)"""
+    x, y, w, h = face_crop_box(face_data, img_bgr.shape)
+    if w < 2 or h < 2:
+        return None
+    gray = cv2.cvtColor(img_bgr[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+    return dct_hash(gray)
+
+
+def hamming(a: int, b: int) -> int:
+    """Number of differing bits between two hashes"""
+    return bin(a ^ b).count("1")
+
+
+def near_duplicates(hashes: Sequence[Optional[int]], max_distance: int) -> List[Optional[int]]:
+    """
+    For each hash, the index of an earlier hash it duplicates (None if it is the first of its kind).
+
+    A hash duplicates the first kept hash within max_distance bits; hashes
+    that are None never match anything.
+    """
+    kept: List[Tuple[int, int]] = []
+    duplicate_of: List[Optional[int]] = []
+    for idx, value in enumerate(hashes):
+        match = None
+        if value is not None:
+            match = next((k for k, kept_value in kept if hamming(value, kept_value) <= max_distance), None)
+            if match is None:
+                kept.append((idx, value))
+        duplicate_of.append(match)
+    return duplicate_of
+
+
+class RecentScanIndex:
+    """
+    Bounded, thread-safe index of recently finished scans by exact key.
+
+    The key must pin down everything the result depends on: the uploads'
+    content digests as well as features and quality tier. Perceptual hashes
+    are deliberately not used here: two different shoppers' photos can hash
+    alike, and a result must never go to someone it wasn't computed for.
+    Entries expire after ttl_seconds; beyond max_entries the least recently
+    used entry is dropped. Results are copied in and out, so callers may
+    modify them.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _expire(self, now: float):
+        # Hits move entries to the end, so storage time isn't ordered: check them all
+        expired = [key for key, entry in self._entries.items() if now - entry[0] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+
+    def lookup(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Copy of the stored result for key, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return copy.deepcopy(entry[1])
+
+    def store(self, key: Hashable, result: Dict[str, Any]):
+        """Remember a finished scan's result under key"""
+        if not self.enabled:
+            return
+        result = copy.deepcopy(result)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            self._entries[key] = (now, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
@@ -0,0 +1,138 @@
+"""
+Pixel Classifier
+Per-pixel colour rules as cv2.LUT bit tables: one packed class image per view, counts from one bincount
+"""
+
+from typing import Callable, Dict, Optional
+
+import cv2
+import numpy as np
+
+# Class -> bit in the packed class image
+CLASS_BITS: Dict[str, int] = {
+    "strict_red": 1 << 0,      # clinically red: narrow hue, high saturation, not dark (redness)
+    "intense_red": 1 << 1,     # extreme saturation red, inflammation (redness)
+    "irritation_red": 1 << 2,  # wider red range used to find irritation patches (redness)
+    "abnormal_red": 1 << 3,    # LAB a far above this person's median (redness, per view)
+    "acne_red": 1 << 4,        # inflamed-blemish red, the acne detector's inRange bounds
+    "shine": 1 << 5,           # specular highlight, LAB L > 210 (hydration)
+}
+
+# Channels rules can test: name -> (source image, channel index)
+CHANNELS = {"h": ("hsv", 0), "s": ("hsv", 1), "v": ("hsv", 2), "l": ("lab", 0), "a": ("lab", 1)}
+
+# Offset of LAB 'a' above the view's median 'a' that counts as abnormal redness
+ABNORMAL_RED_A_OFFSET = 35
+
+# Static rules: class -> {channel: predicate over uint8 values 0..255}. A class holds
+# for a pixel when every channel it lists passes; unlisted channels don't matter.
+RULES: Dict[str, Dict[str, Callable[[np.ndarray], np.ndarray]]] = {
+    "strict_red": {"h": lambda x: (x < 5) | (x > 175), "s": lambda x: x > 130, "v": lambda x: x > 70},
+    "intense_red": {"h": lambda x: (x < 4) | (x > 176), "s": lambda x: x > 150},
+    "irritation_red": {"h": lambda x: (x < 8) | (x > 172), "s": lambda x: x > 90},
+    # cv2.inRange bounds are inclusive: [0..6] or [174..180] hue, S >= 120, V >= 80
+    "acne_red": {"h": lambda x: (x <= 6) | ((x >= 174) & (x <= 180)), "s": lambda x: x >= 120,
+                 "v": lambda x: x >= 80},
+    "shine": {"l": lambda x: x > 210},
+}
+
+_VALUES = np.arange(256)
+
+
+def _channel_lut(channel: str, dynamic: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+    """
+    uint8 LUT for one channel: bit set for every class the value passes on that channel.
+
+    Classes that don't test the channel always pass it, so ANDing the
+    channels' LUT outputs leaves exactly the classes that hold. `dynamic`
+    adds per-view rules (class -> boolean table over 0..255).
+    """
+    lut = np.zeros(256, dtype=np.uint8)
+    dynamic = dynamic or {}
+    for name, bit in CLASS_BITS.items():
+        if name in dynamic:
+            passes = dynamic[name] if channel == "a" else np.ones(256, dtype=bool)
+        else:
+            rule = RULES.get(name, {})
+            passes = rule[channel](_VALUES) if channel in rule else np.ones(256, dtype=bool)
+        lut[passes] |= bit
+    return lut
+
+
+# Static part, built once; only the 'a' table changes per view
+_STATIC_LUTS = {channel: _channel_lut(channel, {"abnormal_red": np.zeros(256, dtype=bool)}) for channel in CHANNELS}
+
+
+def histogram_median(hist: np.ndarray, count: int) -> float:
+    """Median of the values behind a 256-bin histogram, exactly as np.median computes it"""
+    cumulative = np.cumsum(hist)
+    upper = int(np.searchsorted(cumulative, count // 2 + 1))
+    if count % 2:
+        return float(upper)
+    lower = int(np.searchsorted(cumulative, count // 2))
+    return (lower + upper) / 2
+
+
+class PixelClasses:
+    """
+    Packed per-pixel classes of one view, restricted to the skin mask.
+
+    image holds one bit per class (CLASS_BITS) and is 0 outside the mask;
+    per-class pixel counts come from a single bincount over it.
+    """
+
+    def __init__(self, image: np.ndarray, skin_pixels: int, medians: Dict[str, float]):
+        self.image = image
+        self.image.setflags(write=False)
+        self.skin_pixels = skin_pixels
+        self.medians = medians
+
+        value_counts = np.bincount(image.ravel(), minlength=256)
+        self.counts = {name: int(value_counts[(_VALUES & bit) != 0].sum()) for name, bit in CLASS_BITS.items()}
+
+    def count(self, name: str) -> int:
+        """Skin pixels in class `name`"""
+        return self.counts[name]
+
+    def mask(self, name: str) -> np.ndarray:
+        """0/255 mask of the skin pixels in class `name`"""
+        bits = cv2.bitwise_and(self.image, CLASS_BITS[name])
+        return cv2.threshold(bits, 0, 255, cv2.THRESH_BINARY)[1]
+
+
+def classify_pixels(hsv: np.ndarray, lab: np.ndarray, skin_mask: np.ndarray) -> PixelClasses:
+    """
+    Classify every skin pixel of a view against all rules in a few passes.
+
+    Per-view statistics (median S and LAB a over the skin) come from masked
+    histograms, not sorts. The abnormal_red rule depends on the median a, so
+    its LUT is rebuilt per view; the others are fixed.
+
+    Args:
+        hsv: View in HSV (uint8, OpenCV ranges)
+        lab: View in LAB (uint8)
+        skin_mask: 0/255 (or nonzero) skin mask
+
+    Returns:
+        PixelClasses for the view
+    """
+    images = {"hsv": hsv, "lab": lab}
+    planes = {name: cv2.extractChannel(images[src], idx) for name, (src, idx) in CHANNELS.items()}
+
+    skin_pixels = cv2.countNonZero(skin_mask)
+    medians = {}
+    if skin_pixels:
+        for name in ("s", "a"):
+            hist = cv2.calcHist([planes[name]], [0], skin_mask, [256], [0, 256]).ravel()
+            medians[name] = histogram_median(hist, skin_pixels)
+
+    luts = dict(_STATIC_LUTS)
+    if "a" in medians:
+        luts["a"] = _channel_lut("a", {"abnormal_red": _VALUES > medians["a"] + ABNORMAL_RED_A_OFFSET})
+
+    packed = None
+    for name, plane in planes.items():
+        bits = cv2.LUT(plane, luts[name])
+        packed = bits if packed is None else cv2.bitwise_and(packed, bits, dst=packed)
+    packed = cv2.bitwise_and(packed, packed, mask=skin_mask)
+    return PixelClasses(packed, skin_pixels, medians)
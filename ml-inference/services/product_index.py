@@ -0,0 +1,408 @@
+"""
+Product Index
+In-process skincare catalog index: products as dense float32 rows, matched to a skin analysis with one matrix-vector product
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+CONCERNS = ("acne", "pigmentation", "wrinkles", "redness", "hydration", "oiliness", "texture", "dark_circles")
+SKIN_TYPES = ("normal", "oily", "dry", "combination", "sensitive")
+UNDERTONES = ("warm", "cool", "neutral")
+
+# Row layout: concerns, then skin types, then undertones
+FEATURES = (
+    [f"concern:{c}" for c in CONCERNS]
+    + [f"skin_type:{t}" for t in SKIN_TYPES]
+    + [f"undertone:{u}" for u in UNDERTONES]
+)
+CONCERN_OFFSET = 0
+SKIN_TYPE_OFFSET = len(CONCERNS)
+UNDERTONE_OFFSET = SKIN_TYPE_OFFSET + len(SKIN_TYPES)
+DIMENSIONS = len(FEATURES)
+
+# Catalog spellings -> concern
+CONCERN_ALIASES = {
+    "dark_spots": "pigmentation", "hyperpigmentation": "pigmentation", "uneven_tone": "pigmentation",
+    "melasma": "pigmentation", "fine_lines": "wrinkles", "aging": "wrinkles", "anti_aging": "wrinkles",
+    "firmness": "wrinkles", "blemishes": "acne", "breakouts": "acne", "blackheads": "acne",
+    "sensitivity": "redness", "rosacea": "redness", "irritation": "redness", "dryness": "hydration",
+    "dehydration": "hydration", "oil_control": "oiliness", "shine": "oiliness", "pores": "texture",
+    "roughness": "texture", "puffiness": "dark_circles", "under_eye": "dark_circles",
+}
+
+# Weight of a skin-type / undertone match relative to a fully severe concern
+SKIN_TYPE_WEIGHT = 0.3
+UNDERTONE_WEIGHT = 0.15
+
+# Severity (0-1) from which a user concern is reported as matched
+MATCHED_CONCERN_SEVERITY = 0.3
+
+STORE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+
+# Leading bytes of a store log that identify it, with its inode (they hold the generation of a replace)
+LOG_ID_BYTES = 64
+
+
+def _normalize_name(name: Any) -> str:
+    return str(name).strip().lower().replace("-", "_").replace(" ", "_")
+
+
+def _as_list(value: Any) -> List:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+def encode_product(product: Dict[str, Any]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Index row of a catalog product.
+
+    `concerns` is a list of concern names or a {concern: weight} dict
+    (aliases such as dark_spots or fine_lines are mapped, unknown names are
+    ignored); the concern part is scaled to unit length so products that
+    list many concerns don't outrank focused ones. `skin_types` and
+    `undertones` (or `undertone`) mark who the product suits; when a
+    product lists none it suits everyone.
+
+    Returns:
+        (float32 row of DIMENSIONS, targeted concerns)
+    """
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+
+    concerns = product.get("concerns") or []
+    weights = concerns.items() if isinstance(concerns, dict) else ((c, 1.0) for c in _as_list(concerns))
+    targeted = []
+    for name, weight in weights:
+        name = _normalize_name(name)
+        concern = CONCERN_ALIASES.get(name, name)
+        if concern in CONCERNS:
+            vector[CONCERN_OFFSET + CONCERNS.index(concern)] += float(weight)
+            if concern not in targeted:
+                targeted.append(concern)
+    norm = np.linalg.norm(vector[:SKIN_TYPE_OFFSET])
+    if norm > 0:
+        vector[:SKIN_TYPE_OFFSET] /= norm
+
+    for names, options, offset in (
+        (product.get("skin_types"), SKIN_TYPES, SKIN_TYPE_OFFSET),
+        (product.get("undertones", product.get("undertone")), UNDERTONES, UNDERTONE_OFFSET),
+    ):
+        suited = [options.index(n) for n in map(_normalize_name, _as_list(names)) if n in options]
+        if not suited:
+            suited = range(len(options))
+        for i in suited:
+            vector[offset + i] = 1.0
+    return vector, targeted
+
+
+def skin_type_from_analysis(analysis: Dict[str, Any]) -> str:
+    """Skin type from oiliness/hydration/sensitivity, with the thresholds the backend uses"""
+    oiliness = analysis.get("oiliness_score") or 50
+    hydration = analysis.get("hydration_score") or 50
+    hydration_level = str(analysis.get("hydration_level") or "").lower()
+
+    if oiliness > 70:
+        return "oily"
+    if oiliness > 55 and hydration < 60:
+        return "combination"
+    if hydration_level == "dry" or hydration < 40:
+        return "dry"
+    if analysis.get("sensitivity_level") == "high" or (analysis.get("redness_score") or 0) > 50:
+        return "sensitive"
+    return "normal"
+
+
+def encode_analysis(analysis: Dict[str, Any]) -> np.ndarray:
+    """
+    Query vector of a face-scan analysis.
+
+    Concern entries are severities in 0-1 (scores where higher is better,
+    hydration and texture, are inverted); the user's skin type and
+    undertone get SKIN_TYPE_WEIGHT / UNDERTONE_WEIGHT.
+    """
+    def score(key: str, default: float = 0.0) -> float:
+        value = analysis.get(key)
+        return default if value is None else float(value)
+
+    severities = {
+        "acne": score("acne_score"),
+        "pigmentation": score("pigmentation_score"),
+        "wrinkles": score("wrinkle_score"),
+        "redness": score("redness_score"),
+        "hydration": 100 - score("hydration_score", 100),
+        "oiliness": score("oiliness_score"),
+        "texture": 100 - score("texture_score", 100),
+        "dark_circles": score("dark_circles_score"),
+    }
+    query = np.zeros(DIMENSIONS, dtype=np.float32)
+    for i, concern in enumerate(CONCERNS):
+        query[CONCERN_OFFSET + i] = min(max(severities[concern] / 100, 0.0), 1.0)
+
+    query[SKIN_TYPE_OFFSET + SKIN_TYPES.index(skin_type_from_analysis(analysis))] = SKIN_TYPE_WEIGHT
+    undertone = _normalize_name(analysis.get("skin_undertone") or "neutral")
+    if undertone in UNDERTONES:
+        query[UNDERTONE_OFFSET + UNDERTONES.index(undertone)] = UNDERTONE_WEIGHT
+    return query
+
+
+class CatalogPartition:
+    """
+    One store's products as rows of a float32 matrix.
+
+    Upserts overwrite a product's row in place or append one (capacity
+    doubles as needed); removals move the last row into the gap, so the
+    live rows stay contiguous and are scored with a single matmul.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.matrix = np.zeros((capacity, DIMENSIONS), dtype=np.float32)
+        self.product_ids: List[str] = []
+        self.concerns: List[List[str]] = []
+        self.rows: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def upsert(self, product: Dict[str, Any]):
+        product_id = str(product["product_id"])
+        vector, concerns = encode_product(product)
+        row = self.rows.get(product_id)
+        if row is None:
+            row = len(self.product_ids)
+            if row == len(self.matrix):
+                grown = np.zeros((2 * len(self.matrix), DIMENSIONS), dtype=np.float32)
+                grown[:row] = self.matrix[:row]
+                self.matrix = grown
+            self.rows[product_id] = row
+            self.product_ids.append(product_id)
+            self.concerns.append(concerns)
+        else:
+            self.concerns[row] = concerns
+        self.matrix[row] = vector
+
+    def remove(self, product_id: str) -> bool:
+        row = self.rows.pop(str(product_id), None)
+        if row is None:
+            return False
+        last = len(self.product_ids) - 1
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            self.product_ids[row] = self.product_ids[last]
+            self.concerns[row] = self.concerns[last]
+            self.rows[self.product_ids[row]] = row
+        self.product_ids.pop()
+        self.concerns.pop()
+        return True
+
+    def top_k(self, query: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        """
+        The k best-scoring products for a query vector.
+
+        Returns:
+            [{"product_id", "match_score", "matched_concerns"}], best first
+        """
+        count = len(self.product_ids)
+        k = min(k, count)
+        if k <= 0:
+            return []
+        scores = self.matrix[:count] @ query
+        if k < count:
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+        else:
+            best = np.argsort(-scores, kind="stable")
+
+        user_concerns = {c for i, c in enumerate(CONCERNS) if query[CONCERN_OFFSET + i] >= MATCHED_CONCERN_SEVERITY}
+        return [
+            {
+                "product_id": self.product_ids[row],
+                "match_score": round(float(scores[row]), 4),
+                "matched_concerns": [c for c in self.concerns[row] if c in user_concerns],
+            }
+            for row in best.tolist()
+        ]
+
+
+class ProductIndex:
+    """
+    Per-store catalog partitions, kept in sync across server workers.
+
+    Every change is appended to a per-store JSONL log in the index directory
+    (under the store's lock file), and each worker replays entries it hasn't
+    seen before serving from a store, so an upsert sent to one worker is
+    visible to all of them without rebuilding. A full replace rewrites the
+    log under the same lock, which makes other workers reload that store.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        output_dir = os.getenv("OUTPUT_DIR", "./output")
+        self.directory = directory or os.getenv("PRODUCT_INDEX_DIR", os.path.join(output_dir, "product_index"))
+        os.makedirs(self.directory, exist_ok=True)
+        self.partitions: Dict[str, CatalogPartition] = {}
+        # store_id -> ((log inode, first LOG_ID_BYTES of the log), bytes replayed)
+        self._log_positions: Dict[str, Tuple[Tuple[int, bytes], int]] = {}
+        self._lock = threading.Lock()
+
+    def _log_path(self, store_id: str) -> str:
+        if not STORE_ID_PATTERN.match(store_id):
+            raise ValueError("store_id may only contain letters, digits, '_', '-' and '.'")
+        return os.path.join(self.directory, f"{store_id}.jsonl")
+
+    @contextlib.contextmanager
+    def _store_lock(self, store_id: str):
+        """
+        Exclusive lock on a store's log, across workers.
+
+        The lock is held on a separate {store_id}.lock file: the log itself
+        is replaced by a full sync, so a lock on the log's inode would not
+        cover the writer that replaces it.
+        """
+        path = self._log_path(store_id)
+        with open(path[:-len(".jsonl")] + ".lock", "ab") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield path
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _apply(self, partition: CatalogPartition, entry: Dict[str, Any]):
+        if entry.get("op") == "upsert":
+            for product in entry["products"]:
+                partition.upsert(product)
+        elif entry.get("op") == "remove":
+            for product_id in entry["product_ids"]:
+                partition.remove(product_id)
+
+    def _sync(self, store_id: str) -> CatalogPartition:
+        """Replay log entries this worker hasn't applied yet (call with _lock held)"""
+        path = self._log_path(store_id)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self.partitions.pop(store_id, None)
+            self._log_positions.pop(store_id, None)
+            return self.partitions.setdefault(store_id, CatalogPartition())
+
+        with f:
+            # A replaced log can get the old inode number back, so a log is known
+            # by its inode and its first bytes (a replace starts with a new generation)
+            log_id = (os.fstat(f.fileno()).st_ino, f.read(LOG_ID_BYTES))
+            known_id, offset = self._log_positions.get(store_id, (None, 0))
+            size = os.fstat(f.fileno()).st_size
+            if known_id != log_id or size < offset or store_id not in self.partitions:
+                # New or rewritten log: rebuild from the start
+                self.partitions[store_id] = CatalogPartition()
+                offset = 0
+            partition = self.partitions[store_id]
+            if size > offset:
+                f.seek(offset)
+                data = f.read()
+                end = data.rfind(b"\n") + 1  # a line still being written is picked up next time
+                for line in data[:end].splitlines():
+                    if line.strip():
+                        self._apply(partition, json.loads(line))
+                offset += end
+        self._log_positions[store_id] = (log_id, offset)
+        return partition
+
+    def _append(self, store_id: str, entry: Dict[str, Any]) -> CatalogPartition:
+        """Append an entry to the store's log and apply it (call with _lock held)"""
+        with self._store_lock(store_id) as path:
+            # Opened under the lock, so no replace can swap the log out from under the write
+            with open(path, "ab") as f:
+                if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                    raise RuntimeError(f"{path} was replaced while locked")
+                partition = self._sync(store_id)
+                f.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+                f.flush()
+                self._apply(partition, entry)
+                self._log_positions[store_id] = (self._log_positions[store_id][0], f.tell())
+        return partition
+
+    @staticmethod
+    def _clean_products(products: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        cleaned = []
+        for product in products:
+            if product.get("product_id") in (None, ""):
+                raise ValueError("Every product needs a product_id")
+            cleaned.append({
+                "product_id": str(product["product_id"]),
+                "concerns": product.get("concerns") or [],
+                "skin_types": _as_list(product.get("skin_types")),
+                "undertones": _as_list(product.get("undertones", product.get("undertone"))),
+            })
+        return cleaned
+
+    def upsert(self, store_id: str, products: Iterable[Dict[str, Any]], replace: bool = False) -> Dict[str, Any]:
+        """
+        Add or update products of a store.
+
+        Args:
+            store_id: Store whose catalog partition to change
+            products: Dicts with product_id, concerns, skin_types, undertones
+            replace: Drop the store's other products (full catalog sync)
+
+        Returns:
+            {"store_id", "upserted", "size"}
+        """
+        products = self._clean_products(products)
+        entry = {"op": "upsert", "products": products}
+        with self._lock:
+            if replace:
+                # First in the line, so the rewritten log starts differently from any earlier one
+                entry = {"op": "upsert", "generation": f"{time.time_ns()}-{os.getpid()}", "products": products}
+                with self._store_lock(store_id) as path:
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+                    os.replace(tmp, path)
+                    partition = self._sync(store_id)
+            else:
+                partition = self._append(store_id, entry)
+            size = len(partition)
+        print(f"[ProductIndex] {store_id}: {len(products)} products upserted{' (replace)' if replace else ''}, {size} total")
+        return {"store_id": store_id, "upserted": len(products), "size": size}
+
+    def remove(self, store_id: str, product_ids: Iterable[str]) -> Dict[str, Any]:
+        """
+        Remove products from a store.
+
+        Returns:
+            {"store_id", "removed", "size"}
+        """
+        product_ids = [str(p) for p in product_ids]
+        with self._lock:
+            partition = self._sync(store_id)
+            removed = sum(1 for p in product_ids if p in partition.rows)
+            if removed:
+                partition = self._append(store_id, {"op": "remove", "product_ids": product_ids})
+            size = len(partition)
+        return {"store_id": store_id, "removed": removed, "size": size}
+
+    def match(self, store_id: str, analysis: Dict[str, Any], k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Top-k products of a store for a face-scan analysis.
+
+        Returns:
+            [{"product_id", "match_score", "matched_concerns"}], best first
+        """
+        query = encode_analysis(analysis)
+        with self._lock:
+            return self._sync(store_id).top_k(query, k)
+
+    def stats(self, store_id: str) -> Dict[str, Any]:
+        """Size of a store's partition"""
+        with self._lock:
+            partition = self._sync(store_id)
+            return {"store_id": store_id, "size": len(partition), "dimensions": DIMENSIONS}
@@ -0,0 +1,123 @@
+"""
+Quality Tiers
+Load-adaptive degradation: trade face-scan resolution and coverage for throughput under load
+"""
+
+import os
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Tiers from best to cheapest; each one keeps the savings of the tiers before it.
+# - max_image_size: (width, height) uploads are scaled down to before face detection
+# - fast_decode:    let the JPEG decoder skip DCT detail it would throw away (PIL draft mode)
+# - max_views:      analyze only the first N uploads (front first); None = all
+# - profile:        restrict detectors to this feature profile; None = as requested
+QUALITY_TIERS: Dict[str, Dict[str, Any]] = {
+    "full": {"max_image_size": (1920, 1080), "fast_decode": False, "max_views": None, "profile": None},
+    "reduced_resolution": {"max_image_size": (960, 540), "fast_decode": True, "max_views": None, "profile": None},
+    "single_view": {"max_image_size": (960, 540), "fast_decode": True, "max_views": 1, "profile": None},
+    "essential": {"max_image_size": (960, 540), "fast_decode": True, "max_views": 1, "profile": "essential"},
+}
+
+TIER_NAMES = list(QUALITY_TIERS)
+
+
+class QualityTierController:
+    """
+    Picks the face-scan quality tier from current load, with hysteresis.
+
+    Load is the larger of two pressures:
+    - queue: requests waiting in the face_scan admission lane / its queue size
+    - latency: p95 of recent end-to-end scan latencies / the latency target
+
+    The controller degrades as soon as load reaches a tier's entry threshold
+    (jumping several tiers at once if needed), but only recovers one tier at
+    a time, once load has stayed below that tier's threshold minus the
+    hysteresis band for the hold period. That keeps it from flapping when
+    the cheaper tier's own lower latencies pull the p95 back down.
+    """
+
+    # Load at which each tier after "full" is entered
+    ENTER_THRESHOLDS = (0.5, 0.75, 1.0)
+
+    def __init__(self, lane=None):
+        """
+        Args:
+            lane: AdmissionLane whose wait queue measures backlog (None = latency only)
+        """
+        self.lane = lane
+        self.forced_tier = os.getenv("FACE_SCAN_QUALITY_TIER", "auto")
+        if self.forced_tier != "auto" and self.forced_tier not in QUALITY_TIERS:
+            print(f"[Quality] Unknown FACE_SCAN_QUALITY_TIER '{self.forced_tier}', using auto")
+            self.forced_tier = "auto"
+
+        self.latency_target_ms = float(os.getenv("QUALITY_LATENCY_TARGET_MS", "8000"))
+        self.hysteresis = float(os.getenv("QUALITY_HYSTERESIS", "0.2"))
+        self.hold_seconds = float(os.getenv("QUALITY_HOLD_SECONDS", "30"))
+        self.window_seconds = float(os.getenv("QUALITY_WINDOW_SECONDS", "120"))
+
+        # (timestamp, latency_ms) of recent scans
+        self._latencies = deque(maxlen=int(os.getenv("QUALITY_WINDOW_SIZE", "200")))
+        self._level = 0
+        self._changed_at = time.monotonic()
+        self.tier_counts = {name: 0 for name in TIER_NAMES}
+
+    def record(self, latency_ms: float):
+        """Record the end-to-end latency of a finished scan"""
+        self._latencies.append((time.monotonic(), latency_ms))
+
+    def p95_latency_ms(self) -> Optional[float]:
+        """p95 of latencies recorded within the window (None without samples)"""
+        horizon = time.monotonic() - self.window_seconds
+        recent = sorted(ms for ts, ms in self._latencies if ts >= horizon)
+        if not recent:
+            return None
+        return recent[min(len(recent) - 1, int(0.95 * len(recent)))]
+
+    def load(self) -> float:
+        """Current load (1.0 = queue full or p95 at the latency target)"""
+        queue_load = 0.0
+        if self.lane is not None:
+            queue_load = self.lane.waiting / max(1, self.lane.max_queue)
+        p95 = self.p95_latency_ms()
+        latency_load = p95 / self.latency_target_ms if p95 is not None and self.latency_target_ms > 0 else 0.0
+        return max(queue_load, latency_load)
+
+    def select(self) -> str:
+        """Tier for a scan starting now (updates the controller state)"""
+        if self.forced_tier != "auto":
+            tier = self.forced_tier
+        else:
+            load = self.load()
+            target = sum(1 for threshold in self.ENTER_THRESHOLDS if load >= threshold)
+            now = time.monotonic()
+            if target > self._level:
+                self._set_level(target, load, now)
+            elif (self._level > 0
+                    and load < self.ENTER_THRESHOLDS[self._level - 1] - self.hysteresis
+                    and now - self._changed_at >= self.hold_seconds):
+                self._set_level(self._level - 1, load, now)
+            tier = TIER_NAMES[self._level]
+
+        self.tier_counts[tier] += 1
+        return tier
+
+    def _set_level(self, level: int, load: float, now: float):
+        print(f"[Quality] {TIER_NAMES[self._level]} -> {TIER_NAMES[level]} (load {load:.2f})")
+        self._level = level
+        self._changed_at = now
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current tier, load signals and how many scans ran in each tier"""
+        p95 = self.p95_latency_ms()
+        return {
+            "mode": self.forced_tier,
+            "tier": self.forced_tier if self.forced_tier != "auto" else TIER_NAMES[self._level],
+            "load": round(self.load(), 3),
+            "queue_waiting": self.lane.waiting if self.lane is not None else None,
+            "p95_latency_ms": round(p95, 1) if p95 is not None else None,
+            "latency_target_ms": self.latency_target_ms,
+            "seconds_in_tier": round(time.monotonic() - self._changed_at, 1),
+            "scans_per_tier": dict(self.tier_counts),
+        }
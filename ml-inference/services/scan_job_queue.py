@@ -0,0 +1,341 @@
+"""
+Scan Job Queue
+Durable sqlite-backed queue for asynchronous face and body scans
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from services.serialization import dumps, loads
+
+# Handler signature: async (scan_id, image_data, **options) -> result dict
+ScanHandler = Callable[..., Awaitable[Dict[str, Any]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scan_jobs (
+    kind TEXT NOT NULL,
+    scan_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_expires_at REAL,
+    finished_at REAL,
+    result BLOB,
+    error TEXT,
+    options BLOB,
+    PRIMARY KEY (kind, scan_id)
+);
+CREATE INDEX IF NOT EXISTS idx_scan_jobs_status ON scan_jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS scan_job_images (
+    kind TEXT NOT NULL,
+    scan_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (kind, scan_id, idx)
+);
+"""
+
+# Rough progress reported for each job state
+_PROGRESS = {"queued": 0, "processing": 50, "completed": 100, "failed": 100}
+
+
+class ScanJobQueue:
+    """
+    Durable job queue for long-running scans.
+
+    POST endpoints enqueue the uploaded images and return immediately; worker
+    threads claim jobs from a local sqlite database, run the registered
+    handler and store the result. Jobs are keyed by (kind, scan_id), so
+    re-submitting a scan_id returns the existing job instead of re-running it.
+    Claimed jobs carry a lease: if a worker dies mid-scan the lease expires
+    and the job is picked up again (up to max_attempts).
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        num_workers: Optional[int] = None,
+        retention_hours: Optional[float] = None,
+        lease_seconds: Optional[float] = None,
+        max_attempts: int = 3
+    ):
+        output_dir = os.getenv("OUTPUT_DIR", "./output")
+        self.db_path = db_path or os.getenv("SCAN_JOB_DB", os.path.join(output_dir, "scan_jobs.sqlite3"))
+        self.num_workers = num_workers if num_workers is not None else int(os.getenv("SCAN_JOB_WORKERS", "1"))
+        self.retention_seconds = 3600 * (
+            retention_hours if retention_hours is not None else float(os.getenv("SCAN_JOB_RETENTION_HOURS", "24"))
+        )
+        self.lease_seconds = lease_seconds if lease_seconds is not None else float(os.getenv("SCAN_JOB_LEASE_SECONDS", "300"))
+        self.max_attempts = max_attempts
+        self.poll_interval = 1.0
+        self.purge_interval = 600.0
+
+        self._handlers: Dict[str, ScanHandler] = {}
+        self._local = threading.local()
+        # Connections inherited from a parent process (see _connection); never closed
+        self._inherited_connections: List[sqlite3.Connection] = []
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._last_purge = 0.0
+
+        db_dir = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        # A one-off connection: the queue is usually built in a preloading server's
+        # master, and sqlite connections must not be carried across fork()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Databases created before per-job options existed
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(scan_jobs)")}
+            if "options" not in columns:
+                conn.execute("ALTER TABLE scan_jobs ADD COLUMN options BLOB")
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Get this thread's sqlite connection (autocommit; explicit transactions where needed).
+
+        Connections are per thread and per process: after a fork the main
+        thread's thread-local still holds the parent's connection, which is
+        set aside unused (closing it would drop this process's file locks).
+        """
+        pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid != pid:
+            self._inherited_connections.append(conn)
+            conn = None
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    def register_handler(self, kind: str, handler: ScanHandler):
+        """Register the coroutine that processes jobs of the given kind ("face", "body")"""
+        self._handlers[kind] = handler
+
+    # =========================================================================
+    # Producer side
+    # =========================================================================
+
+    def enqueue(self, kind: str, scan_id: str, image_data: List[bytes],
+                options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Persist a scan job and its images. Idempotent by (kind, scan_id).
+
+        options are passed to the handler as keyword arguments (e.g. features).
+
+        Returns:
+            Status dictionary for the new (or already existing) job
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for scan kind '{kind}'")
+
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO scan_jobs (kind, scan_id, status, created_at, updated_at, options) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (kind, scan_id, now, now, dumps(options) if options else None)
+            ).rowcount
+            if inserted:
+                conn.executemany(
+                    "INSERT INTO scan_job_images (kind, scan_id, idx, data) VALUES (?, ?, ?, ?)",
+                    [(kind, scan_id, idx, sqlite3.Binary(data)) for idx, data in enumerate(image_data)]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if inserted:
+            print(f"[ScanJobs] Enqueued {kind} scan {scan_id} ({len(image_data)} images)")
+            with self._wakeup:
+                self._wakeup.notify()
+        else:
+            print(f"[ScanJobs] {kind} scan {scan_id} already exists, not re-enqueued")
+
+        return self.get_status(kind, scan_id)
+
+    def get_status(self, kind: str, scan_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        """Get job status (and result, once completed) from the store"""
+        row = self._connection().execute(
+            "SELECT * FROM scan_jobs WHERE kind = ? AND scan_id = ?", (kind, scan_id)
+        ).fetchone()
+        if row is None:
+            return None
+
+        status = {
+            "scan_id": row["scan_id"],
+            "job_id": row["scan_id"],
+            "kind": row["kind"],
+            "status": row["status"],  # queued | processing | completed | failed
+            "progress": _PROGRESS.get(row["status"], 0),
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "finished_at": row["finished_at"],
+        }
+        if row["error"]:
+            status["error"] = row["error"]
+        if include_result and row["result"] is not None:
+            status["result"] = loads(row["result"])
+        return status
+
+    def stats(self) -> Dict[str, int]:
+        """Job counts by status"""
+        rows = self._connection().execute(
+            "SELECT status, COUNT(*) AS n FROM scan_jobs GROUP BY status"
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    # =========================================================================
+    # Worker side
+    # =========================================================================
+
+    def start(self):
+        """Start worker threads (no-op when SCAN_JOB_WORKERS=0)"""
+        if self._workers:
+            return
+        self._stopping.clear()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"scan-job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        print(f"[ScanJobs] Started {self.num_workers} worker(s), db: {self.db_path}")
+
+    def stop(self, timeout: float = 30.0):
+        """Stop workers; a job in flight keeps its lease and is retried if not finished"""
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join(timeout=timeout)
+        self._workers = []
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                self._maybe_purge()
+                job = self._claim_next()
+                if job is None:
+                    with self._wakeup:
+                        self._wakeup.wait(timeout=self.poll_interval)
+                    continue
+                self._run_job(*job)
+            except Exception as e:
+                print(f"[ScanJobs] Worker error: {e}")
+                traceback.print_exc()
+                time.sleep(self.poll_interval)
+
+    def _claim_next(self) -> Optional[tuple]:
+        """Atomically claim the oldest queued job, or one whose lease has expired"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT kind, scan_id, attempts, options FROM scan_jobs "
+                "WHERE status = 'queued' OR (status = 'processing' AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            kind, scan_id, attempts = row["kind"], row["scan_id"], row["attempts"]
+            options = loads(row["options"]) if row["options"] else {}
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE scan_jobs SET status = 'failed', error = ?, updated_at = ?, finished_at = ? "
+                    "WHERE kind = ? AND scan_id = ?",
+                    (f"Gave up after {attempts} attempts", now, now, kind, scan_id)
+                )
+                conn.execute("DELETE FROM scan_job_images WHERE kind = ? AND scan_id = ?", (kind, scan_id))
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE scan_jobs SET status = 'processing', attempts = attempts + 1, "
+                "updated_at = ?, lease_expires_at = ? WHERE kind = ? AND scan_id = ?",
+                (now, now + self.lease_seconds, kind, scan_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        images = [
+            bytes(r["data"]) for r in conn.execute(
+                "SELECT data FROM scan_job_images WHERE kind = ? AND scan_id = ? ORDER BY idx",
+                (kind, scan_id)
+            )
+        ]
+        return kind, scan_id, images, options
+
+    def _run_job(self, kind: str, scan_id: str, images: List[bytes], options: Dict[str, Any]):
+        start_time = time.time()
+        handler = self._handlers.get(kind)
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for scan kind '{kind}'")
+            result = asyncio.run(handler(scan_id, images, **options))
+            self._finish(kind, scan_id, "completed", result=dumps(result))
+            print(f"[ScanJobs] {kind} scan {scan_id} completed in {int((time.time() - start_time) * 1000)}ms")
+        except Exception as e:
+            print(f"[ScanJobs] {kind} scan {scan_id} failed: {e}")
+            traceback.print_exc()
+            self._finish(kind, scan_id, "failed", error=str(e))
+
+    def _finish(self, kind: str, scan_id: str, status: str, result: Optional[bytes] = None, error: Optional[str] = None):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE scan_jobs SET status = ?, result = ?, error = ?, updated_at = ?, "
+                "finished_at = ?, lease_expires_at = NULL WHERE kind = ? AND scan_id = ?",
+                (status, result, error, now, now, kind, scan_id)
+            )
+            # Uploads are only needed until the job has an outcome
+            conn.execute("DELETE FROM scan_job_images WHERE kind = ? AND scan_id = ?", (kind, scan_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        self.purge_expired(now)
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete finished jobs older than the retention window"""
+        cutoff = (now or time.time()) - self.retention_seconds
+        conn = self._connection()
+        deleted = conn.execute(
+            "DELETE FROM scan_jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+            (cutoff,)
+        ).rowcount
+        if deleted:
+            print(f"[ScanJobs] Purged {deleted} expired job(s)")
+        return deleted
@@ -0,0 +1,324 @@
+"""
+Scan Profiler
+On-demand statistical profiler for live face scans (sampled stacks + per-stage memory peaks)
+"""
+
+import dis
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Pipeline event -> name of the stage that ends with it
+STAGE_NAMES = {
+    "faces_detected": "decode_detect",
+    "quality_gate": "prepare",
+    "preview": "appearance",
+    "view_result": "detectors",
+    "result": "merge",
+}
+
+# Threads sampled besides the scan's own thread (the shared detector pool)
+HELPER_THREAD_PREFIXES = ("face-detector",)
+
+_code_cache: Dict[Any, Dict[int, str]] = {}
+
+
+def _native_callee(frame) -> Optional[str]:
+    """
+    Name of the C function a frame is blocked in, or None if it is running Python.
+
+    A thread whose innermost Python frame sits on a CALL instruction is
+    inside a builtin/extension function (OpenCV, NumPy, MediaPipe, a lock);
+    the callee is read from the call expression's source span.
+    """
+    code = frame.f_code
+    offset = frame.f_lasti
+    calls = _code_cache.get(code)
+    if calls is None:
+        calls = {}
+        positions = list(code.co_positions()) if hasattr(code, "co_positions") else []
+        for ins in dis.get_instructions(code):
+            if not ins.opname.startswith("CALL"):
+                continue
+            name = "native"
+            if positions:
+                lineno, end_lineno, col, _ = positions[ins.offset // 2]
+                text = linecache.getline(code.co_filename, lineno or 0)[col or 0:] if lineno else ""
+                name = text.split("(", 1)[0].strip() or "native"
+            calls[ins.offset] = name
+        _code_cache[code] = calls
+    return calls.get(offset)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ScanProfile:
+    """
+    One profiled scan: a sampler thread plus per-stage memory high-water marks.
+
+    Samples the thread driving the scan's pipeline (re-read on every step,
+    since the stream endpoint resumes it on different threadpool threads)
+    and the shared detector pool threads, which may also be running a
+    concurrent scan's detectors.
+    """
+
+    def __init__(self, scan_id: str, interval_ms: float = 5.0):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.scan_id = scan_id
+        self.interval = interval_ms / 1000
+        self.started_at = time.time()
+        self.duration_ms = 0.0
+
+        # (role, stack tuple) -> ms; stacks are root-first labels
+        self.stack_ms: Counter = Counter()
+        self.native_ms: Counter = Counter()
+        self.samples = 0
+        self.stages: List[Dict[str, Any]] = []
+
+        self._scan_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    # -- sampling ---------------------------------------------------------
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed_ms = (now - last) * 1000
+            last = now
+            helpers = {
+                t.ident for t in threading.enumerate()
+                if t.ident != own and t.name.startswith(HELPER_THREAD_PREFIXES)
+            }
+            for tid, frame in sys._current_frames().items():
+                if tid == self._scan_thread:
+                    role = "scan"
+                elif tid in helpers:
+                    role = "detectors"
+                else:
+                    continue
+                stack = []
+                native = _native_callee(frame)
+                f = frame
+                while f is not None:
+                    stack.append(_frame_label(f.f_code))
+                    f = f.f_back
+                stack.reverse()
+                # Idle pool threads (waiting for a work item to run) aren't part of the scan
+                if role == "detectors" and not any(label.startswith("run (thread.py") for label in stack):
+                    continue
+                if native:
+                    stack.append(f"{native} [native]")
+                    self.native_ms[native] += elapsed_ms
+                self.stack_ms[(role, tuple(stack))] += elapsed_ms
+            self.samples += 1
+
+    def wrap(self, events: Iterator[Tuple[str, Dict]]) -> Iterator[Tuple[str, Dict]]:
+        """Drive a FaceScanService event iterator under the profiler, recording each stage"""
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        self._sampler = threading.Thread(target=self._sample_loop, name="scan-profiler", daemon=True)
+        self._scan_thread = threading.get_ident()
+        self._sampler.start()
+        start = time.perf_counter()
+        try:
+            while True:
+                self._scan_thread = threading.get_ident()
+                stage_start = time.perf_counter()
+                base, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                try:
+                    event, payload = next(events)
+                except StopIteration:
+                    return
+                current, peak = tracemalloc.get_traced_memory()
+                view = payload.get("view")
+                stage = STAGE_NAMES.get(event, event)
+                self.stages.append({
+                    "stage": f"{view}.{stage}" if view else stage,
+                    "ms": round((time.perf_counter() - stage_start) * 1000, 1),
+                    "peak_alloc_mb": round((peak - base) / 1e6, 2),
+                    "retained_mb": round((current - base) / 1e6, 2),
+                })
+                # Between steps the thread belongs to whoever consumes the events
+                self._scan_thread = None
+                yield event, payload
+        finally:
+            self._stop.set()
+            self._sampler.join()
+            self.duration_ms = (time.perf_counter() - start) * 1000
+            if started_tracing:
+                tracemalloc.stop()
+
+    # -- output -----------------------------------------------------------
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed stacks ("role;frame;frame weight_ms"), for flamegraph.pl / speedscope"""
+        lines = []
+        for (role, stack), ms in sorted(self.stack_ms.items(), key=lambda item: -item[1]):
+            lines.append(f"{role};{';'.join(stack)} {max(1, round(ms))}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        """speedscope.app file: one sampled profile per role, weights in milliseconds"""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[str, int] = {}
+
+        def frame_id(label: str) -> int:
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            return index[label]
+
+        profiles = []
+        for role in ("scan", "detectors"):
+            samples, weights = [], []
+            for (r, stack), ms in self.stack_ms.items():
+                if r == role:
+                    samples.append([frame_id(label) for label in stack])
+                    weights.append(round(ms, 3))
+            if samples:
+                profiles.append({
+                    "type": "sampled",
+                    "name": f"{self.scan_id} ({role})",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": round(sum(weights), 3),
+                    "samples": samples,
+                    "weights": weights,
+                })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"face-scan {self.scan_id}",
+            "exporter": "flash-ai-ml-inference",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def summary(self, top: int = 15) -> Dict[str, Any]:
+        """Stage timings and memory peaks, hottest functions and native calls"""
+        self_ms: Counter = Counter()
+        scan_ms = 0.0
+        for (role, stack), ms in self.stack_ms.items():
+            self_ms[stack[-1]] += ms
+            if role == "scan":
+                scan_ms += ms
+        native_total = sum(self.native_ms.values())
+        return {
+            "profile_id": self.profile_id,
+            "scan_id": self.scan_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "stages": self.stages,
+            "native_ms": round(native_total, 1),
+            "scan_thread_ms": round(scan_ms, 1),
+            "top_self_ms": [{"frame": f, "ms": round(ms, 1)} for f, ms in self_ms.most_common(top)],
+            "top_native_ms": [{"call": c, "ms": round(ms, 1)} for c, ms in self.native_ms.most_common(top)],
+        }
+
+
+class ScanProfiler:
+    """
+    Arms profiling for the next N face scans or for one scan_id.
+
+    claim() is the only call on the request path; while nothing is armed it
+    is a single attribute check, so the profiler costs nothing when off.
+    One scan is profiled at a time (tracemalloc peaks are process-wide).
+    """
+
+    def __init__(self, keep: int = 20):
+        self._remaining = 0
+        self._scan_id: Optional[str] = None
+        self._interval_ms = 5.0
+        self._armed = False
+        self._active = False
+        self._lock = threading.Lock()
+        self.profiles: deque = deque(maxlen=keep)
+
+    def arm(self, count: int = 1, scan_id: Optional[str] = None, interval_ms: float = 5.0) -> Dict[str, Any]:
+        """Profile the next `count` scans, or only the scan with `scan_id`"""
+        with self._lock:
+            self._remaining = 0 if scan_id else max(1, count)
+            self._scan_id = scan_id
+            self._interval_ms = max(1.0, interval_ms)
+            self._armed = True
+        print(f"[Profiler] Armed: {f'scan_id={scan_id}' if scan_id else f'next {self._remaining} scans'}")
+        return self.status()
+
+    def disarm(self):
+        with self._lock:
+            self._armed = False
+            self._remaining = 0
+            self._scan_id = None
+
+    def claim(self, scan_id: str) -> Optional[ScanProfile]:
+        """A profile to run this scan under, or None (the common, free case)"""
+        if not self._armed:
+            return None
+        with self._lock:
+            if not self._armed:
+                return None
+            if self._scan_id is not None:
+                if scan_id != self._scan_id:
+                    return None
+                self._armed = False
+            else:
+                self._remaining -= 1
+                self._armed = self._remaining > 0
+        profile = ScanProfile(scan_id, self._interval_ms)
+        print(f"[Profiler] Profiling scan {scan_id} as {profile.profile_id}")
+        return profile
+
+    def wrap(self, profile: Optional[ScanProfile], events: Iterator) -> Iterator:
+        """Events under `profile` if there is one; the finished profile is kept for retrieval"""
+        if profile is None:
+            return events
+        return self._run(profile, events)
+
+    def _run(self, profile: ScanProfile, events: Iterator) -> Iterator:
+        with self._lock:
+            busy, self._active = self._active, True
+        if busy:
+            print(f"[Profiler] Another scan is being profiled, running {profile.scan_id} unprofiled")
+            yield from events
+            return
+        try:
+            yield from profile.wrap(events)
+        finally:
+            with self._lock:
+                self._active = False
+            self.profiles.append(profile)
+            print(f"[Profiler] Captured {profile.profile_id}: {profile.samples} samples, "
+                  f"{profile.duration_ms:.0f} ms")
+
+    def get(self, profile_id: str) -> Optional[ScanProfile]:
+        for profile in self.profiles:
+            if profile.profile_id == profile_id:
+                return profile
+        return None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "armed": self._armed,
+            "remaining": self._remaining,
+            "scan_id": self._scan_id,
+            "interval_ms": self._interval_ms,
+            "profiles": [
+                {"profile_id": p.profile_id, "scan_id": p.scan_id, "started_at": p.started_at,
+                 "duration_ms": round(p.duration_ms, 1), "samples": p.samples}
+                for p in reversed(self.profiles)
+            ],
+        }
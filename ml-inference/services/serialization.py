@@ -0,0 +1,58 @@
+"""
+Fast JSON Serialization
+ORJSON-based encoding with native NumPy scalar/array support for analysis results
+"""
+
+import json
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+# Try to import orjson, but fall back to the stdlib encoder if unavailable
+ORJSON_AVAILABLE = False
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except Exception:
+    pass
+
+
+def _numpy_default(obj: Any) -> Any:
+    """Encode values the fast path can't handle natively (non-contiguous arrays, np.str_, ...)"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize an analysis result to UTF-8 JSON bytes in a single pass.
+
+    NumPy scalars and arrays are encoded directly, so results don't need a
+    separate conversion walk before they are returned.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_numpy_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, default=_numpy_default, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    """Deserialize JSON bytes/str produced by dumps()"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with dumps().
+
+    Returning this directly from an endpoint skips FastAPI's jsonable_encoder
+    walk as well, so the result is only traversed once by the encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,363 @@
+"""
+Shade Index
+Nearest foundation/concealer shades across brand catalogs by CIEDE2000, through a quantized-Lab candidate LUT
+"""
+
+import functools
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+UNDERTONES = ("warm", "cool", "neutral")
+
+# Shade undertones a user's undertone is matched against (neutral shades suit everyone)
+COMPATIBLE_UNDERTONES = {
+    "warm": ("warm", "neutral"),
+    "cool": ("cool", "neutral"),
+    "neutral": ("warm", "cool", "neutral"),
+}
+
+# Quantized-Lab LUT: a query's cell maps to the candidate shades of each undertone
+# group, ranked at the cell centre. Candidates are every shade within LUT_SLACK of the
+# LUT_MAX_K-th best at the centre (capped at LUT_MAX_CANDIDATES); the slack covers how
+# far ΔE2000 moves across a LUT_CELL-wide cell for skin colours, so the exact re-rank at
+# the query itself finds the same top-k as a full scan.
+LUT_CELL = 2.0
+LUT_MAX_K = 10
+LUT_SLACK = 4.0
+LUT_MAX_CANDIDATES = 48
+# Cells cached per partition before the cache is reset
+LUT_MAX_CELLS = 50000
+# Partitions this small are scanned directly; the LUT wouldn't save anything
+LUT_MIN_SHADES = 64
+
+BRAND_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,128}$")
+HEX_PATTERN = re.compile(r"^#?([0-9a-fA-F]{6})$")
+
+# sRGB (D65) -> XYZ, and the D65 white point
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def srgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """CIELAB (D65) of 8-bit sRGB colours, shape (..., 3) -> (..., 3) float64"""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+
+@functools.lru_cache(maxsize=65536)
+def _hex_lab(value: str) -> Tuple[float, float, float]:
+    return tuple(srgb_to_lab([int(value[i:i + 2], 16) for i in (0, 2, 4)]).tolist())
+
+
+def hex_to_lab(hex_color: str) -> np.ndarray:
+    """CIELAB of a "#rrggbb" colour"""
+    match = HEX_PATTERN.match(str(hex_color).strip())
+    if not match:
+        raise ValueError(f"Invalid hex colour: {hex_color!r}")
+    return np.array(_hex_lab(match.group(1).lower()))
+
+
+def delta_e_2000(lab: np.ndarray, labs: np.ndarray) -> np.ndarray:
+    """
+    CIEDE2000 colour difference between one Lab colour and each row of `labs`.
+
+    Args:
+        lab: (3,) or (m, 1, 3) reference colour(s)
+        labs: (n, 3) colours
+
+    Returns:
+        Differences, shape (n,) (or (m, n) for m references)
+    """
+    lab = np.asarray(lab, dtype=np.float64)
+    L1, a1, b1 = lab[..., 0], lab[..., 1], lab[..., 2]
+    L2, a2, b2 = labs[:, 0], labs[:, 1], labs[:, 2]
+
+    c_mean7 = ((np.hypot(a1, b1) + np.hypot(a2, b2)) * 0.5) ** 7
+    g = 1.5 - 0.5 * np.sqrt(c_mean7 / (c_mean7 + 25.0 ** 7))  # 1 + G
+    a1p, a2p = g * a1, g * a2
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    # Hue angles in degrees, [0, 360)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    chroma_product = c1p * c2p
+    achromatic = chroma_product == 0
+    dh = h2p - h1p
+    far = np.abs(dh) > 180
+    dh = np.where(far, dh - np.copysign(360.0, dh), dh)
+    dH = np.where(achromatic, 0.0, 2 * np.sqrt(chroma_product) * np.sin(np.radians(dh * 0.5)))
+
+    h_sum = h1p + h2p
+    h_mean = np.where(achromatic, h_sum, np.where(far, (h_sum * 0.5 + 180) % 360, h_sum * 0.5))
+    h_rad = np.radians(h_mean)
+    t = (1 - 0.17 * np.cos(h_rad - np.radians(30)) + 0.24 * np.cos(2 * h_rad)
+         + 0.32 * np.cos(3 * h_rad + np.radians(6)) - 0.20 * np.cos(4 * h_rad - np.radians(63)))
+    c_mean = (c1p + c2p) * 0.5
+    c_mean7 = c_mean ** 7
+    r_t = -2 * np.sqrt(c_mean7 / (c_mean7 + 25.0 ** 7)) * np.sin(np.radians(60) * np.exp(-((h_mean - 275) / 25) ** 2))
+    l_offset = ((L1 + L2) * 0.5 - 50) ** 2
+    s_l = 1 + 0.015 * l_offset / np.sqrt(20 + l_offset)
+
+    l_term = (L2 - L1) / s_l
+    c_term = (c2p - c1p) / (1 + 0.045 * c_mean)
+    h_term = dH / (1 + 0.015 * c_mean * t)
+    return np.sqrt(np.maximum(l_term ** 2 + c_term ** 2 + h_term ** 2 + r_t * c_term * h_term, 0.0))
+
+
+class ShadePartition:
+    """
+    Shades of one brand (or of all brands) with a lazily filled candidate LUT.
+
+    The LUT maps a quantized-Lab cell to, per undertone group, the shades
+    that can be among the LUT_MAX_K nearest to any colour in the cell. Cells
+    are filled on first use, so only the skin colours actually queried cost
+    anything; a query then re-ranks a few dozen candidates instead of the
+    whole catalog.
+    """
+
+    def __init__(self, shades: List[Dict[str, Any]]):
+        self.shades = shades
+        self.labs = np.array([s["lab"] for s in shades], dtype=np.float64).reshape(-1, 3)
+        self.groups = {
+            undertone: np.array([i for i, s in enumerate(shades) if s["undertone"] == undertone], dtype=np.int64)
+            for undertone in UNDERTONES
+        }
+        brand_names = sorted({s["brand"] for s in shades})
+        self.brand_codes = np.array([brand_names.index(s["brand"]) for s in shades], dtype=np.int64)
+        self.brand_names = brand_names
+        self.use_lut = len(shades) > LUT_MIN_SHADES
+        self.lut: Dict[Tuple[int, int, int], Dict[str, np.ndarray]] = {}
+        self._lut_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.shades)
+
+    def _cell_candidates(self, cell: Tuple[int, int, int]) -> Dict[str, np.ndarray]:
+        candidates = self.lut.get(cell)
+        if candidates is not None:
+            return candidates
+        center = (np.array(cell, dtype=np.float64) + 0.5) * LUT_CELL
+        candidates = {}
+        for undertone, rows in self.groups.items():
+            if len(rows) <= LUT_MAX_K:
+                candidates[undertone] = rows
+                continue
+            distances = delta_e_2000(center, self.labs[rows])
+            kth = np.partition(distances, LUT_MAX_K - 1)[LUT_MAX_K - 1]
+            near = np.flatnonzero(distances <= kth + LUT_SLACK)
+            if len(near) > LUT_MAX_CANDIDATES:
+                near = near[np.argsort(distances[near], kind="stable")[:LUT_MAX_CANDIDATES]]
+            candidates[undertone] = rows[near]
+        with self._lut_lock:
+            if len(self.lut) >= LUT_MAX_CELLS:
+                self.lut.clear()
+            self.lut[cell] = candidates
+        return candidates
+
+    def nearest(self, lab: np.ndarray, k: int, undertones: Iterable[str]) -> List[Tuple[int, float]]:
+        """(shade row, ΔE2000) of the k nearest shades among the given undertone groups, nearest first"""
+        undertones = list(undertones)
+        if self.use_lut and k <= LUT_MAX_K:
+            cell = tuple(int(v) for v in np.floor(lab / LUT_CELL))
+            candidates = self._cell_candidates(cell)
+            rows = np.concatenate([candidates[u] for u in undertones])
+        else:
+            rows = np.concatenate([self.groups[u] for u in undertones])
+        if len(rows) == 0:
+            return []
+        distances = delta_e_2000(lab, self.labs[rows])
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(int(rows[i]), float(distances[i])) for i in order]
+
+    def nearest_per_brand(self, lab: np.ndarray, k: int, undertones: Iterable[str],
+                          brands: Optional[Iterable[str]] = None) -> List[Tuple[int, float]]:
+        """(shade row, ΔE2000) of the k nearest shades of each brand, in one pass over the partition"""
+        rows = np.sort(np.concatenate([self.groups[u] for u in undertones]))
+        if brands is not None:
+            codes = [self.brand_names.index(b) for b in set(brands) if b in self.brand_names]
+            rows = rows[np.isin(self.brand_codes[rows], codes)]
+        if len(rows) == 0:
+            return []
+        distances = delta_e_2000(lab, self.labs[rows])
+        brand_codes = self.brand_codes[rows]
+        order = np.lexsort((distances, brand_codes))
+        # Rank of each shade within its brand
+        sorted_codes = brand_codes[order]
+        starts = np.searchsorted(sorted_codes, sorted_codes, side="left")
+        keep = order[np.arange(len(order)) - starts < k]
+        return [(int(rows[i]), float(distances[i])) for i in keep]
+
+
+class ShadeIndex:
+    """
+    Shade catalogs of all brands, partitioned per brand plus one partition over everything.
+
+    Catalogs are bulk-loaded per brand and saved as <brand>.json in the index
+    directory; a VERSION file changes on every load, and each server worker
+    re-reads the catalogs when it sees a new version, so a load sent to one
+    worker reaches all of them.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        output_dir = os.getenv("OUTPUT_DIR", "./output")
+        self.directory = directory or os.getenv("SHADE_INDEX_DIR", os.path.join(output_dir, "shade_index"))
+        os.makedirs(self.directory, exist_ok=True)
+        self.brands: Dict[str, ShadePartition] = {}
+        self.all_shades = ShadePartition([])
+        self._version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def _version_path(self) -> str:
+        return os.path.join(self.directory, "VERSION")
+
+    def _brand_path(self, brand: str) -> str:
+        if not BRAND_PATTERN.match(brand):
+            raise ValueError("brand may only contain letters, digits, '_', '-' and '.'")
+        return os.path.join(self.directory, f"{brand}.json")
+
+    @staticmethod
+    def _clean_shade(brand: str, shade: Dict[str, Any]) -> Dict[str, Any]:
+        """Catalog entry with its Lab colour resolved (from `lab`, else `hex`)"""
+        shade_id = shade.get("shade_id")
+        if shade_id in (None, ""):
+            raise ValueError(f"{brand}: every shade needs a shade_id")
+        if shade.get("lab") is not None:
+            lab = [float(v) for v in shade["lab"]]
+            if len(lab) != 3:
+                raise ValueError(f"{brand}/{shade_id}: lab must be [L, a, b]")
+        elif shade.get("hex"):
+            lab = hex_to_lab(shade["hex"]).tolist()
+        else:
+            raise ValueError(f"{brand}/{shade_id}: a shade needs hex or lab")
+        undertone = str(shade.get("undertone") or "neutral").lower()
+        return {
+            "brand": brand,
+            "shade_id": str(shade_id),
+            "name": shade.get("name"),
+            "hex": shade.get("hex"),
+            "undertone": undertone if undertone in UNDERTONES else "neutral",
+            "lab": [round(v, 4) for v in lab],
+        }
+
+    def _sync(self):
+        """Re-read the catalogs if another worker loaded some (call with _lock held)"""
+        try:
+            stat = os.stat(self._version_path)
+        except FileNotFoundError:
+            return
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._version:
+            return
+        brands = {}
+        for entry in sorted(os.scandir(self.directory), key=lambda e: e.name):
+            if entry.name.endswith(".json"):
+                with open(entry.path) as f:
+                    brands[entry.name[:-len(".json")]] = ShadePartition(json.load(f))
+        self.brands = brands
+        self.all_shades = ShadePartition([s for p in brands.values() for s in p.shades])
+        self._version = version
+
+    def _bump_version(self):
+        tmp = f"{self._version_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp, self._version_path)
+
+    def load(self, catalogs: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Bulk-load shade catalogs, replacing each given brand's shades.
+
+        Args:
+            catalogs: brand -> shades ({shade_id, name, hex or lab, undertone})
+
+        Returns:
+            {"brands": {brand: shades loaded}, "total_shades"}
+        """
+        cleaned = {brand: [self._clean_shade(brand, s) for s in shades] for brand, shades in catalogs.items()}
+        with self._lock:
+            for brand, shades in cleaned.items():
+                path = self._brand_path(brand)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(shades, f)
+                os.replace(tmp, path)
+            self._bump_version()
+            self._sync()
+            total = len(self.all_shades)
+        print(f"[ShadeIndex] Loaded {sum(len(s) for s in cleaned.values())} shades of {len(cleaned)} brands, "
+              f"{total} in the index")
+        return {"brands": {brand: len(shades) for brand, shades in cleaned.items()}, "total_shades": total}
+
+    def remove_brand(self, brand: str) -> bool:
+        """Drop a brand's catalog"""
+        with self._lock:
+            try:
+                os.remove(self._brand_path(brand))
+            except FileNotFoundError:
+                return False
+            self._bump_version()
+            self._sync()
+        return True
+
+    def match(self, hex_color: Optional[str] = None, lab: Optional[Iterable[float]] = None,
+              undertone: Optional[str] = None, k: int = 5, brands: Optional[List[str]] = None,
+              per_brand: bool = False) -> List[Dict[str, Any]]:
+        """
+        Nearest shades to a skin colour by CIEDE2000.
+
+        Args:
+            hex_color: Skin colour as "#rrggbb" (e.g. skin_hex_color), or
+            lab: Skin colour in CIELAB
+            undertone: User undertone; only compatible shades are returned
+            k: Shades to return (per brand with per_brand)
+            brands: Restrict to these brands (default: all)
+            per_brand: k shades from each brand instead of k overall
+
+        Returns:
+            [{"brand", "shade_id", "name", "hex", "undertone", "delta_e"}], nearest first
+        """
+        query = np.asarray(lab, dtype=np.float64) if lab is not None else hex_to_lab(hex_color)
+        undertone = (undertone or "").lower()
+        allowed = COMPATIBLE_UNDERTONES.get(undertone, UNDERTONES)
+        with self._lock:
+            self._sync()
+            all_shades = self.all_shades
+            partitions = [self.brands[b] for b in (brands or []) if b in self.brands]
+
+        if per_brand:
+            nearest = all_shades.nearest_per_brand(query, k, allowed, brands)
+            matches = [(all_shades.shades[row], distance) for row, distance in nearest]
+        elif brands is None:
+            matches = [(all_shades.shades[row], distance) for row, distance in all_shades.nearest(query, k, allowed)]
+        else:
+            matches = [(p.shades[row], distance) for p in partitions for row, distance in p.nearest(query, k, allowed)]
+            matches = sorted(matches, key=lambda m: m[1])[:k]
+        return [
+            {"brand": s["brand"], "shade_id": s["shade_id"], "name": s["name"], "hex": s["hex"],
+             "undertone": s["undertone"], "delta_e": round(distance, 2)}
+            for s, distance in matches
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Shades per brand and LUT cells filled"""
+        with self._lock:
+            self._sync()
+            return {
+                "brands": {brand: len(p) for brand, p in self.brands.items()},
+                "total_shades": len(self.all_shades),
+                "lut_cells": len(self.all_shades.lut),
+            }
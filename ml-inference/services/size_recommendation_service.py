@@ -3,10 +3,33 @@ Size Recommendation Service
 AI-powered size recommendations based on body measurements
 """
 
+import math
 import numpy as np
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 import json
 
+# Measurements each chart category scores on, with their weights in the combined score
+CATEGORY_WEIGHTS = {
+    "tops": {"chest": 0.6, "waist": 0.4},
+    "bottoms": {"waist": 0.5, "hips": 0.5},
+}
+
+# Used when a shopper hasn't provided a measurement
+DEFAULT_MEASUREMENTS = {"chest_cm": 95, "waist_cm": 80, "hips_cm": 95, "height_cm": 170}
+
+# _measurement_score steps: (cm outside the size range, score), narrowest first
+SCORE_STEPS = ((0.0, 1.0), (2.5, 0.9), (5.0, 0.7), (10.0, 0.4))
+FAR_SCORE = 0.1
+
+# Lookup grid compiled per chart: measurements GRID_MIN_CM..GRID_MAX_CM in GRID_STEP_CM steps.
+# Each step has two cells, the grid point itself and the open interval after it; with
+# every band edge on a grid point the scores are constant within a cell, so the table
+# is exact. Measurements outside the grid (or charts with off-grid edges) are computed.
+GRID_MIN_CM = 40.0
+GRID_MAX_CM = 180.0
+GRID_STEP_CM = 0.5
+GRID_CELLS = 2 * int((GRID_MAX_CM - GRID_MIN_CM) / GRID_STEP_CM) + 1
+
 class SizeRecommendationService:
     def __init__(self):
         """Initialize size recommendation service"""
@@ -33,6 +56,184 @@ class SizeRecommendationService:
                 "XXL": {"waist": (94, 102), "hips": (114, 122)}
             }
         }
+        self.compiled_charts = self._compile_charts()
+
+    def _compile_charts(self) -> Dict[str, Dict]:
+        """
+        Size charts as arrays for vectorized scoring.
+
+        Per category: size names in chart order; for each scored measurement
+        its weight plus the per-size range centre and half width (computed
+        exactly as _measurement_score does); and the lookup table over the
+        measurement grid, or None when the chart can't be tabulated exactly.
+        """
+        compiled = {}
+        for category, chart in self.size_charts.items():
+            sizes = list(chart.keys())
+            fields = []
+            for field, weight in CATEGORY_WEIGHTS.get(category, {}).items():
+                ranges = np.array([chart[size][field] for size in sizes], dtype=np.float64)
+                fields.append({
+                    "name": field,
+                    "weight": weight,
+                    "mid": (ranges[:, 0] + ranges[:, 1]) / 2,
+                    "half_width": (ranges[:, 1] - ranges[:, 0]) / 2,
+                })
+            compiled[category] = {"sizes": sizes, "fields": fields}
+            compiled[category]["lut"] = self._compile_lut(compiled[category], category)
+        return compiled
+
+    def _compile_lut(self, compiled: Dict, category: str) -> Optional[Dict]:
+        """
+        Dense lookup table of a compiled chart over the measurement grid.
+
+        Every cell of the (one axis per scored measurement) grid holds the id
+        of its normalized score vector (uint8 unless a chart has more than 256
+        distinct vectors); ids index `scores`, the exact float64 rows (also
+        kept as size -> score dicts for single lookups).
+
+        Returns:
+            {"rows", "scores", "score_dicts"}, or None if the chart has
+            no scored measurements or a band edge off the grid
+        """
+        fields = compiled["fields"]
+        if not fields:
+            return None
+        for field in fields:
+            for margin, _ in SCORE_STEPS:
+                for edge in (field["mid"] - field["half_width"] - margin, field["mid"] + field["half_width"] + margin):
+                    if np.any(np.mod(edge, GRID_STEP_CM) != 0):
+                        print(f"[SizeRec] {category} chart has band edges off the {GRID_STEP_CM} cm grid, "
+                              f"scoring it without a lookup table")
+                        return None
+
+        # Representative measurement of each cell: the grid point, or the middle of the interval.
+        # A field's step scores per size only change at its band edges, so each axis has a few
+        # distinct step vectors; scores are computed once per combination of those and spread
+        # over the dense grid.
+        axis = GRID_MIN_CM + np.arange(GRID_CELLS) * (GRID_STEP_CM / 2)
+        axis_ids, representatives = [], []
+        for field in fields:
+            _, first, ids = np.unique(self._field_scores(field, axis), axis=0, return_index=True, return_inverse=True)
+            axis_ids.append(ids.ravel())
+            representatives.append(axis[first])
+        mesh = np.meshgrid(*representatives, indexing="ij")
+        values = {field["name"]: grid.ravel() for field, grid in zip(fields, mesh)}
+        table, combo_ids = np.unique(self._exact_score_matrix(compiled, values), axis=0, return_inverse=True)
+        dtype = np.uint8 if len(table) <= 256 else np.uint16
+        rows = combo_ids.reshape(mesh[0].shape).astype(dtype)[np.ix_(*axis_ids)]
+        rows.setflags(write=False)
+        return {
+            "rows": rows,
+            "scores": table,
+            "score_dicts": [dict(zip(compiled["sizes"], row)) for row in table.tolist()],
+        }
+
+    @staticmethod
+    def _grid_cell(value: float) -> Optional[int]:
+        """Lookup grid cell of one measurement, None outside the grid"""
+        if not GRID_MIN_CM <= value <= GRID_MAX_CM:
+            return None
+        steps = (value - GRID_MIN_CM) / GRID_STEP_CM
+        whole = math.floor(steps)
+        return 2 * whole + (steps != whole)
+
+    @staticmethod
+    def _grid_cells(values: np.ndarray) -> np.ndarray:
+        """Lookup grid cells of many measurements, -1 outside the grid"""
+        values = np.asarray(values, dtype=np.float64)
+        inside = (values >= GRID_MIN_CM) & (values <= GRID_MAX_CM)
+        steps = (np.where(inside, values, GRID_MIN_CM) - GRID_MIN_CM) / GRID_STEP_CM
+        whole = np.floor(steps)
+        cells = (2 * whole + (steps != whole)).astype(np.int64)
+        cells[~inside] = -1
+        return cells
+
+    def product_category(self, product_metadata: Optional[Dict] = None) -> str:
+        """Size chart category for a product (pants/jeans/shorts are bottoms; default tops)"""
+        category = "tops"  # Default
+        if product_metadata:
+            category = product_metadata.get("category", "tops").lower()
+            if "pant" in category or "jean" in category or "short" in category:
+                category = "bottoms"
+        return category
+
+    def score_matrix(
+        self,
+        category: str,
+        chest: np.ndarray,
+        waist: np.ndarray,
+        hips: np.ndarray
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Normalized size scores for many shoppers at once.
+
+        Row for row the same values as _calculate_size_scores: shoppers on the
+        lookup grid are one table gather, the rest are computed.
+
+        Args:
+            category: Chart category (as returned by product_category)
+            chest, waist, hips: Measurements in cm, one entry per shopper
+
+        Returns:
+            (size names, float64 array of shape (shoppers, sizes))
+        """
+        compiled = self._compiled_chart(category)
+        values = {"chest": chest, "waist": waist, "hips": hips}
+        lut = compiled["lut"]
+        if lut is None:
+            return compiled["sizes"], self._exact_score_matrix(compiled, values)
+
+        cells = [self._grid_cells(values[field["name"]]) for field in compiled["fields"]]
+        inside = np.logical_and.reduce([c >= 0 for c in cells])
+        scores = np.empty((len(cells[0]), len(compiled["sizes"])))
+        scores[inside] = lut["scores"][lut["rows"][tuple(c[inside] for c in cells)]]
+        if not inside.all():
+            outside = {name: np.asarray(v, dtype=np.float64)[~inside] for name, v in values.items()}
+            scores[~inside] = self._exact_score_matrix(compiled, outside)
+        return compiled["sizes"], scores
+
+    def _compiled_chart(self, category: str) -> Dict:
+        compiled = self.compiled_charts.get(category)
+        if compiled is None:
+            # Unknown categories use the tops sizes, but no measurement applies,
+            # so every size scores the same (as in _calculate_size_scores)
+            compiled = {"sizes": self.compiled_charts["tops"]["sizes"], "fields": [], "lut": None}
+        return compiled
+
+    @staticmethod
+    def _field_scores(field: Dict, measurements: np.ndarray) -> np.ndarray:
+        """_measurement_score of every measurement against every size's range, (measurements, sizes)"""
+        measurement = np.asarray(measurements, dtype=np.float64)[:, None]
+        distance = np.abs(measurement - field["mid"][None, :])
+        half_width = field["half_width"][None, :]
+        field_score = np.full(distance.shape, FAR_SCORE)
+        # Widest band first, so narrower bands overwrite it
+        for margin, step_score in reversed(SCORE_STEPS):
+            field_score[distance <= half_width + margin] = step_score
+        return field_score
+
+    def _exact_score_matrix(self, compiled: Dict, values: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Size scores of a compiled chart computed per measurement.
+
+        Step scores, weighted sum, 0.01 floor and normalization use the same
+        float64 operations in the same order as _exact_size_scores.
+        """
+        sizes = compiled["sizes"]
+        score = None
+        for field in compiled["fields"]:
+            weighted = self._field_scores(field, values[field["name"]]) * field["weight"]
+            score = weighted if score is None else score + weighted
+        if score is None:
+            score = np.ones((len(next(iter(values.values()))), len(sizes)))
+        score = np.maximum(score, 0.01)  # Minimum score of 0.01
+
+        # Summed column by column, left to right, like sum() over the dict
+        total = score[:, 0].copy()
+        for column in range(1, len(sizes)):
+            total += score[:, column]
+        return score / total[:, None]
 
     def is_ready(self) -> bool:
         """Check if service is ready"""
@@ -57,17 +258,13 @@ class SizeRecommendationService:
         """
         try:
             # Determine product category (tops or bottoms)
-            category = "tops"  # Default
-            if product_metadata:
-                category = product_metadata.get("category", "tops").lower()
-                if "pant" in category or "jean" in category or "short" in category:
-                    category = "bottoms"
+            category = self.product_category(product_metadata)
 
             # Get measurements
-            chest = measurements.get("chest_cm", 95)
-            waist = measurements.get("waist_cm", 80)
-            hips = measurements.get("hips_cm", 95)
-            height = measurements.get("height_cm", 170)
+            chest = measurements.get("chest_cm", DEFAULT_MEASUREMENTS["chest_cm"])
+            waist = measurements.get("waist_cm", DEFAULT_MEASUREMENTS["waist_cm"])
+            hips = measurements.get("hips_cm", DEFAULT_MEASUREMENTS["hips_cm"])
+            height = measurements.get("height_cm", DEFAULT_MEASUREMENTS["height_cm"])
 
             # Calculate size scores
             size_scores = self._calculate_size_scores(
@@ -110,6 +307,29 @@ class SizeRecommendationService:
         """
         Calculate probability scores for each size
 
+        Looked up in the chart's compiled table when the measurements are on
+        its grid, otherwise computed by _exact_size_scores
+        """
+        compiled = self.compiled_charts.get(category)
+        lut = compiled["lut"] if compiled else None
+        if lut is not None:
+            values = {"chest": chest, "waist": waist, "hips": hips}
+            cells = tuple(self._grid_cell(values[field["name"]]) for field in compiled["fields"])
+            if None not in cells:
+                return dict(lut["score_dicts"][lut["rows"][cells]])
+        return self._exact_size_scores(chest, waist, hips, height, category)
+
+    def _exact_size_scores(
+        self,
+        chest: float,
+        waist: float,
+        hips: float,
+        height: float,
+        category: str
+    ) -> Dict[str, float]:
+        """
+        Calculate probability scores for each size from the chart ranges
+
         Uses a Gaussian-like scoring function where measurements closer to
         the size chart range get higher scores
         """
@@ -0,0 +1,268 @@
+"""
+Batch Re-analysis
+Re-run face analysis over archived scans with a process pool, resumable JSONL output and a view cache
+
+    python tools/batch_reanalyze.py --input scans/ --output results.jsonl --cache-dir cache/
+
+Input is either a directory with one sub-directory of images per scan (the
+directory name is the scan_id; images are ordered front, left, right by file
+name, else alphabetically) or a JSONL manifest of
+{"scan_id": ..., "images": [paths relative to the manifest]} lines.
+
+Each output line is {"scan_id", "result", "cached", "ms"}. Lines are flushed
+as scans finish, and the output doubles as the checkpoint: a re-run skips
+scan_ids already in it (a torn last line from a crash is dropped), so an
+interrupted run resumes where it stopped. --retry-failed re-runs scans whose
+result failed and appends them again; the last line for a scan_id wins.
+
+With --cache-dir, each scan's normalized views (canonical face crop,
+landmarks and the geometry to map results back) are stored as <scan_id>.npz;
+later runs load them and skip decoding, detection and warping. Results are
+the same as /face-scan at the full quality tier.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+VIEW_ORDER = ("front", "left", "right")
+
+# Worker process state, set up once by _init_worker
+_service = None
+_features: Optional[List[str]] = None
+_cache_dir: Optional[str] = None
+
+
+def _view_rank(filename: str) -> Tuple[int, str]:
+    name = filename.lower()
+    for rank, view in enumerate(VIEW_ORDER):
+        if view in name:
+            return rank, name
+    return len(VIEW_ORDER), name
+
+
+def iter_directory_scans(root: str) -> Iterator[Tuple[str, List[str]]]:
+    """(scan_id, image paths) for each scan sub-directory, in name order"""
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        images = sorted((f for f in os.listdir(entry.path) if f.lower().endswith(IMAGE_EXTENSIONS)), key=_view_rank)
+        if images:
+            yield entry.name, [os.path.join(entry.path, f) for f in images]
+
+
+def iter_manifest_scans(path: str) -> Iterator[Tuple[str, List[str]]]:
+    """(scan_id, image paths) for each manifest line; relative paths are relative to the manifest"""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+                yield str(entry["scan_id"]), [os.path.join(base, p) for p in entry["images"]]
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"[Batch] Manifest line {line_no} skipped: {e}")
+
+
+def load_checkpoint(output: str, retry_failed: bool = False) -> Set[str]:
+    """
+    scan_ids already in the output file.
+
+    A last line without a newline (the process died mid-write) is cut off
+    so appending continues from a clean line. With retry_failed, scans whose
+    result was unsuccessful are not counted as done.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            print(f"[Batch] Dropping torn last line of {output}")
+            f.truncate(end)
+    for line in data[:end].splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if retry_failed and not (entry.get("result") or {}).get("success"):
+            continue
+        done.add(entry["scan_id"])
+    return done
+
+
+def _cache_path(scan_id: str) -> Optional[str]:
+    if _cache_dir is None:
+        return None
+    return os.path.join(_cache_dir, f"{scan_id.replace(os.sep, '_')}.npz")
+
+
+def _load_views(path: str):
+    import numpy as np
+    with np.load(path, allow_pickle=False) as data:
+        count = int(data["view_count"])
+        return [
+            _service.view_from_arrays({key[len(f"v{i}_"):]: data[key] for key in data.files if key.startswith(f"v{i}_")})
+            for i in range(count)
+        ]
+
+
+def _save_views(path: str, views):
+    import numpy as np
+    arrays = {"view_count": np.array(len(views))}
+    for i, view in enumerate(views):
+        arrays.update({f"v{i}_{key}": value for key, value in _service.view_to_arrays(view).items()})
+    # Write then rename, so an interrupted run never leaves a truncated cache entry
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def _init_worker(features: Optional[List[str]], cache_dir: Optional[str], verbose: bool):
+    global _service, _features, _cache_dir
+    if not verbose:
+        # The service logs every stage of every scan
+        sys.stdout = open(os.devnull, "w")
+    from services.face_scan_service import FaceScanService
+    _service = FaceScanService()
+    _service.warm_up()
+    _features = features
+    _cache_dir = cache_dir
+
+
+def _analyze_scan(scan_id: str, image_paths: List[str]) -> Dict[str, Any]:
+    """Analyze one scan in a worker process (from its cached views when there are any)"""
+    start = time.perf_counter()
+    cache_path = _cache_path(scan_id)
+    cached = False
+    try:
+        views = None
+        if cache_path is not None and os.path.exists(cache_path):
+            try:
+                views = _load_views(cache_path)
+                cached = True
+            except Exception as e:
+                print(f"[Batch] {scan_id}: unreadable cache entry, recomputing: {e}")
+        if views is None:
+            image_data = []
+            for path in image_paths:
+                with open(path, "rb") as f:
+                    image_data.append(f.read())
+            views = _service.normalize_views(image_data)
+            if cache_path is not None and views:
+                _save_views(cache_path, views)
+        result = _service.analyze_normalized_views(scan_id, views, _features)
+    except Exception as e:
+        result = _service._error_response(scan_id, str(e), time.perf_counter() - start)
+    return {"scan_id": scan_id, "result": result, "cached": cached,
+            "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def run(scans: Iterator[Tuple[str, List[str]]], output: str, workers: int, features: Optional[List[str]] = None,
+        cache_dir: Optional[str] = None, retry_failed: bool = False, limit: Optional[int] = None,
+        verbose: bool = False) -> Dict[str, Any]:
+    """
+    Analyze scans across a process pool, appending results to `output` as they finish.
+
+    At most 2 scans per worker are in flight, so the input is streamed, not
+    read up front.
+
+    Returns:
+        Run summary (scans done, skipped as already done, failed, cache hits, throughput)
+    """
+    from services.serialization import dumps
+
+    done = load_checkpoint(output, retry_failed)
+    if done:
+        print(f"[Batch] Resuming: {len(done)} scans already in {output}")
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Process parallelism replaces the service's own threads and worker processes
+    os.environ.setdefault("DETECTOR_THREADS", "1")
+    os.environ["FACE_SCAN_WORKER_PROCESSES"] = "0"
+
+    stats = {"done": 0, "skipped": 0, "failed": 0, "cached": 0}
+    started = time.time()
+    submitted = 0
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                               initializer=_init_worker, initargs=(features, cache_dir, verbose))
+    with pool, open(output, "ab") as out:
+        in_flight = set()
+
+        def drain(block_until: int):
+            nonlocal in_flight
+            while len(in_flight) > block_until:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    line = future.result()
+                    out.write(dumps(line) + b"\n")
+                    out.flush()
+                    stats["done"] += 1
+                    stats["cached"] += line["cached"]
+                    stats["failed"] += not line["result"].get("success")
+                    if stats["done"] % 50 == 0:
+                        rate = stats["done"] / max(time.time() - started, 1e-6)
+                        print(f"[Batch] {stats['done']} scans, {rate:.2f}/s, {stats['failed']} failed, "
+                              f"{stats['cached']} from cache")
+
+        for scan_id, image_paths in scans:
+            if scan_id in done:
+                stats["skipped"] += 1
+                continue
+            if limit is not None and submitted >= limit:
+                break
+            drain(workers * 2 - 1)
+            in_flight.add(pool.submit(_analyze_scan, scan_id, image_paths))
+            submitted += 1
+        drain(0)
+        os.fsync(out.fileno())
+
+    elapsed = time.time() - started
+    stats["seconds"] = round(elapsed, 1)
+    stats["scans_per_second"] = round(stats["done"] / elapsed, 2) if elapsed > 0 else 0.0
+    print(f"[Batch] Finished: {json.dumps(stats)}")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Re-run face analysis over archived scans")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Directory with one sub-directory of images per scan")
+    source.add_argument("--manifest", help='JSONL of {"scan_id": ..., "images": [...]}')
+    parser.add_argument("--output", required=True, help="JSONL results file (appended; also the checkpoint)")
+    parser.add_argument("--workers", type=int, default=len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+                        else (os.cpu_count() or 1), help="Worker processes (default: available CPUs)")
+    parser.add_argument("--features", help="Comma-separated features or profiles (default: everything)")
+    parser.add_argument("--cache-dir", help="Cache normalized views here as <scan_id>.npz")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-run scans whose stored result failed")
+    parser.add_argument("--limit", type=int, help="Stop after this many new scans")
+    parser.add_argument("--verbose", action="store_true", help="Show the service's per-scan logs")
+    args = parser.parse_args(argv)
+
+    features = [f.strip() for f in args.features.split(",") if f.strip()] if args.features else None
+    if features:
+        from services.face_scan_service import FaceScanService
+        try:
+            FaceScanService().resolve_features(features)
+        except ValueError as e:
+            parser.error(str(e))
+    scans = iter_directory_scans(args.input) if args.input else iter_manifest_scans(args.manifest)
+    stats = run(scans, args.output, max(1, args.workers), features, args.cache_dir, args.retry_failed,
+                args.limit, args.verbose)
+    return 0 if stats["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,775 @@
+"""
+Detector Equivalence Harness
+Run frozen reference detectors and the current ones side by side over a checked-in image corpus
+
+    python tools/detector_equivalence.py                        # compare, print a summary
+    python tools/detector_equivalence.py --report report.json   # also write every delta
+    python tools/detector_equivalence.py --generate             # rebuild the corpus
+
+The reference is tools/detector_reference.py (frozen copies of
+_normalize_lighting, _detect_acne, _detect_wrinkles, _analyze_texture,
+_analyze_redness and _detect_pigmentation); the candidate is the live
+FaceScanService, or any subclass given with --candidate module:Class.
+
+Each corpus image is warped into the canonical crop and masked once, then:
+- lighting: both _normalize_lighting outputs are compared pixel by pixel
+- regions: the candidate's per-view region masks (template warp) are compared
+  with the regions rasterized on the view's own landmarks, by IoU per region
+- acne, wrinkles, texture, redness, pigmentation: both detectors run on the
+  reference-normalized view (same derived inputs), so a detector is judged
+  on its own and not on lighting changes upstream
+
+Result fields are compared by path (wrinkle_regions.forehead.bbox[0]):
+numbers pass when |cand - ref| <= abs + rel * |ref|, anything else must be
+equal. List-of-location fields (*_locations, redness_regions) are matched
+as sets: points (or bbox centres) of the same type within --location-tol
+of each other pair up, and paired entries compare their other attributes
+like fields. Exits with 1 when anything is out of tolerance.
+
+The corpus (tools/equivalence_corpus) is synthetic: faces rendered from a
+face mesh template with seeded skin tones, lighting gradients, pores, dark
+spots, pimples, blackheads, red patches and wrinkles. Most images carry
+mesh landmarks, every fourth only a Haar-style bbox. Seeds from YAWED_SEEDS_FROM
+on are turned heads (the left/right views of a scan), with realistic face depth.
+--generate rewrites it deterministically from the seeds.
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+
+DEFAULT_CORPUS = os.path.join(TOOLS_DIR, "equivalence_corpus")
+MESH_TEMPLATE = "face_mesh.json"
+MANIFEST = "manifest.json"
+
+# Registered detectors compared on each view, plus "lighting" for _normalize_lighting
+DETECTORS = ("acne", "wrinkles", "texture", "redness", "pigmentation")
+TARGETS = ("lighting", "regions") + DETECTORS
+
+# Result fields holding lists of located findings
+LOCATION_FIELDS = ("acne_locations", "dark_spots_locations", "enlarged_pores_locations", "redness_regions")
+
+# Landmark with the attributes the service reads (x, y normalized to the image)
+MeshPoint = namedtuple("MeshPoint", ["x", "y", "z"])
+
+# Worker process state, set up once by _init_worker
+_reference = None
+_candidate = None
+
+
+# ----------------------------------------------------------------------------
+# Corpus generation
+# ----------------------------------------------------------------------------
+
+# Face mesh indices used for drawing (MediaPipe topology)
+FACE_OVAL = [10, 338, 297, 332, 284, 251, 389, 356, 454, 323, 361, 288, 397, 365, 379, 378, 400, 377,
+             152, 148, 176, 149, 150, 136, 172, 58, 132, 93, 234, 127, 162, 21, 54, 103, 67, 109]
+LEFT_EYE = [33, 7, 163, 144, 145, 153, 154, 155, 133, 173, 157, 158, 159, 160, 161, 246]
+RIGHT_EYE = [362, 382, 381, 380, 374, 373, 390, 249, 263, 466, 388, 387, 386, 385, 384, 398]
+LEFT_BROW = [70, 63, 105, 66, 107]
+RIGHT_BROW = [336, 296, 334, 293, 300]
+OUTER_LIPS = [61, 146, 91, 181, 84, 17, 314, 405, 321, 375, 291, 409, 270, 269, 267, 0, 37, 39, 40, 185]
+INNER_LIPS = [78, 95, 88, 178, 87, 14, 317, 402, 318, 324, 308, 415, 310, 311, 312, 13, 82, 81, 80, 191]
+NOSTRILS = (98, 327)
+CHEEKS = ([116, 117, 118, 119, 100, 126, 209, 49, 129, 203, 205, 206, 207, 216, 212, 202, 204, 194, 32, 140, 171],
+          [345, 346, 347, 348, 329, 355, 429, 279, 358, 423, 425, 426, 427, 436, 432, 422, 424, 418, 262, 369, 396])
+FOREHEAD = [10, 338, 297, 332, 284, 251, 21, 54, 103, 67, 109, 108, 69, 104, 68, 71, 70, 63, 105, 66, 107, 9,
+            336, 296, 334, 293, 301, 298, 333, 299, 337, 151]
+
+# BGR skin tones from light to deep
+SKIN_TONES = [(196, 214, 241), (170, 196, 232), (140, 175, 215), (110, 150, 198), (80, 118, 165), (55, 82, 120)]
+IMAGE_SIZES = [(480, 600), (640, 480), (720, 960)]
+
+# Seeds from here on are rendered with a turned head (yaw in degrees, cycling
+# through YAWS) and the mesh depth scaled by YAWED_DEPTH: the template's own
+# z is about a quarter of a real face's front-to-ear depth
+YAWED_SEEDS_FROM = 24
+YAWS = (15, -15, 30, -30, 45, -45)
+YAWED_DEPTH = 4.0
+
+
+def load_mesh(corpus: str) -> np.ndarray:
+    """(478, 3) face mesh template: x/y centred on the face, face width 1"""
+    with open(os.path.join(corpus, MESH_TEMPLATE)) as f:
+        return np.array(json.load(f), dtype=np.float64)
+
+
+def pose_mesh(mesh: np.ndarray, placement: Dict[str, float]) -> np.ndarray:
+    """Mesh turned by the placement's yaw (degrees, about the vertical axis), z scaled by its depth"""
+    yaw = math.radians(placement.get("yaw", 0.0))
+    x, y, z = mesh[:, 0], mesh[:, 1], mesh[:, 2] * placement.get("depth", 1.0)
+    if not yaw:
+        return np.stack([x, y, z], axis=1)
+    return np.stack([x * math.cos(yaw) + z * math.sin(yaw), y,
+                     z * math.cos(yaw) - x * math.sin(yaw)], axis=1)
+
+
+def place_mesh(mesh: np.ndarray, placement: Dict[str, float], size: Tuple[int, int]) -> np.ndarray:
+    """
+    Mesh points in pixels for a placement {"cx", "cy", "width", "angle", optional "yaw", "depth"}
+    in an image of size (w, h)
+    """
+    w, h = size
+    angle = math.radians(placement["angle"])
+    rot = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+    xy = pose_mesh(mesh, placement)[:, :2] @ rot.T * placement["width"] * w
+    return xy + [placement["cx"] * w, placement["cy"] * h]
+
+
+def face_data_for(entry: Dict[str, Any], mesh: np.ndarray) -> Dict:
+    """Face detection data of a manifest entry, as _detect_face() would return it"""
+    w, h = entry["size"]
+    if entry["face"] == "bbox":
+        return {"type": "bbox", "data": tuple(entry["bbox"])}
+    xy = place_mesh(mesh, entry["placement"], (w, h))
+    z = pose_mesh(mesh, entry["placement"])[:, 2]
+    return {"type": "landmarks",
+            "data": [MeshPoint(x / w, y / h, z) for (x, y), z in zip(xy, z)]}
+
+
+def _random_points(rng: np.random.Generator, polygon: np.ndarray, count: int) -> List[Tuple[int, int]]:
+    """Up to `count` random pixel positions inside the convex hull of a polygon"""
+    hull = cv2.convexHull(polygon.astype(np.float32))
+    x0, y0 = polygon.min(axis=0)
+    x1, y1 = polygon.max(axis=0)
+    points = []
+    for _ in range(count * 20):
+        if len(points) >= count:
+            break
+        x, y = rng.uniform(x0, x1), rng.uniform(y0, y1)
+        if cv2.pointPolygonTest(hull, (float(x), float(y)), False) > 0:
+            points.append((int(x), int(y)))
+    return points
+
+
+def _blend_blob(img: np.ndarray, center: Tuple[int, int], radius: float, color, strength: float):
+    """Blend a soft round blob of `color` into img (strength 0-1 at the centre)"""
+    h, w = img.shape[:2]
+    r = int(math.ceil(radius * 2))
+    x, y = center
+    x0, x1, y0, y1 = max(0, x - r), min(w, x + r + 1), max(0, y - r), min(h, y + r + 1)
+    if x0 >= x1 or y0 >= y1:
+        return
+    yy, xx = np.mgrid[y0:y1, x0:x1]
+    alpha = strength * np.exp(-((xx - x) ** 2 + (yy - y) ** 2) / (2 * (radius / 1.5) ** 2))
+    patch = img[y0:y1, x0:x1].astype(np.float32)
+    img[y0:y1, x0:x1] = np.clip(patch * (1 - alpha[..., None]) + np.float32(color) * alpha[..., None], 0, 255)
+
+
+def _draw_line(img: np.ndarray, points: np.ndarray, darkness: float, width: int):
+    """Darken img along a polyline (a wrinkle), softened by a small blur"""
+    layer = np.zeros(img.shape[:2], dtype=np.uint8)
+    cv2.polylines(layer, [points.astype(np.int32)], False, 255, width, cv2.LINE_AA)
+    alpha = cv2.GaussianBlur(layer, (3, 3), 0).astype(np.float32) / 255 * darkness
+    img[:] = np.clip(img.astype(np.float32) * (1 - alpha[..., None]), 0, 255)
+
+
+def render_face(seed: int, mesh: np.ndarray) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Render one synthetic face and its manifest entry from a seed.
+
+    Returns:
+        (BGR image, entry with size, placement, face data kind and traits)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = IMAGE_SIZES[seed % len(IMAGE_SIZES)]
+    placement = {
+        "cx": round(float(rng.uniform(0.44, 0.56)), 4),
+        "cy": round(float(rng.uniform(0.45, 0.55)), 4),
+        "width": round(float(rng.uniform(0.4, 0.6)) * min(1.0, h / w / 1.2), 4),
+        "angle": round(float(rng.uniform(-8, 8)), 2),
+    }
+    if seed >= YAWED_SEEDS_FROM:
+        # Not drawn from rng, so the frontal seeds render exactly as before
+        placement.update(yaw=YAWS[(seed - YAWED_SEEDS_FROM) % len(YAWS)], depth=YAWED_DEPTH)
+    xy = place_mesh(mesh, placement, (w, h))
+    tone = np.array(SKIN_TONES[int(rng.integers(len(SKIN_TONES)))], dtype=np.float32)
+    tone = np.clip(tone * rng.uniform(0.92, 1.08, 3), 0, 255)
+    traits = {
+        "tone": [int(v) for v in tone],
+        "lighting": round(float(rng.uniform(0.0, 0.35)), 3),
+        "noise": round(float(rng.uniform(2.0, 7.0)), 2),
+        "pores": int(rng.integers(0, 120)),
+        "dark_spots": int(rng.integers(0, 14)),
+        "pimples": int(rng.integers(0, 8)),
+        "blackheads": int(rng.integers(0, 20)),
+        "red_patches": int(rng.choice([0, 0, 1, 2, 4])),
+        "wrinkles": round(float(rng.uniform(0.0, 1.0)), 3),
+        # Every sixth face is severe: flushed cheeks and deep lines, for the strict redness/wrinkle paths
+        "flush": round(float(rng.uniform(0.6, 0.95)), 3) if seed % 6 == 5 else 0.0,
+        "blur": round(float(rng.choice([0.0, 0.0, 0.8, 1.6])), 2),
+    }
+
+    # Background and skin
+    background = rng.uniform(40, 220, 3).astype(np.float32)
+    img = np.empty((h, w, 3), dtype=np.float32)
+    img[:] = background
+    face = np.zeros((h, w), dtype=np.uint8)
+    cv2.fillPoly(face, [cv2.convexHull(xy[FACE_OVAL].astype(np.int32))], 255)
+    img[face > 0] = tone
+
+    # Pores/roughness: blurred noise over the face
+    noise = cv2.GaussianBlur(rng.normal(0, traits["noise"], (h, w)).astype(np.float32), (0, 0), 0.8)
+    img += noise[..., None] * (face[..., None] > 0)
+
+    # Eyes, brows, lips, nostrils
+    for eye in (LEFT_EYE, RIGHT_EYE):
+        pts = xy[eye].astype(np.int32)
+        cv2.fillPoly(img, [pts], (225, 228, 232))
+        center = xy[eye].mean(axis=0)
+        radius = max(2, int(np.ptp(xy[eye][:, 1]) * 0.45))
+        cv2.circle(img, (int(center[0]), int(center[1])), radius, tuple(float(c) for c in rng.uniform(20, 90, 3)), -1)
+    brow_color = tuple(float(c) for c in tone * rng.uniform(0.2, 0.45))
+    brow_width = max(2, int(placement["width"] * w * 0.025))
+    for brow in (LEFT_BROW, RIGHT_BROW):
+        cv2.polylines(img, [xy[brow].astype(np.int32)], False, brow_color, brow_width, cv2.LINE_AA)
+    cv2.fillPoly(img, [xy[OUTER_LIPS].astype(np.int32)], tuple(float(c) for c in tone * [0.65, 0.55, 0.9]))
+    cv2.fillPoly(img, [xy[INNER_LIPS].astype(np.int32)], tuple(float(c) for c in tone * 0.3))
+    for nostril in NOSTRILS:
+        cv2.circle(img, tuple(int(v) for v in xy[nostril]), max(2, int(placement["width"] * w * 0.012)),
+                   tuple(float(c) for c in tone * 0.45), -1)
+
+    scale = placement["width"] * w / 300.0  # blemish sizes relative to a 300 px wide face
+    forehead = xy[FOREHEAD]
+    cheeks = [xy[cheek] for cheek in CHEEKS]
+    skin_areas = [forehead] + cheeks
+
+    for _ in range(traits["pores"]):
+        for point in _random_points(rng, skin_areas[int(rng.integers(3))], 1):
+            _blend_blob(img, point, 0.9 * scale, tone * 0.7, float(rng.uniform(0.2, 0.5)))
+    for _ in range(traits["dark_spots"]):
+        for point in _random_points(rng, skin_areas[int(rng.integers(3))], 1):
+            _blend_blob(img, point, float(rng.uniform(2, 6)) * scale, tone * [0.55, 0.6, 0.7],
+                        float(rng.uniform(0.4, 0.9)))
+    for _ in range(traits["pimples"]):
+        for point in _random_points(rng, cheeks[int(rng.integers(2))], 1):
+            radius = float(rng.uniform(3, 7)) * scale
+            _blend_blob(img, point, radius, (70, 80, 205), float(rng.uniform(0.5, 0.9)))
+            _blend_blob(img, point, radius * 0.35, (215, 225, 245), float(rng.uniform(0.2, 0.6)))
+    for _ in range(traits["blackheads"]):
+        for point in _random_points(rng, xy[[4, 45, 275, 1, 5, 48, 278]], 1) or \
+                _random_points(rng, cheeks[int(rng.integers(2))], 1):
+            _blend_blob(img, point, float(rng.uniform(0.8, 1.8)) * scale, (35, 35, 40), float(rng.uniform(0.6, 1.0)))
+    for _ in range(traits["red_patches"]):
+        for point in _random_points(rng, cheeks[int(rng.integers(2))], 1):
+            _blend_blob(img, point, float(rng.uniform(20, 55)) * scale, (60, 60, 215), float(rng.uniform(0.3, 0.8)))
+
+    if traits["flush"]:
+        flush = np.zeros((h, w), dtype=np.uint8)
+        for cheek in cheeks:
+            cv2.fillPoly(flush, [cv2.convexHull(cheek.astype(np.int32))], 255)
+        cv2.fillPoly(flush, [cv2.convexHull(xy[[4, 45, 275, 1, 5, 48, 278, 98, 327]].astype(np.int32))], 255)
+        alpha = cv2.GaussianBlur(flush, (0, 0), 6 * scale).astype(np.float32) / 255 * traits["flush"]
+        img[:] = img * (1 - alpha[..., None]) + np.float32([45, 40, 225]) * alpha[..., None]
+
+    # Wrinkles: forehead lines, crow's feet and nasolabial folds, deeper with the trait
+    depth = 1.0 if traits["flush"] else traits["wrinkles"]
+    if depth > 0.2:
+        top, brow = xy[10], (xy[105] + xy[334]) / 2
+        left, right = xy[67], xy[297]
+        for level in np.linspace(0.3, 0.7, int(1 + depth * 3)):
+            y = top[1] + (brow[1] - top[1]) * level
+            xs = np.linspace(left[0], right[0], 24)
+            ys = y + np.sin(np.linspace(0, math.pi, 24)) * -3 * scale + rng.normal(0, 0.6, 24)
+            _draw_line(img, np.stack([xs, ys], axis=1), 0.25 + 0.5 * depth, max(1, int(scale * (1 + 2 * depth))))
+        for corner, direction in ((xy[33], -1), (xy[263], 1)):
+            for spread in np.linspace(-0.5, 0.5, int(2 + depth * 3)):
+                length = (10 + 14 * depth) * scale
+                end = corner + [direction * length * math.cos(spread), length * math.sin(spread)]
+                start = corner + [direction * 4 * scale, 0]
+                _draw_line(img, np.stack([start, end]), 0.2 + 0.45 * depth, max(1, int(scale * (1 + depth))))
+        for wing, mouth, side in ((xy[129], xy[61], -1), (xy[358], xy[291], 1)):
+            ts = np.linspace(0, 1, 16)[:, None]
+            curve = wing * (1 - ts) + mouth * ts + [side * 6 * scale, 0] * np.sin(ts * math.pi)
+            _draw_line(img, curve, 0.25 + 0.5 * depth, max(1, int(scale * (1 + 2 * depth))))
+
+    # Directional lighting and optional defocus
+    angle = rng.uniform(0, 2 * math.pi)
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    ramp = ((xx / w - 0.5) * math.cos(angle) + (yy / h - 0.5) * math.sin(angle)) * 2
+    img *= (1 + traits["lighting"] * ramp)[..., None]
+    if traits["blur"] > 0:
+        img = cv2.GaussianBlur(img, (0, 0), traits["blur"])
+    img = np.clip(img, 0, 255).astype(np.uint8)
+
+    entry = {"seed": seed, "size": [w, h], "placement": placement, "traits": traits,
+             "face": "bbox" if seed % 4 == 3 else "landmarks"}
+    if entry["face"] == "bbox":
+        # Haar-style box: square, about 80% of the face width, centred between the eyes and the nose tip
+        side = 0.8 * np.ptp(xy[FACE_OVAL][:, 0])
+        cx, cy = (xy[168] + xy[1]) / 2
+        entry["bbox"] = [int(cx - side / 2), int(cy - side / 2), int(side), int(side)]
+    return img, entry
+
+
+def generate_corpus(corpus: str, count: int, first_seed: int = 0) -> List[Dict[str, Any]]:
+    """Render `count` faces into `corpus` (JPEG) and write the manifest; returns its entries"""
+    mesh = load_mesh(corpus)
+    entries = []
+    for seed in range(first_seed, first_seed + count):
+        img, entry = render_face(seed, mesh)
+        entry["file"] = f"face_{seed:03d}.jpg"
+        cv2.imwrite(os.path.join(corpus, entry["file"]), img, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        entries.append(entry)
+    with open(os.path.join(corpus, MANIFEST), "w") as f:
+        json.dump({"mesh": MESH_TEMPLATE, "images": entries}, f, indent=1)
+    print(f"[Equivalence] Wrote {len(entries)} images to {corpus}")
+    return entries
+
+
+# ----------------------------------------------------------------------------
+# Comparison
+# ----------------------------------------------------------------------------
+
+def flatten(value: Any, path: str = "") -> Iterator[Tuple[str, Any]]:
+    """(path, leaf) pairs of nested dicts/lists: a.b[0].c"""
+    if isinstance(value, dict):
+        for key in sorted(value):
+            yield from flatten(value[key], f"{path}.{key}" if path else str(key))
+    elif isinstance(value, (list, tuple)):
+        for idx, item in enumerate(value):
+            yield from flatten(item, f"{path}[{idx}]")
+    else:
+        yield path, value
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, (bool, np.bool_))
+
+
+def field_tolerance(tolerances: Dict[str, Any], path: str) -> Tuple[float, float]:
+    """(abs, rel) tolerance for a field path: the most specific prefix in tolerances["fields"] wins"""
+    fields = tolerances.get("fields", {})
+    key = path
+    while key:
+        if key in fields:
+            tol = fields[key]
+            return float(tol.get("abs", 0.0)), float(tol.get("rel", 0.0))
+        key = key.rsplit(".", 1)[0] if "." in key else ""
+    return float(tolerances.get("abs", 0.0)), float(tolerances.get("rel", 0.0))
+
+
+def compare_values(ref: Any, cand: Any, path: str, tolerances: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Per-leaf deltas between two results (locations excluded), one record per leaf in either"""
+    ref_leaves, cand_leaves = dict(flatten(ref, path)), dict(flatten(cand, path))
+    records = []
+    for leaf in sorted(set(ref_leaves) | set(cand_leaves)):
+        record = {"field": leaf}
+        if leaf not in cand_leaves or leaf not in ref_leaves:
+            record.update(ref=ref_leaves.get(leaf), cand=cand_leaves.get(leaf), ok=False,
+                          issue="missing" if leaf not in cand_leaves else "extra")
+        else:
+            a, b = ref_leaves[leaf], cand_leaves[leaf]
+            record.update(ref=a, cand=b)
+            if _is_number(a) and _is_number(b):
+                abs_tol, rel_tol = field_tolerance(tolerances, leaf.split("[")[0] if "[" in leaf else leaf)
+                delta = abs(float(b) - float(a))
+                record["abs"] = delta
+                record["rel"] = delta / abs(float(a)) if a else (0.0 if delta == 0 else math.inf)
+                record["ok"] = delta <= abs_tol + rel_tol * abs(float(a))
+            else:
+                record["ok"] = a == b
+        records.append(record)
+    return records
+
+
+def _location_point(entry: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    if "x" in entry and "y" in entry:
+        return float(entry["x"]), float(entry["y"])
+    bbox = entry.get("bbox")
+    if bbox and len(bbox) == 4:
+        return (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return None
+
+
+def match_locations(ref: List[Dict], cand: List[Dict], max_distance: float) -> List[Tuple[int, int]]:
+    """
+    Pair reference and candidate locations, closest pairs first.
+
+    Entries pair up when they have the same "type" (if any) and their points
+    (or bbox centres) are within max_distance; each entry pairs at most once.
+    """
+    pairs = []
+    for i, a in enumerate(ref):
+        pa = _location_point(a)
+        for j, b in enumerate(cand):
+            pb = _location_point(b)
+            if pa is None or pb is None or a.get("type") != b.get("type"):
+                continue
+            distance = math.hypot(pa[0] - pb[0], pa[1] - pb[1])
+            if distance <= max_distance:
+                pairs.append((distance, i, j))
+    used_ref, used_cand, matched = set(), set(), []
+    for _, i, j in sorted(pairs):
+        if i not in used_ref and j not in used_cand:
+            used_ref.add(i)
+            used_cand.add(j)
+            matched.append((i, j))
+    return matched
+
+
+def compare_locations(ref: List[Dict], cand: List[Dict], field: str,
+                      tolerances: Dict[str, Any]) -> Dict[str, Any]:
+    """Set comparison of one location field: matched/missing/extra and attribute deltas of matched pairs"""
+    matched = match_locations(ref, cand, float(tolerances.get("location", 0.0)))
+    attribute_records = []
+    for i, j in matched:
+        a = {k: v for k, v in ref[i].items() if k not in ("x", "y")}
+        b = {k: v for k, v in cand[j].items() if k not in ("x", "y")}
+        attribute_records.extend(r for r in compare_values(a, b, field, tolerances) if not r["ok"])
+    paired_ref = {i for i, _ in matched}
+    paired_cand = {j for _, j in matched}
+    return {
+        "ref": len(ref),
+        "cand": len(cand),
+        "matched": len(matched),
+        "missing": [ref[i] for i in range(len(ref)) if i not in paired_ref],
+        "extra": [cand[j] for j in range(len(cand)) if j not in paired_cand],
+        "attribute_mismatches": attribute_records,
+        "ok": len(matched) == len(ref) == len(cand) and not attribute_records,
+    }
+
+
+def compare_results(ref: Dict[str, Any], cand: Dict[str, Any], tolerances: Dict[str, Any]) -> Dict[str, Any]:
+    """Field records and location comparisons of one detector's reference and candidate results"""
+    locations = {}
+    for field in LOCATION_FIELDS:
+        if field in ref or field in cand:
+            locations[field] = compare_locations(ref.get(field) or [], cand.get(field) or [], field, tolerances)
+    ref_fields = {k: v for k, v in ref.items() if k not in LOCATION_FIELDS}
+    cand_fields = {k: v for k, v in cand.items() if k not in LOCATION_FIELDS}
+    return {"fields": compare_values(ref_fields, cand_fields, "", tolerances), "locations": locations}
+
+
+def compare_region_masks(ref: Dict[str, np.ndarray], cand, tolerances: Dict[str, Any]) -> Dict[str, Any]:
+    """IoU of every reference region mask with the candidate's (a ViewRegionMasks)"""
+    ious = {}
+    for name, ref_mask in ref.items():
+        cand_mask = cand.get(name)
+        if cand_mask is None or cand_mask.shape != ref_mask.shape:
+            ious[name] = 0.0
+            continue
+        a, b = ref_mask > 0, cand_mask > 0
+        union = int(np.count_nonzero(a | b))
+        ious[name] = round(np.count_nonzero(a & b) / union, 4) if union else 1.0
+    worst = min(ious, key=ious.get) if ious else None
+    min_iou = ious[worst] if worst else 1.0
+    return {"iou": ious, "min_iou": min_iou, "worst_region": worst,
+            "ok": min_iou >= float(tolerances.get("region_iou", 0.97))}
+
+
+def compare_images(ref: np.ndarray, cand: np.ndarray, tolerances: Dict[str, Any]) -> Dict[str, Any]:
+    """Pixel deltas between two normalized images"""
+    if ref.shape != cand.shape:
+        return {"ok": False, "issue": f"shape {cand.shape} != {ref.shape}"}
+    delta = np.abs(ref.astype(np.int16) - cand.astype(np.int16))
+    max_abs = int(delta.max()) if delta.size else 0
+    return {
+        "max_abs": max_abs,
+        "mean_abs": round(float(delta.mean()), 4) if delta.size else 0.0,
+        "changed_fraction": round(float((delta > 0).mean()), 6) if delta.size else 0.0,
+        "ok": max_abs <= int(tolerances.get("pixel", 0)),
+    }
+
+
+# ----------------------------------------------------------------------------
+# Running
+# ----------------------------------------------------------------------------
+
+def _load_class(spec: str):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def _init_worker(candidate: str, verbose: bool):
+    global _reference, _candidate
+    if not verbose:
+        # The service logs every stage and detector
+        sys.stdout = open(os.devnull, "w")
+    from detector_reference import ReferenceDetectors
+    _reference = ReferenceDetectors()
+    _candidate = _load_class(candidate)()
+
+
+def _timed(fn, *args) -> Tuple[Any, float, Optional[str]]:
+    start = time.perf_counter()
+    try:
+        value, error = fn(*args), None
+    except Exception as e:
+        value, error = None, f"{type(e).__name__}: {e}"
+    return value, (time.perf_counter() - start) * 1000, error
+
+
+def _compare_entry(corpus: str, entry: Dict[str, Any], targets: List[str],
+                   tolerances: Dict[str, Any]) -> Dict[str, Any]:
+    """Compare reference and candidate on one corpus image (runs in a worker process)"""
+    from services.detector_graph import run_detector_graph
+
+    record = {"image": entry["file"], "targets": {}}
+    img = cv2.imread(os.path.join(corpus, entry["file"]))
+    face_data = face_data_for(entry, load_mesh(corpus))
+    img_original, canonical_face_data, geometry = _reference._normalize_face_geometry(img, face_data)
+    skin_mask = _reference._create_view_skin_mask(img_original, canonical_face_data, geometry)
+
+    # Sides take turns going first, so cache warm-up doesn't favour one of them in the timings
+    sides = [("ref", _reference), ("cand", _candidate)]
+    if entry["seed"] % 2:
+        sides.reverse()
+
+    lit = {side: _timed(service._normalize_lighting, img_original, skin_mask)
+           for side, service in sides if side == "ref" or "lighting" in targets}
+    ref_img, ref_ms, ref_error = lit["ref"]
+    if "lighting" in targets:
+        cand_img, cand_ms, cand_error = lit["cand"]
+        result = {"ref_ms": ref_ms, "cand_ms": cand_ms}
+        if ref_error or cand_error:
+            result.update(ok=False, ref_error=ref_error, cand_error=cand_error)
+        else:
+            result.update(compare_images(ref_img, cand_img, tolerances))
+        record["targets"]["lighting"] = result
+    if "regions" in targets and canonical_face_data["type"] == "landmarks":
+        points = canonical_face_data["points"]
+        ref_masks, ref_ms, ref_error = _timed(_reference._reference_region_masks, points)
+        cand_masks, cand_ms, cand_error = _timed(_candidate._view_region_masks, points)
+        result = {"ref_ms": ref_ms, "cand_ms": cand_ms}
+        if ref_error or cand_error or cand_masks is None:
+            # None makes every consumer rasterize on its own, which is the reference
+            result.update(ok=not (ref_error or cand_error), ref_error=ref_error, cand_error=cand_error)
+        else:
+            result.update(compare_region_masks(ref_masks, cand_masks, tolerances))
+        record["targets"]["regions"] = result
+    if ref_img is None:
+        return record
+
+    # Both sides read the same view, so derived inputs (gray, LAB, HSV, pixel classes) are shared
+    view = {"img": ref_img, "skin_mask": skin_mask, "face_data": canonical_face_data, "view_name": "front"}
+    graph = {}
+    for name in targets:
+        if name in ("lighting", "regions"):
+            continue
+        for side, service in sides:
+            spec = service._detectors[name]
+            graph[f"{side}:{name}"] = (spec["inputs"], lambda v, run=spec["run"]: _timed(run, v))
+    outputs = run_detector_graph(view, graph)
+
+    for name in targets:
+        if name in ("lighting", "regions"):
+            continue
+        (ref_value, ref_ms, ref_error), (cand_value, cand_ms, cand_error) = \
+            outputs[f"ref:{name}"], outputs[f"cand:{name}"]
+        result = {"ref_ms": ref_ms, "cand_ms": cand_ms}
+        if ref_error or cand_error:
+            result.update(ok=False, ref_error=ref_error, cand_error=cand_error)
+        else:
+            result.update(compare_results(ref_value, cand_value, tolerances))
+            result["ok"] = all(r["ok"] for r in result["fields"]) and \
+                all(loc["ok"] for loc in result["locations"].values())
+        record["targets"][name] = result
+    return record
+
+
+def summarize(records: List[Dict[str, Any]], targets: List[str]) -> Dict[str, Any]:
+    """
+    Aggregate per-image records by target.
+
+    Returns:
+        target -> images, failing images, mean reference/candidate ms, per-field
+        max/mean abs delta, max rel delta and out-of-tolerance counts (with
+        the worst image), and per-location-field matched/missing/extra totals;
+        for regions, the lowest region IoU and where it was
+    """
+    summary = {}
+    for target in targets:
+        results = [(r["image"], r["targets"][target]) for r in records if target in r["targets"]]
+        entry = {
+            "images": len(results),
+            "failing_images": [image for image, res in results if not res["ok"]],
+            "errors": {image: res.get("cand_error") or res.get("ref_error")
+                       for image, res in results if res.get("cand_error") or res.get("ref_error")},
+            "ref_ms": round(sum(res["ref_ms"] for _, res in results) / max(len(results), 1), 2),
+            "cand_ms": round(sum(res["cand_ms"] for _, res in results) / max(len(results), 1), 2),
+        }
+        if target == "lighting":
+            pixel = [res for _, res in results if "max_abs" in res]
+            entry["max_abs"] = max((res["max_abs"] for res in pixel), default=0)
+            entry["mean_abs"] = round(sum(res["mean_abs"] for res in pixel) / max(len(pixel), 1), 4)
+            summary[target] = entry
+            continue
+        if target == "regions":
+            ious = [(image, res) for image, res in results if "min_iou" in res]
+            worst = min(ious, key=lambda item: item[1]["min_iou"], default=None)
+            entry["min_iou"] = worst[1]["min_iou"] if worst else 1.0
+            entry["worst"] = f"{worst[0]} ({worst[1]['worst_region']})" if worst else None
+            summary[target] = entry
+            continue
+
+        fields: Dict[str, Dict[str, Any]] = {}
+        locations: Dict[str, Dict[str, int]] = {}
+        for image, res in results:
+            for rec in res.get("fields", []):
+                # Per-index paths (bbox[2]) are summarized under the field they belong to
+                name = re.sub(r"\[\d+\]", "[]", rec["field"])
+                stats = fields.setdefault(name, {"compared": 0, "out_of_tolerance": 0, "max_abs": 0.0,
+                                                 "sum_abs": 0.0, "max_rel": 0.0, "worst_image": None})
+                stats["compared"] += 1
+                if "abs" in rec:
+                    stats["sum_abs"] += rec["abs"]
+                    if rec["abs"] > stats["max_abs"]:
+                        stats["max_abs"], stats["worst_image"] = rec["abs"], image
+                    stats["max_rel"] = max(stats["max_rel"], rec["rel"])
+                if not rec["ok"]:
+                    stats["out_of_tolerance"] += 1
+                    stats["worst_image"] = stats["worst_image"] or image
+            for field, loc in res.get("locations", {}).items():
+                totals = locations.setdefault(field, {"ref": 0, "cand": 0, "matched": 0, "missing": 0,
+                                                      "extra": 0, "attribute_mismatches": 0})
+                totals["ref"] += loc["ref"]
+                totals["cand"] += loc["cand"]
+                totals["matched"] += loc["matched"]
+                totals["missing"] += len(loc["missing"])
+                totals["extra"] += len(loc["extra"])
+                totals["attribute_mismatches"] += len(loc["attribute_mismatches"])
+        for stats in fields.values():
+            stats["mean_abs"] = round(stats.pop("sum_abs") / max(stats["compared"], 1), 6)
+            stats["max_abs"] = round(stats["max_abs"], 6)
+            stats["max_rel"] = round(stats["max_rel"], 6) if math.isfinite(stats["max_rel"]) else "inf"
+        entry["fields"] = fields
+        entry["locations"] = locations
+        summary[target] = entry
+    return summary
+
+
+def run(corpus: str, targets: List[str], tolerances: Dict[str, Any], workers: int,
+        candidate: str = "services.face_scan_service:FaceScanService", limit: Optional[int] = None,
+        report: Optional[str] = None, verbose: bool = False) -> Dict[str, Any]:
+    """
+    Compare reference and candidate detectors over the corpus across a process pool.
+
+    Returns:
+        {"summary": per-target aggregates, "ok": everything within tolerance}
+        (the report file additionally holds every per-image record)
+    """
+    with open(os.path.join(corpus, MANIFEST)) as f:
+        entries = json.load(f)["images"][:limit]
+
+    # Process parallelism replaces the service's own threads and worker processes
+    os.environ.setdefault("DETECTOR_THREADS", "1")
+    os.environ["FACE_SCAN_WORKER_PROCESSES"] = "0"
+
+    started = time.time()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                               initializer=_init_worker, initargs=(candidate, verbose))
+    with pool:
+        futures = [pool.submit(_compare_entry, corpus, entry, targets, tolerances) for entry in entries]
+        records = [future.result() for future in futures]
+
+    summary = summarize(records, targets)
+    ok = all(not entry["failing_images"] for entry in summary.values())
+    for target, entry in summary.items():
+        speedup = entry["ref_ms"] / entry["cand_ms"] if entry["cand_ms"] else 0.0
+        status = "OK" if not entry["failing_images"] else f"{len(entry['failing_images'])} images differ"
+        print(f"[Equivalence] {target}: {entry['images']} images, {status}, "
+              f"ref {entry['ref_ms']} ms, candidate {entry['cand_ms']} ms ({speedup:.2f}x)")
+        if target == "lighting" and entry["failing_images"]:
+            print(f"[Equivalence]   pixels: max abs {entry['max_abs']}, mean abs {entry['mean_abs']}")
+        if target == "regions" and entry["failing_images"]:
+            print(f"[Equivalence]   min IoU {entry['min_iou']} in {entry['worst']}")
+        for field, stats in entry.get("fields", {}).items():
+            if stats["out_of_tolerance"]:
+                print(f"[Equivalence]   {field}: {stats['out_of_tolerance']}/{stats['compared']} out of tolerance, "
+                      f"max abs {stats['max_abs']}, max rel {stats['max_rel']} (worst {stats['worst_image']})")
+        for field, totals in entry.get("locations", {}).items():
+            if totals["missing"] or totals["extra"] or totals["attribute_mismatches"]:
+                print(f"[Equivalence]   {field}: {totals['matched']}/{totals['ref']} matched, "
+                      f"{totals['missing']} missing, {totals['extra']} extra, "
+                      f"{totals['attribute_mismatches']} attribute mismatches")
+        errors = list(entry["errors"].items())
+        for image, error in errors[:3]:
+            print(f"[Equivalence]   {image}: {error}")
+        if len(errors) > 3:
+            print(f"[Equivalence]   ... and {len(errors) - 3} more errors")
+    print(f"[Equivalence] {'All within tolerance' if ok else 'Differences found'} "
+          f"({len(records)} images, {time.time() - started:.1f}s)")
+
+    if report:
+        with open(report, "w") as f:
+            json.dump({"tolerances": tolerances, "summary": summary, "images": records}, f, indent=1,
+                      default=lambda o: o.item() if hasattr(o, "item") else str(o))
+    return {"summary": summary, "ok": ok}
+
+
+def _parse_field_tolerance(value: str) -> Tuple[str, Dict[str, float]]:
+    """FIELD=ABS[,REL] -> (field, {"abs", "rel"})"""
+    field, _, numbers = value.partition("=")
+    parts = numbers.split(",")
+    if not field or not numbers or len(parts) > 2:
+        raise argparse.ArgumentTypeError(f"expected FIELD=ABS[,REL], got '{value}'")
+    return field, {"abs": float(parts[0]), "rel": float(parts[1]) if len(parts) > 1 else 0.0}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Compare frozen reference detectors with the current ones")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Corpus directory (manifest.json + images)")
+    parser.add_argument("--generate", action="store_true", help="Re-render the corpus instead of comparing")
+    parser.add_argument("--count", type=int, default=36, help="Images rendered by --generate")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"Comma-separated subset of {','.join(TARGETS)}")
+    parser.add_argument("--candidate", default="services.face_scan_service:FaceScanService",
+                        help="module:Class of the candidate implementation")
+    parser.add_argument("--abs-tol", type=float, default=0.0, help="Default absolute tolerance for numeric fields")
+    parser.add_argument("--rel-tol", type=float, default=0.0, help="Default relative tolerance for numeric fields")
+    parser.add_argument("--field-tol", type=_parse_field_tolerance, action="append", default=[],
+                        metavar="FIELD=ABS[,REL]", help="Tolerance for one field or field prefix (repeatable)")
+    parser.add_argument("--location-tol", type=float, default=0.0,
+                        help="Max distance between paired locations (normalized crop coordinates)")
+    parser.add_argument("--pixel-tol", type=int, default=0, help="Max per-pixel difference of normalized images")
+    parser.add_argument("--region-iou", type=float, default=0.97,
+                        help="Min IoU of each region mask with the one rasterized on the view's landmarks")
+    parser.add_argument("--tolerances",
+                        help="JSON file with abs, rel, location, pixel, region_iou and fields: {name: {abs, rel}}")
+    parser.add_argument("--workers", type=int, default=len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+                        else (os.cpu_count() or 1), help="Worker processes (default: available CPUs)")
+    parser.add_argument("--limit", type=int, help="Only compare the first N corpus images")
+    parser.add_argument("--report", help="Write the summary and every per-image delta to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the service's logs")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        generate_corpus(args.corpus, max(1, args.count))
+        return 0
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = [t for t in targets if t not in TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(unknown)}")
+
+    tolerances = {"abs": args.abs_tol, "rel": args.rel_tol, "location": args.location_tol,
+                  "pixel": args.pixel_tol, "region_iou": args.region_iou, "fields": {}}
+    if args.tolerances:
+        with open(args.tolerances) as f:
+            loaded = json.load(f)
+        tolerances["fields"].update(loaded.pop("fields", {}))
+        tolerances.update(loaded)
+    tolerances["fields"].update(dict(args.field_tol))
+
+    result = run(args.corpus, targets, tolerances, max(1, args.workers), args.candidate, args.limit,
+                 args.report, args.verbose)
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,952 @@
+"""
+Detector Reference Implementations
+Frozen copies of the detectors that produce stored scores, for tools/detector_equivalence.py
+
+Do not edit or optimize this file. It keeps _normalize_lighting,
+_detect_acne, _detect_wrinkles, _analyze_texture, _analyze_redness and
+_detect_pigmentation exactly as they were when the equivalence harness was
+added, so a faster FaceScanService version can be checked against them.
+The colour rules are inlined as the original per-pixel HSV/LAB comparisons,
+not read from services.pixel_classifier, so a classifier regression shows up
+as a difference. _reference_region_masks draws each region on the view's own
+landmarks, as every consumer did before the shared template, so the
+candidate's region masks can be checked. Everything else (landmark indices,
+defaults) comes from the live service.
+
+Refresh it only after a deliberate, reviewed change to stored scores: paste
+the new method bodies in and say so in the commit message.
+"""
+
+import os
+import sys
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.face_scan_service import FaceScanService  # noqa: E402
+
+
+class ReferenceDetectors(FaceScanService):
+    """FaceScanService with the frozen reference detectors (the registry picks these up through self)"""
+
+    def _reference_region_masks(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        0/255 mask of every template region, drawn on a view's landmarks (canonical-crop pixels)
+        with the primitive its consumer used: fillPoly, fillPoly of the convex hull, or fillConvexPoly.
+        """
+        masks = {}
+        for name, (indices, primitive) in self._region_mask_specs().items():
+            region_points = np.array([points[i] for i in indices if i < len(points)], dtype=np.int32)
+            mask = np.zeros((self.CANONICAL_HEIGHT, self.CANONICAL_WIDTH), dtype=np.uint8)
+            if len(region_points) >= 3:
+                if primitive == "hull":
+                    cv2.fillPoly(mask, [cv2.convexHull(region_points)], 255)
+                elif primitive == "convex":
+                    cv2.fillConvexPoly(mask, region_points, 255)
+                else:
+                    cv2.fillPoly(mask, [region_points], 255)
+            masks[name] = mask
+        return masks
+
+    def _normalize_lighting(self, img: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Normalize lighting conditions for consistent analysis.
+
+        This reduces the impact of:
+        - Uneven lighting (shadows, highlights)
+        - Camera flash/specular reflections
+        - White balance variations
+        - Over/under exposure
+
+        Args:
+            img: BGR image
+            mask: Optional face mask to focus normalization on face region
+
+        Returns:
+            Lighting-normalized BGR image
+        """
+        # Convert to LAB color space
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        l_channel, a_channel, b_channel = cv2.split(lab)
+
+        # === Step 1: CLAHE on L channel for contrast normalization ===
+        clahe = cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8))
+        l_normalized = clahe.apply(l_channel)
+
+        # === Step 2: Reduce specular highlights ===
+        # Find very bright areas (likely flash/specular)
+        _, highlight_mask = cv2.threshold(l_channel, 240, 255, cv2.THRESH_BINARY)
+
+        # Reduce highlight intensity
+        if np.sum(highlight_mask) > 0:
+            # Blend with surrounding areas
+            highlight_reduction = cv2.GaussianBlur(l_normalized, (15, 15), 0)
+            l_normalized = np.where(
+                highlight_mask > 0,
+                np.clip(l_normalized * 0.7 + highlight_reduction * 0.3, 0, 255).astype(np.uint8),
+                l_normalized
+            )
+
+        # === Step 3: Shadow recovery ===
+        # Find very dark areas
+        _, shadow_mask = cv2.threshold(l_channel, 40, 255, cv2.THRESH_BINARY_INV)
+
+        if np.sum(shadow_mask) > 0:
+            # Lift shadows slightly
+            shadow_lift = cv2.add(l_normalized, np.ones_like(l_normalized) * 15)
+            l_normalized = np.where(
+                shadow_mask > 0,
+                np.clip(l_normalized * 0.6 + shadow_lift * 0.4, 0, 255).astype(np.uint8),
+                l_normalized
+            )
+
+        # === Step 4: Local normalization for uneven lighting ===
+        if mask is not None:
+            # Calculate local mean brightness in face region
+            kernel = np.ones((31, 31), np.float32) / (31 * 31)
+            local_mean = cv2.filter2D(l_normalized.astype(np.float32), -1, kernel)
+
+            # Target brightness (neutral gray)
+            target_brightness = 140
+
+            # Calculate correction factor
+            correction = target_brightness - local_mean
+            correction = np.clip(correction, -40, 40)  # Limit correction
+
+            # Apply correction only to face region
+            l_corrected = l_normalized.astype(np.float32) + correction
+            l_normalized = np.clip(l_corrected, 0, 255).astype(np.uint8)
+
+        # === Step 5: Merge and convert back ===
+        lab_normalized = cv2.merge([l_normalized, a_channel, b_channel])
+        img_normalized = cv2.cvtColor(lab_normalized, cv2.COLOR_LAB2BGR)
+
+        return img_normalized
+
+    def _detect_acne(self, img: np.ndarray, mask: np.ndarray, face_data: Dict,
+                     gray: Optional[np.ndarray] = None, hsv: Optional[np.ndarray] = None,
+                     lab: Optional[np.ndarray] = None, classes=None) -> Dict:
+        """Detect acne and blemishes with HIGH ACCURACY multi-stage validation.
+
+        STRICT ACCURACY MODE:
+        - Multi-stage validation: each spot must pass multiple criteria
+        - Contrast verification: spot must be significantly different from surroundings
+        - Local intensity comparison: compare to immediate neighborhood
+        - Only count high-confidence detections
+        """
+
+        h, w = img.shape[:2]
+        gray = gray if gray is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray_masked = cv2.bitwise_and(gray, gray, mask=mask)
+        hsv = hsv if hsv is not None else cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+
+        # Calculate skin baseline statistics for comparison
+        skin_pixels = gray[mask > 0]
+        if len(skin_pixels) == 0:
+            return self._default_acne()
+
+        skin_mean = np.mean(skin_pixels)
+        skin_std = np.std(skin_pixels)
+
+        # Detect red/inflamed areas - VERY STRICT: Only true inflammation
+        # Increased saturation requirement to avoid detecting normal skin flush
+        # (classes, the live pixel classifier's output, is deliberately ignored)
+        lower_red1 = np.array([0, 120, 80])  # Very high saturation required
+        upper_red1 = np.array([6, 255, 255])   # Narrower hue range
+        lower_red2 = np.array([174, 120, 80])  # Very high saturation
+        upper_red2 = np.array([180, 255, 255])
+
+        red_mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
+        red_mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
+        red_mask = cv2.bitwise_or(red_mask1, red_mask2)
+        red_mask = cv2.bitwise_and(red_mask, mask)
+
+        # Strong morphological cleaning
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        red_mask = cv2.morphologyEx(red_mask, cv2.MORPH_OPEN, kernel)
+        red_mask = cv2.morphologyEx(red_mask, cv2.MORPH_CLOSE, kernel)
+
+        # Blob detection with stronger blur to reduce texture noise
+        blurred = cv2.GaussianBlur(gray_masked, (5, 5), 0)
+
+        # Adaptive threshold - STRICT parameters
+        thresh_dark = cv2.adaptiveThreshold(
+            blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV, 15, 5  # Larger block, higher C = stricter
+        )
+        thresh_dark = cv2.bitwise_and(thresh_dark, mask)
+        thresh_dark = cv2.morphologyEx(thresh_dark, cv2.MORPH_OPEN, kernel)
+
+        contours_dark, _ = cv2.findContours(thresh_dark, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        blackhead_count = 0
+        pimple_count = 0
+        whitehead_count = 0
+        acne_locations = []
+
+        # BALANCED: Moderate minimum area to catch real acne while avoiding pore false positives
+        min_area = 50  # Lowered to catch smaller acne spots
+        max_area = 500  # Increased to catch larger blemishes
+        skin_area = max(np.sum(mask > 0), 1)
+        area_scale = skin_area / 100000
+
+        def verify_spot_contrast(cnt, spot_type="dark"):
+            """Verify spot has significant contrast with surrounding skin"""
+            M = cv2.moments(cnt)
+            if M["m00"] == 0:
+                return False, 0, 0
+
+            cx = int(M["m10"] / M["m00"])
+            cy = int(M["m01"] / M["m00"])
+
+            # Get spot intensity
+            spot_mask = np.zeros_like(gray)
+            cv2.drawContours(spot_mask, [cnt], -1, 255, -1)
+            spot_pixels = gray[spot_mask > 0]
+            if len(spot_pixels) == 0:
+                return False, 0, 0
+
+            spot_mean = np.mean(spot_pixels)
+
+            # Get surrounding area intensity (dilate the contour)
+            dilated = cv2.dilate(spot_mask, kernel, iterations=3)
+            surround_mask = cv2.subtract(dilated, spot_mask)
+            surround_mask = cv2.bitwise_and(surround_mask, mask)
+            surround_pixels = gray[surround_mask > 0]
+
+            if len(surround_pixels) < 10:
+                return False, 0, 0
+
+            surround_mean = np.mean(surround_pixels)
+
+            # Calculate contrast ratio - BALANCED thresholds for better detection
+            if spot_type == "dark":
+                contrast = surround_mean - spot_mean
+                # Lowered threshold: 22+ units darker (was 35)
+                # AND darker than skin mean by 1.0 std dev (was 1.5)
+                is_valid = contrast > 22 and spot_mean < skin_mean - 1.0 * skin_std
+            else:  # bright
+                contrast = spot_mean - surround_mean
+                # Lowered threshold: 25+ units brighter (was 40)
+                is_valid = contrast > 25 and spot_mean > skin_mean + 1.5 * skin_std
+
+            return is_valid, cx / w, cy / h
+
+        # Detect blackheads with contrast verification
+        for cnt in contours_dark:
+            area = cv2.contourArea(cnt)
+            scaled_min = min_area * max(area_scale, 0.5)
+            scaled_max = max_area * max(area_scale, 0.5)
+
+            if scaled_min < area < scaled_max:
+                perimeter = cv2.arcLength(cnt, True)
+                if perimeter > 0:
+                    circularity = 4 * np.pi * area / (perimeter ** 2)
+                    # BALANCED: Moderate circularity to catch irregular acne (0.45)
+                    if circularity > 0.45:
+                        # VERIFY contrast with surroundings
+                        is_valid, cx, cy = verify_spot_contrast(cnt, "dark")
+                        if is_valid:
+                            blackhead_count += 1
+                            acne_locations.append({
+                                "x": round(cx, 3), "y": round(cy, 3),
+                                "type": "blackhead",
+                                "size": "small" if area < 60 else "medium"
+                            })
+
+        # Detect pimples with strict validation
+        contours_red, _ = cv2.findContours(red_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        for cnt in contours_red:
+            area = cv2.contourArea(cnt)
+            if min_area * 1.5 * max(area_scale, 0.5) < area < max_area * 2 * max(area_scale, 0.5):
+                perimeter = cv2.arcLength(cnt, True)
+                if perimeter > 0:
+                    circularity = 4 * np.pi * area / (perimeter ** 2)
+                    if circularity > 0.5:  # Higher circularity for pimples
+                        # Verify it's actually red/inflamed, not just skin tone
+                        spot_mask = np.zeros((h, w), dtype=np.uint8)
+                        cv2.drawContours(spot_mask, [cnt], -1, 255, -1)
+                        spot_hsv = hsv[spot_mask > 0]
+                        if len(spot_hsv) > 0:
+                            avg_saturation = np.mean(spot_hsv[:, 1])
+                            # Moderate saturation threshold for inflammation detection
+                            if avg_saturation > 75:  # Lowered to catch pink/inflamed spots
+                                M = cv2.moments(cnt)
+                                if M["m00"] > 0:
+                                    cx = M["m10"] / M["m00"] / w
+                                    cy = M["m01"] / M["m00"] / h
+                                    pimple_count += 1
+                                    acne_locations.append({
+                                        "x": round(cx, 3), "y": round(cy, 3),
+                                        "type": "pimple",
+                                        "size": "small" if area < 120 else "large"
+                                    })
+
+        # Detect whiteheads with contrast verification - lowered threshold
+        _, thresh_bright = cv2.threshold(blurred, 195, 255, cv2.THRESH_BINARY)
+        thresh_bright = cv2.bitwise_and(thresh_bright, mask)
+        thresh_bright = cv2.morphologyEx(thresh_bright, cv2.MORPH_OPEN, kernel)
+
+        contours_bright, _ = cv2.findContours(thresh_bright, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        for cnt in contours_bright:
+            area = cv2.contourArea(cnt)
+            if min_area * max(area_scale, 0.5) < area < max_area * 0.7 * max(area_scale, 0.5):
+                perimeter = cv2.arcLength(cnt, True)
+                if perimeter > 0:
+                    circularity = 4 * np.pi * area / (perimeter ** 2)
+                    if circularity > 0.55:  # Whiteheads are very circular
+                        is_valid, cx, cy = verify_spot_contrast(cnt, "bright")
+                        if is_valid:
+                            whitehead_count += 1
+                            acne_locations.append({
+                                "x": round(cx, 3), "y": round(cy, 3),
+                                "type": "whitehead", "size": "small"
+                            })
+
+        # Cap counts - LOWER caps to prevent over-detection
+        blackhead_count = min(blackhead_count, 10)  # Reduced from 15
+        pimple_count = min(pimple_count, 8)         # Reduced from 10
+        whitehead_count = min(whitehead_count, 5)   # Reduced from 8
+
+        # Calculate score - direct count mapping per IGA clinical scale
+        # Weight: blackheads (1x), whiteheads (1x), pimples (2x - more severe)
+        # IGA Grade mapping: 0=Clear, 1-10=Almost Clear, 11-25=Mild, 26-50=Moderate, 51+=Severe
+        total_blemishes = blackhead_count + whitehead_count + pimple_count * 2
+        acne_score = min(100, total_blemishes)  # Direct mapping - no artificial multiplier
+
+        # Inflammation based on verified red pixels - BALANCED thresholds
+        red_pixel_ratio = np.sum(red_mask > 0) / skin_area
+        if red_pixel_ratio > 0.15:  # Lowered to detect moderate redness
+            inflammation = 0.66
+        elif red_pixel_ratio > 0.06:  # Lowered for mild inflammation
+            inflammation = 0.33
+        else:
+            inflammation = 0.0
+
+        acne_locations = acne_locations[:15]
+
+        return {
+            "acne_score": int(acne_score),
+            "whitehead_count": int(whitehead_count),
+            "blackhead_count": int(blackhead_count),
+            "pimple_count": int(pimple_count),
+            "inflammation_level": float(inflammation),
+            "acne_locations": acne_locations,
+        }
+
+    def _detect_wrinkles(self, img: np.ndarray, mask: np.ndarray, face_data: Dict,
+                         gray: Optional[np.ndarray] = None) -> Dict:
+        """
+        Detect wrinkles using improved multi-stage analysis.
+
+        Improvements over basic Canny:
+        1. Better noise reduction preserving wrinkle edges
+        2. Direction-aware filtering (wrinkles are typically horizontal)
+        3. Intensity-based filtering to ignore minor variations
+        4. Regional analysis with appropriate thresholds
+        5. Distinction between fine lines and deep wrinkles
+        """
+
+        gray = gray if gray is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape
+
+        # === Step 1: Advanced Preprocessing ===
+        # CLAHE for better contrast in wrinkle regions
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        enhanced = clahe.apply(gray)
+
+        # Bilateral filter - preserves edges (wrinkles) while smoothing noise
+        filtered = cv2.bilateralFilter(enhanced, 9, 75, 75)
+
+        # Additional smoothing to reduce false positives from pores/texture
+        smoothed = cv2.GaussianBlur(filtered, (3, 3), 0)
+
+        # === Step 2: Multi-scale Edge Detection ===
+        # Use higher thresholds to avoid detecting minor texture as wrinkles
+        edges_fine = cv2.Canny(smoothed, 50, 120)     # Fine lines
+        edges_deep = cv2.Canny(smoothed, 80, 180)    # Deep wrinkles only
+
+        edges_fine = cv2.bitwise_and(edges_fine, mask)
+        edges_deep = cv2.bitwise_and(edges_deep, mask)
+
+        # === Step 3: Directional Filtering ===
+        # Wrinkles tend to be horizontal or follow face contours
+        # Filter out vertical edges (often facial features, not wrinkles)
+
+        # Sobel for direction analysis
+        sobel_x = cv2.Sobel(smoothed, cv2.CV_64F, 1, 0, ksize=3)
+        sobel_y = cv2.Sobel(smoothed, cv2.CV_64F, 0, 1, ksize=3)
+
+        # Calculate gradient direction
+        angle = np.arctan2(np.abs(sobel_y), np.abs(sobel_x)) * 180 / np.pi
+
+        # Horizontal-ish edges (wrinkles) are 0-30 or 150-180 degrees
+        horizontal_mask = ((angle < 35) | (angle > 145)).astype(np.uint8) * 255
+        horizontal_mask = cv2.bitwise_and(horizontal_mask, mask)
+
+        # Apply directional filter to edges
+        wrinkle_edges = cv2.bitwise_and(edges_fine, horizontal_mask)
+
+        # === Step 4: Laplacian for wrinkle depth estimation ===
+        laplacian = cv2.Laplacian(smoothed, cv2.CV_64F)
+        laplacian_abs = np.uint8(np.clip(np.absolute(laplacian), 0, 255))
+        laplacian_masked = cv2.bitwise_and(laplacian_abs, mask)
+
+        # === Step 5: Regional Analysis with MediaPipe Landmarks ===
+        forehead_severity = 0.0
+        crows_feet_severity = 0.0
+        nasolabial_severity = 0.0
+        regional_wrinkle_count = 0
+
+        if face_data["type"] == "landmarks":
+            landmarks = face_data["data"]
+
+            def get_region_mask(region_indices, region_name):
+                precomputed = self._region_mask(face_data, region_name, (h, w))
+                if precomputed is not None:
+                    return precomputed
+                region_mask = np.zeros((h, w), dtype=np.uint8)
+                points = []
+                for idx in region_indices:
+                    if idx < len(landmarks):
+                        lm = landmarks[idx]
+                        points.append([int(lm.x * w), int(lm.y * h)])
+                if len(points) >= 3:
+                    hull = cv2.convexHull(np.array(points, dtype=np.int32))
+                    cv2.fillPoly(region_mask, [hull], 255)
+                return region_mask
+
+            def analyze_wrinkles_in_region(edge_img, lap_img, region_mask, min_length=8):
+                """Analyze wrinkles in a specific region with quality filtering"""
+                region_edges = cv2.bitwise_and(edge_img, region_mask)
+                region_lap = cv2.bitwise_and(lap_img, region_mask)
+
+                # Count high-confidence wrinkle lines
+                lines = cv2.HoughLinesP(
+                    region_edges, 1, np.pi / 180,
+                    threshold=15,           # Require stronger evidence
+                    minLineLength=min_length,  # Minimum length
+                    maxLineGap=4           # Allow small gaps
+                )
+
+                if lines is None:
+                    return 0, 0.0
+
+                # Filter lines by orientation and intensity
+                valid_lines = 0
+                total_intensity = 0
+
+                for line in lines:
+                    x1, y1, x2, y2 = line[0]
+                    # Calculate angle
+                    angle = abs(np.arctan2(y2 - y1, x2 - x1) * 180 / np.pi)
+
+                    # For forehead, wrinkles are mostly horizontal (0-30 deg)
+                    # For crow's feet, they radiate outward (30-60 deg)
+                    # For nasolabial, they follow the fold (40-70 deg)
+
+                    # Check intensity along the line
+                    line_mask = np.zeros((h, w), dtype=np.uint8)
+                    cv2.line(line_mask, (x1, y1), (x2, y2), 255, 2)
+                    line_intensity = np.mean(region_lap[line_mask > 0]) if np.sum(line_mask > 0) > 0 else 0
+
+                    # Valid wrinkle: moderate intensity, proper orientation
+                    if line_intensity > 20:  # Must have some depth
+                        valid_lines += 1
+                        total_intensity += line_intensity
+
+                avg_intensity = total_intensity / valid_lines if valid_lines > 0 else 0
+                return valid_lines, avg_intensity
+
+            # === Forehead Analysis ===
+            forehead_mask = get_region_mask(self.FOREHEAD, "forehead_hull")
+            forehead_lines, forehead_intensity = analyze_wrinkles_in_region(
+                wrinkle_edges, laplacian_masked, forehead_mask, min_length=12
+            )
+            # Severity based on line count and intensity
+            if forehead_lines >= 8 and forehead_intensity > 35:
+                forehead_severity = 1.0   # Severe
+            elif forehead_lines >= 4 and forehead_intensity > 25:
+                forehead_severity = 0.66  # Moderate
+            elif forehead_lines >= 2 or forehead_intensity > 20:
+                forehead_severity = 0.33  # Mild
+            else:
+                forehead_severity = 0.0   # None
+
+            regional_wrinkle_count += forehead_lines
+
+            # === Crow's Feet Analysis ===
+            left_cf_mask = get_region_mask(self.LEFT_CROWS_FEET, "left_crows_feet_hull")
+            right_cf_mask = get_region_mask(self.RIGHT_CROWS_FEET, "right_crows_feet_hull")
+            left_cf_lines, left_cf_int = analyze_wrinkles_in_region(
+                edges_fine, laplacian_masked, left_cf_mask, min_length=6
+            )
+            right_cf_lines, right_cf_int = analyze_wrinkles_in_region(
+                edges_fine, laplacian_masked, right_cf_mask, min_length=6
+            )
+            cf_lines = left_cf_lines + right_cf_lines
+            cf_intensity = (left_cf_int + right_cf_int) / 2
+
+            if cf_lines >= 10 and cf_intensity > 30:
+                crows_feet_severity = 1.0
+            elif cf_lines >= 5 and cf_intensity > 22:
+                crows_feet_severity = 0.66
+            elif cf_lines >= 2 or cf_intensity > 18:
+                crows_feet_severity = 0.33
+            else:
+                crows_feet_severity = 0.0
+
+            regional_wrinkle_count += cf_lines
+
+            # === Nasolabial Fold Analysis ===
+            left_nl_mask = get_region_mask(self.LEFT_NASOLABIAL, "left_nasolabial_hull")
+            right_nl_mask = get_region_mask(self.RIGHT_NASOLABIAL, "right_nasolabial_hull")
+            left_nl_lines, left_nl_int = analyze_wrinkles_in_region(
+                edges_deep, laplacian_masked, left_nl_mask, min_length=10
+            )
+            right_nl_lines, right_nl_int = analyze_wrinkles_in_region(
+                edges_deep, laplacian_masked, right_nl_mask, min_length=10
+            )
+            nl_lines = left_nl_lines + right_nl_lines
+            nl_intensity = (left_nl_int + right_nl_int) / 2
+
+            if nl_lines >= 4 and nl_intensity > 40:
+                nasolabial_severity = 1.0
+            elif nl_lines >= 2 and nl_intensity > 28:
+                nasolabial_severity = 0.66
+            elif nl_lines >= 1 or nl_intensity > 22:
+                nasolabial_severity = 0.33
+            else:
+                nasolabial_severity = 0.0
+
+            regional_wrinkle_count += nl_lines
+
+        # === Step 6: Overall Wrinkle Metrics ===
+        skin_pixels = laplacian_masked[mask > 0]
+
+        if len(skin_pixels) > 0:
+            # Fine lines: medium intensity gradients
+            fine_line_pixels = np.sum((skin_pixels > 20) & (skin_pixels <= 50))
+            deep_wrinkle_pixels = np.sum(skin_pixels > 50)
+
+            skin_area = max(np.sum(mask > 0), 1)
+
+            # Normalize by skin area
+            fine_lines_count = min(35, int(fine_line_pixels / (skin_area * 0.003)))
+            deep_wrinkles_count = min(12, int(deep_wrinkle_pixels / (skin_area * 0.006)))
+        else:
+            fine_lines_count = 0
+            deep_wrinkles_count = 0
+
+        # === Step 7: Calculate Overall Wrinkle Score ===
+        # Weighted combination of all factors
+        wrinkle_score = (
+            (forehead_severity * 15) +
+            (crows_feet_severity * 18) +
+            (nasolabial_severity * 12) +
+            (deep_wrinkles_count * 3) +
+            (fine_lines_count * 0.4) +
+            (regional_wrinkle_count * 0.8)
+        )
+
+        wrinkle_score = min(100, max(0, int(wrinkle_score)))
+
+        # Build wrinkle regions with bounding boxes (normalized coordinates)
+        wrinkle_regions = {
+            "forehead": {
+                "severity": float(forehead_severity),
+                "bbox": [0.25, 0.08, 0.75, 0.22]  # top portion of face
+            },
+            "left_crows_feet": {
+                "severity": float(crows_feet_severity),
+                "bbox": [0.05, 0.25, 0.25, 0.42]  # outer left eye area
+            },
+            "right_crows_feet": {
+                "severity": float(crows_feet_severity),
+                "bbox": [0.75, 0.25, 0.95, 0.42]  # outer right eye area
+            },
+            "nasolabial": {
+                "severity": float(nasolabial_severity),
+                "bbox": [0.28, 0.50, 0.72, 0.78]  # nose-to-mouth folds
+            }
+        }
+
+        return {
+            "wrinkle_score": int(wrinkle_score),
+            "fine_lines_count": int(fine_lines_count),
+            "deep_wrinkles_count": int(deep_wrinkles_count),
+            "forehead_lines_severity": float(forehead_severity),
+            "crows_feet_severity": float(crows_feet_severity),
+            "nasolabial_folds_severity": float(nasolabial_severity),
+            "wrinkle_regions": wrinkle_regions,
+        }
+
+    def _analyze_texture(self, img: np.ndarray, mask: np.ndarray,
+                         gray: Optional[np.ndarray] = None) -> Dict:
+        """Analyze skin texture using variance and gradient analysis"""
+
+        gray = gray if gray is not None else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray_masked = gray.copy()
+        gray_masked[mask == 0] = 0
+
+        # Calculate local variance (indicates texture roughness)
+        kernel_size = 5
+        mean = cv2.blur(gray_masked.astype(np.float32), (kernel_size, kernel_size))
+        sqr_mean = cv2.blur(gray_masked.astype(np.float32) ** 2, (kernel_size, kernel_size))
+        variance = sqr_mean - mean ** 2
+        variance[mask == 0] = 0
+
+        # Get variance statistics
+        skin_variance = variance[mask > 0]
+        mean_variance = np.mean(skin_variance) if len(skin_variance) > 0 else 0
+
+        # Pore detection using Laplacian of Gaussian
+        blurred = cv2.GaussianBlur(gray_masked, (3, 3), 0)
+        log = cv2.Laplacian(blurred, cv2.CV_64F)
+        log = np.uint8(np.absolute(log))
+
+        _, pore_mask = cv2.threshold(log, 25, 255, cv2.THRESH_BINARY)
+        pore_mask = cv2.bitwise_and(pore_mask, mask)
+
+        # Count and measure pores
+        contours, _ = cv2.findContours(pore_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        h, w = gray.shape
+
+        pore_sizes = []
+        enlarged_pores = 0
+        enlarged_pores_locations = []  # Store locations of enlarged pores
+        skin_area = max(np.sum(mask > 0), 1)
+        area_scale = skin_area / 100000
+
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            if 3 * max(area_scale, 0.5) < area < 80 * max(area_scale, 0.5):
+                pore_sizes.append(area)
+                if area > 25 * max(area_scale, 0.5):
+                    enlarged_pores += 1
+                    # Get centroid for enlarged pores only
+                    M = cv2.moments(cnt)
+                    if M["m00"] > 0 and len(enlarged_pores_locations) < 15:
+                        cx = M["m10"] / M["m00"] / w
+                        cy = M["m01"] / M["m00"] / h
+                        enlarged_pores_locations.append({
+                            "x": round(cx, 3),
+                            "y": round(cy, 3)
+                        })
+
+        enlarged_pores = min(enlarged_pores, 50)
+
+        # Classify pore size (as float 0.0-1.0 for database, represents mm)
+        if pore_sizes:
+            avg_pore_area = float(np.mean(pore_sizes))
+            # Convert area to approximate mm (normalized)
+            pore_size = min(1.0, avg_pore_area / 30.0)  # 30 px² → ~1mm
+        else:
+            pore_size = 0.1  # small default
+
+        # Determine roughness level (0.0-1.0 scale for database)
+        if mean_variance > 400:
+            roughness = 1.0  # rough
+        elif mean_variance > 150:
+            roughness = 0.5  # slightly_rough
+        else:
+            roughness = 0.0  # smooth
+
+        # Calculate texture score (higher = smoother)
+        smoothness_score = max(0, min(100, 100 - int(mean_variance / 4)))
+        texture_score = max(0, min(100, smoothness_score - (enlarged_pores)))
+
+        return {
+            "texture_score": int(texture_score),
+            "pore_size_average": float(pore_size),
+            "enlarged_pores_count": int(enlarged_pores),
+            "roughness_level": float(roughness),
+            "smoothness_score": int(smoothness_score),
+            "enlarged_pores_locations": enlarged_pores_locations,
+            # T-zone region for pores highlight
+            "pores_region": {
+                "bbox": [0.35, 0.15, 0.65, 0.75]  # nose/forehead/chin T-zone
+            }
+        }
+
+    def _analyze_redness(self, img: np.ndarray, mask: np.ndarray,
+                         hsv: Optional[np.ndarray] = None, lab: Optional[np.ndarray] = None,
+                         classes=None) -> Dict:
+        """Analyze skin redness with HIGH ACCURACY validation.
+
+        STRICT ACCURACY MODE:
+        - Compare to individual's skin tone baseline
+        - Verify redness is abnormal, not natural undertone
+        - Use LAB color space for better red detection
+        - Only flag clinically significant redness
+
+        classes (the live pixel classifier's output) is deliberately ignored.
+        """
+
+        hsv = hsv if hsv is not None else cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        hsv_pixels = hsv[mask > 0]
+        lab_pixels = lab[mask > 0]
+
+        if len(hsv_pixels) == 0:
+            return self._default_redness()
+
+        h_channel = hsv_pixels[:, 0]
+        s_channel = hsv_pixels[:, 1]
+        v_channel = hsv_pixels[:, 2]
+        a_channel = lab_pixels[:, 1]  # LAB 'a' channel: negative=green, positive=red
+        total_pixels = len(h_channel)
+
+        # Calculate baseline skin tone
+        median_saturation = np.median(s_channel)
+        median_a = np.median(a_channel)  # Baseline red-green axis
+
+        # ULTRA STRICT: Only count pixels EXTREMELY redder than person's baseline
+        # Using LAB 'a' channel which better captures red vs non-red
+        # Increased threshold from 20 to 35 - must be VERY obviously redder than baseline
+        red_threshold_a = median_a + 35  # Much higher threshold for true redness
+        abnormal_red_pixels = np.sum(a_channel > red_threshold_a)
+        abnormal_red_ratio = abnormal_red_pixels / total_pixels
+
+        # HSV-based red with ULTRA STRICT thresholds
+        # Very narrow hue range AND very high saturation AND brightness check
+        strict_red = np.sum(
+            ((h_channel < 5) | (h_channel > 175)) &  # Very narrow hue range
+            (s_channel > 130) &  # Very high saturation - only true inflammation
+            (v_channel > 70)
+        )
+        strict_red_ratio = strict_red / total_pixels
+
+        # Intense inflammation: extreme saturation red only
+        intense_red = np.sum(
+            ((h_channel < 4) | (h_channel > 176)) &  # Extremely narrow hue
+            (s_channel > 150)  # Only very obvious inflammation
+        )
+        intense_ratio = intense_red / total_pixels
+
+        # Account for natural skin undertone - GENEROUS baseline subtraction
+        # Warm skin tones (common in Indian population) naturally have higher redness
+        natural_baseline = min(0.35, median_saturation / 300)  # More generous for warm undertones
+        adjusted_red_ratio = max(0, strict_red_ratio - natural_baseline)
+        adjusted_abnormal_ratio = max(0, abnormal_red_ratio - 0.15)  # 15% is normal variation (was 5%)
+
+        # SAFETY: If most of the face appears "red", it's likely natural skin tone
+        # Cap the ratios to prevent natural warm skin from scoring high
+        if abnormal_red_ratio > 0.5:  # More than 50% "abnormal" = probably just natural tone
+            adjusted_abnormal_ratio = min(adjusted_abnormal_ratio, 0.10)
+        if strict_red_ratio > 0.3:  # More than 30% "red" = probably just warm undertone
+            adjusted_red_ratio = min(adjusted_red_ratio, 0.08)
+
+        # Calculate redness score - LOWER multipliers to reduce false positives
+        redness_score = min(100, int(
+            adjusted_abnormal_ratio * 50 +  # Reduced from 80 - LAB-based abnormal redness
+            adjusted_red_ratio * 30 +        # Reduced from 40 - HSV-based strict redness
+            intense_ratio * 100              # Reduced from 150 - Intense inflammation
+        ))
+
+        # Determine sensitivity level - STRICT thresholds
+        if intense_ratio > 0.10 or adjusted_abnormal_ratio > 0.15:
+            sensitivity = "high"
+        elif intense_ratio > 0.04 or adjusted_abnormal_ratio > 0.08:
+            sensitivity = "medium"
+        else:
+            sensitivity = "low"
+
+        # Check for irritation patterns
+        red_binary = np.zeros_like(mask)
+        hsv_full = hsv.copy()
+        red_binary[((hsv_full[:, :, 0] < 8) | (hsv_full[:, :, 0] > 172)) &
+                   (hsv_full[:, :, 1] > 90) & (mask > 0)] = 255
+
+        # Morphological cleanup
+        kernel = np.ones((3, 3), np.uint8)
+        red_binary = cv2.morphologyEx(red_binary, cv2.MORPH_OPEN, kernel)
+
+        num_labels, _ = cv2.connectedComponents(red_binary)
+        irritation_detected = bool((num_labels - 1) > 10)
+
+        # Rosacea indicators - STRICT: requires multiple strong signals
+        rosacea_indicators = bool(
+            intense_ratio > 0.12 and
+            adjusted_abnormal_ratio > 0.20 and
+            adjusted_red_ratio > 0.15
+        )
+
+        # Build redness regions - only for significant redness
+        redness_regions = []
+        if adjusted_red_ratio > 0.15 or adjusted_abnormal_ratio > 0.12:
+            redness_regions.append({
+                "region": "cheeks",
+                "bbox": [0.10, 0.35, 0.40, 0.65],
+                "intensity": round(float(max(adjusted_red_ratio, adjusted_abnormal_ratio)), 2)
+            })
+            redness_regions.append({
+                "region": "cheeks",
+                "bbox": [0.60, 0.35, 0.90, 0.65],
+                "intensity": round(float(max(adjusted_red_ratio, adjusted_abnormal_ratio)), 2)
+            })
+        if intense_ratio > 0.06:
+            redness_regions.append({
+                "region": "nose",
+                "bbox": [0.38, 0.40, 0.62, 0.70],
+                "intensity": round(float(intense_ratio), 2)
+            })
+
+        return {
+            "redness_score": int(redness_score),
+            "sensitivity_level": sensitivity,
+            "irritation_detected": irritation_detected,
+            "rosacea_indicators": rosacea_indicators,
+            "redness_regions": redness_regions,
+        }
+
+    def _detect_pigmentation(self, img: np.ndarray, mask: np.ndarray,
+                             lab: Optional[np.ndarray] = None) -> Dict:
+        """Detect pigmentation with HIGH ACCURACY contrast validation.
+
+        STRICT ACCURACY MODE:
+        - Each spot must have significant contrast vs surroundings
+        - Verify spots are true pigmentation, not shadows
+        - Use local neighborhood comparison
+        - Only count validated dark spots
+        """
+
+        lab = lab if lab is not None else cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        l_channel = lab[:, :, 0]
+        a_channel = lab[:, :, 1]  # For color-based validation
+        h, w = l_channel.shape
+
+        skin_lightness = l_channel[mask > 0]
+        if len(skin_lightness) == 0:
+            return self._default_pigmentation()
+
+        mean_lightness = np.mean(skin_lightness)
+        std_lightness = np.std(skin_lightness)
+        median_lightness = np.median(skin_lightness)
+
+        # STRICT: Use 2.0 std for initial detection, then validate
+        dark_threshold = mean_lightness - 2.0 * std_lightness
+        dark_threshold = max(dark_threshold, mean_lightness * 0.65)
+
+        dark_mask = (l_channel < dark_threshold).astype(np.uint8) * 255
+        dark_mask = cv2.bitwise_and(dark_mask, mask)
+
+        # Strong morphological cleanup
+        kernel = np.ones((3, 3), np.uint8)
+        dark_mask = cv2.morphologyEx(dark_mask, cv2.MORPH_OPEN, kernel)
+        dark_mask = cv2.morphologyEx(dark_mask, cv2.MORPH_CLOSE, kernel)
+
+        contours, _ = cv2.findContours(dark_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        dark_spots_count = 0
+        total_dark_area = 0
+        dark_spots_locations = []
+        skin_area = max(np.sum(mask > 0), 1)
+        area_scale = skin_area / 100000
+
+        # STRICT: Higher minimum area
+        min_area = 25
+        max_area = 1200
+
+        def verify_pigmentation_spot(cnt):
+            """Verify spot is true pigmentation with contrast validation"""
+            M = cv2.moments(cnt)
+            if M["m00"] == 0:
+                return False, 0
+
+            # Get spot intensity
+            spot_mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.drawContours(spot_mask, [cnt], -1, 255, -1)
+            spot_pixels = l_channel[spot_mask > 0]
+
+            if len(spot_pixels) < 5:
+                return False, 0
+
+            spot_mean = np.mean(spot_pixels)
+
+            # Get surrounding area (dilate contour)
+            dilated = cv2.dilate(spot_mask, kernel, iterations=4)
+            surround_mask = cv2.subtract(dilated, spot_mask)
+            surround_mask = cv2.bitwise_and(surround_mask, mask)
+            surround_pixels = l_channel[surround_mask > 0]
+
+            if len(surround_pixels) < 20:
+                return False, 0
+
+            surround_mean = np.mean(surround_pixels)
+
+            # STRICT: Spot must be at least 12 units darker than immediate surroundings
+            contrast = surround_mean - spot_mean
+            if contrast < 12:
+                return False, 0
+
+            # Additional check: spot should also be darker than global median
+            if spot_mean > median_lightness - 5:
+                return False, 0
+
+            return True, contrast
+
+        large_patches = 0
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            scaled_min = min_area * max(area_scale, 0.5)
+            scaled_max = max_area * max(area_scale, 0.5)
+
+            if scaled_min < area < scaled_max:
+                # VERIFY this is true pigmentation
+                is_valid, contrast = verify_pigmentation_spot(cnt)
+
+                if is_valid:
+                    dark_spots_count += 1
+                    total_dark_area += area
+
+                    if area > 400 * max(area_scale, 0.5):
+                        large_patches += 1
+
+                    M = cv2.moments(cnt)
+                    if M["m00"] > 0 and len(dark_spots_locations) < 10:
+                        cx = M["m10"] / M["m00"] / w
+                        cy = M["m01"] / M["m00"] / h
+                        dark_spots_locations.append({
+                            "x": round(cx, 3),
+                            "y": round(cy, 3),
+                            "size": round(float(area / skin_area * 1000), 3),
+                            "contrast": round(float(contrast), 1)
+                        })
+
+        dark_spots_count = min(dark_spots_count, 20)
+
+        # Pigmentation score - based on VERIFIED spots only
+        dark_ratio = total_dark_area / skin_area
+        pigmentation_score = min(100, int(dark_ratio * 400 + dark_spots_count * 3.0))
+
+        # Severity classification - STRICT thresholds
+        if dark_spots_count > 12 or dark_ratio > 0.08:
+            severity = 1.0  # severe
+        elif dark_spots_count > 6 or dark_ratio > 0.04:
+            severity = 0.66  # moderate
+        elif dark_spots_count > 2:
+            severity = 0.33  # mild
+        else:
+            severity = 0.0  # none
+
+        # Sun damage score
+        sun_damage_score = int(min(100, int(std_lightness * 1.8 + dark_spots_count * 1.5)))
+
+        # Melasma detection - requires multiple large verified patches
+        melasma_detected = bool(large_patches >= 2)
+
+        return {
+            "pigmentation_score": int(pigmentation_score),
+            "dark_spots_count": int(dark_spots_count),
+            "dark_spots_severity": float(severity),
+            "sun_damage_score": sun_damage_score,
+            "melasma_detected": melasma_detected,
+            "dark_spots_locations": dark_spots_locations,
+        }
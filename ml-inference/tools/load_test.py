@@ -0,0 +1,544 @@
+"""
+Load Test
+Drive the service with mixed /face-scan, /body-scan and /size-recommendation traffic over a concurrency sweep
+
+    python tools/load_test.py --concurrency 1,2,4,8 --duration 20 --output load.json
+    python tools/load_test.py --url http://127.0.0.1:8000 --mix face=1 --output load.json
+    python tools/load_test.py --spawn-server --compare load-main.json --output load.json
+
+By default the FastAPI app from main.py runs in this process and requests go
+through httpx's ASGI transport (startup/shutdown handlers included), so no
+server or network is involved. --url targets a running server instead, and
+--spawn-server starts `uvicorn main:app` on a free local port for the run.
+
+Each concurrency level runs closed-loop for --duration seconds: that many
+clients each send the next request as soon as the previous one finished,
+picking face/body/size by the --mix weights. Face scans send 1-3 views from
+--face-images (default: the synthetic faces in tools/equivalence_corpus);
+a warm-up pass keeps only images the service finds a face in. Body scans send
+synthetic front/side/back silhouettes (or --body-images), size
+recommendations random measurements.
+
+The JSON output has, per level: throughput, latency percentiles (overall and
+per endpoint), status counts, errors (transport errors, 5xx, success=false),
+shed requests (429/503/413 from admission control), degraded face scans
+(lower quality tier or partial) and CPU/RSS samples of the serving process
+over time. --compare prints throughput and p95 against an earlier output.
+
+The recent-scan result cache is turned off (RECENT_SCAN_CACHE_SIZE=0) in the
+in-process and spawned app unless --keep-scan-cache is given, since the
+same images are sent over and over.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import httpx
+import numpy as np
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.dirname(TOOLS_DIR)
+sys.path.insert(0, SERVICE_DIR)
+
+KINDS = ("face", "body", "size")
+ENDPOINTS = {"face": "/face-scan", "body": "/body-scan", "size": "/size-recommendation"}
+SHED_STATUSES = (413, 429, 503)
+DEFAULT_FACE_IMAGES = os.path.join(TOOLS_DIR, "equivalence_corpus", "*.jpg")
+CATEGORIES = ("tops", "bottoms", "dresses", "outerwear")
+
+
+def log(message: str):
+    """Progress line on the real stdout (the in-process service's own logs may be silenced)"""
+    print(message, file=sys.__stdout__, flush=True)
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """"face=5,body=1,size=4" -> normalized weights"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown traffic kind '{name}' (expected {', '.join(KINDS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("mix weights must add up to more than 0")
+    return {name: weight / total for name, weight in weights.items() if weight > 0}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "max": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1),
+            "mean": round(float(np.mean(values)), 1), "max": round(float(np.max(values)), 1)}
+
+
+# ----------------------------------------------------------------------------
+# Synthetic traffic
+# ----------------------------------------------------------------------------
+
+def _encode(img: np.ndarray) -> bytes:
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def render_body(view: str, seed: int, size: Tuple[int, int] = (720, 1280)) -> bytes:
+    """A standing figure silhouette (front, side or back) on a plain background, as JPEG"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    img = np.empty((h, w, 3), dtype=np.uint8)
+    img[:] = rng.integers(150, 235, 3)
+    skin = tuple(int(c) for c in rng.integers(60, 200, 3))
+    cloth = tuple(int(c) for c in rng.integers(20, 140, 3))
+    cx = w // 2
+    half = 0.55 if view == "side" else 1.0  # Narrower torso and hips in profile
+    head_y, head_r = int(h * 0.12), int(h * 0.055)
+    cv2.circle(img, (cx, head_y), head_r, skin, -1)
+    shoulder, waist, hip = (int(w * f * half) for f in (0.16, 0.11, 0.14))
+    torso = np.array([[cx - shoulder, int(h * 0.2)], [cx + shoulder, int(h * 0.2)], [cx + waist, int(h * 0.45)],
+                      [cx + hip, int(h * 0.55)], [cx - hip, int(h * 0.55)], [cx - waist, int(h * 0.45)]], np.int32)
+    cv2.fillPoly(img, [torso], cloth)
+    leg = max(8, int(w * 0.05 * (1.2 if view == "side" else 1.0)))
+    for side in ((-1, 1) if view != "side" else (0,)):
+        x = cx + side * int(hip * 0.5)
+        cv2.line(img, (x, int(h * 0.55)), (x, int(h * 0.95)), cloth, leg)
+    if view != "side":
+        for side in (-1, 1):
+            cv2.line(img, (cx + side * shoulder, int(h * 0.21)), (cx + side * int(shoulder * 1.3), int(h * 0.5)),
+                     skin, max(6, leg // 2))
+    return _encode(img)
+
+
+class TrafficFactory:
+    """Builds the POST (path, httpx kwargs) for each traffic kind"""
+
+    def __init__(self, face_images: List[bytes], body_views: List[List[bytes]], face_views: int, seed: int,
+                 request_timeout_ms: Optional[int] = None):
+        self.face_images = face_images
+        self.body_views = body_views
+        self.face_views = face_views
+        self.request_timeout_ms = request_timeout_ms
+        self.rng = random.Random(seed)
+
+    def build(self, kind: str) -> Tuple[str, Dict[str, Any]]:
+        scan_id = f"load-{kind}-{uuid.uuid4().hex[:12]}"
+        if kind == "face":
+            views = self.rng.sample(self.face_images, min(self.face_views, len(self.face_images)))
+            files = [("images", (f"view_{i}.jpg", data, "image/jpeg")) for i, data in enumerate(views)]
+            headers = {"X-Request-Timeout-Ms": str(self.request_timeout_ms)} if self.request_timeout_ms else None
+            return ENDPOINTS[kind], {"data": {"scan_id": scan_id}, "files": files, "headers": headers}
+        if kind == "body":
+            views = self.rng.choice(self.body_views)
+            files = [("images", (f"view_{i}.jpg", data, "image/jpeg")) for i, data in enumerate(views)]
+            return ENDPOINTS[kind], {"data": {"scan_id": scan_id}, "files": files}
+        height = self.rng.uniform(150, 195)
+        measurements = {
+            "height_cm": round(height, 1),
+            "chest_cm": round(self.rng.uniform(78, 125), 1),
+            "waist_cm": round(self.rng.uniform(60, 115), 1),
+            "hips_cm": round(self.rng.uniform(82, 128), 1),
+        }
+        body = {"measurements": measurements, "product_id": f"sku-{self.rng.randrange(1000)}",
+                "product_metadata": {"category": self.rng.choice(CATEGORIES)}}
+        return ENDPOINTS[kind], {"json": body}
+
+
+def load_images(pattern: str) -> List[bytes]:
+    """Bytes of the images matching a glob pattern (or in a directory)"""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    paths = sorted(p for p in glob.glob(pattern) if p.lower().endswith((".jpg", ".jpeg", ".png", ".webp")))
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+
+# ----------------------------------------------------------------------------
+# Resource sampling
+# ----------------------------------------------------------------------------
+
+class ResourceSampler:
+    """
+    CPU and RSS of one process over time, read from /proc.
+
+    CPU is the share of one core used between samples (200 = two busy cores).
+    Without /proc (not Linux) only this process can be measured, and RSS is
+    the peak from getrusage.
+    """
+
+    def __init__(self, pid: int, interval: float):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Dict[str, float]] = []
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._proc = os.path.exists(f"/proc/{pid}/stat")
+
+    def _cpu_seconds(self) -> float:
+        if self._proc:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # Fields after the command name (which may contain spaces): utime, stime are 14 and 15
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / self._ticks
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime + usage.ru_stime
+
+    def _rss_mb(self) -> float:
+        if self._proc:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+            return 0.0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    async def run(self, started: float):
+        last_cpu, last_time = self._cpu_seconds(), time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                cpu, now = self._cpu_seconds(), time.monotonic()
+                self.samples.append({
+                    "t": round(now - started, 2),
+                    "cpu_percent": round((cpu - last_cpu) / max(now - last_time, 1e-6) * 100, 1),
+                    "rss_mb": round(self._rss_mb(), 1),
+                })
+                last_cpu, last_time = cpu, now
+            except (OSError, ValueError, IndexError):
+                return  # Process went away
+
+
+# ----------------------------------------------------------------------------
+# Running
+# ----------------------------------------------------------------------------
+
+async def send(client: httpx.AsyncClient, factory: TrafficFactory, kind: str) -> Dict[str, Any]:
+    """Send one request and classify its outcome"""
+    path, kwargs = factory.build(kind)
+    started = time.perf_counter()
+    record = {"kind": kind}
+    try:
+        response = await client.post(path, **kwargs)
+        record["status"] = response.status_code
+        if response.status_code in SHED_STATUSES:
+            record["outcome"] = "shed"
+        elif response.status_code >= 400:
+            record["outcome"] = "error"
+            record["error"] = response.text[:200]
+        else:
+            body = response.json()
+            if isinstance(body, dict) and body.get("success") is False:
+                record["outcome"] = "error"
+                record["error"] = str(body.get("error"))[:200]
+            elif kind == "face" and (body.get("partial") or body.get("quality_tier", "full") != "full"):
+                record["outcome"] = "degraded"
+                record["tier"] = "partial" if body.get("partial") else body.get("quality_tier")
+            else:
+                record["outcome"] = "ok"
+    except httpx.HTTPError as e:
+        record.update(status=None, outcome="error", error=f"{type(e).__name__}: {e}")
+    record["ms"] = (time.perf_counter() - started) * 1000
+    return record
+
+
+async def run_level(client: httpx.AsyncClient, factory: TrafficFactory, mix: Dict[str, float], concurrency: int,
+                    duration: float, sampler: ResourceSampler, seed: int) -> Dict[str, Any]:
+    """Closed-loop load at one concurrency level for `duration` seconds"""
+    rng = random.Random(seed)
+    kinds, weights = list(mix), list(mix.values())
+    records: List[Dict[str, Any]] = []
+    started = time.monotonic()
+    stop_at = started + duration
+
+    async def client_loop():
+        while time.monotonic() < stop_at:
+            records.append(await send(client, factory, rng.choices(kinds, weights)[0]))
+
+    sampler.samples = []
+    sampling = asyncio.ensure_future(sampler.run(started))
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    sampling.cancel()
+    elapsed = time.monotonic() - started
+    return summarize_level(records, concurrency, elapsed, sampler.samples)
+
+
+def summarize_level(records: List[Dict[str, Any]], concurrency: int, elapsed: float,
+                    samples: List[Dict[str, float]]) -> Dict[str, Any]:
+    """Throughput, latency percentiles, outcome counts and resource samples of one level"""
+    def outcome_counts(rs):
+        counts = {"ok": 0, "degraded": 0, "shed": 0, "error": 0}
+        for r in rs:
+            counts[r["outcome"]] += 1
+        return counts
+
+    completed = [r for r in records if r["outcome"] in ("ok", "degraded")]
+    statuses: Dict[str, int] = {}
+    for r in records:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+    tiers: Dict[str, int] = {}
+    for r in records:
+        if r.get("tier"):
+            tiers[r["tier"]] = tiers.get(r["tier"], 0) + 1
+    errors: Dict[str, int] = {}
+    for r in records:
+        if r["outcome"] == "error":
+            errors[r.get("error", "")] = errors.get(r.get("error", ""), 0) + 1
+
+    endpoints = {}
+    for kind in KINDS:
+        rs = [r for r in records if r["kind"] == kind]
+        if rs:
+            done = [r["ms"] for r in rs if r["outcome"] in ("ok", "degraded")]
+            endpoints[kind] = dict(requests=len(rs), throughput_rps=round(len(done) / elapsed, 2),
+                                   latency_ms=percentiles(done), **outcome_counts(rs))
+
+    cpu = [s["cpu_percent"] for s in samples]
+    rss = [s["rss_mb"] for s in samples]
+    return {
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(records),
+        "throughput_rps": round(len(completed) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": percentiles([r["ms"] for r in completed]),
+        **outcome_counts(records),
+        "statuses": statuses,
+        "degraded_tiers": tiers,
+        "top_errors": dict(sorted(errors.items(), key=lambda item: -item[1])[:5]),
+        "endpoints": endpoints,
+        "cpu_percent": {"mean": round(float(np.mean(cpu)), 1) if cpu else 0.0, "max": max(cpu, default=0.0)},
+        "rss_mb": {"start": rss[0] if rss else 0.0, "max": max(rss, default=0.0), "end": rss[-1] if rss else 0.0},
+        "samples": samples,
+    }
+
+
+async def preflight(client: httpx.AsyncClient, face_images: List[bytes]) -> List[bytes]:
+    """Warm the service up and keep the face images it detects a face in (all of them if none pass)"""
+    usable = []
+    for idx, data in enumerate(face_images):
+        try:
+            response = await client.post("/face-scan", data={"scan_id": f"load-warmup-{idx}"},
+                                         files=[("images", ("front.jpg", data, "image/jpeg"))])
+            if response.status_code == 200 and response.json().get("success"):
+                usable.append(data)
+        except httpx.HTTPError as e:
+            log(f"[LoadTest] Warm-up request failed: {e}")
+    if not usable:
+        log("[LoadTest] No face image passed face detection; face scans will count as errors")
+        return face_images
+    log(f"[LoadTest] {len(usable)}/{len(face_images)} face images usable")
+    return usable
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(env: Dict[str, str], startup_timeout: float = 180.0) -> Tuple[subprocess.Popen, str]:
+    """Start `uvicorn main:app` on a free local port and wait for /health"""
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=SERVICE_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with {proc.returncode} during startup")
+        try:
+            if httpx.get(f"{url}/health", timeout=2).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"Server did not answer /health within {startup_timeout:.0f}s")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def sweep(client: httpx.AsyncClient, factory: TrafficFactory, mix: Dict[str, float], levels: List[int],
+                duration: float, sampler: ResourceSampler, seed: int, warm_up: bool) -> List[Dict[str, Any]]:
+    if warm_up and "face" in mix:
+        factory.face_images = await preflight(client, factory.face_images)
+    results = []
+    for concurrency in levels:
+        level = await run_level(client, factory, mix, concurrency, duration, sampler, seed + concurrency)
+        lat = level["latency_ms"]
+        log(f"[LoadTest] concurrency {concurrency}: {level['throughput_rps']} req/s, "
+              f"p50 {lat['p50']} / p95 {lat['p95']} / p99 {lat['p99']} ms, {level['error']} errors, {level['shed']} shed, {level['degraded']} degraded, "
+              f"CPU {level['cpu_percent']['mean']}%, RSS max {level['rss_mb']['max']} MB")
+        results.append(level)
+    return results
+
+
+async def run_in_process(factory: TrafficFactory, mix: Dict[str, float], levels: List[int], duration: float,
+                         interval: float, timeout: float, seed: int, warm_up: bool) -> List[Dict[str, Any]]:
+    """Sweep against main.app in this process through the ASGI transport"""
+    from main import app
+
+    sampler = ResourceSampler(os.getpid(), interval)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+            return await sweep(client, factory, mix, levels, duration, sampler, seed, warm_up)
+
+
+async def run_remote(url: str, pid: Optional[int], factory: TrafficFactory, mix: Dict[str, float],
+                     levels: List[int], duration: float, interval: float, timeout: float, seed: int,
+                     warm_up: bool) -> List[Dict[str, Any]]:
+    """Sweep against a server over HTTP (resources sampled only when its pid is known)"""
+    sampler = ResourceSampler(pid, interval) if pid else _NullSampler()
+    limits = httpx.Limits(max_connections=max(levels) + 4)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        return await sweep(client, factory, mix, levels, duration, sampler, seed, warm_up)
+
+
+class _NullSampler:
+    samples: List[Dict[str, float]] = []
+
+    async def run(self, started: float):
+        await asyncio.Event().wait()
+
+
+def compare(base_path: str, levels: List[Dict[str, Any]]):
+    """Print throughput and p95 per concurrency level against an earlier output"""
+    with open(base_path) as f:
+        base = {level["concurrency"]: level for level in json.load(f)["levels"]}
+    for level in levels:
+        old = base.get(level["concurrency"])
+        if old is None:
+            continue
+        def pct(new, prev):
+            return f"{(new - prev) / prev * 100:+.1f}%" if prev else "n/a"
+        log(f"[LoadTest] vs {os.path.basename(base_path)} at concurrency {level['concurrency']}: "
+              f"throughput {old['throughput_rps']} -> {level['throughput_rps']} req/s "
+              f"({pct(level['throughput_rps'], old['throughput_rps'])}), "
+              f"p95 {old['latency_ms']['p95']} -> {level['latency_ms']['p95']} ms "
+              f"({pct(level['latency_ms']['p95'], old['latency_ms']['p95'])}), "
+              f"errors {old['error']} -> {level['error']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Concurrency sweep over mixed scan traffic")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Base URL of a running server (default: main.app in-process)")
+    target.add_argument("--spawn-server", action="store_true", help="Start uvicorn main:app locally for the run")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, for CPU/RSS sampling")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("face=5,body=1,size=4"),
+                        help="Traffic weights, e.g. face=5,body=1,size=4")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    parser.add_argument("--face-images", default=DEFAULT_FACE_IMAGES, help="Glob or directory of face photos")
+    parser.add_argument("--face-views", type=int, default=3, choices=(1, 2, 3), help="Images per face scan")
+    parser.add_argument("--body-images", help="Glob or directory of body photos (default: synthetic silhouettes)")
+    parser.add_argument("--request-timeout-ms", type=int, help="Send X-Request-Timeout-Ms with face scans")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request (seconds)")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between CPU/RSS samples")
+    parser.add_argument("--no-warm-up", action="store_true", help="Skip the warm-up/face-image check")
+    parser.add_argument("--keep-scan-cache", action="store_true",
+                        help="Leave the recent-scan result cache on (in-process / spawned server)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for traffic choices")
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show the service's logs (in-process)")
+    args = parser.parse_args(argv)
+
+    try:
+        levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    except ValueError:
+        parser.error("--concurrency must be comma-separated integers")
+    if not levels or min(levels) < 1:
+        parser.error("--concurrency levels must be at least 1")
+
+    output = os.path.abspath(args.output) if args.output else None
+    base = os.path.abspath(args.compare) if args.compare else None
+    face_images = load_images(args.face_images)
+    if "face" in args.mix and not face_images:
+        parser.error(f"No face images found at {args.face_images}")
+    if args.body_images:
+        body = load_images(args.body_images)
+        body_views = [body[i:i + 3] for i in range(0, len(body) - 2, 3)] or [body * 3]
+    else:
+        body_views = [[render_body(view, seed) for view in ("front", "side", "back")] for seed in range(4)]
+    factory = TrafficFactory(face_images, body_views, args.face_views, args.seed, args.request_timeout_ms)
+
+    if not args.keep_scan_cache:
+        os.environ["RECENT_SCAN_CACHE_SIZE"] = "0"
+    started = time.time()
+    server = None
+    if args.url or args.spawn_server:
+        url, pid = args.url, args.server_pid
+        if args.spawn_server:
+            server, url = spawn_server(dict(os.environ))
+            pid = server.pid
+            log(f"[LoadTest] Server started at {url} (pid {pid})")
+        try:
+            levels_out = asyncio.run(run_remote(url, pid, factory, args.mix, levels, args.duration,
+                                                args.sample_interval, args.timeout, args.seed, not args.no_warm_up))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=30)
+        target_name = "spawned" if args.spawn_server else url
+    else:
+        # Same working directory as the server, so relative settings (output/, models/) resolve alike
+        os.chdir(SERVICE_DIR)
+        if not args.verbose:
+            # The service logs every stage of every scan; this tool's lines go through log()
+            sys.stdout = open(os.devnull, "w")
+        try:
+            levels_out = asyncio.run(run_in_process(factory, args.mix, levels, args.duration, args.sample_interval,
+                                                    args.timeout, args.seed, not args.no_warm_up))
+        finally:
+            sys.stdout = sys.__stdout__
+        target_name = "in-process"
+
+    result = {
+        "commit": _git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "target": target_name,
+        "mix": args.mix,
+        "duration_per_level": args.duration,
+        "face_views": args.face_views,
+        "face_images": len(factory.face_images),
+        "python": platform.python_version(),
+        "cpus": len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count(),
+        "levels": levels_out,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=1)
+        log(f"[LoadTest] Results written to {output}")
+    if base:
+        compare(base, levels_out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""
+Size Recommendation Backfill
+Recompute size recommendations for every shopper × product pair after a size chart changes
+
+    python tools/size_backfill.py --shoppers shoppers.csv --products products.jsonl --output recs.jsonl
+
+Shoppers and products are CSV (with a header row) or JSONL, picked by file
+extension. Shopper rows need shopper_id plus any of chest_cm, waist_cm,
+hips_cm, height_cm (missing or empty values get the same defaults as
+/size-recommendation). Product rows need product_id and are otherwise the
+product_metadata (category, brand, ...).
+
+Only the chart category of a product affects its scores, so products are
+grouped by category and every chunk of shoppers is scored once per category
+as a shoppers × sizes matrix. Shoppers are streamed in --chunk-size chunks,
+and results are written as each chunk finishes: JSONL lines of
+{"shopper_id", "product_id", "recommended_size", "confidence", "all_sizes"},
+or CSV rows with all_sizes as a JSON column. Values match
+SizeRecommendationService.recommend_size for each pair.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.serialization import dumps  # noqa: E402
+from services.size_recommendation_service import DEFAULT_MEASUREMENTS, SizeRecommendationService  # noqa: E402
+
+SCORED_MEASUREMENTS = ("chest_cm", "waist_cm", "hips_cm")
+CSV_COLUMNS = ["shopper_id", "product_id", "recommended_size", "confidence", "all_sizes"]
+
+# Output rows buffered between writes: a chunk has chunk_size x products rows,
+# so writers flush every WRITE_BATCH_ROWS instead of building the chunk's output at once
+WRITE_BATCH_ROWS = 65536
+
+
+def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV (header row required) or JSONL file, one dict at a time"""
+    with open(path, newline="") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+            return
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                print(f"[SizeBackfill] {path} line {line_no} skipped: {e}")
+
+
+def iter_chunks(records: Iterator[Dict[str, Any]], chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group records into lists of at most chunk_size"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_products(path: str, service: SizeRecommendationService) -> Dict[str, List[str]]:
+    """product_ids grouped by chart category, in file order"""
+    by_category: Dict[str, List[str]] = {}
+    for record in iter_records(path):
+        product_id = record.get("product_id")
+        if product_id in (None, ""):
+            print(f"[SizeBackfill] Product without product_id skipped: {record}")
+            continue
+        category = service.product_category(record)
+        by_category.setdefault(category, []).append(str(product_id))
+    return by_category
+
+
+def _measurement_arrays(chunk: List[Dict[str, Any]]) -> Tuple[List[str], Dict[str, np.ndarray], List[Dict]]:
+    """
+    shopper_ids, scored measurement columns and per-shopper measurement dicts for a chunk.
+
+    Missing or empty values get DEFAULT_MEASUREMENTS; rows without a
+    shopper_id or with a non-numeric measurement are skipped.
+    """
+    shopper_ids, rows = [], []
+    for record in chunk:
+        shopper_id = record.get("shopper_id")
+        if shopper_id in (None, ""):
+            print("[SizeBackfill] Shopper without shopper_id skipped")
+            continue
+        measurements = {}
+        try:
+            for key, default in DEFAULT_MEASUREMENTS.items():
+                value = record.get(key)
+                measurements[key] = default if value in (None, "") else float(value)
+        except (TypeError, ValueError) as e:
+            print(f"[SizeBackfill] Shopper {shopper_id} skipped: {e}")
+            continue
+        shopper_ids.append(str(shopper_id))
+        rows.append(measurements)
+    columns = {key: np.array([row[key] for row in rows], dtype=np.float64) for key in SCORED_MEASUREMENTS}
+    return shopper_ids, columns, rows
+
+
+class JSONLWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write_chunk(self, shopper_ids: List[str], products: Dict[str, List[str]],
+                    recommendations: Dict[str, List[Dict]]):
+        lines = []
+        product_keys = {c: [dumps(p) for p in ids] for c, ids in products.items()}
+        # Each result dict is serialized once, however many shoppers and products share it
+        encoded: Dict[int, bytes] = {}
+        for i, shopper_id in enumerate(shopper_ids):
+            prefix = b'{"shopper_id":' + dumps(shopper_id) + b',"product_id":'
+            for category, keys in product_keys.items():
+                rec = recommendations[category][i]
+                body = encoded.get(id(rec))
+                if body is None:
+                    body = encoded[id(rec)] = b"," + dumps(rec)[1:] + b"\n"
+                lines.extend(prefix + key + body for key in keys)
+            if len(lines) >= WRITE_BATCH_ROWS:
+                self.f.write(b"".join(lines))
+                lines.clear()
+        if lines:
+            self.f.write(b"".join(lines))
+
+
+class CSVWriter:
+    def __init__(self, f, fit_advice: bool):
+        self.f = f
+        self.writer = csv.writer(f)
+        self.writer.writerow(CSV_COLUMNS + (["fit_advice"] if fit_advice else []))
+
+    def write_chunk(self, shopper_ids: List[str], products: Dict[str, List[str]],
+                    recommendations: Dict[str, List[Dict]]):
+        rows = []
+        encoded: Dict[int, List] = {}
+        for i, shopper_id in enumerate(shopper_ids):
+            for category, product_ids in products.items():
+                rec = recommendations[category][i]
+                values = encoded.get(id(rec))
+                if values is None:
+                    values = [rec["recommended_size"], rec["confidence"], json.dumps(rec["all_sizes"])]
+                    if "fit_advice" in rec:
+                        values.append(rec["fit_advice"])
+                    encoded[id(rec)] = values
+                rows.extend([shopper_id, product_id] + values for product_id in product_ids)
+            if len(rows) >= WRITE_BATCH_ROWS:
+                self.writer.writerows(rows)
+                rows.clear()
+        if rows:
+            self.writer.writerows(rows)
+
+
+def recommend_chunk(service: SizeRecommendationService, category: str, columns: Dict[str, np.ndarray],
+                    measurements: List[Dict], fit_advice: bool = False) -> List[Dict]:
+    """
+    recommend_size results (without the product) for every shopper of a chunk in one category.
+
+    Scores only take a few distinct values, so results are built once per
+    distinct score row and shared: shoppers with the same row get the same
+    dict object unless fit_advice adds per-shopper text.
+
+    Returns:
+        One dict per shopper: recommended_size, confidence, all_sizes (+ fit_advice)
+    """
+    sizes, scores = service.score_matrix(category, columns["chest_cm"], columns["waist_cm"], columns["hips_cm"])
+    distinct, inverse = np.unique(scores, axis=0, return_inverse=True)
+    shared, confidences = [], []
+    for row in distinct.tolist():
+        best_index = row.index(max(row))  # first maximum, like max() over the dict
+        confidences.append(row[best_index])
+        shared.append({
+            "recommended_size": sizes[best_index],
+            "confidence": round(row[best_index], 2),
+            "all_sizes": {size: round(value, 2) for size, value in zip(sizes, row)},
+        })
+    indices = inverse.ravel().tolist()
+    if not fit_advice:
+        return [shared[index] for index in indices]
+    return [
+        dict(shared[index], fit_advice=service._generate_fit_advice(
+            shopper, shared[index]["recommended_size"], category, confidences[index]))
+        for index, shopper in zip(indices, measurements)
+    ]
+
+
+def run(shoppers_path: str, products_path: str, output: str, chunk_size: int = 50000,
+        fit_advice: bool = False) -> Dict[str, Any]:
+    """
+    Score every shopper against every product, streaming results to `output`.
+
+    Returns:
+        Run summary (shoppers, products, rows written, seconds, rows per second)
+    """
+    service = SizeRecommendationService()
+    products = load_products(products_path, service)
+    product_count = sum(len(ids) for ids in products.values())
+    print(f"[SizeBackfill] {product_count} products in categories {sorted(products)}")
+
+    stats = {"shoppers": 0, "products": product_count, "rows": 0}
+    started = time.time()
+    as_csv = output.lower().endswith(".csv")
+    with open(output, "w", newline="") if as_csv else open(output, "wb") as out:
+        writer = CSVWriter(out, fit_advice) if as_csv else JSONLWriter(out)
+        if product_count:
+            for chunk in iter_chunks(iter_records(shoppers_path), chunk_size):
+                shopper_ids, columns, measurements = _measurement_arrays(chunk)
+                if not shopper_ids:
+                    continue
+                recommendations = {
+                    category: recommend_chunk(service, category, columns, measurements, fit_advice)
+                    for category in products
+                }
+                writer.write_chunk(shopper_ids, products, recommendations)
+                out.flush()
+
+                stats["shoppers"] += len(shopper_ids)
+                stats["rows"] += len(shopper_ids) * product_count
+                rate = stats["rows"] / max(time.time() - started, 1e-6)
+                print(f"[SizeBackfill] {stats['shoppers']} shoppers, {stats['rows']} rows, {rate:,.0f} rows/s")
+
+    elapsed = time.time() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["rows_per_second"] = round(stats["rows"] / elapsed) if elapsed > 0 else 0
+    print(f"[SizeBackfill] Finished: {json.dumps(stats)}")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Recompute size recommendations for shopper × product pairs")
+    parser.add_argument("--shoppers", required=True, help="Shopper measurements (.csv or .jsonl)")
+    parser.add_argument("--products", required=True, help="Products with their metadata (.csv or .jsonl)")
+    parser.add_argument("--output", required=True, help="Results file (.jsonl, or .csv)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Shoppers scored per chunk")
+    parser.add_argument("--fit-advice", action="store_true", help="Include the fit_advice text (slower)")
+    args = parser.parse_args(argv)
+
+    run(args.shoppers, args.products, args.output, max(1, args.chunk_size), args.fit_advice)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())